@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Worker's hot D1 queries against a local sqlite stand-in.
+
+Usage:
+  python3 scripts/bench_queries.py --synthetic 300000 [--db /tmp/bench.sqlite] [--out bench.json]
+  python3 scripts/bench_queries.py --from-sqlite /path/to/wy.sqlite [--db /tmp/bench.sqlite] [--out bench.json]
+  python3 scripts/bench_queries.py --db /tmp/bench.sqlite --compare baseline.json [--max-regression 0.25]
+
+The database is built the way D1's is: worker/db/migrations/*.sql applied
+in order (SqliteSink), then loaded either with a synthetic statewide data
+set (d1seed.dataset, deterministic for a given --seed) or from a local
+wy.sqlite.  An existing --db that already has voters is reused as is, so
+the expensive load happens once and later runs only measure.
+
+Every query in d1seed.workload.QUERIES whose tables have rows is run with
+--samples parameter sets drawn from random voters.  The report gives
+p50/p95/p99 latency, rows returned, VM steps per execution (the sqlite3
+module has no scan counters, so steps stand in for rows scanned) and the
+EXPLAIN QUERY PLAN.  --out writes all of it as JSON.
+
+--compare reads an earlier --out file and exits 1 when a query got slower:
+its VM steps (deterministic for the same data and seed) grew by more than
+--max-regression, or its p95 did and by at least --min-ms (timings are
+noisy below that).  Plan changes are printed but do not fail the run.
+"""
+import argparse, hashlib, json, platform, sqlite3, sys, time
+from pathlib import Path
+
+from d1seed import MIGRATIONS_DIR, SqliteSink
+from d1seed.dataset import load_from_sqlite, load_synthetic
+from d1seed.workload import QUERIES, ParamPool, available, run_query
+
+
+def migrations_digest():
+    digest = hashlib.blake2b(digest_size=8)
+    names = []
+    for path in sorted(Path(MIGRATIONS_DIR).glob('*.sql')):
+        names.append(path.name)
+        digest.update(path.read_bytes())
+    return names, digest.hexdigest()
+
+
+def prepare(args):
+    sink = SqliteSink(args.db)
+    conn = sink.conn
+    loaded = conn.execute('SELECT COUNT(*) FROM voters').fetchone()[0]
+    if loaded and (args.synthetic or args.from_sqlite):
+        print(f'{args.db} already has {loaded} voters; reusing it (delete the file to reload)')
+    elif not loaded:
+        if not (args.synthetic or args.from_sqlite):
+            raise SystemExit('empty database: pass --synthetic N or --from-sqlite PATH to load it')
+        started = time.perf_counter()
+        if args.from_sqlite:
+            if not Path(args.from_sqlite).exists():
+                raise SystemExit(f'SQLite file missing: {args.from_sqlite}')
+            counts = load_from_sqlite(conn, args.from_sqlite)
+        else:
+            counts = load_synthetic(conn, voters=args.synthetic, seed=args.seed)
+        print('Loaded ' + ', '.join(f'{t} {n}' for t, n in counts.items() if n) +
+              f' in {time.perf_counter() - started:.1f}s')
+    if args.analyze:
+        conn.execute('ANALYZE')
+    conn.row_factory = None
+    return sink, conn
+
+
+def dataset_counts(conn):
+    counts = {}
+    for table in ('voters', 'voters_addr_norm', 'voter_name_search', 'streets_index', 'wy_city_county',
+                  'v_best_phone', 'voter_contacts', 'call_activity', 'street_house_order', 'district_coverage',
+                  'call_queue', 'pulse_optins', 'activity_totals'):
+        try:
+            counts[table] = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        except sqlite3.OperationalError:
+            counts[table] = None
+    return counts
+
+
+def print_report(results, show_plans):
+    print(f"\n{'query':<30} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rows':>7} {'vm steps':>11}")
+    for name, r in results.items():
+        print(f"{name:<30} {r['p50_ms']:9.3f} {r['p95_ms']:9.3f} {r['p99_ms']:9.3f} {r['rows_mean']:7.1f} "
+              f"{r['vm_steps_mean']:11d}")
+    if show_plans:
+        for name, r in results.items():
+            print(f'\nEXPLAIN QUERY PLAN ({name}):')
+            for line in r['plan']:
+                print('  ', line)
+
+
+def compare(results, counts, baseline, max_regression, min_ms):
+    """Print per-query changes against `baseline`; return the regressed names."""
+    regressed = []
+    print(f"\n{'query':<30} {'p95 was':>9} {'p95 now':>9} {'steps was':>11} {'steps now':>11}")
+    for name, now in results.items():
+        was = baseline['queries'].get(name)
+        if not was:
+            print(f'{name:<30} (new)')
+            continue
+        steps_grew = now['vm_steps_mean'] > was['vm_steps_mean'] * (1 + max_regression) + 100
+        p95_grew = (now['p95_ms'] > was['p95_ms'] * (1 + max_regression)
+                    and now['p95_ms'] - was['p95_ms'] >= min_ms)
+        flag = '  REGRESSED' if steps_grew or p95_grew else ''
+        print(f"{name:<30} {was['p95_ms']:9.3f} {now['p95_ms']:9.3f} {was['vm_steps_mean']:11d} "
+              f"{now['vm_steps_mean']:11d}{flag}")
+        if flag:
+            regressed.append(name)
+        if was['plan'] != now['plan']:
+            print(f'  plan changed for {name}:')
+            for line in was['plan']:
+                print('    -', line)
+            for line in now['plan']:
+                print('    +', line)
+    for name in baseline['queries']:
+        if name not in results:
+            print(f'{name:<30} (not run)')
+    if baseline.get('migrations_digest') != migrations_digest()[1]:
+        print('\nnote: migrations changed since the baseline')
+    if baseline.get('dataset') != counts:
+        print('note: dataset row counts differ from the baseline; VM steps are only comparable on the same data')
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='bench.sqlite', help='migrated sqlite database to build or reuse')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--synthetic', type=int, default=None, metavar='VOTERS',
+                        help='load this many synthetic voters (production is ~300000)')
+    source.add_argument('--from-sqlite', default=None, metavar='PATH', help='load a local wy.sqlite')
+    parser.add_argument('--analyze', action='store_true', help='run ANALYZE before measuring (D1 does not by default)')
+    parser.add_argument('--queries', default=None, help='comma-separated query names (default: all)')
+    parser.add_argument('--samples', type=int, default=200, help='parameter sets per query')
+    parser.add_argument('--pool', type=int, default=500, help='random voters to draw parameters from')
+    parser.add_argument('--seed', type=int, default=1, help='data and parameter seed')
+    parser.add_argument('--plans', action='store_true', help='print EXPLAIN QUERY PLAN for every query')
+    parser.add_argument('--out', default=None, help='write results as JSON')
+    parser.add_argument('--compare', default=None, help='earlier --out JSON to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.25, help='allowed growth as a fraction')
+    parser.add_argument('--min-ms', type=float, default=0.5, help='ignore p95 growth smaller than this')
+    args = parser.parse_args()
+    if args.samples < 1:
+        raise SystemExit('--samples must be at least 1')
+
+    selected = QUERIES
+    if args.queries:
+        wanted = [n.strip() for n in args.queries.split(',') if n.strip()]
+        known = {q.name for q in QUERIES}
+        unknown = [n for n in wanted if n not in known]
+        if unknown:
+            raise SystemExit(f"unknown queries: {', '.join(unknown)} (known: {', '.join(sorted(known))})")
+        selected = [q for q in QUERIES if q.name in wanted]
+
+    sink, conn = prepare(args)
+    counts = dataset_counts(conn)
+    pool = ParamPool(conn, size=args.pool, seed=args.seed)
+    print(f"Benchmarking on {counts['voters']} voters, {args.samples} samples per query (sqlite {sqlite3.sqlite_version})")
+
+    results = {}
+    for query in selected:
+        if not available(conn, query):
+            print(f'  skip {query.name}: needs rows in {", ".join(query.requires)}')
+            continue
+        results[query.name] = run_query(conn, query, pool, args.samples)
+    print_report(results, args.plans)
+
+    names, digest = migrations_digest()
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'sqlite_version': sqlite3.sqlite_version,
+        'python': platform.python_version(),
+        'migrations': names,
+        'migrations_digest': digest,
+        'dataset': counts,
+        'seed': args.seed,
+        'samples': args.samples,
+        'analyzed': args.analyze,
+        'queries': results,
+    }
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2) + '\n', encoding='utf-8')
+        print(f'\nWrote {args.out}')
+
+    regressed = []
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding='utf-8'))
+        names = {q.name for q in selected}
+        baseline['queries'] = {n: r for n, r in baseline.get('queries', {}).items() if n in names}
+        regressed = compare(results, counts, baseline, args.max_regression, args.min_ms)
+    sink.close()
+    if regressed:
+        print(f"\n{len(regressed)} queries regressed: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Build one best phone per voter (E.164, ranked offline) and seed v_best_phone.
+
+Usage:
+  python3 scripts/build_best_phone.py /path/to/wy.sqlite [--sink remote|local|sqlite] [--no-seed] [--delta]
+  python3 scripts/build_best_phone.py /path/to/wy.sqlite --no-seed --local-area 307
+
+Every phone row in the local sqlite (voter_phones, best_phone and
+v_best_phone, whichever are tables) is a candidate.  Numbers are
+normalized to E.164 in one pass over the candidate table (a SQL function,
+cached per distinct raw value):
+
+  * punctuation and extensions ("x12", "ext. 12") are dropped
+  * NANP numbers become +1NPANXXXXXX; 11 digits must start with 1
+  * 7-digit numbers get --local-area if given (Wyoming has only 307),
+    otherwise they are rejected
+  * area codes and exchanges must start 2-9 and not be N11, and
+    555-0100..0199 (reserved for fiction) is rejected
+  * numbers written with a non-1 country code are kept when they have
+    8-15 digits
+
+is_wy_area is 1 for area code 307.  Valid candidates of voters that exist
+in voters are ranked per voter by confidence_code (higher first), is_primary,
+then recency (imported_at / updated_at / created_at), and the top one is
+written to best_phone_built (same columns as v_best_phone).  Rejected
+candidates go to best_phone_rejects with their reason and the counts are
+printed (and emitted with --events).
+
+The sink then gets exactly one row per voter with a usable phone, so the
+Worker reads v_best_phone directly instead of ranking candidates in the
+best_phone view on every /call.  A full seed only upserts; use --delta to
+also delete voters whose phone went away.
+"""
+import argparse, re, time
+from functools import lru_cache
+
+from d1seed import SinkError, find_source, verify_counts
+from d1seed.cli import (add_source_argument, add_sink_arguments, add_checkpoint_arguments, add_delta_arguments,
+                        sink_from_args, checkpoint_from_args, open_source, seed_table, instrumented)
+
+BEST_COLUMNS = ['voter_id', 'phone_e164', 'confidence_code', 'is_wy_area', 'imported_at']
+CANDIDATE_SOURCES = ['voter_phones', 'best_phone', 'v_best_phone']
+WY_AREA = '307'
+
+BUILT_SCHEMA = """
+DROP TABLE IF EXISTS best_phone_built;
+CREATE TABLE best_phone_built (
+  voter_id TEXT PRIMARY KEY,
+  phone_e164 TEXT NOT NULL,
+  confidence_code INTEGER,
+  is_wy_area INTEGER NOT NULL,
+  imported_at TEXT
+);
+DROP TABLE IF EXISTS best_phone_rejects;
+CREATE TABLE best_phone_rejects (
+  voter_id TEXT,
+  source TEXT NOT NULL,
+  raw TEXT,
+  reason TEXT NOT NULL
+);
+CREATE INDEX idx_best_phone_rejects_reason ON best_phone_rejects(reason);
+"""
+
+EXTENSION = re.compile(r'\s*(?:x|ext\.?|extension|#)\s*\d*\s*$', re.I)
+NON_DIGITS = re.compile(r'\D')
+
+
+@lru_cache(maxsize=1 << 18)
+def normalize(raw, local_area=None):
+    """'+1NPANXXXXXX' (or another E.164 number) for `raw`, or '!reason'."""
+    if raw is None:
+        return '!empty'
+    text = EXTENSION.sub('', str(raw).strip())
+    if not text:
+        return '!empty'
+    international = text.startswith('+') or text.startswith('011')
+    digits = NON_DIGITS.sub('', text)
+    if text.startswith('011'):
+        digits = digits[3:]
+    if international and not digits.startswith('1'):
+        return '+' + digits if 8 <= len(digits) <= 15 else '!bad_length'
+    if len(digits) == 11 and digits.startswith('1'):
+        digits = digits[1:]
+    elif len(digits) == 7:
+        if not local_area:
+            return '!no_area_code'
+        digits = local_area + digits
+    if len(digits) != 10:
+        return '!bad_length'
+    area, exchange, line = digits[:3], digits[3:6], digits[6:]
+    if area[0] in '01' or area[1:] == '11':
+        return '!invalid_area'
+    if exchange[0] in '01' or exchange[1:] == '11':
+        return '!invalid_exchange'
+    if exchange == '555' and '0100' <= line <= '0199':
+        return '!fictional'
+    return '+1' + digits
+
+
+def columns(conn, table):
+    return [r[1] for r in conn.execute(f'PRAGMA table_info({table})')]
+
+
+def first(cols, *names):
+    return next((n for n in names if n in cols), None)
+
+
+def stage_candidates(conn):
+    """temp.phone_candidates from every phone table; returns the sources used."""
+    conn.execute('DROP TABLE IF EXISTS temp.phone_candidates')
+    conn.execute('CREATE TEMP TABLE phone_candidates (voter_id TEXT, source TEXT, raw TEXT, '
+                 'confidence INTEGER, is_primary INTEGER, seen_at TEXT)')
+    used = []
+    for table in CANDIDATE_SOURCES:
+        if not find_source(conn, [table], types=('table',)):
+            continue
+        cols = columns(conn, table)
+        raw = first(cols, 'phone_e164', 'phone_number', 'phone', 'phone_raw')
+        if 'voter_id' not in cols or not raw:
+            print(f'  {table}: no voter_id / phone column; skipped')
+            continue
+        conf = first(cols, 'confidence_code', 'confidence')
+        primary = first(cols, 'is_primary')
+        seen = first(cols, 'imported_at', 'updated_at', 'created_at')
+        n = conn.execute(f"""
+            INSERT INTO temp.phone_candidates (voter_id, source, raw, confidence, is_primary, seen_at)
+            SELECT voter_id, '{table}', {raw}, {f'CAST({conf} AS INTEGER)' if conf else 'NULL'},
+                   {f'COALESCE({primary}, 0)' if primary else '0'}, {seen or 'NULL'}
+            FROM {table}
+        """).rowcount
+        used.append(table)
+        print(f'  {table}: {n} candidates ({raw}, confidence {conf or "-"}, recency {seen or "-"})')
+    if not used:
+        raise SystemExit(f"No phone table found in sqlite (looked for {', '.join(CANDIDATE_SOURCES)})")
+    return used
+
+
+def build(conn, local_area=None):
+    started = time.perf_counter()
+    normalize.cache_clear()
+    conn.create_function('normalize_phone', 2, normalize, deterministic=True)
+    print('Staging phone candidates:')
+    with conn:
+        stage_candidates(conn)
+        conn.executescript(BUILT_SCHEMA)
+        conn.execute('DROP TABLE IF EXISTS temp.phone_norm')
+        conn.execute("""
+            CREATE TEMP TABLE phone_norm AS
+            SELECT c.voter_id, c.source, c.raw, c.confidence, c.is_primary, c.seen_at,
+                   normalize_phone(c.raw, ?) AS norm,
+                   v.voter_id IS NOT NULL AS known
+            FROM temp.phone_candidates c
+            LEFT JOIN voters v ON v.voter_id = c.voter_id
+        """, (local_area,))
+        conn.execute("""
+            INSERT INTO best_phone_rejects (voter_id, source, raw, reason)
+            SELECT voter_id, source, raw, CASE WHEN norm LIKE '!%' THEN SUBSTR(norm, 2) ELSE 'unknown_voter' END
+            FROM temp.phone_norm
+            WHERE norm LIKE '!%' OR NOT known
+        """)
+        conn.execute(f"""
+            INSERT INTO best_phone_built (voter_id, phone_e164, confidence_code, is_wy_area, imported_at)
+            SELECT voter_id, norm, confidence, norm LIKE '+1{WY_AREA}%', seen_at
+            FROM (
+              SELECT voter_id, norm, confidence, seen_at,
+                     ROW_NUMBER() OVER (PARTITION BY voter_id
+                                        ORDER BY confidence DESC NULLS LAST, is_primary DESC,
+                                                 seen_at DESC NULLS LAST, norm) AS rn
+              FROM temp.phone_norm
+              WHERE norm NOT LIKE '!%' AND known
+            )
+            WHERE rn = 1
+            ORDER BY voter_id
+        """)
+    return report(conn, time.perf_counter() - started)
+
+
+def report(conn, seconds):
+    candidates, candidate_voters, valid, valid_distinct = conn.execute("""
+        SELECT COUNT(*), COUNT(DISTINCT voter_id),
+               SUM(norm NOT LIKE '!%' AND known),
+               COUNT(DISTINCT CASE WHEN norm NOT LIKE '!%' AND known THEN voter_id || ' ' || norm END)
+        FROM temp.phone_norm
+    """).fetchone()
+    built, wy = conn.execute('SELECT COUNT(*), COALESCE(SUM(is_wy_area), 0) FROM best_phone_built').fetchone()
+    reasons = dict(conn.execute(
+        'SELECT reason, COUNT(*) FROM best_phone_rejects GROUP BY reason ORDER BY COUNT(*) DESC').fetchall())
+    stats = {
+        'candidates': candidates,
+        'candidate_voters': candidate_voters,
+        'valid': valid or 0,
+        'duplicates': (valid or 0) - valid_distinct,
+        'outranked': valid_distinct - built,
+        'rejected': sum(reasons.values()),
+        'reject_reasons': reasons,
+        'best_phones': built,
+        'wy_area': wy,
+        'seconds': round(seconds, 2),
+    }
+    print(f'Built best_phone_built: {built} voters with a phone ({wy} in {WY_AREA}) '
+          f'from {candidates} candidates in {seconds:.1f}s')
+    print(f"  {stats['duplicates']} duplicate numbers collapsed, {stats['outranked']} lower-ranked numbers dropped")
+    print(f"  {stats['rejected']} rejected" + (': ' + ', '.join(f'{r} {n}' for r, n in reasons.items())
+                                              if reasons else ''))
+    for reason, raw in conn.execute("""
+            SELECT reason, MIN(raw) FROM best_phone_rejects WHERE raw IS NOT NULL GROUP BY reason ORDER BY reason"""):
+        print(f'    e.g. {reason}: {raw!r}')
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_source_argument(parser)
+    add_sink_arguments(parser)
+    add_checkpoint_arguments(parser)
+    add_delta_arguments(parser)
+    parser.add_argument('--local-area', default=None, metavar='NPA',
+                        help='area code for 7-digit numbers (e.g. 307); without it they are rejected')
+    parser.add_argument('--no-seed', action='store_true', help='only build the local tables')
+    args = parser.parse_args()
+    if args.local_area and not re.fullmatch(r'[2-9]\d\d', args.local_area):
+        raise SystemExit(f'--local-area must be a 3-digit area code, got {args.local_area!r}')
+
+    with instrumented(args) as log:
+        conn = open_source(args.sqlite)
+        if not find_source(conn, ['voters'], types=('table',)):
+            raise SystemExit('voters table missing in sqlite')
+        stats = build(conn, args.local_area)
+        log.emit('best_phone', **stats)
+        if args.no_seed:
+            conn.close()
+            return
+        sink = sink_from_args(args)
+        checkpoint = checkpoint_from_args(args, sink)
+        seed_table(conn, sink, args, checkpoint, 'v_best_phone', BEST_COLUMNS,
+                   f"SELECT {', '.join(BEST_COLUMNS)} FROM best_phone_built;")
+        verify_counts(sink, 'v_best_phone')
+        conn.close()
+        sink.close()
+        print('\nAll done')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except SinkError as e:
+        raise SystemExit(f'seeding failed: {e}')
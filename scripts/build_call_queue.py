@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Rank every callable voter into call_queue so "get next voter" is an index pop.
+
+Usage:
+  python3 scripts/build_call_queue.py /path/to/wy.sqlite [--sink remote|local|sqlite] [--queues all,county,house,senate]
+  python3 scripts/build_call_queue.py /path/to/wy.sqlite --incremental
+  python3 scripts/build_call_queue.py /path/to/wy.sqlite --no-seed
+
+Voters and phones come from the local sqlite (voters + best_phone_built,
+best_phone or voter_phones).  Call history (call_activity, call_followups,
+voter_contacts) is read from the local sqlite when it has those tables,
+otherwise from the sink.  Each voter with a phone gets a priority, lower
+first (a voter with several numbers is ranked by the best of them):
+
+  tier       0 follow-up due (call_followups not done, or a call asking for
+             one, due today or earlier), 1 never called, 2 called before
+             with a retryable outcome (no_answer, vm, follow_up, ...)
+  attempts   retries sink behind voters tried fewer times
+  area code  Wyoming numbers (is_wy_area) before out-of-state ones
+  confidence higher confidence_code first
+
+Refused, wrong numbers and do-not-call never enter the queue; connected
+voters and voters with a voter_contacts row only come back for a due
+follow-up.  Rows are written per queue ('all', 'county:<COUNTY>',
+'house:<NN>', 'senate:<NN>'; pick with --queues) into the
+local call_queue_built and then to call_queue on the sink
+(worker/db/migrations/037_add_call_queue.sql).
+
+--incremental only re-ranks voters touched since the last build: new
+calls, contacts or follow-ups, and follow-ups that became due.  Their rows
+are replaced locally and on the sink; everyone else keeps their rank.
+"""
+import argparse, time
+
+from d1seed import SinkError, find_source, verify_counts
+from d1seed.adaptive import send_batches
+from d1seed.cli import (add_source_argument, add_sink_arguments, sink_from_args, controller_from_args, open_source,
+                        instrumented)
+from d1seed.encode import encode_row, esc, insert_head
+
+QUEUE_KINDS = ('all', 'county', 'house', 'senate')
+QUEUE_COLUMNS = ['queue', 'voter_id', 'priority', 'reason', 'built_at']
+
+# call_activity outcomes: the call reached someone, or must not be retried
+TERMINAL_OUTCOMES = ('connected', 'contacted', 'refused', 'wrong_number', 'dnc')
+HARD_STOP_OUTCOMES = ('refused', 'wrong_number', 'dnc')
+
+BUILT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS call_queue_built (
+  queue TEXT NOT NULL,
+  voter_id TEXT NOT NULL,
+  priority INTEGER NOT NULL,
+  reason TEXT,
+  built_at TEXT,
+  PRIMARY KEY (queue, voter_id)
+);
+CREATE INDEX IF NOT EXISTS idx_call_queue_built_voter ON call_queue_built(voter_id);
+CREATE TABLE IF NOT EXISTS call_queue_state (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  built_at TEXT NOT NULL,
+  queues TEXT NOT NULL,
+  history TEXT NOT NULL
+);
+"""
+
+STATS_SCHEMA = """
+DROP TABLE IF EXISTS temp.call_stats;
+DROP TABLE IF EXISTS temp.followup_due;
+DROP TABLE IF EXISTS temp.contact_stats;
+DROP TABLE IF EXISTS temp.touched;
+CREATE TEMP TABLE call_stats (voter_id TEXT PRIMARY KEY, attempts INTEGER, terminal INTEGER, hard_stop INTEGER,
+                              due INTEGER);
+CREATE TEMP TABLE followup_due (voter_id TEXT PRIMARY KEY);
+CREATE TEMP TABLE contact_stats (voter_id TEXT PRIMARY KEY, dnc INTEGER);
+CREATE TEMP TABLE touched (voter_id TEXT PRIMARY KEY);
+"""
+
+OUTCOME = "LOWER(TRIM(COALESCE(NULLIF(call_result, ''), outcome, '')))"
+
+
+def _in(values):
+    return '(' + ', '.join(esc(v) for v in values) + ')'
+
+
+CALL_STATS_SQL = f"""
+SELECT voter_id, COUNT(*) AS attempts,
+       MAX(CASE WHEN {OUTCOME} IN {_in(TERMINAL_OUTCOMES)} THEN 1 ELSE 0 END) AS terminal,
+       MAX(CASE WHEN {OUTCOME} IN {_in(HARD_STOP_OUTCOMES)} THEN 1 ELSE 0 END) AS hard_stop,
+       MAX(CASE WHEN followup_needed = 1 AND COALESCE(followup_date, '') <= DATE('now') THEN 1 ELSE 0 END) AS due
+FROM call_activity {{where}}
+GROUP BY voter_id
+"""
+
+FOLLOWUP_SQL = """
+SELECT DISTINCT voter_id
+FROM call_followups
+WHERE COALESCE(done, 0) = 0 AND COALESCE(due_date, '') <= DATE('now') {and_where}
+"""
+
+CONTACT_SQL = """
+SELECT voter_id, MAX(COALESCE(dnc, 0)) AS dnc
+FROM voter_contacts {where}
+GROUP BY voter_id
+"""
+
+TOUCHED_SQL = """
+SELECT voter_id FROM call_activity
+ WHERE created_at >= {since} OR (followup_needed = 1 AND followup_date > {since_day} AND followup_date <= DATE('now'))
+UNION
+SELECT voter_id FROM call_followups
+ WHERE created_at >= {since} OR (COALESCE(done, 0) = 0 AND due_date > {since_day} AND due_date <= DATE('now'))
+UNION
+SELECT voter_id FROM voter_contacts WHERE COALESCE(updated_at, created_at) >= {since}
+"""
+
+
+class History:
+    """Reads call history from the local sqlite when it mirrors the D1
+    tables, otherwise from the sink.  Queries are paged by voter_id."""
+
+    TABLES = ('call_activity', 'call_followups', 'voter_contacts')
+
+    def __init__(self, conn, sink, page=5000):
+        self.conn = conn
+        self.sink = sink
+        self.page = page
+        local = all(find_source(conn, [t], types=('table',)) for t in self.TABLES)
+        if not local and sink is None:
+            raise SystemExit('call history tables are not in the local sqlite and --no-seed gives no sink to read')
+        self.name = 'local sqlite' if local else sink.name
+        self.local = local
+
+    def query(self, sql):
+        if self.local:
+            cur = self.conn.execute(sql)
+            return [tuple(r) for r in cur]
+        return [tuple(r.values()) for r in self.sink.query(sql)]
+
+    def pages(self, sql):
+        inner = sql.strip().rstrip(';')
+        after = None
+        while True:
+            where = f'WHERE voter_id > {esc(after)} ' if after is not None else ''
+            rows = self.query(f'SELECT * FROM ({inner}) {where}ORDER BY voter_id LIMIT {self.page};')
+            if not rows:
+                return
+            yield from rows
+            after = rows[-1][0]
+
+    def now(self):
+        return self.query("SELECT CURRENT_TIMESTAMP AS now;")[0][0]
+
+
+def stage_history(conn, history, since=None):
+    """Fill the temp stats tables; with `since`, only for touched voters."""
+    conn.executescript(STATS_SCHEMA)
+    scope = ''
+    if since is not None:
+        touched = TOUCHED_SQL.format(since=esc(since), since_day=esc(since[:10]))
+        conn.executemany('INSERT OR IGNORE INTO temp.touched VALUES (?)', history.pages(touched))
+        if not conn.execute('SELECT 1 FROM temp.touched LIMIT 1').fetchone():
+            return 0
+        scope = f'voter_id IN ({touched})'
+    conn.executemany('INSERT INTO temp.call_stats VALUES (?, ?, ?, ?, ?)',
+                     history.pages(CALL_STATS_SQL.format(where=f'WHERE {scope}' if scope else '')))
+    conn.executemany('INSERT INTO temp.followup_due VALUES (?)',
+                     history.pages(FOLLOWUP_SQL.format(and_where=f'AND {scope}' if scope else '')))
+    conn.executemany('INSERT INTO temp.contact_stats VALUES (?, ?)',
+                     history.pages(CONTACT_SQL.format(where=f'WHERE {scope}' if scope else '')))
+    return conn.execute('SELECT COUNT(*) FROM temp.touched').fetchone()[0]
+
+
+def columns(conn, table):
+    return {r[1] for r in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def district_code_expr(column):
+    """Same normalization as the Worker's normalizeDistrictCode: '7' -> '07'."""
+    value = f'TRIM(COALESCE(CAST({column} AS TEXT), \'\'))'
+    return (f"CASE WHEN {value} GLOB '[0-9]*' AND {value} <> '' THEN printf('%02d', CAST({value} AS INTEGER)) "
+            f"ELSE UPPER({value}) END")
+
+
+def phone_sql(phones):
+    """One usable phone per voter from `phones`.
+
+    best_phone_built has one row per voter already, but best_phone and
+    voter_phones have one per number; the number that ranks a voter
+    highest (Wyoming area code, then confidence) is the one kept.
+    """
+    return f"""
+        SELECT voter_id, is_wy_area, confidence_code FROM (
+          SELECT voter_id, is_wy_area, confidence_code,
+                 ROW_NUMBER() OVER (PARTITION BY voter_id
+                                    ORDER BY COALESCE(is_wy_area, 0) = 1 DESC,
+                                             COALESCE(CAST(confidence_code AS INTEGER), 0) DESC,
+                                             phone_e164) AS rn
+          FROM {phones}
+          WHERE NULLIF(TRIM(phone_e164), '') IS NOT NULL
+        )
+        WHERE rn = 1"""
+
+
+def scored_sql(conn, only_touched):
+    """SELECT voter_id, county, house, senate, priority, reason for callable voters."""
+    phones = find_source(conn, ['best_phone_built', 'best_phone', 'v_best_phone', 'voter_phones'])
+    if not phones:
+        raise SystemExit('No best_phone / voter_phones source found in sqlite')
+    vcols = columns(conn, 'voters')
+    house = 'house_district' if 'house_district' in vcols else 'house'
+    senate = 'senate_district' if 'senate_district' in vcols else 'senate'
+    touched = 'AND v.voter_id IN (SELECT voter_id FROM temp.touched)' if only_touched else ''
+    return f"""
+        SELECT voter_id, county, house, senate,
+               tier * 100000000 + MIN(attempts, 99) * 1000000 + (1 - wy) * 10000
+                 + (9999 - MIN(MAX(confidence, 0), 9999)) AS priority,
+               CASE tier WHEN 0 THEN 'followup' WHEN 1 THEN 'new' ELSE 'retry' END AS reason
+        FROM (
+          SELECT v.voter_id,
+                 UPPER(TRIM(COALESCE(v.county, ''))) AS county,
+                 {district_code_expr(f'v.{house}')} AS house,
+                 {district_code_expr(f'v.{senate}')} AS senate,
+                 CASE WHEN f.voter_id IS NOT NULL OR COALESCE(cs.due, 0) = 1 THEN 0
+                      WHEN cs.voter_id IS NULL THEN 1 ELSE 2 END AS tier,
+                 COALESCE(cs.attempts, 0) AS attempts,
+                 CASE WHEN COALESCE(p.is_wy_area, 0) = 1 THEN 1 ELSE 0 END AS wy,
+                 COALESCE(CAST(p.confidence_code AS INTEGER), 0) AS confidence,
+                 COALESCE(cs.terminal, 0) AS terminal,
+                 ct.voter_id IS NOT NULL AS contacted
+          FROM voters v
+          JOIN ({phone_sql(phones)}) p ON p.voter_id = v.voter_id
+          LEFT JOIN temp.call_stats cs ON cs.voter_id = v.voter_id
+          LEFT JOIN temp.followup_due f ON f.voter_id = v.voter_id
+          LEFT JOIN temp.contact_stats ct ON ct.voter_id = v.voter_id
+          WHERE COALESCE(cs.hard_stop, 0) = 0 AND COALESCE(ct.dnc, 0) = 0 {touched}
+        )
+        WHERE tier = 0 OR (terminal = 0 AND NOT contacted)
+    """
+
+
+def queue_key(kind):
+    return {
+        'all': "'all'",
+        'county': "'county:' || county",
+        'house': "'house:' || house",
+        'senate': "'senate:' || senate",
+    }[kind]
+
+
+def rank(conn, kinds, built_at, only_touched):
+    """Write the ranked rows into call_queue_built; returns rows written."""
+    with conn:
+        conn.execute('DROP TABLE IF EXISTS temp.scored')
+        conn.execute(f'CREATE TEMP TABLE scored AS {scored_sql(conn, only_touched)}')
+        if only_touched:
+            conn.execute('DELETE FROM call_queue_built WHERE voter_id IN (SELECT voter_id FROM temp.touched)')
+        else:
+            conn.execute('DELETE FROM call_queue_built')
+        for kind in kinds:
+            column = 'voter_id' if kind == 'all' else kind
+            conn.execute(
+                f'INSERT INTO call_queue_built (queue, voter_id, priority, reason, built_at) '
+                f'SELECT {queue_key(kind)}, voter_id, priority, reason, ? FROM temp.scored '
+                f"WHERE {column} != '' ORDER BY 1, priority, voter_id", (built_at,))
+    return conn.execute('SELECT COUNT(*) FROM temp.scored').fetchone()[0]
+
+
+def report(conn):
+    queues, rows = conn.execute('SELECT COUNT(DISTINCT queue), COUNT(*) FROM call_queue_built').fetchone()
+    print(f'call_queue_built: {rows} rows in {queues} queues')
+    for reason, cnt in conn.execute('SELECT reason, COUNT(*) FROM temp.scored GROUP BY reason ORDER BY reason'):
+        print(f'  {reason}: {cnt} voters')
+
+
+def push(conn, sink, where, delete_touched, max_bytes, batch_size, controller):
+    """Send call_queue_built rows matching `where` to call_queue on the sink."""
+    if delete_touched:
+        keys = conn.execute('SELECT voter_id FROM temp.touched ORDER BY voter_id').fetchall()
+        items = ((esc(k), k) for (k,) in keys)
+        for batch, _ in send_batches(sink, items, 'DELETE FROM call_queue WHERE voter_id IN (', max_bytes,
+                                     batch_size, sep=',', tail=');', controller=controller):
+            print(f'Cleared {batch.rows} touched voters from call_queue')
+    else:
+        sink.execute('DELETE FROM call_queue;')
+    rows = conn.execute(f"SELECT {', '.join(QUEUE_COLUMNS)} FROM call_queue_built {where} "
+                        f'ORDER BY queue, priority, voter_id')
+    items = ((encode_row(r), r[1]) for r in rows)
+    sent = 0
+    for batch, _ in send_batches(sink, items, insert_head('call_queue', QUEUE_COLUMNS), max_bytes, batch_size,
+                                 controller=controller):
+        sent += batch.rows
+        print(f'Inserted {sent} call_queue rows ({batch.rows} rows, {len(batch.sql.encode("utf-8"))} bytes)')
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_source_argument(parser)
+    add_sink_arguments(parser)
+    parser.add_argument('--queues', default=','.join(QUEUE_KINDS),
+                        help=f"comma-separated queue kinds to build ({', '.join(QUEUE_KINDS)})")
+    parser.add_argument('--incremental', action='store_true', help='only re-rank voters touched since the last build')
+    parser.add_argument('--no-seed', action='store_true', help='only build the local table')
+    args = parser.parse_args()
+    kinds = [k.strip() for k in args.queues.split(',') if k.strip()]
+    unknown = set(kinds) - set(QUEUE_KINDS)
+    if unknown or not kinds:
+        raise SystemExit(f"--queues takes {', '.join(QUEUE_KINDS)}; got {args.queues!r}")
+
+    with instrumented(args):
+        conn = open_source(args.sqlite)
+        conn.executescript(BUILT_SCHEMA)
+        if args.incremental and args.no_seed:
+            raise SystemExit('--incremental refreshes the sink; it cannot be combined with --no-seed')
+        sink = None if args.no_seed else sink_from_args(args)
+        history = History(conn, sink)
+        # The state describes what the sink holds, so it is only written after a
+        # successful push; a full build drops it until then.
+        state = conn.execute('SELECT built_at, queues, history FROM call_queue_state WHERE id = 1').fetchone()
+        incremental = args.incremental
+        if incremental and (state is None or state[1] != ','.join(kinds) or state[2] != history.name):
+            print('No previous build with the same queues and history source; doing a full build')
+            incremental = False
+        if not incremental:
+            with conn:
+                conn.execute('DELETE FROM call_queue_state')
+
+        started = time.perf_counter()
+        built_at = history.now()
+        since = state[0] if incremental else None
+        touched = stage_history(conn, history, since)
+        print(f'Read call history from {history.name}' + (f' ({touched} voters touched since {since})' if incremental else ''))
+        if incremental and not touched:
+            print('Nothing touched since the last build')
+            conn.close()
+            return
+        ranked = rank(conn, kinds, built_at, incremental)
+        print(f'Ranked {ranked} callable voters in {time.perf_counter() - started:.2f}s')
+        report(conn)
+
+        if sink is not None:
+            controller = controller_from_args(args)
+            where = 'WHERE voter_id IN (SELECT voter_id FROM temp.touched)' if incremental else ''
+            push(conn, sink, where, incremental, args.max_bytes, args.batch, controller)
+            verify_counts(sink, 'call_queue')
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO call_queue_state (id, built_at, queues, history) VALUES (1, ?, ?, ?)',
+                             (built_at, ','.join(kinds), history.name))
+            sink.close()
+        conn.close()
+        print('\nAll done')
+
+if __name__ == '__main__':
+    try:
+        main()
+    except SinkError as e:
+        raise SystemExit(f'seeding failed: {e}')
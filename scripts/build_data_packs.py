@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Build compressed offline data packs (one per county, city and legislative
+district) for the volunteer app's IndexedDB cache.
+
+Usage:
+  python3 scripts/build_data_packs.py /path/to/wy.sqlite [--out .data_packs] [--kinds county,city,house,senate]
+  python3 scripts/build_data_packs.py /path/to/wy.sqlite --only county-natrona,house-07 [--jobs 4] [--keep 3]
+
+A pack is gzip'd JSON with the turf's streets (id, name, house range,
+address count), voters (name, address, city, zip, party, street id, house
+number, districts) and best phones, each as {"columns": [...], "rows":
+[...]} in key order.  Street ids come from streets_index_built /
+voter_street_link and house numbers from voter_addr_parsed when the address
+pipeline has run (parse_addresses.py, build_streets_index.py); otherwise
+those columns are null.
+
+The pack's version is a hash of its uncompressed content, written last in
+the pack and used as its file name and ETag, so files are immutable and a
+rebuild with unchanged data writes nothing.  manifest.json in --out lists
+every pack's current version, size and row counts, and for each of the
+last --keep versions a delta pack that upserts changed rows and deletes
+removed ones, so a client that already has a turf only downloads what
+changed.  Files no longer referenced by the manifest are removed.
+
+Packs are built in parallel (--jobs, default one per core); each worker
+streams its rows from sqlite straight into the gzip writer.  Sizes and
+build times are printed and recorded in the manifest.
+
+ui/src/idb.js (fetchPack) is the client: it reads the manifest, applies a
+delta when it has the base version and fetches the full pack otherwise.
+The packs hold voter data: serve them only behind the same Access policy
+as the API, never from the public ui/ site.
+"""
+import argparse, gzip, hashlib, json, os, re, sqlite3, time
+from multiprocessing import Pool
+from pathlib import Path
+
+from d1seed import find_source
+from d1seed.cli import add_source_argument, open_source
+from d1seed.sinks import REPO_ROOT
+
+PACK_FORMAT = 1
+KINDS = ('county', 'city', 'house', 'senate')
+DEFAULT_OUT = REPO_ROOT / '.data_packs'
+
+STREET_COLUMNS = ['id', 'street', 'house_min', 'house_max', 'address_count']
+VOTER_COLUMNS = ['voter_id', 'first_name', 'last_name', 'address', 'city', 'zip', 'party', 'street_id',
+                 'house_number', 'house', 'senate', 'precinct']
+PHONE_COLUMNS = ['voter_id', 'phone_e164', 'confidence']
+SECTIONS = (('streets', STREET_COLUMNS), ('voters', VOTER_COLUMNS), ('phones', PHONE_COLUMNS))
+
+
+def columns(conn, table):
+    return {r[1] for r in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def pick_column(cols, names):
+    return next((n for n in names if n in cols), None)
+
+
+def district_expr(column):
+    """Zero-padded district code, as the Worker's normalizeDistrictCode."""
+    return (f"CASE WHEN TRIM({column}) GLOB '[0-9]*' AND TRIM({column}) <> '' "
+            f"THEN printf('%02d', CAST(TRIM({column}) AS INTEGER)) ELSE UPPER(TRIM({column})) END")
+
+
+def slug(text):
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+
+class Source:
+    """Column mapping of the local wy.sqlite, resolved once in the parent."""
+
+    def __init__(self, conn):
+        self.addr = find_source(conn, ['voters_addr_norm', 'v_voters_addr_norm'])
+        if not self.addr:
+            raise SystemExit('No voters_addr_norm source found in sqlite')
+        vcols = columns(conn, 'voters')
+        self.house = pick_column(vcols, ['house_district', 'house'])
+        self.senate = pick_column(vcols, ['senate_district', 'senate'])
+        self.precinct = pick_column(vcols, ['precinct'])
+        self.phones = find_source(conn, ['best_phone_built', 'best_phone', 'v_best_phone', 'voter_phones'])
+        self.linked = bool(find_source(conn, ['voter_street_link'], types=('table',))
+                           and find_source(conn, ['streets_index_built'], types=('table',)))
+        self.parsed = bool(find_source(conn, ['voter_addr_parsed'], types=('table',)))
+
+    def index_phones(self, conn):
+        """Each voter's phone is a correlated lookup; make it an index seek."""
+        if self.phones and find_source(conn, [self.phones], types=('table',)):
+            with conn:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.phones}_voter_conf '
+                             f'ON {self.phones}(voter_id, confidence_code)')
+
+    def voters_sql(self, where):
+        col = lambda c: f'v.{c}' if c else 'NULL'
+        joins = ''
+        if self.linked:
+            joins += ' LEFT JOIN voter_street_link l ON l.voter_id = v.voter_id'
+        if self.parsed:
+            joins += " LEFT JOIN voter_addr_parsed p ON p.voter_id = v.voter_id AND p.status = 'ok'"
+        if self.phones:
+            phone = (f'(SELECT ph.phone_e164 FROM {self.phones} ph WHERE ph.voter_id = v.voter_id '
+                     f'ORDER BY ph.confidence_code DESC LIMIT 1)')
+            conf = (f'(SELECT ph.confidence_code FROM {self.phones} ph WHERE ph.voter_id = v.voter_id '
+                    f'ORDER BY ph.confidence_code DESC LIMIT 1)')
+        else:
+            phone = conf = 'NULL'
+        return f"""
+            SELECT v.voter_id, a.fn, a.ln, a.addr1, UPPER(TRIM(a.city)), a.zip, v.political_party,
+                   {'l.streets_index_id' if self.linked else 'NULL'}, {'p.house_number' if self.parsed else 'NULL'},
+                   {district_expr(col(self.house))}, {district_expr(col(self.senate))}, {col(self.precinct)},
+                   {phone}, {conf}
+            FROM voters v
+            JOIN {self.addr} a ON a.voter_id = v.voter_id{joins}
+            WHERE {where}
+            ORDER BY v.voter_id
+        """
+
+    def turfs(self, conn, kinds):
+        """[(pack id, kind, label, where clause, params)] for every turf."""
+        out = []
+        if 'county' in kinds:
+            for (county,) in conn.execute(
+                    "SELECT DISTINCT UPPER(TRIM(county)) FROM voters WHERE TRIM(COALESCE(county, '')) <> '' ORDER BY 1"):
+                out.append((f'county-{slug(county)}', 'county', county, 'UPPER(TRIM(v.county)) = ?', (county,)))
+        if 'city' in kinds:
+            for county, city in conn.execute(f"""
+                    SELECT DISTINCT UPPER(TRIM(v.county)), UPPER(TRIM(a.city))
+                    FROM voters v JOIN {self.addr} a ON a.voter_id = v.voter_id
+                    WHERE TRIM(COALESCE(v.county, '')) <> '' AND TRIM(COALESCE(a.city, '')) <> '' ORDER BY 1, 2"""):
+                out.append((f'city-{slug(county)}-{slug(city)}', 'city', f'{city}, {county}',
+                            'UPPER(TRIM(v.county)) = ? AND UPPER(TRIM(a.city)) = ?', (county, city)))
+        for kind, column in (('house', self.house), ('senate', self.senate)):
+            if kind not in kinds or not column:
+                continue
+            expr = district_expr(f'v.{column}')
+            for (code,) in conn.execute(
+                    f"SELECT DISTINCT {expr} FROM voters v WHERE TRIM(COALESCE(v.{column}, '')) <> '' ORDER BY 1"):
+                out.append((f'{kind}-{slug(code)}', kind, code, f'{expr} = ?', (code,)))
+        return out
+
+
+class PackWriter:
+    """Streams one pack's JSON into a gzip file, hashing the plain text."""
+
+    def __init__(self, path, header):
+        self.path = path
+        self.out = gzip.open(path, 'wt', encoding='utf-8', compresslevel=9)
+        self.digest = hashlib.blake2b(digest_size=8)
+        self.raw_bytes = 0
+        self.write(json.dumps(header, separators=(',', ':'))[:-1])
+
+    def write(self, text):
+        self.out.write(text)
+        self.digest.update(text.encode('utf-8'))
+        self.raw_bytes += len(text.encode('utf-8'))
+
+    def section(self, name, cols, rows):
+        self.write(f',"{name}":{{"columns":{json.dumps(cols)},"rows":[')
+        n = 0
+        for row in rows:
+            self.write((',' if n else '') + json.dumps(row, separators=(',', ':')))
+            n += 1
+        self.write(']}')
+        return n
+
+    def close(self):
+        version = self.digest.hexdigest()
+        tail = f',"version":"{version}"}}'
+        self.out.write(tail)
+        self.raw_bytes += len(tail)
+        self.out.close()
+        return version
+
+
+def read_pack(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def keyed(section):
+    return {row[0]: row for row in section['rows']}
+
+
+def write_delta(path, pack_id, old, new):
+    """Rows to upsert and keys to delete to turn `old` into `new`."""
+    body = {'format': PACK_FORMAT, 'id': pack_id, 'base': old['version'], 'version': new['version'],
+            'upsert': {}, 'delete': {}}
+    changed = 0
+    for name, cols in SECTIONS:
+        before, after = keyed(old[name]), keyed(new[name])
+        upsert = [row for key, row in after.items() if before.get(key) != row]
+        delete = sorted(key for key in before if key not in after)
+        body['upsert'][name] = {'columns': cols, 'rows': upsert}
+        body['delete'][name] = delete
+        changed += len(upsert) + len(delete)
+    with gzip.open(path, 'wt', encoding='utf-8', compresslevel=9) as f:
+        json.dump(body, f, separators=(',', ':'))
+    return changed
+
+
+def build_pack(job):
+    """Worker: build one turf's pack and its deltas; returns its manifest entry."""
+    sqlite_path, out_dir, source, (pack_id, kind, label, where, params), previous, keep = job
+    started = time.perf_counter()
+    out_dir = Path(out_dir)
+    conn = sqlite3.connect(f'file:{sqlite_path}?mode=ro', uri=True)
+    tmp = out_dir / f'.{pack_id}.{os.getpid()}.tmp'
+    writer = PackWriter(tmp, {'format': PACK_FORMAT, 'id': pack_id, 'kind': kind, 'label': label})
+
+    street_ids, phones = set(), []
+
+    def voter_rows():
+        for row in conn.execute(source.voters_sql(where), params):
+            if row[7] is not None:
+                street_ids.add(row[7])
+            if row[12]:
+                phones.append((row[0], row[12], row[13]))
+            yield row[:12]
+
+    # voters first so the street ids are known; sections are keyed by name
+    counts = {'voters': writer.section('voters', VOTER_COLUMNS, voter_rows())}
+    streets = []
+    ids = sorted(street_ids)
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        streets.extend(conn.execute(
+            f"SELECT id, street_canonical, house_min, house_max, address_count FROM streets_index_built "
+            f"WHERE id IN ({', '.join('?' * len(chunk))}) ORDER BY id", chunk).fetchall())
+    counts['streets'] = writer.section('streets', STREET_COLUMNS, sorted(streets))
+    counts['phones'] = writer.section('phones', PHONE_COLUMNS, phones)
+    version = writer.close()
+    conn.close()
+
+    file_name = f'{pack_id}.{version}.json.gz'
+    history = [v for v in (previous or {}).get('versions', []) if v != version]
+    if previous and previous.get('version') == version:
+        tmp.unlink()
+        entry = dict(previous, build_seconds=round(time.perf_counter() - started, 3), changed=False)
+        return entry
+    tmp.replace(out_dir / file_name)
+
+    deltas = {}
+    if history:
+        new = read_pack(out_dir / file_name)
+        for base in history[:keep]:
+            base_file = out_dir / f'{pack_id}.{base}.json.gz'
+            if not base_file.exists():
+                continue
+            delta_name = f'{pack_id}.{base}-{version}.delta.json.gz'
+            rows = write_delta(out_dir / delta_name, pack_id, read_pack(base_file), new)
+            deltas[base] = {'file': delta_name, 'bytes': (out_dir / delta_name).stat().st_size, 'rows': rows}
+    return {
+        'id': pack_id,
+        'kind': kind,
+        'label': label,
+        'version': version,
+        'etag': f'"{version}"',
+        'file': file_name,
+        'bytes': (out_dir / file_name).stat().st_size,
+        'raw_bytes': writer.raw_bytes,
+        'rows': counts,
+        'versions': [version] + history[:keep],
+        'deltas': deltas,
+        'build_seconds': round(time.perf_counter() - started, 3),
+        'changed': True,
+    }
+
+
+def prune(out_dir, manifest):
+    keep = {'manifest.json'}
+    for entry in manifest['packs'].values():
+        keep.add(entry['file'])
+        keep.update(f"{entry['id']}.{v}.json.gz" for v in entry['versions'])
+        keep.update(d['file'] for d in entry['deltas'].values())
+    removed = 0
+    for path in out_dir.iterdir():
+        if path.is_file() and path.name not in keep and (path.name.endswith('.json.gz') or path.suffix == '.tmp'):
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_source_argument(parser)
+    parser.add_argument('--out', default=str(DEFAULT_OUT), help='pack directory (manifest.json and *.json.gz)')
+    parser.add_argument('--kinds', default=','.join(KINDS), help='turf kinds to build')
+    parser.add_argument('--only', default=None, help='comma-separated pack ids (e.g. county-natrona,house-07)')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='parallel pack builders')
+    parser.add_argument('--keep', type=int, default=3, help='earlier versions to keep deltas from')
+    args = parser.parse_args()
+    kinds = {k.strip() for k in args.kinds.split(',') if k.strip()}
+    if kinds - set(KINDS):
+        raise SystemExit(f"unknown kinds: {', '.join(sorted(kinds - set(KINDS)))}")
+
+    conn = open_source(args.sqlite)
+    source = Source(conn)
+    source.index_phones(conn)
+    turfs = source.turfs(conn, kinds)
+    conn.close()
+    if args.only:
+        wanted = {p.strip() for p in args.only.split(',') if p.strip()}
+        turfs = [t for t in turfs if t[0] in wanted]
+        missing = wanted - {t[0] for t in turfs}
+        if missing:
+            raise SystemExit(f"no such packs: {', '.join(sorted(missing))}")
+    if not turfs:
+        raise SystemExit('no turfs to build')
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / 'manifest.json'
+    manifest = json.loads(manifest_path.read_text(encoding='utf-8')) if manifest_path.exists() else {'packs': {}}
+    sqlite_path = str(Path(args.sqlite).resolve())
+    jobs = [(sqlite_path, str(out_dir), source, turf, manifest['packs'].get(turf[0]), args.keep) for turf in turfs]
+
+    print(f'Building {len(turfs)} packs with {args.jobs} workers '
+          f"(street ids: {'yes' if source.linked else 'no'}, house numbers: {'yes' if source.parsed else 'no'}, "
+          f"phones: {source.phones or 'none'})")
+    started = time.perf_counter()
+    with Pool(max(1, args.jobs)) as pool:
+        for entry in pool.imap_unordered(build_pack, jobs):
+            manifest['packs'][entry['id']] = entry
+            status = 'new' if entry['changed'] else 'unchanged'
+            print(f"  {entry['id']:<32} {entry['rows']['voters']:>7} voters {entry['bytes'] / 1024:>9.1f} KiB "
+                  f"({entry['raw_bytes'] / max(entry['bytes'], 1):.1f}x) {len(entry['deltas'])} deltas "
+                  f"{entry['build_seconds']:6.2f}s  {status}")
+    elapsed = time.perf_counter() - started
+
+    built = [manifest['packs'][t[0]] for t in turfs]
+    manifest.update({
+        'format': PACK_FORMAT,
+        'built_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'stats': {
+            'packs': len(built),
+            'changed': sum(1 for e in built if e['changed']),
+            'bytes': sum(e['bytes'] for e in built),
+            'raw_bytes': sum(e['raw_bytes'] for e in built),
+            'delta_bytes': sum(d['bytes'] for e in built for d in e['deltas'].values()),
+            'build_seconds': round(elapsed, 2),
+            'jobs': args.jobs,
+        },
+    })
+    manifest['packs'] = dict(sorted(manifest['packs'].items()))
+    manifest_path.write_text(json.dumps(manifest, indent=1) + '\n', encoding='utf-8')
+    removed = prune(out_dir, manifest)
+    s = manifest['stats']
+    print(f"\n{s['packs']} packs ({s['changed']} changed), {s['bytes'] / 1048576:.1f} MiB compressed "
+          f"from {s['raw_bytes'] / 1048576:.1f} MiB, deltas {s['delta_bytes'] / 1048576:.2f} MiB, "
+          f"{elapsed:.1f}s wall; removed {removed} stale files")
+    print(f'Wrote {manifest_path}')
+
+
+if __name__ == '__main__':
+    main()
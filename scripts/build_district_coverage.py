@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Build district_coverage and the county / city / district metadata JSON from
+wy.sqlite in one aggregation pass, seed the table and write a versioned
+static copy of the JSON.
+
+Usage:
+  python3 scripts/build_district_coverage.py /path/to/wy.sqlite [--sink remote|local|sqlite] [--delta]
+  python3 scripts/build_district_coverage.py /path/to/wy.sqlite --no-seed [--out ui/admin] [--keep 3]
+
+One GROUP BY over voters (joined to voters_addr_norm for the city) gives
+voter counts per (county, city, house district, senate district) cell;
+everything else is rolled up from those cells:
+
+  district_coverage_built  one row per district, county and city with its
+                           voter count (migration 039), seeded to
+                           district_coverage keyed on `cell`
+  wy.json                  counties, citiesByCounty, houseByCounty,
+                           senateByCounty, houseAll, senateAll (the shape
+                           scripts/dev-sqlite-api.mjs writes and the UI
+                           reads) plus voter counts per county, city and
+                           district and each district's counties and cities
+
+District codes are zero-padded like the Worker's normalizeDistrictCode.
+Voters without a county or city are counted in the report but not in
+coverage rows.  citiesByCounty drops cities with fewer than
+--min-city-voters voters (stray pairs from typos), as the dev API does.
+
+The JSON's version is a hash of its content.  It is written to
+<out>/meta/wy.<version>.json, which never changes and is served with an
+immutable Cache-Control (ui/_headers).  <out>/wy.latest.json points at it
+and <out>/wy.json keeps a copy for older pages.  A rebuild with unchanged
+data writes nothing, and only the last --keep versions are kept.  With
+district_coverage seeded, GET /metadata answers from its indexes and never
+touches voters.
+"""
+import argparse, hashlib, json, time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from d1seed import SinkError, find_source, verify_counts
+from d1seed.cli import (add_source_argument, add_sink_arguments, add_checkpoint_arguments, add_delta_arguments,
+                        sink_from_args, checkpoint_from_args, open_source, seed_table, instrumented)
+from d1seed.sinks import REPO_ROOT
+
+COVERAGE_COLUMNS = ['cell', 'district_type', 'district_code', 'county', 'city', 'voter_count']
+ADDR_SOURCES = ['voters_addr_norm', 'v_voters_addr_norm']
+DEFAULT_OUT = REPO_ROOT / 'ui' / 'admin'
+META_FORMAT = 1
+
+BUILT_SCHEMA = """
+DROP TABLE IF EXISTS district_coverage_built;
+CREATE TABLE district_coverage_built (
+  cell TEXT PRIMARY KEY,
+  district_type TEXT NOT NULL,
+  district_code TEXT NOT NULL,
+  county TEXT NOT NULL,
+  city TEXT NOT NULL,
+  voter_count INTEGER NOT NULL
+);
+"""
+
+
+def district_expr(column):
+    # same as the Worker's buildDistrictNormalizationExpr
+    return f"""CASE
+      WHEN TRIM({column}) GLOB '[0-9]*' AND TRIM({column}) <> '' THEN printf('%02d', CAST(TRIM({column}) AS INTEGER))
+      ELSE NULLIF(UPPER(TRIM({column})), '')
+    END"""
+
+
+def columns(conn, table):
+    return {r[1] for r in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def stage_cells(conn, addr):
+    """temp.cells(county, city, house, senate, voters): the one pass over voters."""
+    vcols = columns(conn, 'voters')
+    acols = columns(conn, addr) if addr else set()
+    picks = {}
+    for kind in ('house', 'senate'):
+        if f'{kind}_district' in vcols:
+            picks[kind] = f'v.{kind}_district'
+        elif kind in vcols:
+            picks[kind] = f'v.{kind}'
+        elif kind in acols:
+            picks[kind] = f'a.{kind}'
+        else:
+            raise SystemExit(f'no {kind} district column in voters or {addr}')
+    city = "UPPER(TRIM(COALESCE(a.city, '')))" if addr else "''"
+    join = f'LEFT JOIN {addr} a ON a.voter_id = v.voter_id' if addr else ''
+    conn.execute('DROP TABLE IF EXISTS temp.cells')
+    conn.execute(f"""
+        CREATE TEMP TABLE cells AS
+        SELECT UPPER(TRIM(COALESCE(v.county, ''))) AS county, {city} AS city,
+               {district_expr(picks['house'])} AS house, {district_expr(picks['senate'])} AS senate,
+               COUNT(*) AS voters
+        FROM voters v
+        {join}
+        GROUP BY 1, 2, 3, 4
+    """)
+    return picks
+
+
+def build(conn, addr):
+    started = time.perf_counter()
+    with conn:
+        picks = stage_cells(conn, addr)
+        conn.executescript(BUILT_SCHEMA)
+        for kind in ('house', 'senate'):
+            conn.execute(f"""
+                INSERT INTO district_coverage_built (cell, district_type, district_code, county, city, voter_count)
+                SELECT '{kind}:' || {kind} || ':' || county || ':' || city, '{kind}', {kind}, county, city,
+                       SUM(voters)
+                FROM temp.cells
+                WHERE {kind} IS NOT NULL AND county <> '' AND city <> ''
+                GROUP BY {kind}, county, city
+            """)
+    seconds = time.perf_counter() - started
+    total, no_county, no_city = conn.execute("""
+        SELECT SUM(voters), SUM(CASE WHEN county = '' THEN voters ELSE 0 END),
+               SUM(CASE WHEN county <> '' AND city = '' THEN voters ELSE 0 END)
+        FROM temp.cells
+    """).fetchone()
+    no_house, no_senate = conn.execute("""
+        SELECT SUM(CASE WHEN house IS NULL THEN voters ELSE 0 END), SUM(CASE WHEN senate IS NULL THEN voters ELSE 0 END)
+        FROM temp.cells
+    """).fetchone()
+    rows, house, senate = conn.execute("""
+        SELECT COUNT(*), COUNT(DISTINCT CASE WHEN district_type = 'house' THEN district_code END),
+               COUNT(DISTINCT CASE WHEN district_type = 'senate' THEN district_code END)
+        FROM district_coverage_built
+    """).fetchone()
+    stats = {'voters': total or 0, 'cells': conn.execute('SELECT COUNT(*) FROM temp.cells').fetchone()[0],
+             'coverage_rows': rows, 'house_districts': house, 'senate_districts': senate,
+             'no_county': no_county or 0, 'no_city': no_city or 0, 'no_house': no_house or 0,
+             'no_senate': no_senate or 0, 'districts_from': picks, 'seconds': round(seconds, 2)}
+    print(f'Built district_coverage_built: {rows} rows ({house} house, {senate} senate districts) '
+          f"from {stats['voters']} voters in {stats['cells']} cells in {seconds:.1f}s")
+    print(f"  without county {stats['no_county']}, without city {stats['no_city']}, "
+          f"without house district {stats['no_house']}, without senate district {stats['no_senate']}")
+    return stats
+
+
+def _district_sort(code):
+    return (0, int(code), code) if code.isdigit() else (1, 0, code)
+
+
+def metadata(conn, min_city_voters):
+    """The wy.json payload, rolled up from temp.cells."""
+    cells = conn.execute("SELECT county, city, house, senate, voters FROM temp.cells WHERE county <> ''").fetchall()
+    counties = sorted({c[0] for c in cells})
+    voters_by_county = {c: 0 for c in counties}
+    voters_by_city = {c: {} for c in counties}
+    districts = {'house': {}, 'senate': {}}
+    for county, city, house, senate, n in cells:
+        voters_by_county[county] += n
+        if city:
+            voters_by_city[county][city] = voters_by_city[county].get(city, 0) + n
+        for kind, code in (('house', house), ('senate', senate)):
+            if code is None:
+                continue
+            entry = districts[kind].setdefault(code, {'voters': 0, 'counties': {}})
+            entry['voters'] += n
+            place = entry['counties'].setdefault(county, {'voters': 0, 'cities': {}})
+            place['voters'] += n
+            if city:
+                place['cities'][city] = place['cities'].get(city, 0) + n
+    cities_by_county = {c: sorted(city for city, n in voters_by_city[c].items() if n >= min_city_voters)
+                        for c in counties}
+    by_county = {kind: {c: [] for c in counties} for kind in districts}
+    for kind, entries in districts.items():
+        for code in sorted(entries, key=_district_sort):
+            for county in entries[code]['counties']:
+                by_county[kind][county].append(code)
+    house_all = sorted(districts['house'], key=_district_sort)
+    senate_all = sorted(districts['senate'], key=_district_sort)
+
+    def ordered(entries):
+        return {code: {'voters': e['voters'],
+                       'counties': {c: {'voters': p['voters'], 'cities': dict(sorted(p['cities'].items()))}
+                                    for c, p in sorted(e['counties'].items())}}
+                for code, e in sorted(entries.items(), key=lambda kv: _district_sort(kv[0]))}
+
+    return {
+        'format': META_FORMAT,
+        'state': 'WY',
+        'counts': {
+            'counties': len(counties),
+            'cities': sum(len(v) for v in cities_by_county.values()),
+            'senateCount': len(senate_all),
+            'houseCount': len(house_all),
+            'voters': sum(voters_by_county.values()),
+        },
+        'counties': counties,
+        'citiesByCounty': cities_by_county,
+        'senateByCounty': by_county['senate'],
+        'houseByCounty': by_county['house'],
+        'senateAll': senate_all,
+        'houseAll': house_all,
+        'votersByCounty': voters_by_county,
+        'votersByCity': {c: dict(sorted(v.items())) for c, v in voters_by_city.items()},
+        'districts': {'house': ordered(districts['house']), 'senate': ordered(districts['senate'])},
+    }
+
+
+def write_metadata(payload, out_dir, keep):
+    """Write the versioned JSON, the pointer and the legacy copy; returns
+    (version, changed)."""
+    body = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    version = hashlib.blake2b(body.encode('utf-8'), digest_size=8).hexdigest()
+    out_dir = Path(out_dir)
+    meta_dir = out_dir / 'meta'
+    meta_dir.mkdir(parents=True, exist_ok=True)
+    name = f'wy.{version}.json'
+    pointer_path = out_dir / 'wy.latest.json'
+    previous = json.loads(pointer_path.read_text(encoding='utf-8')) if pointer_path.exists() else {}
+    if previous.get('version') == version and (meta_dir / name).exists():
+        return version, False
+    now = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    full = dict(payload, version=version, generatedAt=now)
+    (meta_dir / name).write_text(json.dumps(full, separators=(',', ':')), encoding='utf-8')
+    (out_dir / 'wy.json').write_text(json.dumps(full, indent=2), encoding='utf-8')
+    history = [v for v in previous.get('versions', []) if v != version][:keep]
+    pointer = {'version': version, 'path': f'/admin/meta/{name}', 'generatedAt': now,
+               'versions': [version] + history}
+    pointer_path.write_text(json.dumps(pointer, indent=2) + '\n', encoding='utf-8')
+    keep_names = {f'wy.{v}.json' for v in pointer['versions']}
+    for path in meta_dir.glob('wy.*.json'):
+        if path.name not in keep_names:
+            path.unlink()
+    return version, True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_source_argument(parser)
+    add_sink_arguments(parser)
+    add_checkpoint_arguments(parser)
+    add_delta_arguments(parser)
+    parser.add_argument('--out', default=str(DEFAULT_OUT), help='where wy.json and meta/ are written (default ui/admin)')
+    parser.add_argument('--keep', type=int, default=3, help='earlier JSON versions to keep')
+    parser.add_argument('--min-city-voters', type=int, default=3,
+                        help='cities with fewer voters are left out of citiesByCounty (default 3)')
+    parser.add_argument('--no-json', action='store_true', help='do not write the static JSON')
+    parser.add_argument('--no-seed', action='store_true', help='only build the local table and JSON')
+    args = parser.parse_args()
+
+    with instrumented(args) as log:
+        conn = open_source(args.sqlite)
+        if not find_source(conn, ['voters']):
+            raise SystemExit('voters table missing in sqlite')
+        addr = find_source(conn, ADDR_SOURCES)
+        if not addr:
+            print(f"No {' / '.join(ADDR_SOURCES)} in sqlite; coverage needs cities, so only the JSON's "
+                  'county and district lists will be filled')
+        stats = build(conn, addr)
+        if not args.no_json:
+            version, changed = write_metadata(metadata(conn, args.min_city_voters), args.out, args.keep)
+            stats.update(version=version, json_changed=changed)
+            print(f"{'Wrote' if changed else 'Unchanged:'} {Path(args.out) / 'meta' / f'wy.{version}.json'}")
+        log.emit('district_coverage', **stats)
+        if args.no_seed:
+            conn.close()
+            return
+        sink = sink_from_args(args)
+        checkpoint = checkpoint_from_args(args, sink)
+        seed_table(conn, sink, args, checkpoint, 'district_coverage', COVERAGE_COLUMNS,
+                   f"SELECT {', '.join(COVERAGE_COLUMNS)} FROM district_coverage_built;", key='cell')
+        verify_counts(sink, 'district_coverage')
+        conn.close()
+        sink.close()
+        print('\nAll done')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except SinkError as e:
+        raise SystemExit(f'seeding failed: {e}')
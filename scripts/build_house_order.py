@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Build street_house_order (doors per street side in house-number order) and
+seed it to D1, or benchmark it against the request-time sort.
+
+Usage:
+  python3 scripts/parse_addresses.py /path/to/wy.sqlite
+  python3 scripts/build_streets_index.py /path/to/wy.sqlite --no-seed
+  python3 scripts/build_house_order.py /path/to/wy.sqlite [--sink remote|local|sqlite] [--no-seed] [--delta]
+  python3 scripts/build_house_order.py /path/to/wy.sqlite --bench [--bench-streets 50] [--runs 20]
+
+Every voter with a house number on a linked street (voter_addr_parsed +
+voter_street_link) gets a row with the street's side (parity 0 = even,
+1 = odd) and a position: the door's rank on that side ordered by house
+number and suffix, shared by everyone living at the same door.  Schema is
+worker/db/migrations/036_add_street_house_order.sql.
+
+/canvass/nearby with a streets_index_id and a house number then reads
+"range doors either side of house X" as two index range scans on
+(streets_index_id, parity, position) instead of filtering the whole street
+and sorting it by ABS(house - X).  --bench times both forms of the query
+locally, prints their EXPLAIN QUERY PLAN and checks they agree.
+"""
+import argparse, random, statistics, time
+
+from d1seed import SinkError, find_source, verify_counts
+from d1seed.cli import (add_source_argument, add_sink_arguments, add_checkpoint_arguments, add_delta_arguments,
+                        sink_from_args, checkpoint_from_args, open_source, seed_table, instrumented)
+
+ORDER_COLUMNS = ['voter_id', 'streets_index_id', 'parity', 'position', 'house_number', 'house_suffix']
+
+ORDER_SCHEMA = """
+CREATE TABLE street_house_order (
+  voter_id TEXT PRIMARY KEY,
+  streets_index_id INTEGER NOT NULL,
+  parity INTEGER NOT NULL,
+  position INTEGER NOT NULL,
+  house_number INTEGER NOT NULL,
+  house_suffix TEXT
+);
+CREATE INDEX idx_street_house_order_position ON street_house_order(streets_index_id, parity, position);
+CREATE INDEX idx_street_house_order_house ON street_house_order(streets_index_id, parity, house_number, position);
+"""
+
+# The request-time query /canvass/nearby runs without the table: every
+# voter on the street, sorted by distance from the requested house.
+SORT_SQL = """
+SELECT v.voter_id
+FROM voters v
+LEFT JOIN temp.bench_addr va ON v.voter_id = va.voter_id
+WHERE va.street_index_id = :street AND va.addr_raw IS NOT NULL AND va.addr_raw != ''
+ORDER BY CASE WHEN {h} IS NULL THEN 1 ELSE 0 END, ABS({h} - :house) ASC, {h} ASC, v.voter_id
+LIMIT :limit
+""".format(h="CAST(TRIM(SUBSTR(va.addr_raw, 1, INSTR(va.addr_raw || ' ', ' ') - 1)) AS INTEGER)")
+
+# Same as the Worker's house-order path: anchor each side at the first door
+# at or above the house (or its last door), then take the position window.
+WINDOW_SQL = """
+WITH anchor AS (
+  SELECT s.parity,
+         COALESCE(
+           (SELECT a.position FROM street_house_order a
+             WHERE a.streets_index_id = :street AND a.parity = s.parity AND a.house_number >= :house
+             ORDER BY a.house_number, a.position LIMIT 1),
+           (SELECT a.position FROM street_house_order a
+             WHERE a.streets_index_id = :street AND a.parity = s.parity
+             ORDER BY a.position DESC LIMIT 1)) AS pos
+  FROM (SELECT 0 AS parity UNION ALL SELECT 1) s
+),
+doors AS (
+  SELECT o.voter_id, o.house_number
+  FROM anchor
+  JOIN street_house_order o
+    ON o.streets_index_id = :street AND o.parity = anchor.parity
+   AND o.position BETWEEN anchor.pos - :range AND anchor.pos + :range
+)
+SELECT v.voter_id
+FROM doors d
+JOIN voters v ON v.voter_id = d.voter_id
+LEFT JOIN temp.bench_addr va ON v.voter_id = va.voter_id
+ORDER BY ABS(d.house_number - :house) ASC, d.house_number ASC, v.voter_id
+LIMIT :limit
+"""
+
+
+def build(conn):
+    for table, hint in (('voter_addr_parsed', 'scripts/parse_addresses.py'),
+                        ('voter_street_link', 'scripts/build_streets_index.py')):
+        if not find_source(conn, [table], types=('table',)):
+            raise SystemExit(f'{table} missing; run {hint} first')
+    started = time.perf_counter()
+    with conn:
+        conn.execute('DROP TABLE IF EXISTS street_house_order')
+        conn.executescript(ORDER_SCHEMA)
+        conn.execute("""
+            INSERT INTO street_house_order (voter_id, streets_index_id, parity, position, house_number, house_suffix)
+            SELECT voter_id, streets_index_id, parity,
+                   DENSE_RANK() OVER (PARTITION BY streets_index_id, parity
+                                      ORDER BY house_number, COALESCE(house_suffix, '')) - 1,
+                   house_number, house_suffix
+            FROM (SELECT p.voter_id, l.streets_index_id, p.house_number % 2 AS parity, p.house_number, p.house_suffix
+                  FROM voter_addr_parsed p
+                  JOIN voter_street_link l ON l.voter_id = p.voter_id
+                  WHERE p.house_number IS NOT NULL)
+            ORDER BY voter_id
+        """)
+    rows, streets, doors = conn.execute(
+        'SELECT COUNT(*), COUNT(DISTINCT streets_index_id), '
+        'COUNT(DISTINCT streets_index_id || \':\' || parity || \':\' || position) FROM street_house_order').fetchone()
+    print(f'Built street_house_order: {rows} voters, {doors} doors on {streets} streets '
+          f'in {time.perf_counter() - started:.1f}s')
+
+
+def stage_bench_addr(conn):
+    """temp.bench_addr: the address table the way D1 has it, with an indexed
+    street_index_id and addr_raw, so the sort query is timed fairly."""
+    addr = find_source(conn, ['voters_addr_norm', 'v_voters_addr_norm'])
+    if not addr:
+        raise SystemExit('No voters_addr_norm source found in sqlite')
+    conn.execute('DROP TABLE IF EXISTS temp.bench_addr')
+    conn.execute(f"""
+        CREATE TEMP TABLE bench_addr AS
+        SELECT a.voter_id, a.addr1, a.addr1 AS addr_raw, a.city, l.streets_index_id AS street_index_id
+        FROM {addr} a LEFT JOIN voter_street_link l ON l.voter_id = a.voter_id
+    """)
+    conn.execute('CREATE UNIQUE INDEX temp.idx_bench_addr_voter ON bench_addr(voter_id)')
+    conn.execute('CREATE INDEX temp.idx_bench_addr_street ON bench_addr(street_index_id)')
+    conn.execute('ANALYZE temp')
+
+
+def pick_probes(conn, n_streets, per_street, seed):
+    """(street, house) pairs on the busiest streets, houses drawn from real doors."""
+    rnd = random.Random(seed)
+    streets = [r[0] for r in conn.execute(
+        'SELECT streets_index_id FROM street_house_order GROUP BY streets_index_id '
+        'ORDER BY COUNT(*) DESC, streets_index_id LIMIT ?', (n_streets,))]
+    probes = []
+    for sid in streets:
+        houses = [r[0] for r in conn.execute(
+            'SELECT DISTINCT house_number FROM street_house_order WHERE streets_index_id = ? ORDER BY 1', (sid,))]
+        probes.extend((sid, rnd.choice(houses)) for _ in range(per_street))
+    return probes
+
+
+def time_query(conn, sql, probes, params, runs):
+    samples = []
+    results = {}
+    for sid, house in probes:
+        args = dict(params, street=sid, house=house)
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            rows = conn.execute(sql, args).fetchall()
+            samples.append((time.perf_counter() - t0) * 1000)
+        results[(sid, house)] = [r[0] for r in rows]
+    return samples, results
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def bench(conn, n_streets, per_street, runs, limit, doors, seed):
+    if not find_source(conn, ['street_house_order'], types=('table',)):
+        raise SystemExit('street_house_order missing; run without --bench first')
+    stage_bench_addr(conn)
+    probes = pick_probes(conn, n_streets, per_street, seed)
+    if not probes:
+        raise SystemExit('street_house_order is empty; nothing to benchmark')
+    params = {'limit': limit, 'range': doors}
+    sid, house = probes[0]
+    for label, sql in (('sort', SORT_SQL), ('house order', WINDOW_SQL)):
+        print(f'\nEXPLAIN QUERY PLAN ({label}):')
+        for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', dict(params, street=sid, house=house)):
+            print('  ', row[-1])
+
+    streets = len({sid for sid, _ in probes})
+    print(f'\n{len(probes)} probes on {streets} streets, {runs} runs each, limit {limit}, range {doors} doors')
+    sort_ms, sort_rows = time_query(conn, SORT_SQL, probes, params, runs)
+    window_ms, window_rows = time_query(conn, WINDOW_SQL, probes, params, runs)
+    for label, ms in (('sort', sort_ms), ('house order', window_ms)):
+        print(f'  {label:<12} p50 {statistics.median(ms):7.3f} ms  p95 {percentile(ms, 0.95):7.3f} ms  '
+              f'max {max(ms):7.3f} ms')
+    speedup = statistics.median(sort_ms) / max(statistics.median(window_ms), 1e-9)
+    print(f'  median speedup: {speedup:.1f}x')
+    # Both rank by distance from the house; they can only differ where the
+    # sort reaches past `range` doors on a side or ties on distance break
+    # across the two sides.
+    same = sum(1 for k in probes if sort_rows[k] == window_rows[k])
+    print(f'  identical results on {same} / {len(probes)} probes')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_source_argument(parser)
+    add_sink_arguments(parser)
+    add_checkpoint_arguments(parser)
+    add_delta_arguments(parser)
+    parser.add_argument('--no-seed', action='store_true', help='only build the local table')
+    bench_group = parser.add_argument_group('benchmark')
+    bench_group.add_argument('--bench', action='store_true', help='time the sort against the house-order lookup')
+    bench_group.add_argument('--bench-streets', type=int, default=50, help='busiest streets to probe')
+    bench_group.add_argument('--per-street', type=int, default=5, help='random houses probed per street')
+    bench_group.add_argument('--runs', type=int, default=20, help='executions per probe')
+    bench_group.add_argument('--limit', type=int, default=20, help='rows per query (as the Worker: 1-100)')
+    bench_group.add_argument('--range', type=int, default=20, help='doors either side of the house')
+    bench_group.add_argument('--seed', type=int, default=1, help='probe sampling seed')
+    args = parser.parse_args()
+    with instrumented(args):
+        conn = open_source(args.sqlite)
+        if args.bench:
+            bench(conn, args.bench_streets, args.per_street, args.runs, args.limit, args.range, args.seed)
+            conn.close()
+            return
+
+        build(conn)
+        if args.no_seed:
+            conn.close()
+            return
+        sink = sink_from_args(args)
+        checkpoint = checkpoint_from_args(args, sink)
+        seed_table(conn, sink, args, checkpoint, 'street_house_order', ORDER_COLUMNS,
+                   f"SELECT {', '.join(ORDER_COLUMNS)} FROM street_house_order;")
+        verify_counts(sink, 'street_house_order')
+        conn.close()
+        sink.close()
+        print('\nAll done')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except SinkError as e:
+        raise SystemExit(f'seeding failed: {e}')
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Build the voter name search rows (normalized names, city, county, zip) and
+seed voter_name_search, whose triggers keep the FTS5 index on D1 current.
+
+Usage:
+  python3 scripts/build_name_search.py /path/to/wy.sqlite [--sink remote|local|sqlite] [--no-seed]
+  python3 scripts/build_name_search.py /path/to/wy.sqlite --delta [--verify-remote]
+  python3 scripts/bench_queries.py --from-sqlite /path/to/wy.sqlite --queries search_names,search_names_fts
+
+Every voter in voters_addr_norm (or v_voters_addr_norm) with a last name
+gets one row in voter_name_search_built: names through
+d1seed.names.name_key (upper case, no diacritics, apostrophes or periods),
+city and county upper-cased, zip trimmed.  Schema is
+worker/db/migrations/038_add_voter_name_search.sql.
+
+On the sink, each INSERT OR REPLACE / DELETE against voter_name_search
+updates voter_name_fts through triggers, so --delta sends only voters whose
+name or place changed and the index follows.  POST
+/contact-form/search-names then answers from prefix indexes instead of a
+LIKE scan; until the table has rows it keeps using the LIKE query.
+bench_queries.py times both (search_names and search_names_fts).
+"""
+import argparse, time
+
+from d1seed import SinkError, find_source, verify_counts
+from d1seed.cli import (add_source_argument, add_sink_arguments, add_checkpoint_arguments, add_delta_arguments,
+                        sink_from_args, checkpoint_from_args, open_source, seed_table, instrumented)
+from d1seed.names import SEARCH_COLUMNS, register, search_select
+
+ADDR_SOURCES = ['voters_addr_norm', 'v_voters_addr_norm']
+
+BUILT_SCHEMA = """
+DROP TABLE IF EXISTS voter_name_search_built;
+CREATE TABLE voter_name_search_built (
+  voter_id TEXT PRIMARY KEY,
+  ln_norm TEXT NOT NULL,
+  fn_norm TEXT,
+  city TEXT,
+  county TEXT,
+  zip TEXT
+);
+"""
+
+
+def build(conn, addr):
+    started = time.perf_counter()
+    register(conn)
+    with conn:
+        conn.executescript(BUILT_SCHEMA)
+        conn.execute(f"INSERT OR REPLACE INTO voter_name_search_built ({', '.join(SEARCH_COLUMNS)}) "
+                     f"{search_select(addr)} ORDER BY a.voter_id")
+    return report(conn, addr, time.perf_counter() - started)
+
+
+def report(conn, addr, seconds):
+    total = conn.execute(f'SELECT COUNT(*) FROM {addr}').fetchone()[0]
+    built, surnames, no_first, no_city = conn.execute("""
+        SELECT COUNT(*), COUNT(DISTINCT ln_norm), SUM(fn_norm IS NULL), SUM(city IS NULL OR city = '')
+        FROM voter_name_search_built
+    """).fetchone()
+    changed = conn.execute(f"""
+        SELECT COUNT(*) FROM voter_name_search_built b JOIN {addr} a ON a.voter_id = b.voter_id
+        WHERE b.ln_norm <> UPPER(TRIM(a.ln))
+    """).fetchone()[0]
+    stats = {
+        'voters': total,
+        'rows': built,
+        'skipped_no_last_name': total - built,
+        'surnames': surnames,
+        'no_first_name': no_first or 0,
+        'no_city': no_city or 0,
+        'normalized_last_names': changed,
+        'seconds': round(seconds, 2),
+    }
+    print(f'Built voter_name_search_built: {built} voters, {surnames} distinct last names in {seconds:.1f}s')
+    print(f"  {stats['skipped_no_last_name']} skipped without a last name, {stats['no_first_name']} without a first "
+          f"name, {stats['no_city']} without a city; {changed} last names changed by normalization")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_source_argument(parser)
+    add_sink_arguments(parser)
+    add_checkpoint_arguments(parser)
+    add_delta_arguments(parser)
+    parser.add_argument('--no-seed', action='store_true', help='only build the local table')
+    args = parser.parse_args()
+
+    with instrumented(args) as log:
+        conn = open_source(args.sqlite)
+        addr = find_source(conn, ADDR_SOURCES)
+        if not addr or not find_source(conn, ['voters']):
+            raise SystemExit(f"voters or {' / '.join(ADDR_SOURCES)} missing in sqlite")
+        stats = build(conn, addr)
+        log.emit('name_search', source=addr, **stats)
+        if args.no_seed:
+            conn.close()
+            return
+        sink = sink_from_args(args)
+        checkpoint = checkpoint_from_args(args, sink)
+        seed_table(conn, sink, args, checkpoint, 'voter_name_search', SEARCH_COLUMNS,
+                   f"SELECT {', '.join(SEARCH_COLUMNS)} FROM voter_name_search_built;")
+        verify_counts(sink, 'voter_name_search')
+        conn.close()
+        sink.close()
+        print('\nAll done')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except SinkError as e:
+        raise SystemExit(f'seeding failed: {e}')
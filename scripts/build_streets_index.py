@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Build streets_index from the parsed voter addresses and seed it to D1.
+
+Usage:
+  python3 scripts/parse_addresses.py /path/to/wy.sqlite
+  python3 scripts/build_streets_index.py /path/to/wy.sqlite [--sink remote|local|sqlite] [--no-seed] [--delta]
+
+One GROUP BY pass over voter_addr_parsed produces a street per
+(city_county_id, street_canonical) with its parts, min/max house number and
+address count, into the local table streets_index_built; voter_street_link
+maps every voter to their street.  Ids are stable: a street keeps the id it
+has in streets_index on the sink (or, with --no-seed or an empty sink, in
+the last local build or the local streets_index), and new streets get the
+next ids after every id the sink holds, in (city_county_id,
+street_canonical) order.  When the sink has the same street under several
+ids, the lowest one is kept.
+
+city_county_id comes from voters_addr_norm.city_county_id when the local
+table has it, otherwise (city, county) is matched against wy_city_county,
+read locally or, failing that, from the sink.
+
+Seeding goes through the usual batching path: streets_index_built ->
+streets_index, voter_street_link -> tmp_voter_street, then the address
+table's street_index_id is refreshed from tmp_voter_street in voter_id
+ranges; addresses without a link row keep theirs.  With --delta only
+changed streets and links are sent.
+
+Sink streets that were not rebuilt (gone, or duplicates of a kept id) are
+deleted last, after the links, street_house_order rows and address
+street_index_id values still pointing at them are cleared.
+"""
+import argparse
+
+from d1seed import SinkError, find_source, verify_counts
+from d1seed.cli import (add_source_argument, add_sink_arguments, add_checkpoint_arguments, add_delta_arguments,
+                        sink_from_args, checkpoint_from_args, open_source, seed_table, instrumented)
+from d1seed.encode import esc
+
+STREET_COLUMNS = ['id', 'city_county_id', 'street_prefix', 'street_core', 'street_type', 'street_suffix',
+                  'street_canonical', 'raw_address', 'house_min', 'house_max', 'address_count']
+
+BUILT_SCHEMA = """
+CREATE TABLE streets_index_built (
+  id INTEGER PRIMARY KEY,
+  city_county_id INTEGER NOT NULL,
+  street_prefix TEXT,
+  street_core TEXT NOT NULL,
+  street_type TEXT,
+  street_suffix TEXT,
+  street_canonical TEXT NOT NULL,
+  raw_address TEXT,
+  house_min INTEGER,
+  house_max INTEGER,
+  address_count INTEGER,
+  UNIQUE (city_county_id, street_canonical)
+);
+CREATE TABLE voter_street_link (
+  voter_id TEXT PRIMARY KEY,
+  streets_index_id INTEGER NOT NULL
+);
+"""
+
+
+def columns(conn, table):
+    return {r[1] for r in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def load_city_county(conn, sink):
+    """Fill temp.cc_map(city, county, id) with upper-cased names."""
+    conn.execute('DROP TABLE IF EXISTS temp.cc_map')
+    conn.execute('CREATE TEMP TABLE cc_map (city TEXT, county TEXT, id INTEGER, PRIMARY KEY (city, county))')
+    rows = None
+    if find_source(conn, ['wy_city_county'], types=('table',)):
+        cols = columns(conn, 'wy_city_county')
+        city, county = ('city_norm', 'county_norm') if 'city_norm' in cols else ('city', 'county')
+        rows = conn.execute(f'SELECT {city}, {county}, id FROM wy_city_county').fetchall()
+        print(f'Using local wy_city_county ({len(rows)} rows)')
+    if not rows and sink is not None:
+        rows = [(r['city_norm'], r['county_norm'], r['id'])
+                for r in sink.query('SELECT id, city_norm, county_norm FROM wy_city_county')]
+        print(f'Using wy_city_county from {sink.name} ({len(rows)} rows)')
+    if not rows:
+        raise SystemExit('No wy_city_county rows locally or on the sink; cannot assign city_county_id')
+    conn.executemany(
+        'INSERT OR IGNORE INTO temp.cc_map VALUES (UPPER(TRIM(?)), UPPER(TRIM(?)), CAST(? AS INTEGER))', rows)
+
+
+def sink_streets(sink, page=20000):
+    """[(id, city_county_id, street_canonical)] of streets_index on the sink, in id order."""
+    rows, after = [], None
+    while True:
+        where = f'WHERE id > {int(after)} ' if after is not None else ''
+        batch = sink.query(f'SELECT id, city_county_id, street_canonical FROM streets_index {where}'
+                           f'ORDER BY id LIMIT {page};')
+        rows += [(int(r['id']), r['city_county_id'], r['street_canonical']) for r in batch]
+        if len(batch) < page:
+            return rows
+        after = rows[-1][0]
+
+
+def previous_ids(conn, sink):
+    """({(city_county_id, street_canonical): id}, every id on the sink).
+
+    The sink decides when it has streets; otherwise the last build or the
+    local streets_index.
+    """
+    remote = sink_streets(sink) if sink is not None else []
+    if remote:
+        ids = {}
+        for sid, cc, canon in remote:
+            if cc is not None and canon is not None:
+                ids.setdefault((int(cc), canon), sid)
+        print(f'Keeping ids of {len(ids)} streets from streets_index on {sink.name} ({len(remote)} rows)')
+        return ids, {sid for sid, _, _ in remote}
+    for table in ('streets_index_built', 'streets_index'):
+        if find_source(conn, [table], types=('table',)) and {'city_county_id', 'street_canonical'} <= columns(conn, table):
+            ids = {(int(cc), canon): sid for sid, cc, canon in conn.execute(
+                f'SELECT id, city_county_id, street_canonical FROM {table} '
+                f'WHERE id IS NOT NULL AND city_county_id IS NOT NULL AND street_canonical IS NOT NULL')}
+            if ids:
+                print(f'Keeping ids of {len(ids)} streets from local {table}')
+                return ids, set()
+    return {}, set()
+
+
+def build(conn, sink):
+    """Build the local tables; returns the sink's street ids that were not rebuilt."""
+    if not find_source(conn, ['voter_addr_parsed'], types=('table',)):
+        raise SystemExit('voter_addr_parsed missing; run scripts/parse_addresses.py first')
+    addr = find_source(conn, ['voters_addr_norm', 'v_voters_addr_norm'])
+    if 'city_county_id' in columns(conn, addr):
+        cc_join = ''
+        cc_expr = 'CAST(a.city_county_id AS INTEGER)'
+    else:
+        load_city_county(conn, sink)
+        cc_join = ('LEFT JOIN voters v ON v.voter_id = a.voter_id '
+                   'LEFT JOIN temp.cc_map m ON m.city = UPPER(TRIM(a.city)) AND m.county = UPPER(TRIM(v.county))')
+        cc_expr = 'm.id'
+
+    prev, remote_ids = previous_ids(conn, sink)
+    conn.execute('DROP TABLE IF EXISTS temp.addr_street')
+    conn.execute(f"""
+        CREATE TEMP TABLE addr_street AS
+        SELECT p.voter_id, {cc_expr} AS city_county_id, p.street_canonical, p.pre_dir, p.street_core,
+               p.street_type, p.post_dir, p.house_number, a.addr1
+        FROM voter_addr_parsed p
+        JOIN {addr} a ON a.voter_id = p.voter_id
+        {cc_join}
+        WHERE p.street_canonical IS NOT NULL
+    """)
+    unmatched = conn.execute('SELECT COUNT(*) FROM temp.addr_street WHERE city_county_id IS NULL').fetchone()[0]
+    streets = conn.execute("""
+        SELECT city_county_id, street_canonical, MIN(pre_dir), MIN(street_core), MIN(street_type), MIN(post_dir),
+               MIN(addr1), MIN(house_number), MAX(house_number), COUNT(*)
+        FROM temp.addr_street
+        WHERE city_county_id IS NOT NULL
+        GROUP BY city_county_id, street_canonical
+        ORDER BY city_county_id, street_canonical
+    """).fetchall()
+
+    next_id = max([*prev.values(), *remote_ids], default=0) + 1
+    rows = []
+    reused = 0
+    for cc, canon, pre, core, typ, post, raw, hmin, hmax, cnt in streets:
+        sid = prev.get((cc, canon))
+        if sid is None:
+            sid = next_id
+            next_id += 1
+        else:
+            reused += 1
+        rows.append((sid, cc, pre, core, typ, post, canon, raw, hmin, hmax, cnt))
+
+    with conn:
+        conn.execute('DROP TABLE IF EXISTS streets_index_built')
+        conn.execute('DROP TABLE IF EXISTS voter_street_link')
+        conn.executescript(BUILT_SCHEMA)
+        conn.executemany(f"INSERT INTO streets_index_built ({', '.join(STREET_COLUMNS)}) "
+                         f"VALUES ({', '.join('?' * len(STREET_COLUMNS))})", rows)
+        conn.execute("""
+            INSERT INTO voter_street_link (voter_id, streets_index_id)
+            SELECT s.voter_id, b.id
+            FROM temp.addr_street s
+            JOIN streets_index_built b
+              ON b.city_county_id = s.city_county_id AND b.street_canonical = s.street_canonical
+        """)
+    linked = conn.execute('SELECT COUNT(*) FROM voter_street_link').fetchone()[0]
+    print(f'Built {len(rows)} streets ({reused} kept their id, {len(rows) - reused} new); '
+          f'linked {linked} voters; {unmatched} parsed addresses had no city_county_id match')
+    return remote_ids - {r[0] for r in rows}
+
+
+def link_target(sink):
+    """The sink's address table that carries street_index_id, or None."""
+    objs = {r['name']: r['type'] for r in sink.query(
+        "SELECT name, type FROM sqlite_master WHERE name IN ('v_voters_addr_norm', 'voters_addr_norm')")}
+    for name in ('v_voters_addr_norm', 'voters_addr_norm'):
+        if objs.get(name) == 'table':
+            cols = {r['name'] for r in sink.query(f'PRAGMA table_info({name})')}
+            if 'street_index_id' in cols:
+                return name
+    return None
+
+
+def update_links(conn, sink, range_size):
+    target = link_target(sink)
+    if not target:
+        print(f'No address table with street_index_id on {sink.name}; skipping link update')
+        return
+    bounds = [r[0] for r in conn.execute(
+        'SELECT voter_id FROM (SELECT voter_id, ROW_NUMBER() OVER (ORDER BY voter_id) AS rn FROM voter_street_link) '
+        'WHERE rn > 1 AND (rn - 1) % ? = 0', (range_size,))]
+    edges = [None] + bounds + [None]
+    for i, (low, high) in enumerate(zip(edges, edges[1:]), 1):
+        where = ' AND '.join(
+            ([f'voter_id >= {esc(low)}'] if low is not None else []) +
+            ([f'voter_id < {esc(high)}'] if high is not None else [])) or '1 = 1'
+        sink.execute(
+            f'UPDATE {target} SET street_index_id = '
+            f'(SELECT s.streets_index_id FROM tmp_voter_street s WHERE s.voter_id = {target}.voter_id) '
+            f'WHERE {where} AND voter_id IN (SELECT voter_id FROM tmp_voter_street);')
+        print(f'Updated {target}.street_index_id range {i} / {len(edges) - 1}')
+
+
+def drop_stale(sink, stale, chunk=500):
+    """Delete sink streets that were not rebuilt, clearing what still references them."""
+    if not stale:
+        return
+    tables = {r['name'] for r in sink.query(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('tmp_voter_street', 'street_house_order')")}
+    target = link_target(sink)
+    stale = sorted(stale)
+    for i in range(0, len(stale), chunk):
+        ids = ', '.join(str(sid) for sid in stale[i:i + chunk])
+        stmts = [f'DELETE FROM {t} WHERE streets_index_id IN ({ids});' for t in sorted(tables)]
+        if target:
+            stmts.append(f'UPDATE {target} SET street_index_id = NULL WHERE street_index_id IN ({ids});')
+        sink.execute(' '.join(stmts + [f'DELETE FROM streets_index WHERE id IN ({ids});']))
+    print(f'Deleted {len(stale)} streets from streets_index on {sink.name} that were not rebuilt')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_source_argument(parser)
+    add_sink_arguments(parser)
+    add_checkpoint_arguments(parser)
+    add_delta_arguments(parser)
+    parser.add_argument('--no-seed', action='store_true', help='only build the local tables')
+    parser.add_argument('--link-range', type=int, default=5000, help='voters per street_index_id UPDATE statement')
+    args = parser.parse_args()
+    with instrumented(args):
+        conn = open_source(args.sqlite)
+        sink = None if args.no_seed else sink_from_args(args)
+        stale = build(conn, sink)
+        if sink is None:
+            conn.close()
+            return
+
+        checkpoint = checkpoint_from_args(args, sink)
+        seed_table(conn, sink, args, checkpoint, 'streets_index', STREET_COLUMNS,
+                   f"SELECT {', '.join(STREET_COLUMNS)} FROM streets_index_built;", key='id')
+        seed_table(conn, sink, args, checkpoint, 'tmp_voter_street', ['voter_id', 'streets_index_id'],
+                   'SELECT voter_id, streets_index_id FROM voter_street_link;')
+        verify_counts(sink, 'tmp_voter_street')
+        update_links(conn, sink, args.link_range)
+        drop_stale(sink, stale)
+        verify_counts(sink, 'streets_index')
+        conn.close()
+        sink.close()
+        print('\nAll done')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except SinkError as e:
+        raise SystemExit(f'seeding failed: {e}')
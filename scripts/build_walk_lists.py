@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Generate walk lists (walk_batches + walk_assignments) from the parsed voter
+addresses and seed them to D1.
+
+Usage:
+  python3 scripts/parse_addresses.py /path/to/wy.sqlite
+  python3 scripts/build_walk_lists.py /path/to/wy.sqlite [--county NATRONA] [--target-size 50] [--no-seed]
+  python3 scripts/build_walk_lists.py /path/to/wy.sqlite --sink remote|local|sqlite [--first-id 1]
+  python3 scripts/build_walk_lists.py /path/to/wy.sqlite --county NATRONA --sink remote
+
+Doors (voters sharing a house number and suffix on a street) are grouped
+by county, city, precinct and district, the grouping walk_batches records.
+Within a group the route walks a street's odd side up in house-number
+order, comes back down the even side, then moves on to the nearest
+remaining street and repeats.  The route is cut into batches of about
+--target-size voters, never splitting a door; a short tail is folded into
+the batch before it.
+
+There are no coordinates in wy.sqlite, so "nearest street" is judged from
+the addresses themselves: streets whose house-number blocks overlap are
+neighbours (parallel streets on a grid), numbered streets prefer the next
+number (2ND ST -> 3RD ST), and names break the remaining ties.
+
+Output is deterministic: every sort has a full key and batch ids are
+assigned in (county, city, precinct, district, route) order starting at
+--first-id, so a regenerated list diffs cleanly against the last one; the
+digest printed at the end changes only when the lists do.  Results go to
+the local tables walk_batches_built / walk_assignments_built (position is
+the 1-based stop in the batch's route).  Seeding first deletes the sink's
+batches with id >= --first-id (default 1) and their assignments: that id
+range belongs to this generator.
+
+With --county only that county's batches are deleted, and the other
+counties' batches stay on the sink, so the new ids must not reuse theirs.
+Without --first-id they start right after the highest id the sink holds
+for any other county (rebuilding the same county gives the same ids);
+an explicit --first-id whose range would overlap another county's batches
+is refused.
+"""
+import argparse, hashlib, re, time
+from collections import Counter, namedtuple
+from itertools import groupby
+
+from d1seed import SinkError, batch_insert, find_source, verify_counts
+from d1seed.cli import (add_source_argument, add_sink_arguments, sink_from_args, controller_from_args, open_source,
+                        instrumented)
+from d1seed.encode import esc
+
+BATCH_COLUMNS = ['id', 'volunteer_id', 'county', 'city', 'district', 'precinct']
+ASSIGNMENT_COLUMNS = ['batch_id', 'voter_id', 'position']
+
+BUILT_SCHEMA = """
+CREATE TABLE walk_batches_built (
+  id INTEGER PRIMARY KEY,
+  volunteer_id TEXT NOT NULL,
+  county TEXT,
+  city TEXT,
+  district TEXT,
+  precinct TEXT
+);
+CREATE TABLE walk_assignments_built (
+  batch_id INTEGER NOT NULL,
+  voter_id TEXT NOT NULL,
+  position INTEGER,
+  PRIMARY KEY (batch_id, voter_id)
+);
+"""
+
+ORDINAL_RE = re.compile(r'^(\d+)(ST|ND|RD|TH)?\b')
+# step between a numbered and a named street: after any numbered neighbour
+FAR = 10 ** 6
+
+Door = namedtuple('Door', 'house_number house_suffix voter_ids')
+
+
+class Street:
+    __slots__ = ('canonical', 'ordinal', 'sides', 'lo', 'hi')
+
+    def __init__(self, canonical, core):
+        m = ORDINAL_RE.match(core or '')
+        self.canonical = canonical
+        self.ordinal = int(m.group(1)) if m else None
+        self.sides = ([], [])  # even, odd; doors in ascending house order
+        self.lo = self.hi = None
+
+    def add(self, door):
+        self.sides[door.house_number % 2].append(door)
+        self.lo = door.house_number if self.lo is None else min(self.lo, door.house_number)
+        self.hi = door.house_number if self.hi is None else max(self.hi, door.house_number)
+
+    def walk(self):
+        """Up the odd side, back down the even side."""
+        even, odd = self.sides
+        return odd + even[::-1]
+
+
+def distance(a, b):
+    """Sort key for how close street b is to street a."""
+    gap = max(0, max(a.lo, b.lo) - min(a.hi, b.hi))
+    step = abs(a.ordinal - b.ordinal) if a.ordinal is not None and b.ordinal is not None else FAR
+    return (gap, step, b.canonical)
+
+
+def route(streets):
+    """Greedy nearest-street tour starting at the lowest-numbered block."""
+    remaining = sorted(streets, key=lambda s: (s.lo, s.canonical))
+    current = remaining.pop(0)
+    doors = current.walk()
+    while remaining:
+        nxt = min(remaining, key=lambda s: distance(current, s))
+        remaining.remove(nxt)
+        doors.extend(nxt.walk())
+        current = nxt
+    return doors
+
+
+def cut_batches(doors, target):
+    batches, cur, size = [], [], 0
+    for door in doors:
+        cur.append(door)
+        size += len(door.voter_ids)
+        if size >= target:
+            batches.append(cur)
+            cur, size = [], 0
+    if cur:
+        if batches and size < target / 2:
+            batches[-1].extend(cur)
+        else:
+            batches.append(cur)
+    return batches
+
+
+def columns(conn, table):
+    return {r[1] for r in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def pick_column(cols, names):
+    return next((n for n in names if n in cols), None)
+
+
+def iter_groups(conn, county, district_type):
+    """Yield ((county, city, precinct, district), [Street]) in group order."""
+    addr = find_source(conn, ['voters_addr_norm', 'v_voters_addr_norm'])
+    if not addr:
+        raise SystemExit('No voters_addr_norm source found in sqlite')
+    vcols = columns(conn, 'voters')
+    precinct = pick_column(vcols, ['precinct'])
+    district = pick_column(vcols, [f'{district_type}_district', district_type])
+    precinct_expr = f"COALESCE(v.{precinct}, '')" if precinct else "''"
+    district_expr = f"COALESCE(CAST(v.{district} AS TEXT), '')" if district else "''"
+    where = 'AND UPPER(TRIM(v.county)) = ?' if county else ''
+    cur = conn.execute(f"""
+        SELECT UPPER(TRIM(COALESCE(v.county, ''))), UPPER(TRIM(COALESCE(a.city, ''))),
+               {precinct_expr}, {district_expr},
+               p.street_canonical, p.street_core, p.house_number, COALESCE(p.house_suffix, ''), p.voter_id
+        FROM voter_addr_parsed p
+        JOIN voters v ON v.voter_id = p.voter_id
+        JOIN {addr} a ON a.voter_id = p.voter_id
+        WHERE p.status = 'ok' {where}
+        ORDER BY 1, 2, 3, 4, 5, 7, 8, 9
+    """, (county.upper().strip(),) if county else ())
+    for group, rows in groupby(cur, key=lambda r: r[:4]):
+        streets = []
+        for (canonical, core), street_rows in groupby(rows, key=lambda r: (r[4], r[5])):
+            street = Street(canonical, core)
+            for (house, suffix), door_rows in groupby(street_rows, key=lambda r: (r[6], r[7])):
+                street.add(Door(house, suffix, [r[8] for r in door_rows]))
+            streets.append(street)
+        yield group, streets
+
+
+def build(conn, county, district_type, target, first_id, volunteer):
+    if not find_source(conn, ['voter_addr_parsed'], types=('table',)):
+        raise SystemExit('voter_addr_parsed missing; run scripts/parse_addresses.py first')
+    started = time.perf_counter()
+    batch_rows, assignment_rows = [], []
+    next_id = first_id
+    for (g_county, g_city, g_precinct, g_district), streets in iter_groups(conn, county, district_type):
+        for doors in cut_batches(route(streets), target):
+            batch_rows.append((next_id, volunteer, g_county or None, g_city or None,
+                               g_district or None, g_precinct or None))
+            position = 0
+            for door in doors:
+                for vid in door.voter_ids:
+                    position += 1
+                    assignment_rows.append((next_id, vid, position))
+            next_id += 1
+    elapsed = time.perf_counter() - started
+
+    with conn:
+        conn.execute('DROP TABLE IF EXISTS walk_batches_built')
+        conn.execute('DROP TABLE IF EXISTS walk_assignments_built')
+        conn.executescript(BUILT_SCHEMA)
+        conn.executemany(f"INSERT INTO walk_batches_built ({', '.join(BATCH_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                         batch_rows)
+        conn.executemany('INSERT INTO walk_assignments_built (batch_id, voter_id, position) VALUES (?, ?, ?)',
+                         assignment_rows)
+
+    digest = hashlib.blake2b(digest_size=8)
+    for row in assignment_rows:
+        digest.update(('%d\t%s\t%d\n' % row).encode('utf-8'))
+    sizes = sorted(Counter(r[0] for r in assignment_rows).values()) or [0]
+    print(f'Routed {len(assignment_rows)} voters into {len(batch_rows)} batches '
+          f'(ids {first_id}-{next_id - 1}, sizes {sizes[0]}-{sizes[-1]}, target {target}) in {elapsed:.2f}s')
+    print(f'walk list digest: {digest.hexdigest()}')
+    return first_id, next_id - 1
+
+
+def next_free_id(sink, county):
+    """First id after every sink batch that belongs to another county."""
+    rows = sink.query(f'SELECT COALESCE(MAX(id), 0) + 1 AS next_id FROM walk_batches '
+                      f'WHERE county IS NOT {esc(county.upper().strip())};')
+    return int(rows[0]['next_id'])
+
+
+def check_overlap(sink, first, last, county):
+    """Refuse ids in [first, last] that the sink already uses for another county."""
+    rows = sink.query(f'SELECT COUNT(*) AS n, MIN(id) AS lo, MAX(id) AS hi FROM walk_batches '
+                      f'WHERE id BETWEEN {int(first)} AND {int(last)} AND county IS NOT {esc(county.upper().strip())};')
+    if rows[0]['n']:
+        raise SystemExit(f"ids {first}-{last} would overwrite {rows[0]['n']} batches of other counties on {sink.name} "
+                         f"(ids {rows[0]['lo']}-{rows[0]['hi']}); drop --first-id to start after them")
+
+
+def clear_sink(sink, first_id, county):
+    scope = f'id >= {int(first_id)}' + (f' AND county = {esc(county.upper().strip())}' if county else '')
+    sink.execute(f'DELETE FROM walk_assignments WHERE batch_id IN (SELECT id FROM walk_batches WHERE {scope}); '
+                 f'DELETE FROM walk_batches WHERE {scope};')
+    print(f'Cleared walk batches on {sink.name} where {scope}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_source_argument(parser)
+    add_sink_arguments(parser)
+    parser.add_argument('--county', default=None, help='only generate this county')
+    parser.add_argument('--district-type', choices=('house', 'senate'), default='house',
+                        help='legislative district recorded on each batch')
+    parser.add_argument('--target-size', type=int, default=50, help='voters per batch')
+    parser.add_argument('--first-id', type=int, default=None,
+                        help='id of the first generated walk batch (default 1, or with --county the first id '
+                             'after the other counties on the sink)')
+    parser.add_argument('--volunteer', default='unassigned', help='volunteer_id for the new batches')
+    parser.add_argument('--no-seed', action='store_true', help='only build the local tables')
+    args = parser.parse_args()
+    if args.target_size < 1:
+        raise SystemExit('--target-size must be at least 1')
+
+    with instrumented(args):
+        conn = open_source(args.sqlite)
+        sink = None if args.no_seed else sink_from_args(args)
+        first_id = args.first_id or 1
+        if args.county and sink is not None and args.first_id is None:
+            first_id = next_free_id(sink, args.county)
+        first, last = build(conn, args.county, args.district_type, args.target_size, first_id, args.volunteer)
+        if sink is None or last < first:
+            conn.close()
+            if sink is not None:
+                sink.close()
+            return
+
+        controller = controller_from_args(args)
+        if args.county:
+            check_overlap(sink, first, last, args.county)
+        clear_sink(sink, args.first_id or 1, args.county)
+        batch_insert(conn, sink, 'walk_batches', BATCH_COLUMNS,
+                     f"SELECT {', '.join(BATCH_COLUMNS)} FROM walk_batches_built;",
+                     batch_size=args.batch, max_bytes=args.max_bytes, key='id', controller=controller,
+                     workers=args.workers, in_flight=args.in_flight)
+        batch_insert(conn, sink, 'walk_assignments', ASSIGNMENT_COLUMNS,
+                     f"SELECT {', '.join(ASSIGNMENT_COLUMNS)} FROM walk_assignments_built;",
+                     batch_size=args.batch, max_bytes=args.max_bytes, key='voter_id', controller=controller,
+                     workers=args.workers, in_flight=args.in_flight)
+        verify_counts(sink, 'walk_batches')
+        verify_counts(sink, 'walk_assignments')
+        conn.close()
+        sink.close()
+        print('\nAll done')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except SinkError as e:
+        raise SystemExit(f'seeding failed: {e}')
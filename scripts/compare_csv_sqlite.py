@@ -1,67 +1,394 @@
 #!/usr/bin/env python3
-import csv, sqlite3, sys
+"""
+Diff the CSV exports in api/tmp against the local wy.sqlite tables.
+
+Usage:
+  python3 scripts/compare_csv_sqlite.py [/path/to/wy.sqlite] [--csv-dir api/tmp]
+         [--only voters.csv] [--report-dir /tmp/diff] [--sample 20]
+
+Each CSV is streamed next to an ordered SQLite cursor (ORDER BY voter_id,
+served from the primary key) as a sorted merge, so both sides are read once
+and memory stays bounded however large the export is.  A CSV that turns
+out not to be in voter_id order is diffed again after an external sort, in
+runs of --run-rows rows spilled to temp files.
+
+Reported per file, with full counts:
+  missing_in_sqlite  rows in the CSV but not in the table
+  missing_in_csv     rows in the table but not in the CSV
+  changed            rows on both sides whose shared columns differ
+
+Rows are matched per voter_id, so tables with several rows per voter
+(best_phone has one per phone) diff correctly: the rows of an id are
+paired by their compared columns first, and only what is left over on
+either side is reported, paired up in order as changed and the rest as
+missing.
+
+With --report-dir each category is also written to
+<report-dir>/<table>.<category>.csv.  Columns are matched by header name;
+headerless CSVs are compared by position only when the column count
+matches the table, otherwise only ids are compared.
+
+--events PATH writes a JSON-lines 'table' event per file (counts, seconds,
+rows/s, CSV MB/s) and a run summary; --profile DIR captures cProfile and
+tracemalloc reports (see scripts/d1seed/telemetry.py).
+"""
+import argparse, csv, heapq, os, sqlite3, sys, tempfile, time
+from collections import defaultdict
 from pathlib import Path
 
+from d1seed.cli import add_telemetry_arguments, instrumented
+
 repo = Path(__file__).resolve().parents[1]
-csv_dir = repo / 'api' / 'tmp'
-sqlite_path = Path.home() / 'projects' / 'voterdata' / 'wy.sqlite'
+DEFAULT_CSV_DIR = repo / 'api' / 'tmp'
+DEFAULT_SQLITE = Path.home() / 'projects' / 'voterdata' / 'wy.sqlite'
 
-files = [
+# (csv file, sqlite table, voter_id column index when the CSV has no header)
+FILES = [
     ('voters.csv', 'voters', 0),
     ('voters_addr_norm.csv', 'voters_addr_norm', 0),
     ('best_phone.csv', 'best_phone', 1),
 ]
 
-conn = sqlite3.connect(str(sqlite_path))
-cur = conn.cursor()
+CATEGORIES = ('missing_in_sqlite', 'missing_in_csv', 'changed')
+
+
+def norm(v):
+    """Render a SQLite value the way it appears in a CSV export."""
+    if v is None:
+        return ''
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+
+def table_columns(conn, tbl):
+    return [r[1] for r in conn.execute(f'PRAGMA table_info({tbl})')]
+
 
-print('Using sqlite:', sqlite_path)
+def key_mode(conn, tbl):
+    """'int' or 'text' for how voter_id sorts in SQLite, or 'cast' when the
+    stored types are mixed and the merge has to sort on CAST(... AS TEXT)."""
+    # over the whole column: one stray text id deep in an integer table
+    # changes the sort order the merge relies on
+    types = {r[0] for r in conn.execute(f'SELECT DISTINCT typeof(voter_id) FROM {tbl}')}
+    types.discard('null')
+    if types == {'integer'}:
+        return 'int'
+    if types <= {'text'}:
+        return 'text'
+    return 'cast'
 
-for fname, tbl, idcol in files:
-    path = csv_dir / fname
-    if not path.exists():
-        print(f'CSV missing: {path}')
-        continue
+
+def read_header(path, idcol):
+    """Return (header or None, id column index, width of the first row)."""
+    with open(path, newline='') as fh:
+        first = next(csv.reader(fh), None)
+    if not first:
+        return None, idcol, 0
+    # a header row has a non-numeric id cell, like the old first-row check
+    cell = first[idcol].strip() if idcol < len(first) else ''
+    if cell.isdigit():
+        return None, idcol, len(first)
+    names = [c.strip() for c in first]
+    return names, names.index('voter_id') if 'voter_id' in names else idcol, len(first)
+
+
+class OutOfOrder(Exception):
+    pass
+
+
+def csv_records(path, header, idcol, keyfn, on_bad=None, check_order=False):
+    """Yield (key, row) from the CSV in file order.
+
+    Ids `keyfn` cannot convert (text ids against an integer-keyed table)
+    can never match and go to `on_bad`.  With check_order, the first key
+    lower than its predecessor raises OutOfOrder.
+    """
+    prev = None
     with open(path, newline='') as fh:
         reader = csv.reader(fh)
-        rows = list(reader)
-    print('\nFile:', path.name, 'rows=', len(rows))
-    # detect header by sampling first row: if non-numeric first col for voters, consider header
-    header = False
-    if len(rows) and not rows[0][0].isdigit():
-        header = True
-    print('Header detected:', header)
-    # extract voter_ids (first column) - but some files may have header or extra columns
-    csv_ids = [r[0].strip() for (i,r) in enumerate(rows) if r and (not header or i>0)]
-    csv_ids_set = set(csv_ids)
-    print('Unique ids in CSV:', len(csv_ids_set))
-    # get sqlite ids
+        if header:
+            next(reader, None)
+        for row in reader:
+            if not row or idcol >= len(row):
+                continue
+            vid = row[idcol].strip()
+            if not vid:
+                continue
+            try:
+                key = keyfn(vid)
+            except ValueError:
+                if on_bad:
+                    on_bad(vid, row)
+                continue
+            if check_order:
+                if prev is not None and key < prev:
+                    raise OutOfOrder(vid)
+                prev = key
+            yield key, row
+
+
+def _spill(run, tmpdir):
+    run.sort(key=lambda kr: kr[0])
+    fd, name = tempfile.mkstemp(suffix='.csv', dir=tmpdir)
+    with os.fdopen(fd, 'w', newline='') as fh:
+        w = csv.writer(fh)
+        for _, row in run:
+            w.writerow(row)
+    return name
+
+
+def _read_run(name, idcol, keyfn):
+    with open(name, newline='') as fh:
+        for row in csv.reader(fh):
+            yield keyfn(row[idcol].strip()), row
+
+
+def external_sorted(records, idcol, keyfn, run_rows, tmpdir):
+    """Yield (key, row) in key order holding at most `run_rows` rows in memory;
+    full runs are sorted, spilled to temp files and merged with heapq."""
+    runs = []
+    run = []
+    for rec in records:
+        run.append(rec)
+        if len(run) >= run_rows:
+            runs.append(_spill(run, tmpdir))
+            run = []
+    if not runs:
+        run.sort(key=lambda kr: kr[0])
+        yield from run
+        return
+    if run:
+        runs.append(_spill(run, tmpdir))
+    print(f'  merging {len(runs)} sorted runs')
+    yield from heapq.merge(*(_read_run(r, idcol, keyfn) for r in runs), key=lambda kr: kr[0])
+
+
+def sqlite_records(conn, tbl, cols, mode, keyfn):
+    order = 'CAST(voter_id AS TEXT)' if mode == 'cast' else 'voter_id'
+    cur = conn.execute(f"SELECT {', '.join(cols)} FROM {tbl} WHERE voter_id IS NOT NULL ORDER BY {order}")
+    vi = cols.index('voter_id')
+    while True:
+        rows = cur.fetchmany(5000)
+        if not rows:
+            return
+        for r in rows:
+            yield keyfn(norm(r[vi])) if mode == 'cast' else r[vi], r
+
+
+class Report:
+    def __init__(self, tbl, report_dir, sample, csv_header, cols):
+        self.counts = dict.fromkeys(CATEGORIES, 0)
+        self.counts.update(matched=0, csv_rows=0, sqlite_rows=0, csv_duplicates=0)
+        self.samples = {c: [] for c in CATEGORIES}
+        self.sample = sample
+        self.files = {}
+        self.writers = {}
+        if report_dir:
+            report_dir.mkdir(parents=True, exist_ok=True)
+            heads = {
+                'missing_in_sqlite': csv_header or ['csv_row'],
+                'missing_in_csv': cols,
+                'changed': ['voter_id', 'column', 'csv_value', 'sqlite_value'],
+            }
+            for c in CATEGORIES:
+                fh = open(report_dir / f'{tbl}.{c}.csv', 'w', newline='')
+                self.files[c] = fh
+                self.writers[c] = csv.writer(fh)
+                self.writers[c].writerow(heads[c])
+
+    def add(self, category, vid, rows):
+        self.counts[category] += 1
+        if len(self.samples[category]) < self.sample:
+            self.samples[category].append(vid)
+        if category in self.writers:
+            self.writers[category].writerows(rows)
+
+    def close(self):
+        for fh in self.files.values():
+            fh.close()
+
+
+def grouped(records):
+    """(key, [row, ...]) per key of a key-ordered (key, row) stream."""
+    group = last = None
+    for key, row in records:
+        if group is not None and key == last:
+            group.append(row)
+            continue
+        if group is not None:
+            yield last, group
+        last, group = key, [row]
+    if group is not None:
+        yield last, group
+
+
+def match_rows(rep, lrows, rrows, vi, idcol, pairs):
+    """Classify the CSV and SQLite rows of one id."""
+    vid = lrows[0][idcol].strip()
+    if len(lrows) == 1 and len(rrows) == 1:
+        # the common case: one row per id on each side
+        lrow, rrow = lrows[0], rrows[0]
+        diffs = []
+        for ci, si, name in pairs:
+            cv = lrow[ci] if ci < len(lrow) else ''
+            sv = norm(rrow[si])
+            if cv != sv:
+                diffs.append([vid, name, cv, sv])
+        if diffs:
+            rep.add('changed', vid, diffs)
+        else:
+            rep.counts['matched'] += 1
+        return
+    pool = defaultdict(list)
+    for r in rrows:
+        pool[tuple(norm(r[si]) for _, si, _ in pairs)].append(r)
+    left = []
+    for row in lrows:
+        same = pool.get(tuple(row[ci] if ci < len(row) else '' for ci, _, _ in pairs))
+        if same:
+            same.pop()
+            rep.counts['matched'] += 1
+        else:
+            left.append(row)
+    right = [r for rows in pool.values() for r in rows]
+    for lrow, rrow in zip(left, right):
+        diffs = []
+        for ci, si, name in pairs:
+            cv = lrow[ci] if ci < len(lrow) else ''
+            sv = norm(rrow[si])
+            if cv != sv:
+                diffs.append([vid, name, cv, sv])
+        rep.add('changed', vid, diffs)
+    for lrow in left[len(right):]:
+        rep.add('missing_in_sqlite', vid, [lrow])
+    for rrow in right[len(left):]:
+        rep.add('missing_in_csv', norm(rrow[vi]), [[norm(v) for v in rrow]])
+
+
+def merge_diff(left, right, rep, cols, idcol, pairs):
+    """Walk two (key, row) streams in key order and classify every row."""
+    vi = cols.index('voter_id')
+    left, right = grouped(left), grouped(right)
+    lk, lrows = next(left, (None, None))
+    rk, rrows = next(right, (None, None))
+    while lrows is not None or rrows is not None:
+        if rrows is None or (lrows is not None and lk < rk):
+            rep.counts['csv_rows'] += len(lrows)
+            rep.counts['csv_duplicates'] += len(lrows) - 1
+            for lrow in lrows:
+                rep.add('missing_in_sqlite', lrow[idcol].strip(), [lrow])
+            lk, lrows = next(left, (None, None))
+        elif lrows is None or rk < lk:
+            rep.counts['sqlite_rows'] += len(rrows)
+            for rrow in rrows:
+                rep.add('missing_in_csv', norm(rrow[vi]), [[norm(v) for v in rrow]])
+            rk, rrows = next(right, (None, None))
+        else:
+            rep.counts['csv_rows'] += len(lrows)
+            rep.counts['csv_duplicates'] += len(lrows) - 1
+            rep.counts['sqlite_rows'] += len(rrows)
+            match_rows(rep, lrows, rrows, vi, idcol, pairs)
+            lk, lrows = next(left, (None, None))
+            rk, rrows = next(right, (None, None))
+
+
+def diff_table(conn, path, tbl, idcol, report_dir, sample, run_rows, tmpdir):
+    cols = table_columns(conn, tbl)
+    if 'voter_id' not in cols:
+        print(f'Table {tbl} has no voter_id column; skipping')
+        return None
+    mode = key_mode(conn, tbl)
+    keyfn = int if mode == 'int' else str
+    header, idcol, width = read_header(path, idcol)
+    print('Header detected:', bool(header), '| key order:', mode)
+
+    # (csv index, sqlite index, name) for every column compared on matches
+    if header:
+        pairs = [(header.index(c), cols.index(c), c) for c in cols if c in header and c != 'voter_id']
+    elif width == len(cols):
+        pairs = [(i, i, c) for i, c in enumerate(cols) if c != 'voter_id']
+    else:
+        pairs = []
+    print('Compared columns:', ', '.join(c for _, _, c in pairs) or '(ids only)')
+
+    # Exports are normally written in voter_id order: merge in one pass and
+    # only fall back to an external sort if the CSV turns out unordered.
+    rep = Report(tbl, report_dir, sample, header, cols)
+    on_bad = lambda vid, row: rep.add('missing_in_sqlite', vid, [row])
     try:
-        cur.execute(f"SELECT voter_id FROM {tbl} LIMIT 1")
-        has = cur.fetchone() is not None
-    except Exception as e:
-        print('Table missing or error querying', tbl, e)
-        continue
-    cur.execute(f"SELECT COUNT(*) FROM {tbl}")
-    cnt = cur.fetchone()[0]
-    print('Rows in sqlite table', tbl, '=', cnt)
-    # find up to 20 csv ids missing in sqlite
-    samples_missing = []
-    BATCH = 500
-    csv_list = list(csv_ids_set)
-    for i in range(0, len(csv_list), BATCH):
-        batch = csv_list[i:i+BATCH]
-        q = 'SELECT voter_id FROM {t} WHERE voter_id IN ({ph})'.format(t=tbl, ph=','.join(['?']*len(batch)))
-        cur.execute(q, batch)
-        present = set(r[0] for r in cur.fetchall())
-        for v in batch:
-            if v not in present:
-                samples_missing.append(v)
-                if len(samples_missing) >= 20:
-                    break
-        if len(samples_missing) >= 20:
-            break
-    print('Sample missing ids (up to 20):', samples_missing[:20])
-
-conn.close()
-print('\nDone')
+        merge_diff(csv_records(path, header, idcol, keyfn, on_bad, check_order=True),
+                   sqlite_records(conn, tbl, cols, mode, keyfn), rep, cols, idcol, pairs)
+    except OutOfOrder as e:
+        rep.close()
+        print(f'  CSV is not in voter_id order (at {e}); sorting externally')
+        rep = Report(tbl, report_dir, sample, header, cols)
+        left = external_sorted(csv_records(path, header, idcol, keyfn, on_bad), idcol, keyfn, run_rows, tmpdir)
+        merge_diff(left, sqlite_records(conn, tbl, cols, mode, keyfn), rep, cols, idcol, pairs)
+    finally:
+        rep.close()
+    return rep
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sqlite', nargs='?', default=str(DEFAULT_SQLITE))
+    parser.add_argument('--csv-dir', default=str(DEFAULT_CSV_DIR))
+    parser.add_argument('--only', action='append', help='CSV file name to compare (repeatable)')
+    parser.add_argument('--report-dir', default=None, help='write <table>.<category>.csv reports here')
+    parser.add_argument('--sample', type=int, default=20, help='ids to print per category')
+    parser.add_argument('--run-rows', type=int, default=500_000,
+                        help='rows held in memory per sorted run for unsorted CSVs')
+    add_telemetry_arguments(parser)
+    args = parser.parse_args()
+
+    sqlite_path = Path(args.sqlite)
+    if not sqlite_path.exists():
+        sys.exit(f'SQLite file missing: {sqlite_path}')
+    csv_dir = Path(args.csv_dir)
+    report_dir = Path(args.report_dir) if args.report_dir else None
+    conn = sqlite3.connect(str(sqlite_path))
+    print('Using sqlite:', sqlite_path)
+
+    with instrumented(args) as log:
+        with tempfile.TemporaryDirectory(prefix='csvdiff_') as tmpdir:
+            for fname, tbl, idcol in FILES:
+                if args.only and fname not in args.only:
+                    continue
+                path = csv_dir / fname
+                if not path.exists():
+                    print(f'CSV missing: {path}')
+                    continue
+                print('\nFile:', path.name, '-> table', tbl)
+                exists = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type IN ('table','view') AND name = ?", (tbl,)
+                ).fetchone()
+                if not exists:
+                    print('Table missing in sqlite:', tbl)
+                    continue
+                started = time.perf_counter()
+                rep = diff_table(conn, path, tbl, idcol, report_dir, args.sample, args.run_rows, tmpdir)
+                if rep is None:
+                    continue
+                c = rep.counts
+                seconds = max(time.perf_counter() - started, 1e-9)
+                log.totals['rows'] += c['csv_rows'] + c['sqlite_rows']
+                log.totals['bytes'] += path.stat().st_size
+                log.emit('table', table=tbl, csv=path.name, seconds=round(seconds, 3),
+                         rows_per_s=round((c['csv_rows'] + c['sqlite_rows']) / seconds, 1),
+                         mb_per_s=round(path.stat().st_size / seconds / 1e6, 3), **c)
+                print(f"CSV rows: {c['csv_rows']} ({c['csv_duplicates']} sharing an id) | sqlite rows: {c['sqlite_rows']}")
+                print(f"Matched: {c['matched']} | changed: {c['changed']} | "
+                      f"missing in sqlite: {c['missing_in_sqlite']} | missing in csv: {c['missing_in_csv']}")
+                for cat in CATEGORIES:
+                    if rep.samples[cat]:
+                        print(f'Sample {cat} (up to {args.sample}):', rep.samples[cat])
+                if report_dir:
+                    print('Reports:', ', '.join(str(report_dir / f'{tbl}.{cat}.csv') for cat in CATEGORIES))
+
+        conn.close()
+        print('\nDone')
+
+
+if __name__ == '__main__':
+    main()
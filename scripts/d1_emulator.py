@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Wrangler-compatible local D1 emulator for offline end-to-end seeding.
+
+Usage:
+  python3 scripts/d1_emulator.py [--db PATH] [--latency 0.3] [--fail-rate 0.05] [--seed 1] \\
+      d1 execute wy --remote --file batch.sql
+  python3 scripts/d1_emulator.py d1 execute wy --remote --command "SELECT COUNT(*) AS cnt FROM voters" --json
+  python3 scripts/d1_seed_from_sqlite.py /path/to/wy.sqlite --sink emulator --adaptive --workers 4 --events run.jsonl
+  python3 scripts/d1_seed_from_sqlite.py /path/to/wy.sqlite --wrangler "python3 scripts/d1_emulator.py"
+  python3 scripts/d1_emulator.py --seed-check [--synthetic 5000] [--dir /tmp/check] [-- --workers 4 ...]
+
+Accepts the `wrangler d1 execute` invocations the seeders make and runs
+them against a sqlite file built from worker/db/migrations, with D1's
+statement size and row limits, simulated latency and injected transient
+failures, printing wrangler's output formats.  See d1seed/emulator.py for
+the limits and formats.  --sink emulator drives it through the regular
+wrangler sink with the --fake-* latency and failure settings.
+
+--seed-check builds a small synthetic wy.sqlite, seeds voters,
+v_best_phone and v_voters_addr_norm into a fresh emulated database with
+d1_seed_from_sqlite.py --sink emulator (arguments after -- are passed on)
+and exits 1 unless every table arrives complete.
+"""
+import argparse, sys
+
+from d1seed.emulator import main, seed_check
+
+
+def check(argv):
+    parser = argparse.ArgumentParser(prog='d1_emulator.py --seed-check')
+    parser.add_argument('--seed-check', action='store_true')
+    parser.add_argument('--synthetic', type=int, default=5000, metavar='VOTERS', help='synthetic voters to seed')
+    parser.add_argument('--dir', default=None, help='where the source and emulated databases go (default: a temp dir)')
+    parser.add_argument('extra', nargs='*', help='extra d1_seed_from_sqlite.py arguments (after --)')
+    args = parser.parse_args(argv)
+    failures = seed_check(args.synthetic, args.dir, args.extra)
+    print('Seed check ' + (f'failed: {failures} tables incomplete' if failures else 'passed'))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    if '--seed-check' in sys.argv[1:]:
+        sys.exit(check(sys.argv[1:]))
+    sys.exit(main())
@@ -1,121 +1,45 @@
 #!/usr/bin/env python3
 """
-Seed D1 'wy' from local sqlite in batches using wrangler d1 execute --file.
+Seed D1 'wy' from local sqlite in batches using the shared d1seed library.
 Usage:
-  python3 scripts/d1_seed_from_sqlite.py /path/to/wy.sqlite
+  python3 scripts/d1_seed_from_sqlite.py /path/to/wy.sqlite [--sink remote|local|sqlite|fake] [--resume] [--adaptive]
+  python3 scripts/d1_seed_from_sqlite.py /path/to/wy.sqlite --delta [--verify-remote]
 
 This script is destructive only to the extent it INSERTs/REPLACEs rows into D1.
 It uses INSERT OR REPLACE so re-running is idempotent for primary key rows.
+With --sink sqlite the batches go to a scratch sqlite3 database built from
+worker/db/migrations instead of D1, and the smoke tests are skipped;
+--sink fake does the same behind simulated D1 latency and failures, which is
+how --adaptive batch sizing can be tried out offline.
+
+--delta sends only rows that changed since the previous sync (tracked in a
+per-sink hash manifest under .seed_checkpoints/). Run once with
+--mark-synced after a full seed to start tracking without resending.
+
+--workers N uploads up to N statements at once while the next ones are
+encoded; checkpoints still advance in key order.
+
+--validate reads the voter_id column of voters, the phone source and the
+address source once, before any upload, and stops on duplicate voter_ids,
+rows without one, or phone/address rows whose voter is missing
+(d1seed.integrity); it also counts voters without a phone or address.
+--drop-invalid skips those rows instead of stopping.
+
+--events run.jsonl records per-batch rows, bytes and stage timings (fetch,
+encode, pack, upload) and a run summary as JSON lines; --profile DIR adds
+cProfile and tracemalloc reports.  All seeding tools take both flags.
 """
-import sqlite3, sys, csv, subprocess, tempfile, os
-from pathlib import Path
-
-def esc(s):
-    if s is None:
-        return 'NULL'
-    s = str(s)
-    s = s.replace("'", "''")
-    return "'" + s + "'"
-
-def run_sqlfile_on_d1(path):
-    cmd = ['wrangler','d1','execute','wy','--remote','--file', str(path)]
-    print('Running:', ' '.join(cmd))
-    res = subprocess.run(cmd, capture_output=True, text=True)
-    print('Exit', res.returncode)
-    if res.stdout:
-        print(res.stdout)
-    if res.stderr:
-        print(res.stderr)
-    if res.returncode != 0:
-        raise SystemExit('wrangler command failed')
-
-
-def batch_insert(conn, cursor, table, cols, select_sql, batch_size=2000):
-    cur = conn.cursor()
-    cur.execute(select_sql)
-    rows = cur.fetchall()
-    total = len(rows)
-    print(f'Found {total} rows for {table}')
-    i = 0
-    while i < total:
-        batch = rows[i:i+batch_size]
-        values = []
-        for r in batch:
-            vals = ','.join(esc(v) for v in r)
-            values.append('(' + vals + ')')
-        cols_list = ','.join(cols)
-        sql = f"INSERT OR REPLACE INTO {table} ({cols_list}) VALUES\n" + ',\n'.join(values) + ';'
-        # write to tmp file
-        fh, fname = tempfile.mkstemp(suffix='.sql', prefix=f'd1_{table}_')
-        os.close(fh)
-        with open(fname, 'w') as f:
-            f.write(sql)
-        run_sqlfile_on_d1(fname)
-        os.remove(fname)
-        i += batch_size
-        print(f'Inserted batch up to {i} / {total}')
-    print(f'Done seeding {table}')
-
-
-def verify_counts(table):
-    cmd = ['wrangler','d1','execute','wy','--remote','--command', f"SELECT COUNT(*) AS cnt FROM {table};"]
-    res = subprocess.run(cmd, capture_output=True, text=True)
-    print(res.stdout)
-    if res.returncode != 0:
-        print('verify command failed', res.stderr)
+import argparse, subprocess
 
+from d1seed import SinkError, verify_counts, find_source
+from d1seed.address import PARSED_COLUMNS
+from d1seed.cli import (add_source_argument, add_sink_arguments, add_checkpoint_arguments, add_delta_arguments,
+                        add_validate_arguments, sink_from_args, checkpoint_from_args, open_source, seed_table,
+                        validate_sources, instrumented)
 
-if __name__ == '__main__':
-    path = Path(sys.argv[1]) if len(sys.argv) > 1 else Path.home() / 'projects' / 'voterdata' / 'wyoming' / 'wy.sqlite'
-    if not path.exists():
-        print('SQLite file missing:', path)
-        sys.exit(1)
-    conn = sqlite3.connect(str(path))
-    # 1) voters
-    # Map local column names to the target columns expected by D1
-    # local columns: senate_district, house_district -> map to senate, house
-    voters_select = "SELECT voter_id, political_party, county, senate_district AS senate, house_district AS house FROM voters;"
-    batch_insert(conn, conn.cursor(), 'voters', ['voter_id','political_party','county','senate','house'], voters_select)
-    verify_counts('voters')
-
-    # 2) best_phone (from voter_phones)
-    # prefer voter_phones table if present
-    cur = conn.cursor()
-    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name IN ('best_phone','voter_phones') LIMIT 1;")
-    tbl = cur.fetchone()
-    if tbl:
-        source = tbl[0]
-    else:
-        source = 'voter_phones'
-    # Insert into the materialized table `v_best_phone` (avoid inserting into
-    # the `best_phone` view which may be circularly defined in some D1
-    # deployments). The worker code references `v_best_phone` directly
-    # so populating this table is sufficient.
-    batch_insert(conn, conn.cursor(), 'v_best_phone', ['voter_id','phone_e164','confidence_code','is_wy_area','imported_at'],
-                 f"SELECT voter_id, phone_e164, confidence_code, is_wy_area, imported_at FROM {source};")
-    verify_counts('v_best_phone')
-
-    # 3) voters_addr_norm: try view v_voters_addr_norm then voters_addr_norm
-    cur.execute("SELECT name FROM sqlite_master WHERE type IN ('table','view') AND name IN ('v_voters_addr_norm','voters_addr_norm') LIMIT 1;")
-    tbl = cur.fetchone()
-    if tbl:
-        source = tbl[0]
-        # Use the same batched insertion strategy used above to avoid
-        # creating one enormous SQL statement that exceeds D1 limits.
-    # Use a smaller batch size for address rows (they tend to contain
-    # longer strings which can make a single SQL file exceed D1 limits).
-    batch_insert(conn, conn.cursor(), 'voters_addr_norm',
-             ['voter_id','ln','fn','addr1','city','state','zip','senate','house'],
-             f"SELECT voter_id, ln, fn, addr1, city, state, zip, senate, house FROM {source};",
-             batch_size=500)
-        verify_counts('voters_addr_norm')
-    else:
-        print('No source for voters_addr_norm found in sqlite; skipping')
-
-    conn.close()
-    # smoke tests
+
+def run_smoke_tests():
     print('\nRunning smoke tests against local worker endpoints...')
-    import shlex
     # canvass nearby (use arg list to avoid shell quoting issues)
     canvass_cmd = [
         'curl','-sS','-X','POST','http://127.0.0.1:8787/api/canvass/nearby',
@@ -128,4 +52,88 @@ if __name__ == '__main__':
     callnext_cmd = ['curl','-sS','-X','POST','http://127.0.0.1:8787/api/next']
     print('\nCALL NEXT:', ' '.join(callnext_cmd))
     subprocess.run(callnext_cmd)
-    print('\nAll done')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_source_argument(parser)
+    add_sink_arguments(parser)
+    add_checkpoint_arguments(parser)
+    add_delta_arguments(parser)
+    add_validate_arguments(parser)
+    args = parser.parse_args()
+    with instrumented(args):
+        conn = open_source(args.sqlite)
+        sink = sink_from_args(args)
+        checkpoint = checkpoint_from_args(args, sink)
+        # Map local column names to the target columns expected by D1
+        # local columns: senate_district, house_district -> map to senate, house
+        voters_select = "SELECT voter_id, political_party, county, senate_district AS senate, house_district AS house FROM voters;"
+        # best_phone: prefer best_phone_built (one ranked E.164 phone per
+        # voter, from scripts/build_best_phone.py), then the raw best_phone /
+        # voter_phones tables as-is.
+        phone_source = (find_source(conn, ['best_phone_built', 'best_phone', 'voter_phones'], types=('table',))
+                        or 'voter_phones')
+        addr_source = find_source(conn, ['v_voters_addr_norm', 'voters_addr_norm'])
+        children = [('v_best_phone',
+                     f"SELECT voter_id, phone_e164, confidence_code, is_wy_area, imported_at FROM {phone_source};")]
+        if addr_source:
+            children.append(('v_voters_addr_norm',
+                             f"SELECT voter_id, ln, fn, addr1, city, state, zip, senate, house FROM {addr_source};"))
+        # --validate / --drop-invalid: one pass over each source's voter_ids
+        # before anything is uploaded
+        selects = validate_sources(conn, args, ('voters', voters_select), children)
+
+        # 1) voters
+        seed_table(conn, sink, args, checkpoint, 'voters', ['voter_id','political_party','county','senate','house'],
+                   selects['voters'])
+        verify_counts(sink, 'voters')
+
+        # 2) best_phone
+        if phone_source != 'best_phone_built':
+            print(f'Seeding v_best_phone from {phone_source} as-is; run scripts/build_best_phone.py to rank and normalize it')
+        # Insert into the materialized table `v_best_phone` (avoid inserting into
+        # the `best_phone` view which may be circularly defined in some D1
+        # deployments). The worker code references `v_best_phone` directly
+        # so populating this table is sufficient.
+        seed_table(conn, sink, args, checkpoint, 'v_best_phone',
+                   ['voter_id','phone_e164','confidence_code','is_wy_area','imported_at'],
+                   selects['v_best_phone'])
+        verify_counts(sink, 'v_best_phone')
+
+        # 3) voters_addr_norm: try view v_voters_addr_norm then voters_addr_norm
+        if addr_source:
+            # Write the materialized backing table `v_voters_addr_norm`, as
+            # d1_seed_voters_addr_norm.py does: `voters_addr_norm` is a view on
+            # some D1 deployments and needs city_county_id in the migrated
+            # schema. Batches are cut on statement size, so long address strings
+            # no longer push a single SQL file over D1 limits; the row cap stays
+            # lower than for voters.
+            seed_table(conn, sink, args, checkpoint, 'v_voters_addr_norm',
+                       ['voter_id','ln','fn','addr1','city','state','zip','senate','house'],
+                       selects['v_voters_addr_norm'], batch_size=min(args.batch, 500))
+            verify_counts(sink, 'v_voters_addr_norm')
+        else:
+            print('No source for voters_addr_norm found in sqlite; skipping')
+
+        # 4) voter_addr_parsed: built locally by scripts/parse_addresses.py
+        if find_source(conn, ['voter_addr_parsed'], types=('table',)):
+            parsed_cols = ['voter_id'] + PARSED_COLUMNS
+            seed_table(conn, sink, args, checkpoint, 'voter_addr_parsed', parsed_cols,
+                       f"SELECT {', '.join(parsed_cols)} FROM voter_addr_parsed;")
+            verify_counts(sink, 'voter_addr_parsed')
+        else:
+            print('No voter_addr_parsed in sqlite (run scripts/parse_addresses.py); skipping')
+
+        conn.close()
+        if args.sink in ('remote', 'local'):
+            run_smoke_tests()
+        sink.close()
+        print('\nAll done')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except SinkError as e:
+        raise SystemExit(f'seeding failed: {e}')
@@ -0,0 +1,75 @@
+"""
+Shared seeding library for the D1 seeding scripts in scripts/.
+
+The scripts (d1_seed_from_sqlite.py, d1_seed_voters_addr_norm.py,
+d1_finish_voters_addr_norm.py) are thin entry points over this package:
+
+  encode     - SQL literal encoding and byte-budgeted INSERT batching
+  sinks      - where batches are executed (wrangler --remote, wrangler --local,
+               a direct sqlite3 stand-in built from worker/db/migrations,
+               a fake D1 that injects latency and failures, or wrangler
+               calls answered by the emulator)
+  emulator   - wrangler-compatible `d1 execute` over a migrated sqlite file
+               with D1's limits, latency and failures (d1_emulator.py)
+  adaptive   - BatchController: statement size from measured throughput,
+               error classification, split-and-retry with backoff
+  pipeline   - --workers: encode the next statements while earlier ones
+               upload, confirmed in order
+  seed       - keyset-paged batch_insert / verify_counts / source lookup
+  checkpoint - per-sink JSON checkpoints so --resume continues after the
+               last committed key
+  delta      - per-row hash manifest for --delta syncs and range-fingerprint
+               drift checks against the sink
+  address    - street address parser (house number, directionals, street
+               type, unit) used by parse_addresses.py
+  names      - name normalization and FTS5 match expressions for the
+               voter name search (build_name_search.py)
+  rollups    - incremental activity rollups for the admin dashboards and
+               their full-recount check (refresh_rollups.py)
+  pull       - keyset-paged pull of call_activity / voter_contacts from a
+               sink into a local sqlite, with marks (pull_activity.py)
+  integrity  - pre-upload duplicate and orphan checks over compact sorted
+               voter_id arrays (--validate / --drop-invalid)
+  cli        - shared argparse flags for sinks, checkpoints, delta sync,
+               pre-upload checks and instrumentation
+  telemetry  - JSON-lines batch/summary events (--events) and cProfile /
+               tracemalloc capture (--profile)
+  dataset    - synthetic or wy.sqlite-derived data for a migrated stand-in
+  workload   - the Worker's hot query shapes, for bench_queries.py
+"""
+from .adaptive import BatchController, classify_error, send_batches
+from .address import ParsedAddress, parse_address
+from .checkpoint import Checkpoint
+from .delta import attach_manifest, delta_sync, verify_remote, row_hash
+from .encode import MAX_STATEMENT_BYTES, Batch, esc, iter_insert_batches
+from .sinks import SinkError, Sink, WranglerSink, SqliteSink, FakeSink, EmulatorSink, make_sink, MIGRATIONS_DIR
+from .seed import batch_insert, verify_counts, find_source, iter_keyset
+
+__all__ = [
+    'BatchController',
+    'classify_error',
+    'send_batches',
+    'ParsedAddress',
+    'parse_address',
+    'Checkpoint',
+    'attach_manifest',
+    'delta_sync',
+    'verify_remote',
+    'row_hash',
+    'MAX_STATEMENT_BYTES',
+    'Batch',
+    'esc',
+    'iter_insert_batches',
+    'SinkError',
+    'Sink',
+    'WranglerSink',
+    'SqliteSink',
+    'FakeSink',
+    'EmulatorSink',
+    'make_sink',
+    'MIGRATIONS_DIR',
+    'batch_insert',
+    'verify_counts',
+    'find_source',
+    'iter_keyset',
+]
@@ -0,0 +1,253 @@
+"""
+Adaptive batch sizing for the seeders.
+
+The Python counterpart of the grow-after-3-successes / halve-on-error loop
+in scripts/migrate_voter_data.sh, driven by measurements instead of fixed
+steps.  BatchController owns a statement byte budget:
+
+  * every successful batch records rows/second at the budget it ran with;
+    after `probe_every` successes the budget grows by `growth` while
+    throughput keeps improving, and falls back to the best measured budget
+    when a bigger one turned out slower
+  * a batch slower than `max_latency` shrinks the budget (wrangler and D1
+    time out long requests)
+  * a "too large" failure lowers the hard ceiling below the failed size
+  * a transient failure (network, 5xx, 429, timeouts) halves the budget and
+    backs off exponentially; `max_retries` consecutive failures give up
+  * anything else (SQL errors, constraint failures) is fatal and re-raised
+
+send_batches() packs statements to the controller's current budget and
+retries a failed batch as two halves, so a transient failure costs at most
+one batch and a batch is never resent whole after it was judged too large.
+Both paths report each confirmed statement to telemetry.log.
+"""
+import random, re, time
+from collections import deque
+from contextlib import nullcontext
+
+from . import telemetry
+from .encode import MAX_STATEMENT_BYTES, Batch, pack_statements
+from .sinks import SinkError
+
+TOO_LARGE = re.compile(
+    r'too ?(large|big|long)|toobig|exceeds? .*limit|payload|\b413\b', re.I)
+TARGET = re.compile(r'^\s*(INSERT|DELETE)\b.*?\b(?:INTO|FROM)\s+(\w+)', re.I | re.S)
+TRANSIENT = re.compile(
+    r'timed? ?out|timeout|network|connection|econn|etimedout|fetch failed|socket|'
+    r'temporar|unavailable|overloaded|rate.?limit|too many requests|internal error|'
+    r'\b(429|500|502|503|504)\b', re.I)
+
+
+def classify_error(err):
+    """Return 'too_large', 'transient' or 'fatal' for a SinkError."""
+    text = f'{err} {getattr(err, "output", "") or ""}'
+    if TOO_LARGE.search(text):
+        return 'too_large'
+    if TRANSIENT.search(text):
+        return 'transient'
+    return 'fatal'
+
+
+class BatchController:
+    def __init__(self, max_bytes=MAX_STATEMENT_BYTES, start_bytes=None, min_bytes=4_000,
+                 growth=1.5, probe_every=3, tolerance=0.05, max_latency=20.0,
+                 max_retries=6, backoff=1.0, max_backoff=60.0, verbose=True):
+        self.ceiling = max_bytes
+        self.min_bytes = min_bytes
+        self.budget = int(start_bytes or max(min_bytes, max_bytes // 4))
+        self.growth = growth
+        self.probe_every = probe_every
+        self.tolerance = tolerance
+        self.max_latency = max_latency
+        self.max_retries = max_retries
+        self.backoff_base = backoff
+        self.max_backoff = max_backoff
+        self.verbose = verbose
+        self.rates = {}  # budget -> EWMA rows/second
+        self.successes = 0
+        self.failures = 0  # consecutive
+        self.stats = {'batches': 0, 'rows': 0, 'bytes': 0, 'seconds': 0.0,
+                      'transient': 0, 'too_large': 0, 'splits': 0}
+
+    def _log(self, msg):
+        if self.verbose:
+            print(f'  [adaptive] {msg}')
+
+    def _set_budget(self, budget, why):
+        budget = int(max(self.min_bytes, min(self.ceiling, budget)))
+        if budget != self.budget:
+            self._log(f'budget {self.budget} -> {budget} bytes ({why})')
+            self.budget = budget
+
+    def best_budget(self):
+        return max(self.rates, key=self.rates.get) if self.rates else self.budget
+
+    def record_success(self, rows, nbytes, seconds):
+        seconds = max(seconds, 1e-6)
+        self.stats['batches'] += 1
+        self.stats['rows'] += rows
+        self.stats['bytes'] += nbytes
+        self.stats['seconds'] += seconds
+        self.failures = 0
+        rate = rows / seconds
+        prev = self.rates.get(self.budget)
+        self.rates[self.budget] = rate if prev is None else 0.5 * prev + 0.5 * rate
+        if seconds > self.max_latency:
+            self.successes = 0
+            self._set_budget(self.budget * 0.75, f'batch took {seconds:.1f}s')
+            return
+        self.successes += 1
+        if self.successes < self.probe_every:
+            return
+        self.successes = 0
+        best = self.best_budget()
+        if self.rates[self.budget] >= self.rates[best] * (1 - self.tolerance):
+            # Still on the best curve: probe a bigger statement unless the
+            # last batch did not even fill the current budget.
+            if nbytes >= self.budget * 0.8 and self.budget < self.ceiling:
+                self._set_budget(self.budget * self.growth, f'{rate:.0f} rows/s')
+        else:
+            self._set_budget(best, f'{self.rates[self.budget]:.0f} rows/s < {self.rates[best]:.0f} at {best}')
+
+    def record_failure(self, kind, nbytes, err=None):
+        """Update the budget after a failed batch; raise when out of retries."""
+        self.stats[kind] += 1
+        self.successes = 0
+        if kind == 'too_large':
+            self.ceiling = max(self.min_bytes, int(nbytes * 0.8))
+            for b in [b for b in self.rates if b > self.ceiling]:
+                del self.rates[b]
+            self._set_budget(min(self.budget, self.ceiling), f'{nbytes} bytes rejected as too large')
+            return 0.0
+        self.failures += 1
+        if self.failures > self.max_retries:
+            raise SinkError(f'giving up after {self.failures} consecutive failures',
+                            getattr(err, 'returncode', None), getattr(err, 'output', ''))
+        self._set_budget(self.budget / 2, 'transient failure')
+        delay = min(self.max_backoff, self.backoff_base * 2 ** (self.failures - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def summary(self):
+        s = self.stats
+        rate = s['rows'] / s['seconds'] if s['seconds'] else 0.0
+        return (f"{s['rows']} rows in {s['batches']} batches, {rate:.0f} rows/s; "
+                f"budget {self.budget} bytes (ceiling {self.ceiling}); "
+                f"{s['transient']} transient, {s['too_large']} too-large, {s['splits']} splits")
+
+
+def statement_target(head):
+    """('insert', 'voters') for an INSERT ... INTO voters head, and so on."""
+    m = TARGET.match(head)
+    return (m.group(1).lower(), m.group(2)) if m else ('sql', None)
+
+
+def _take(pending, items, budget, max_rows, base, step):
+    chunk = []
+    size = base
+    while len(chunk) < max_rows:
+        if not pending:
+            nxt = next(items, None)
+            if nxt is None:
+                break
+            pending.append(nxt)
+        n = len(pending[0][0].encode('utf-8')) + step
+        if chunk and size + n > budget:
+            break
+        chunk.append(pending.popleft())
+        size += n
+    return chunk
+
+
+def send_chunk(sink, chunk, head, sep, tail, controller, tally, sleep=time.sleep, clock=time.monotonic,
+               lock=None):
+    """Execute one packed chunk under `controller`, splitting and retrying it.
+
+    Yields (Batch, items, nbytes, seconds) for each statement that landed,
+    in key order.  Retries and splits are added to `tally`; `lock` guards the
+    controller when chunks are sent from several threads.
+    """
+    log = telemetry.current()
+    lock = lock or nullcontext()
+    stack = [chunk]
+    while stack:
+        part = stack.pop()
+        with log.stage('pack'):
+            sql = head + sep.join(i[0] for i in part) + tail
+            nbytes = len(sql.encode('utf-8'))
+        started = clock()
+        try:
+            with log.stage('upload'):
+                sink.execute(sql)
+        except SinkError as e:
+            kind = classify_error(e)
+            if kind == 'fatal' or (kind == 'too_large' and len(part) == 1):
+                raise
+            tally['retries'] = tally.get('retries', 0) + 1
+            with lock:
+                delay = controller.record_failure(kind, nbytes, e)
+            if delay:
+                controller._log(f'{kind} failure on {len(part)} rows; retrying in {delay:.1f}s')
+                with log.stage('backoff'):
+                    sleep(delay)
+            if len(part) > 1:
+                with lock:
+                    controller.stats['splits'] += 1
+                tally['splits'] = tally.get('splits', 0) + 1
+                mid = len(part) // 2
+                stack.append(part[mid:])
+                stack.append(part[:mid])
+            else:
+                stack.append(part)
+            continue
+        seconds = clock() - started
+        with lock:
+            controller.record_success(len(part), nbytes, seconds)
+        yield Batch(len(part), sql, part[-1][1]), part, nbytes, seconds
+
+
+def send_batches(sink, items, head, max_bytes=MAX_STATEMENT_BYTES, max_rows=2000, sep=',\n', tail=';',
+                 controller=None, sleep=time.sleep, clock=time.monotonic, workers=1, in_flight=None):
+    """Execute (fragment, key, ...) items as `head + fragments + tail` statements.
+
+    Yields (Batch, items) after each statement the sink confirmed, in key
+    order, so callers can checkpoint exactly what landed.  Without a
+    controller this is pack_statements + sink.execute and the first failure
+    propagates; with one, statements follow its budget and failed batches
+    are split and retried.  With `workers` > 1 the statements are sent by
+    d1seed.pipeline, still yielded in order.
+    """
+    if workers > 1:
+        from .pipeline import send_pipelined
+        yield from send_pipelined(sink, items, head, max_bytes, max_rows, sep, tail, controller=controller,
+                                  workers=workers, in_flight=in_flight, clock=clock)
+        return
+    log = telemetry.current()
+    log.begin()
+    op, table = statement_target(head)
+    sent = 0
+    if controller is None:
+        for batch, carried in log.timed('pack', pack_statements(items, head, max_bytes, max_rows, sep, tail)):
+            nbytes = len(batch.sql.encode('utf-8'))
+            with log.stage('upload'):
+                sink.execute(batch.sql)
+            log.batch(table, op, batch.rows, nbytes)
+            sent += batch.rows
+            yield batch, carried
+        log.emit('table', table=table, op=op, rows=sent)
+        return
+    base = len(head.encode('utf-8')) + len(tail)
+    pending = deque()
+    items = iter(items)
+    while True:
+        with log.stage('pack'):
+            chunk = _take(pending, items, controller.budget, max_rows, base, len(sep))
+        if not chunk:
+            log.emit('table', table=table, op=op, rows=sent, adaptive=controller.summary())
+            return
+        tally = {}
+        for batch, part, nbytes, _ in send_chunk(sink, chunk, head, sep, tail, controller, tally, sleep, clock):
+            log.count('retries', tally.pop('retries', 0))
+            log.count('splits', tally.pop('splits', 0))
+            log.batch(table, op, batch.rows, nbytes, budget=controller.budget)
+            sent += batch.rows
+            yield batch, part
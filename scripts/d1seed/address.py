@@ -0,0 +1,165 @@
+"""
+Street address parsing for the offline address pipeline.
+
+parse_address() splits a single-line street address (voters_addr_norm.addr1)
+into the parts the Worker otherwise re-derives with SUBSTR/INSTR at request
+time:
+
+  '1204-B N GRAND AVENUE APT 3'  ->  house_number 1204, house_suffix '-B',
+                                     pre_dir 'N', street_core 'GRAND',
+                                     street_type 'AVE', unit_type 'APT',
+                                     unit_number '3',
+                                     street_canonical 'N GRAND AVE'
+
+Directionals, street types and unit designators are canonicalized to the
+USPS Publication 28 abbreviations.  PO boxes and rural routes are flagged
+in `status` and carry no street.  Everything here is pure and picklable so
+the pipeline can fan chunks out to worker processes.
+"""
+import re
+from collections import namedtuple
+
+ParsedAddress = namedtuple(
+    'ParsedAddress',
+    'house_number house_suffix pre_dir street_core street_type post_dir unit_type unit_number '
+    'street_canonical status',
+)
+
+PARSED_COLUMNS = list(ParsedAddress._fields)
+
+DIRECTIONALS = {
+    'N': 'N', 'NORTH': 'N', 'S': 'S', 'SOUTH': 'S', 'E': 'E', 'EAST': 'E', 'W': 'W', 'WEST': 'W',
+    'NE': 'NE', 'NORTHEAST': 'NE', 'NW': 'NW', 'NORTHWEST': 'NW',
+    'SE': 'SE', 'SOUTHEAST': 'SE', 'SW': 'SW', 'SOUTHWEST': 'SW',
+}
+
+# Common USPS Pub. 28 (appendix C1) suffixes and the variants seen in the
+# Wyoming voter file.
+STREET_TYPES = {
+    'ALLEY': 'ALY', 'ALY': 'ALY', 'ANNEX': 'ANX', 'ANX': 'ANX',
+    'AVENUE': 'AVE', 'AVE': 'AVE', 'AV': 'AVE', 'AVN': 'AVE', 'AVNUE': 'AVE',
+    'BEND': 'BND', 'BND': 'BND', 'BLUFF': 'BLF', 'BLF': 'BLF',
+    'BOULEVARD': 'BLVD', 'BLVD': 'BLVD', 'BOUL': 'BLVD', 'BLV': 'BLVD',
+    'BYPASS': 'BYP', 'BYP': 'BYP', 'CANYON': 'CYN', 'CYN': 'CYN',
+    'CENTER': 'CTR', 'CTR': 'CTR', 'CIRCLE': 'CIR', 'CIR': 'CIR', 'CIRC': 'CIR',
+    'COURT': 'CT', 'CT': 'CT', 'COVE': 'CV', 'CV': 'CV', 'CREEK': 'CRK', 'CRK': 'CRK',
+    'CROSSING': 'XING', 'XING': 'XING', 'DRIVE': 'DR', 'DR': 'DR', 'DRV': 'DR',
+    'ESTATES': 'ESTS', 'ESTS': 'ESTS', 'EXPRESSWAY': 'EXPY', 'EXPY': 'EXPY',
+    'FREEWAY': 'FWY', 'FWY': 'FWY', 'GARDENS': 'GDNS', 'GDNS': 'GDNS',
+    'GLEN': 'GLN', 'GLN': 'GLN', 'GROVE': 'GRV', 'GRV': 'GRV',
+    'HEIGHTS': 'HTS', 'HTS': 'HTS', 'HIGHWAY': 'HWY', 'HWY': 'HWY', 'HIWAY': 'HWY',
+    'HILL': 'HL', 'HL': 'HL', 'HOLLOW': 'HOLW', 'HOLW': 'HOLW',
+    'JUNCTION': 'JCT', 'JCT': 'JCT', 'LANE': 'LN', 'LN': 'LN', 'LOOP': 'LOOP',
+    'MEADOWS': 'MDWS', 'MDWS': 'MDWS', 'MOUNTAIN': 'MTN', 'MTN': 'MTN',
+    'PARK': 'PARK', 'PARKWAY': 'PKWY', 'PKWY': 'PKWY', 'PKY': 'PKWY',
+    'PASS': 'PASS', 'PATH': 'PATH', 'PIKE': 'PIKE', 'PLACE': 'PL', 'PL': 'PL',
+    'PLAZA': 'PLZ', 'PLZ': 'PLZ', 'POINT': 'PT', 'PT': 'PT',
+    'RANCH': 'RNCH', 'RNCH': 'RNCH', 'RIDGE': 'RDG', 'RDG': 'RDG',
+    'ROAD': 'RD', 'RD': 'RD', 'ROUTE': 'RTE', 'RTE': 'RTE', 'ROW': 'ROW', 'RUN': 'RUN',
+    'SPRINGS': 'SPGS', 'SPGS': 'SPGS', 'SQUARE': 'SQ', 'SQ': 'SQ',
+    'STREET': 'ST', 'ST': 'ST', 'STR': 'ST', 'STRT': 'ST',
+    'TERRACE': 'TER', 'TER': 'TER', 'TRACE': 'TRCE', 'TRCE': 'TRCE',
+    'TRAIL': 'TRL', 'TRL': 'TRL', 'VALLEY': 'VLY', 'VLY': 'VLY',
+    'VIEW': 'VW', 'VW': 'VW', 'VILLAGE': 'VLG', 'VLG': 'VLG', 'VISTA': 'VIS', 'VIS': 'VIS',
+    'WALK': 'WALK', 'WAY': 'WAY', 'WY': 'WAY',
+}
+
+# Pub. 28 appendix C2 secondary unit designators.
+UNIT_TYPES = {
+    'APARTMENT': 'APT', 'APT': 'APT', 'BASEMENT': 'BSMT', 'BSMT': 'BSMT',
+    'BUILDING': 'BLDG', 'BLDG': 'BLDG', 'DEPARTMENT': 'DEPT', 'DEPT': 'DEPT',
+    'FLOOR': 'FL', 'FL': 'FL', 'FRONT': 'FRNT', 'FRNT': 'FRNT', 'HANGAR': 'HNGR', 'HNGR': 'HNGR',
+    'LOT': 'LOT', 'LOWER': 'LOWR', 'LOWR': 'LOWR', 'OFFICE': 'OFC', 'OFC': 'OFC',
+    'PENTHOUSE': 'PH', 'PH': 'PH', 'REAR': 'REAR', 'ROOM': 'RM', 'RM': 'RM',
+    'SPACE': 'SPC', 'SPC': 'SPC', 'SUITE': 'STE', 'STE': 'STE',
+    'TRAILER': 'TRLR', 'TRLR': 'TRLR', 'UNIT': 'UNIT', 'UPPER': 'UPPR', 'UPPR': 'UPPR',
+    '#': '#',
+}
+
+HOUSE_RE = re.compile(r'^(\d+)(.*)$')
+FRACTION_RE = re.compile(r'^\d/\d$')
+PO_BOX_RE = re.compile(r'^(P ?O|POST OFFICE) ?BOX\b|^BOX \d|^POB ')
+RURAL_RE = re.compile(r'^(RR|R R|RURAL ROUTE|HC|HCR|STAR ROUTE) ?\d')
+CLEAN_RE = re.compile(r"[^A-Z0-9#/\- ]+")
+
+
+def _tokens(addr):
+    s = CLEAN_RE.sub(' ', addr.upper().replace('.', '').replace(',', ' '))
+    # '#12' -> '#', '12' so the unit scan sees the designator
+    s = re.sub(r'#\s*', ' # ', s)
+    return s.split()
+
+
+def _empty(status):
+    return ParsedAddress(None, None, None, None, None, None, None, None, None, status)
+
+
+def parse_address(addr):
+    """Parse one street address line into a ParsedAddress.
+
+    status is 'ok', 'no_number' (street without a house number),
+    'no_street' (nothing left after the number), 'po_box', 'rural_route'
+    or 'empty'.
+    """
+    if not addr or not str(addr).strip():
+        return _empty('empty')
+    toks = _tokens(str(addr))
+    if not toks:
+        return _empty('empty')
+    line = ' '.join(toks)
+    if PO_BOX_RE.search(line):
+        return _empty('po_box')
+    if RURAL_RE.search(line):
+        return _empty('rural_route')
+
+    # secondary unit: the last designator that is not the first street token
+    unit_type = unit_number = None
+    for i in range(len(toks) - 1, 0, -1):
+        if toks[i] in UNIT_TYPES and i >= 2:
+            unit_type = UNIT_TYPES[toks[i]]
+            unit_number = ' '.join(toks[i + 1:]) or None
+            toks = toks[:i]
+            break
+
+    house_number = house_suffix = None
+    m = HOUSE_RE.match(toks[0])
+    if m and len(toks) > 1:
+        house_number = int(m.group(1))
+        house_suffix = m.group(2) or None
+        toks = toks[1:]
+        if len(toks) > 1 and FRACTION_RE.match(toks[0]):
+            house_suffix = f'{house_suffix} {toks[0]}' if house_suffix else toks[0]
+            toks = toks[1:]
+    status = 'ok' if house_number is not None else 'no_number'
+
+    pre_dir = post_dir = street_type = None
+    # a directional is only a prefix when a street name follows it
+    # ('N MAIN ST'), not when it is the name itself ('NORTH ST')
+    if len(toks) > 1 and toks[0] in DIRECTIONALS and not (len(toks) == 2 and toks[1] in STREET_TYPES):
+        pre_dir = DIRECTIONALS[toks[0]]
+        toks = toks[1:]
+    if len(toks) > 2 and toks[-1] in DIRECTIONALS:
+        post_dir = DIRECTIONALS[toks[-1]]
+        toks = toks[:-1]
+    if len(toks) > 1 and toks[-1] in STREET_TYPES:
+        street_type = STREET_TYPES[toks[-1]]
+        toks = toks[:-1]
+    # numbered routes keep their type inside the name: 'HIGHWAY 59' -> 'HWY 59'
+    toks = [STREET_TYPES[t] if t in STREET_TYPES and i + 1 < len(toks) and toks[i + 1].isdigit() else t
+            for i, t in enumerate(toks)]
+
+    street_core = ' '.join(toks) or None
+    if street_core is None:
+        return ParsedAddress(house_number, house_suffix, pre_dir, None, street_type, post_dir,
+                             unit_type, unit_number, None, 'no_street')
+    canonical = ' '.join(p for p in (pre_dir, street_core, street_type, post_dir) if p)
+    return ParsedAddress(house_number, house_suffix, pre_dir, street_core, street_type, post_dir,
+                         unit_type, unit_number, canonical, status)
+
+
+def parse_rows(rows):
+    """Parse a chunk of (voter_id, addr) rows; returns (voter_id, *parsed) tuples.
+
+    Top-level so multiprocessing can pickle it.
+    """
+    return [(vid, *parse_address(addr)) for vid, addr in rows]
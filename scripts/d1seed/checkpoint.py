@@ -0,0 +1,82 @@
+"""
+On-disk seeding checkpoints.
+
+One JSON file per sink holds an entry per target table:
+
+  {"v_voters_addr_norm": {"table": ..., "source": ..., "key": "voter_id",
+                          "last_key": "200123456", "last_key_rows": 1,
+                          "rows": 150000, "batches": 300,
+                          "batch_hash": "<sha256 of the last committed batch>",
+                          "started_at": ..., "updated_at": ..., "finished_at": null}}
+
+The entry is rewritten (atomically, via a temp file and rename) after each
+batch the sink has confirmed, so a restart after a crash resends at most
+the batch that was in flight.  last_key_rows counts the committed rows
+that share last_key, so a source with repeated keys resumes inside that
+key's rows instead of after all of them.
+"""
+import hashlib, json, os
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+def utcnow():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def batch_hash(sql):
+    return hashlib.sha256(sql.encode('utf-8')).hexdigest()
+
+
+class Checkpoint:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.state = {}
+        if self.path.exists():
+            with open(self.path, encoding='utf-8') as f:
+                self.state = json.load(f)
+
+    def get(self, table):
+        return self.state.get(table)
+
+    def start(self, table, source, key):
+        now = utcnow()
+        self.state[table] = {
+            'table': table,
+            'source': source,
+            'key': key,
+            'last_key': None,
+            'last_key_rows': None,
+            'rows': 0,
+            'batches': 0,
+            'batch_hash': None,
+            'started_at': now,
+            'updated_at': now,
+            'finished_at': None,
+        }
+        self.save()
+        return self.state[table]
+
+    def commit(self, table, last_key, rows, sql, last_key_rows=None):
+        entry = self.state[table]
+        entry['last_key'] = last_key
+        entry['last_key_rows'] = last_key_rows
+        entry['rows'] += rows
+        entry['batches'] += 1
+        entry['batch_hash'] = batch_hash(sql)
+        entry['updated_at'] = utcnow()
+        self.save()
+
+    def finish(self, table):
+        entry = self.state[table]
+        entry['finished_at'] = entry['updated_at'] = utcnow()
+        self.save()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
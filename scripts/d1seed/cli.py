@@ -0,0 +1,169 @@
+"""
+argparse helpers shared by the seeding entry points.
+"""
+import sqlite3, time
+from pathlib import Path
+
+from . import telemetry
+from .adaptive import BatchController
+from .checkpoint import Checkpoint
+from .delta import attach_manifest, delta_sync, verify_remote
+from .encode import MAX_STATEMENT_BYTES
+from .integrity import check_sources, filtered, problems, report
+from .seed import batch_insert
+from .sinks import REPO_ROOT, SINK_CHOICES, make_sink
+
+DEFAULT_SQLITE = Path.home() / 'projects' / 'voterdata' / 'wyoming' / 'wy.sqlite'
+DEFAULT_CHECKPOINT_DIR = REPO_ROOT / '.seed_checkpoints'
+
+
+def add_source_argument(parser):
+    parser.add_argument('sqlite', nargs='?', default=str(DEFAULT_SQLITE), help='local wy.sqlite source')
+
+
+def add_sink_arguments(parser, batch=2000):
+    g = parser.add_argument_group('sink')
+    g.add_argument('--sink', choices=SINK_CHOICES, default='remote',
+                   help='remote D1 via wrangler (default), local D1 via wrangler --local, a direct sqlite3 stand-in, '
+                        'a fake D1 with latency and failures, or the wrangler-compatible emulator (d1_emulator.py)')
+    g.add_argument('--database', default=None, help='D1 database name (default: wy for remote, wy_local for local)')
+    g.add_argument('--sink-sqlite', default=None,
+                   help='scratch database for --sink sqlite/fake (default: in-memory) or emulator '
+                        '(default: .d1_emulator/<database>.sqlite); migrations are applied on open')
+    g.add_argument('--wrangler', default='wrangler', help='wrangler command (e.g. "npx wrangler")')
+    g.add_argument('--batch', type=int, default=batch, help='max rows per batch')
+    g.add_argument('--max-bytes', type=int, default=MAX_STATEMENT_BYTES, help='target SQL bytes per batch statement')
+    g.add_argument('--adaptive', action='store_true',
+                   help='size statements from measured throughput (up to --max-bytes) and retry transient failures')
+    g.add_argument('--max-retries', type=int, default=6, help='consecutive transient failures before --adaptive gives up')
+    g.add_argument('--workers', type=int, default=1,
+                   help='statements uploading at once while the next ones are encoded (default 1: no pipelining)')
+    g.add_argument('--in-flight', type=int, default=None,
+                   help='statements packed but not yet confirmed before encoding waits (default 2 x --workers)')
+    g = parser.add_argument_group('simulated D1 (--sink fake or emulator)')
+    g.add_argument('--fake-latency', type=float, default=0.3, help='simulated per-statement round trip, seconds')
+    g.add_argument('--fake-bandwidth', type=int, default=250_000, help='simulated upload bytes/second')
+    g.add_argument('--fake-fail-rate', type=float, default=0.05, help='probability of a transient failure per statement')
+    g.add_argument('--fake-limit', type=int, default=100_000, help='statements over this many bytes fail as too large')
+    g.add_argument('--fake-seed', type=int, default=None, help='random seed for reproducible runs')
+    add_telemetry_arguments(parser)
+
+
+def add_telemetry_arguments(parser):
+    g = parser.add_argument_group('instrumentation')
+    g.add_argument('--events', default=None, metavar='PATH',
+                   help="append JSON-lines batch/summary events here ('-' for stderr)")
+    g.add_argument('--profile', default=None, metavar='DIR',
+                   help='run under cProfile and tracemalloc and write the reports to DIR')
+
+
+def instrumented(args, **settings):
+    """Context manager applying --events/--profile for the body of a run."""
+    for name in ('sink', 'batch', 'max_bytes', 'adaptive', 'workers', 'delta', 'resume'):
+        if name in vars(args):
+            settings.setdefault(name, getattr(args, name))
+    return telemetry.run(events=args.events, profile=args.profile, **settings)
+
+
+def sink_from_args(args):
+    fake = {'latency': args.fake_latency, 'bandwidth': args.fake_bandwidth, 'fail_rate': args.fake_fail_rate,
+            'limit': args.fake_limit, 'seed': args.fake_seed}
+    return make_sink(args.sink, database=args.database, sqlite_path=args.sink_sqlite, wrangler=args.wrangler,
+                     fake=fake)
+
+
+def controller_from_args(args):
+    if not args.adaptive:
+        return None
+    return BatchController(max_bytes=args.max_bytes, max_retries=args.max_retries)
+
+
+def add_checkpoint_arguments(parser):
+    g = parser.add_argument_group('checkpoints')
+    g.add_argument('--resume', action='store_true',
+                   help='continue each table right after the last key committed in its checkpoint')
+    g.add_argument('--checkpoint-dir', default=str(DEFAULT_CHECKPOINT_DIR),
+                   help='where per-sink checkpoint files are written (default: .seed_checkpoints/)')
+    g.add_argument('--no-checkpoint', action='store_true', help='do not read or write checkpoints')
+
+
+def checkpoint_from_args(args, sink):
+    if args.no_checkpoint:
+        return None
+    return Checkpoint(Path(args.checkpoint_dir) / f'{sink.label}.json')
+
+
+def add_delta_arguments(parser):
+    g = parser.add_argument_group('delta sync')
+    g.add_argument('--delta', action='store_true',
+                   help='send only rows inserted, changed or deleted since the last sync (per-row hash manifest)')
+    g.add_argument('--mark-synced', action='store_true',
+                   help='record the current source as synced without sending anything (bootstrap after a full seed)')
+    g.add_argument('--verify-remote', action='store_true',
+                   help='after a delta, compare per-range fingerprints with the sink and repair ranges that drifted')
+    g.add_argument('--range-size', type=int, default=5000, help='rows per voter_id range for --verify-remote')
+
+
+def add_validate_arguments(parser):
+    g = parser.add_argument_group('pre-upload checks')
+    g.add_argument('--validate', action='store_true',
+                   help='before sending anything, check for duplicate voter_ids and phone/address rows whose voter '
+                        'is missing; stop if any are found')
+    g.add_argument('--drop-invalid', action='store_true',
+                   help='run the --validate checks and skip the bad rows instead of stopping')
+    g.add_argument('--validate-sample', type=int, default=10, help='ids to print per problem')
+
+
+def validate_sources(conn, args, parent, children):
+    """Run the --validate checks over (table, select_sql) sources.
+
+    Returns {table: select_sql} to seed from: unchanged, or with
+    --drop-invalid filtered to skip the bad rows.  Exits when problems are
+    found without --drop-invalid.
+    """
+    sources = dict([parent, *children])
+    if not (args.validate or args.drop_invalid):
+        return sources
+    started = time.perf_counter()
+    checks = check_sources(conn, parent, children, sample=args.validate_sample, drop=args.drop_invalid)
+    print(f'Checked {", ".join(sources)} in {time.perf_counter() - started:.1f}s')
+    report(checks)
+    bad = problems(checks)
+    telemetry.current().emit('validate', problems=bad, **{c.table: c._asdict() for c in checks})
+    if not bad:
+        return sources
+    if not args.drop_invalid:
+        raise SystemExit(f'{bad} rows would reach D1 duplicated, orphaned or without a voter_id; '
+                         'fix the source or rerun with --drop-invalid')
+    print('Skipping duplicated, orphaned and keyless rows (--drop-invalid)')
+    return {table: filtered(select_sql, table) for table, select_sql in sources.items()}
+
+
+def manifest_path(args, sink):
+    return Path(args.checkpoint_dir) / f'{sink.label}.manifest.sqlite'
+
+
+def seed_table(conn, sink, args, checkpoint, table, cols, select_sql, batch_size=None, key='voter_id'):
+    """Seed one table with a full batch_insert or, with --delta/--mark-synced,
+    a manifest-driven delta sync."""
+    batch_size = batch_size or args.batch
+    controller = controller_from_args(args)
+    if not (args.delta or args.mark_synced or args.verify_remote):
+        return batch_insert(conn, sink, table, cols, select_sql, batch_size=batch_size, max_bytes=args.max_bytes,
+                            key=key, checkpoint=checkpoint, resume=args.resume, controller=controller,
+                            workers=args.workers, in_flight=args.in_flight)
+    if 'm' not in {row[1] for row in conn.execute('PRAGMA database_list')}:
+        attach_manifest(conn, manifest_path(args, sink))
+    counts = delta_sync(conn, sink, table, cols, select_sql, key=key, batch_size=batch_size, max_bytes=args.max_bytes,
+                        mark_synced=args.mark_synced, controller=controller)
+    if args.verify_remote:
+        verify_remote(conn, sink, table, cols, select_sql, key=key, range_size=args.range_size,
+                      batch_size=batch_size, max_bytes=args.max_bytes, controller=controller)
+    return counts
+
+
+def open_source(path):
+    path = Path(path)
+    if not path.exists():
+        raise SystemExit(f'SQLite file missing: {path}')
+    return sqlite3.connect(str(path))
@@ -0,0 +1,303 @@
+"""
+Benchmark data sets for a migrated sqlite stand-in of D1.
+
+load_synthetic() fills the Worker's tables with a deterministic, statewide
+data set at production scale: Wyoming's counties and towns weighted by
+population, streets per town in proportion, a skewed number of voters per
+street, common surnames, ~65% phone coverage and a few percent of voters
+with contacts and call history.  load_from_sqlite() copies a local
+wy.sqlite (plus streets_index_built, voter_street_link and
+street_house_order when the address pipeline has run) into the same
+tables instead.
+
+Both expect a connection to a database that already has the migration
+chain applied (SqliteSink does that) and return {table: rows}.
+"""
+import random
+
+from .names import SEARCH_COLUMNS, register, search_select
+
+# county -> [(city, approximate population in thousands)]
+COUNTIES = {
+    'ALBANY': [('LARAMIE', 32)],
+    'BIG HORN': [('LOVELL', 2.3), ('GREYBULL', 1.7), ('BASIN', 1.2)],
+    'CAMPBELL': [('GILLETTE', 33), ('WRIGHT', 1.2)],
+    'CARBON': [('RAWLINS', 8.2), ('SARATOGA', 1.7)],
+    'CONVERSE': [('DOUGLAS', 6.4), ('GLENROCK', 2.5)],
+    'CROOK': [('SUNDANCE', 1.2), ('MOORCROFT', 1)],
+    'FREMONT': [('RIVERTON', 11), ('LANDER', 7.5)],
+    'GOSHEN': [('TORRINGTON', 6.1)],
+    'HOT SPRINGS': [('THERMOPOLIS', 2.7)],
+    'JOHNSON': [('BUFFALO', 4.6)],
+    'LARAMIE': [('CHEYENNE', 65), ('PINE BLUFFS', 1.1)],
+    'LINCOLN': [('KEMMERER', 2.6), ('AFTON', 2)],
+    'NATRONA': [('CASPER', 59), ('MILLS', 4), ('EVANSVILLE', 3)],
+    'NIOBRARA': [('LUSK', 1.5)],
+    'PARK': [('CODY', 10), ('POWELL', 6.3)],
+    'PLATTE': [('WHEATLAND', 3.6)],
+    'SHERIDAN': [('SHERIDAN', 18), ('RANCHESTER', 1)],
+    'SUBLETTE': [('PINEDALE', 2)],
+    'SWEETWATER': [('ROCK SPRINGS', 23), ('GREEN RIVER', 12)],
+    'TETON': [('JACKSON', 10.7)],
+    'UINTA': [('EVANSTON', 11.7)],
+    'WASHAKIE': [('WORLAND', 5)],
+    'WESTON': [('NEWCASTLE', 3.4)],
+}
+
+STREET_NAMES = [
+    'MAIN', 'CENTRAL', 'PARK', 'OAK', 'PINE', 'ELM', 'MAPLE', 'CEDAR', 'ASPEN', 'WILLOW', 'SPRUCE', 'BIRCH',
+    'GRAND', 'CAPITOL', 'WARREN', 'PIONEER', 'COLLEGE', 'LINCOLN', 'JEFFERSON', 'WASHINGTON', 'MADISON',
+    'SAGE BRUSH', 'YELLOWSTONE', 'BIG HORN', 'WIND RIVER', 'ELK', 'ANTELOPE', 'BUFFALO', 'MEADOW', 'RIDGE',
+    'SUNSET', 'HILLCREST', 'SKYLINE', 'CANYON', 'PRAIRIE', 'RANCH', 'RIVERSIDE', 'LAKEVIEW', 'MOUNTAIN VIEW',
+    'COTTONWOOD', 'JUNIPER', 'COLUMBINE', 'INDIAN PAINTBRUSH', 'LARAMIE', 'SNOWY RANGE', 'TETON', 'CASCADE',
+]
+STREET_TYPES = ['ST', 'AVE', 'DR', 'RD', 'LN', 'CT', 'CIR', 'WAY', 'PL', 'BLVD', 'TRL']
+DIRECTIONS = ['N', 'S', 'E', 'W']
+ORDINALS = ['1ST', '2ND', '3RD'] + [f'{n}TH' for n in range(4, 21)] + ['21ST', '22ND', '23RD'] + \
+    [f'{n}TH' for n in range(24, 31)]
+
+LAST_NAMES = [
+    'SMITH', 'JOHNSON', 'WILLIAMS', 'BROWN', 'JONES', 'MILLER', 'DAVIS', 'GARCIA', 'RODRIGUEZ', 'WILSON',
+    'MARTINEZ', 'ANDERSON', 'TAYLOR', 'THOMAS', 'HERNANDEZ', 'MOORE', 'MARTIN', 'JACKSON', 'THOMPSON', 'WHITE',
+    'LOPEZ', 'LEE', 'GONZALEZ', 'HARRIS', 'CLARK', 'LEWIS', 'ROBINSON', 'WALKER', 'PEREZ', 'HALL', 'YOUNG',
+    'ALLEN', 'SANCHEZ', 'WRIGHT', 'KING', 'SCOTT', 'GREEN', 'BAKER', 'ADAMS', 'NELSON', 'HILL', 'RAMIREZ',
+    'CAMPBELL', 'MITCHELL', 'ROBERTS', 'CARTER', 'PHILLIPS', 'EVANS', 'TURNER', 'TORRES', 'PARKER', 'COLLINS',
+    'EDWARDS', 'STEWART', 'MORRIS', 'MURPHY', 'COOK', 'ROGERS', 'PETERSON', 'OLSON', 'HANSEN', 'LARSON',
+]
+SYLLABLES = ['AN', 'BER', 'CAL', 'DER', 'EL', 'FOR', 'GAR', 'HOL', 'KIN', 'LAN', 'MAR', 'NOR', 'OS', 'PAR',
+             'RAN', 'SON', 'TER', 'VAL', 'WES', 'BY', 'MAN', 'STEIN', 'BERG', 'TON', 'LEY', 'SEN']
+FIRST_NAMES = [
+    'JAMES', 'MARY', 'JOHN', 'PATRICIA', 'ROBERT', 'JENNIFER', 'MICHAEL', 'LINDA', 'WILLIAM', 'ELIZABETH',
+    'DAVID', 'BARBARA', 'RICHARD', 'SUSAN', 'JOSEPH', 'JESSICA', 'THOMAS', 'SARAH', 'CHARLES', 'KAREN',
+    'CHRISTOPHER', 'NANCY', 'DANIEL', 'LISA', 'MATTHEW', 'BETTY', 'ANTHONY', 'MARGARET', 'MARK', 'SANDRA',
+    'DONALD', 'ASHLEY', 'STEVEN', 'KIMBERLY', 'PAUL', 'EMILY', 'ANDREW', 'DONNA', 'JOSHUA', 'MICHELLE',
+    'KENNETH', 'CAROL', 'KEVIN', 'AMANDA', 'BRIAN', 'DOROTHY', 'GEORGE', 'MELISSA', 'TIMOTHY', 'DEBORAH',
+]
+PARTIES = [('REP', 68), ('DEM', 17), ('UNA', 12), ('LIB', 2), ('CON', 1)]
+CALL_OUTCOMES = [('no_answer', 40), ('vm', 25), ('connected', 18), ('refused', 8), ('wrong_number', 5),
+                 ('follow_up', 4)]
+CONTACT_METHODS = [('door', 60), ('phone', 35), ('event', 5)]
+CONTACT_OUTCOMES = [('supporter', 35), ('undecided', 30), ('not_home', 20), ('opposed', 10), ('moved', 5)]
+
+HOUSE_DISTRICTS = 62
+PAGE = 20000
+
+
+def _weighted(pairs):
+    values = [v for v, _ in pairs]
+    weights = [w for _, w in pairs]
+    return values, weights
+
+
+def _chunks(rows, size=PAGE):
+    buf = []
+    for row in rows:
+        buf.append(row)
+        if len(buf) >= size:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+
+def _insert(conn, table, cols, rows):
+    sql = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+    n = 0
+    for chunk in _chunks(rows):
+        conn.executemany(sql, chunk)
+        n += len(chunk)
+    return n
+
+
+def _surname(rnd):
+    if rnd.random() < 0.6:
+        return rnd.choice(LAST_NAMES)
+    return ''.join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 3)))
+
+
+def load_synthetic(conn, voters=300000, seed=1):
+    """Fill the migrated schema with `voters` synthetic voters."""
+    rnd = random.Random(seed)
+    towns = [(county, city, weight) for county, cities in COUNTIES.items() for city, weight in cities]
+    total_weight = sum(w for _, _, w in towns)
+    counts = {}
+    conn.execute('BEGIN')
+
+    # towns -> wy_city_county, each with a block of house districts
+    cc_rows, streets, street_weights = [], [], []
+    district_base = 0
+    for cc_id, (county, city, weight) in enumerate(towns, 1):
+        cc_rows.append((str(cc_id), city, county, city, county))
+        town_districts = max(1, round(HOUSE_DISTRICTS * weight / total_weight))
+        n_streets = max(8, int(voters * weight / total_weight / 40))
+        for i in range(n_streets):
+            if i < len(ORDINALS) and rnd.random() < 0.5:
+                core, typ = ORDINALS[i], rnd.choice(['ST', 'AVE'])
+            else:
+                core, typ = STREET_NAMES[i % len(STREET_NAMES)], rnd.choice(STREET_TYPES)
+            prefix = rnd.choice(DIRECTIONS) if rnd.random() < 0.25 else None
+            if i >= len(STREET_NAMES):
+                # later streets get a distinguishing directional
+                prefix = DIRECTIONS[(i // len(STREET_NAMES)) % 4]
+            canonical = ' '.join(p for p in (prefix, core, typ) if p)
+            district = district_base + (i * town_districts) // n_streets
+            streets.append([len(streets) + 1, cc_id, prefix, core, typ, canonical, county, city,
+                            district % HOUSE_DISTRICTS + 1, rnd.randrange(1, 40) * 100])
+            # skewed street sizes: a few long streets, many short ones
+            street_weights.append(weight / n_streets * (1.0 / (1 + (i % 25))) ** 0.7)
+        district_base += town_districts
+    counts['wy_city_county'] = _insert(conn, 'wy_city_county', ['id', 'city', 'county', 'city_norm', 'county_norm'],
+                                       cc_rows)
+
+    picks = rnd.choices(range(len(streets)), weights=street_weights, k=voters)
+    parties, party_w = _weighted(PARTIES)
+    voter_rows, addr_rows, phone_rows = [], [], []
+    house_numbers = {}
+    for n, si in enumerate(picks):
+        sid, cc_id, prefix, core, typ, canonical, county, city, house, base = streets[si]
+        voter_id = str(200000000 + n)
+        house_no = base + rnd.randrange(0, 600)
+        lo, hi = house_numbers.get(sid, (house_no, house_no))
+        house_numbers[sid] = (min(lo, house_no), max(hi, house_no))
+        addr = f'{house_no} {canonical}'
+        senate = (house + 1) // 2
+        voter_rows.append((voter_id, rnd.choices(parties, party_w)[0], county, str(senate), str(house)))
+        addr_rows.append((voter_id, addr, city, str(senate), str(house), cc_id, sid, addr,
+                          rnd.choice(FIRST_NAMES), _surname(rnd), f'82{rnd.randrange(0, 1000):03d}'))
+        if rnd.random() < 0.65:
+            wy = rnd.random() < 0.8
+            area = '307' if wy else str(rnd.choice([303, 406, 435, 605, 208, 970]))
+            phone_rows.append((voter_id, f'+1{area}{rnd.randrange(2000000, 9999999)}',
+                               min(100, int(rnd.betavariate(5, 2) * 100)), 1 if wy else 0, '2025-10-01'))
+
+    street_rows = []
+    for sid, cc_id, prefix, core, typ, canonical, *_ in streets:
+        lo, hi = house_numbers.get(sid, (None, None))
+        street_rows.append((sid, cc_id, prefix, core, typ, canonical, canonical, lo, hi))
+    counts['streets_index'] = _insert(conn, 'streets_index', [
+        'id', 'city_county_id', 'street_prefix', 'street_core', 'street_type', 'street_canonical', 'raw_address',
+        'house_min', 'house_max'], street_rows)
+    counts['voters'] = _insert(conn, 'voters', ['voter_id', 'political_party', 'county', 'senate', 'house'],
+                               voter_rows)
+    counts['voters_addr_norm'] = _insert(conn, 'voters_addr_norm', [
+        'voter_id', 'addr1', 'city', 'senate', 'house', 'city_county_id', 'street_index_id', 'addr_raw', 'fn',
+        'ln', 'zip'], addr_rows)
+    counts['voter_name_search'] = _fill_name_search(conn)
+    counts['v_best_phone'] = _insert(conn, 'v_best_phone', [
+        'voter_id', 'phone_e164', 'confidence_code', 'is_wy_area', 'imported_at'], phone_rows)
+
+    methods, method_w = _weighted(CONTACT_METHODS)
+    outcomes, outcome_w = _weighted(CONTACT_OUTCOMES)
+    contacted = rnd.sample(range(voters), k=voters // 50)
+    counts['voter_contacts'] = _insert(conn, 'voter_contacts', [
+        'voter_id', 'volunteer_id', 'method', 'outcome', 'created_at'], (
+        (str(200000000 + n), f'vol{rnd.randrange(200)}@example.org', rnd.choices(methods, method_w)[0],
+         rnd.choices(outcomes, outcome_w)[0], f'2026-{rnd.randint(1, 9):02d}-{rnd.randint(1, 28):02d} 12:00:00')
+        for n in sorted(contacted)))
+    calls, call_w = _weighted(CALL_OUTCOMES)
+    counts['call_activity'] = _insert(conn, 'call_activity', [
+        'voter_id', 'volunteer_email', 'call_result', 'created_at'], (
+        (str(200000000 + rnd.randrange(voters)), f'vol{rnd.randrange(200)}@example.org',
+         rnd.choices(calls, call_w)[0], f'2026-{rnd.randint(1, 9):02d}-{rnd.randint(1, 28):02d} 18:00:00')
+        for _ in range(voters // 15)))
+    conn.execute('COMMIT')
+    return counts
+
+
+def _fill_name_search(conn):
+    # the triggers from migration 038 fill voter_name_fts alongside
+    register(conn)
+    return conn.execute(f"INSERT INTO voter_name_search ({', '.join(SEARCH_COLUMNS)}) {search_select()}").rowcount
+
+
+def _columns(conn, table):
+    return {r[1] for r in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def _has(conn, schema, name):
+    return conn.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type IN ('table', 'view') AND name = ?",
+                        (name,)).fetchone() is not None
+
+
+def load_from_sqlite(conn, path):
+    """Copy a local wy.sqlite into the migrated schema."""
+    conn.execute('ATTACH DATABASE ? AS src', (str(path),))
+    counts = {}
+    conn.execute('BEGIN')
+    addr = 'src.voters_addr_norm' if _has(conn, 'src', 'voters_addr_norm') else 'src.v_voters_addr_norm'
+    vnames = {r[1] for r in conn.execute('PRAGMA src.table_info(voters)')}
+    house = 'house_district' if 'house_district' in vnames else 'house'
+    senate = 'senate_district' if 'senate_district' in vnames else 'senate'
+
+    if _has(conn, 'src', 'wy_city_county'):
+        # keep the source's ids: streets_index_built refers to them
+        cols = {r[1] for r in conn.execute('PRAGMA src.table_info(wy_city_county)')}
+        city, county = ('city_norm', 'county_norm') if 'city_norm' in cols else ('city', 'county')
+        conn.execute(f"""
+            INSERT OR IGNORE INTO wy_city_county (id, city, county, city_norm, county_norm)
+            SELECT CAST(id AS TEXT), UPPER(TRIM({city})), UPPER(TRIM({county})),
+                   UPPER(TRIM({city})), UPPER(TRIM({county}))
+            FROM src.wy_city_county WHERE {city} IS NOT NULL AND {county} IS NOT NULL
+        """)
+    conn.execute(f"""
+        INSERT INTO wy_city_county (id, city, county, city_norm, county_norm)
+        SELECT CAST((SELECT COALESCE(MAX(CAST(id AS INTEGER)), 0) FROM wy_city_county)
+                    + ROW_NUMBER() OVER (ORDER BY county, city) AS TEXT), city, county, city, county
+        FROM (SELECT DISTINCT UPPER(TRIM(a.city)) AS city, UPPER(TRIM(v.county)) AS county
+              FROM {addr} a JOIN src.voters v ON v.voter_id = a.voter_id
+              WHERE a.city IS NOT NULL AND v.county IS NOT NULL
+              EXCEPT SELECT city, county FROM wy_city_county)
+    """)
+    linked = _has(conn, 'src', 'streets_index_built') and _has(conn, 'src', 'voter_street_link')
+    if linked:
+        conn.execute("""
+            INSERT INTO streets_index (id, city_county_id, street_prefix, street_core, street_type, street_suffix,
+                                       street_canonical, raw_address, house_min, house_max, address_count)
+            SELECT id, city_county_id, street_prefix, street_core, street_type, street_suffix, street_canonical,
+                   raw_address, house_min, house_max, address_count
+            FROM src.streets_index_built
+            WHERE CAST(city_county_id AS TEXT) IN (SELECT id FROM wy_city_county)
+        """)
+    conn.execute(f"""
+        INSERT INTO voters (voter_id, political_party, county, senate, house)
+        SELECT voter_id, political_party, UPPER(TRIM(county)), {senate}, {house} FROM src.voters
+    """)
+    link_join = 'LEFT JOIN src.voter_street_link l ON l.voter_id = a.voter_id ' if linked else ''
+    link_col = 'l.streets_index_id' if linked else 'NULL'
+    conn.execute(f"""
+        INSERT INTO voters_addr_norm (voter_id, addr1, city, senate, house, city_county_id, street_index_id,
+                                      addr_raw, fn, ln, zip)
+        SELECT a.voter_id, a.addr1, UPPER(TRIM(a.city)), a.senate, a.house, cc.id,
+               CASE WHEN {link_col} IN (SELECT id FROM streets_index) THEN {link_col} END,
+               a.addr1, a.fn, a.ln, a.zip
+        FROM {addr} a
+        JOIN src.voters v ON v.voter_id = a.voter_id
+        JOIN wy_city_county cc ON cc.city = UPPER(TRIM(a.city)) AND cc.county = UPPER(TRIM(v.county))
+        {link_join}
+    """)
+    _fill_name_search(conn)
+    if linked and _has(conn, 'src', 'street_house_order'):
+        conn.execute("""
+            INSERT INTO street_house_order (voter_id, streets_index_id, parity, position, house_number, house_suffix)
+            SELECT o.voter_id, o.streets_index_id, o.parity, o.position, o.house_number, o.house_suffix
+            FROM src.street_house_order o
+            WHERE o.streets_index_id IN (SELECT id FROM streets_index)
+        """)
+    phones = next((t for t in ('best_phone', 'v_best_phone', 'voter_phones') if _has(conn, 'src', t)), None)
+    if phones:
+        conn.execute(f"""
+            INSERT OR IGNORE INTO v_best_phone (voter_id, phone_e164, confidence_code, is_wy_area, imported_at)
+            SELECT voter_id, phone_e164, confidence_code, is_wy_area, imported_at FROM src.{phones}
+        """)
+    for table in ('voter_contacts', 'call_activity', 'call_followups'):
+        if _has(conn, 'src', table):
+            shared = [c for c in (r[1] for r in conn.execute(f'PRAGMA src.table_info({table})'))
+                      if c in _columns(conn, table) and c != 'id']
+            conn.execute(f"INSERT OR IGNORE INTO {table} ({', '.join(shared)}) "
+                         f"SELECT {', '.join(shared)} FROM src.{table}")
+    conn.execute('COMMIT')
+    conn.execute('DETACH DATABASE src')
+    for table in ('wy_city_county', 'streets_index', 'voters', 'voters_addr_norm', 'voter_name_search',
+                  'street_house_order', 'v_best_phone', 'voter_contacts', 'call_activity', 'call_followups'):
+        counts[table] = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    return counts
@@ -0,0 +1,308 @@
+"""
+Incremental delta sync from the local wy.sqlite to a sink.
+
+A manifest (a small sqlite file next to the checkpoints) keeps one content
+hash per (target table, voter_id) describing what the sink is known to
+hold.  A sync hashes every source row, diffs that against the manifest in
+SQL, and sends only:
+
+  inserts  keys in the source but not the manifest
+  updates  keys whose row hash changed
+  deletes  keys in the manifest that left the source
+
+The manifest is updated after every batch the sink confirms, so an
+interrupted sync simply picks up the remaining delta on the next run.
+
+Remote drift (rows changed on D1 behind our back) is caught with
+verify_remote(): the source and the sink each compute a cheap SQL
+fingerprint per voter_id range in one aggregate query, and only ranges
+whose count or fingerprint differ are pulled back and repaired row by row.
+
+Keys are compared as text everywhere: voter_id is TEXT on D1, but a local
+source may hold it as INTEGER, and 200123456 and '200123456' must be the
+same key in the manifest, in the hashes and in the verify ranges.
+"""
+import hashlib, sqlite3
+from pathlib import Path
+
+from . import telemetry
+from .adaptive import send_batches
+from .encode import MAX_STATEMENT_BYTES, encode_row, esc, insert_head
+
+MANIFEST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS row_hashes (
+  target TEXT NOT NULL,
+  voter_id NOT NULL,
+  hash INTEGER NOT NULL,
+  PRIMARY KEY (target, voter_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS syncs (
+  target TEXT PRIMARY KEY,
+  rows INTEGER,
+  synced_at TEXT
+);
+"""
+
+
+def row_hash(*values):
+    """64-bit content hash of a row, over its SQL literal encoding."""
+    digest = hashlib.blake2b(encode_row(values).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def attach_manifest(conn, path):
+    """Attach the manifest to the source connection as schema `m`.
+
+    Hashing and diffing then run as plain SQL over the source, with
+    row_hash() registered as a deterministic function.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn.create_function('row_hash', -1, row_hash, deterministic=True)
+    conn.execute('ATTACH DATABASE ? AS m', (str(path),))
+    conn.executescript(MANIFEST_SCHEMA.replace('EXISTS ', 'EXISTS m.'))
+    # manifests written before keys were compared as text; their hashes
+    # then differ once and those rows are resent as updates
+    conn.execute("UPDATE OR REPLACE m.row_hashes SET voter_id = CAST(voter_id AS TEXT) WHERE typeof(voter_id) != 'text'")
+    conn.commit()
+
+
+def _inner(select_sql):
+    return select_sql.rstrip().rstrip(';')
+
+
+def _text_key(row, key_index):
+    """`row` with its key as text, the form D1 stores and the manifest keeps."""
+    k = row[key_index]
+    if k is None or isinstance(k, str):
+        return tuple(row)
+    return (*row[:key_index], str(k), *row[key_index + 1:])
+
+
+def _key_sql(key):
+    return f'CAST({key} AS TEXT)'
+
+
+def stage_source_hashes(conn, select_sql, cols, key):
+    """Hash every source row into temp table cur(voter_id, hash).
+
+    The manifest holds one hash per key, so a source with repeated keys
+    (voter_phones has one row per phone) cannot be synced: which of its
+    rows D1 ends up with depends on batch boundaries.  That exits with the
+    duplicated keys instead of a bare UNIQUE constraint error.
+    """
+    conn.execute('DROP TABLE IF EXISTS temp.cur')
+    conn.execute('CREATE TEMP TABLE cur (voter_id PRIMARY KEY, hash INTEGER NOT NULL) WITHOUT ROWID')
+    try:
+        conn.execute(
+            f"INSERT INTO temp.cur SELECT {_key_sql(key)}, "
+            f"row_hash({', '.join(_key_sql(c) if c == key else c for c in cols)}) FROM ({_inner(select_sql)}) "
+            f"WHERE {key} IS NOT NULL"
+        )
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        dups = conn.execute(
+            f"SELECT {key}, COUNT(*) FROM ({_inner(select_sql)}) WHERE {key} IS NOT NULL "
+            f"GROUP BY {key} HAVING COUNT(*) > 1"
+        ).fetchall()
+        sample = ', '.join(str(k) for k, _ in dups[:10])
+        raise SystemExit(
+            f'{len(dups)} {key}s appear more than once in the source ({sample}); a delta sync needs one row '
+            f'per {key}. Seed phones from best_phone_built (scripts/build_best_phone.py) rather than '
+            'voter_phones, or rerun with --validate --drop-invalid to skip duplicated rows.'
+        ) from None
+
+
+def plan_delta(conn, target):
+    """Fill temp.pending(voter_id, op) with the changes since the last sync."""
+    conn.execute('DROP TABLE IF EXISTS temp.pending')
+    conn.execute('CREATE TEMP TABLE pending (voter_id PRIMARY KEY, op TEXT NOT NULL) WITHOUT ROWID')
+    conn.execute(
+        """INSERT INTO temp.pending
+           SELECT c.voter_id, CASE WHEN h.hash IS NULL THEN 'insert' ELSE 'update' END
+           FROM temp.cur c
+           LEFT JOIN m.row_hashes h ON h.target = ? AND h.voter_id = c.voter_id
+           WHERE h.hash IS NULL OR h.hash != c.hash""",
+        (target,),
+    )
+    conn.execute(
+        """INSERT INTO temp.pending
+           SELECT h.voter_id, 'delete' FROM m.row_hashes h
+           WHERE h.target = ? AND NOT EXISTS (SELECT 1 FROM temp.cur c WHERE c.voter_id = h.voter_id)""",
+        (target,),
+    )
+    return dict(conn.execute('SELECT op, COUNT(*) FROM temp.pending GROUP BY op').fetchall())
+
+
+def _send_upserts(conn, sink, target, cols, select_sql, key, key_index, max_bytes, batch_size, controller):
+    rows = conn.execute(
+        f"""SELECT s.* FROM ({_inner(select_sql)}) s
+            JOIN temp.pending p ON p.voter_id = {_key_sql(f's.{key}')} AND p.op != 'delete'
+            ORDER BY s.{key}"""
+    )
+    log = telemetry.current()
+    rows = log.timed('fetch', rows)
+    items = log.timed('encode', ((encode_row(r), k[key_index], row_hash(*k))
+                                 for r in rows for k in (_text_key(r, key_index),)))
+    sent = 0
+    for batch, carried in send_batches(sink, items, insert_head(target, cols), max_bytes, batch_size,
+                                       controller=controller):
+        with log.stage('checkpoint'):
+            conn.executemany(
+                'INSERT OR REPLACE INTO m.row_hashes (target, voter_id, hash) VALUES (?, ?, ?)',
+                [(target, k, h) for _, k, h in carried],
+            )
+            conn.commit()
+        sent += batch.rows
+        print(f'Upserted {sent} rows into {target} ({batch.rows} rows, {len(batch.sql.encode("utf-8"))} bytes)')
+    return sent
+
+
+def _send_deletes(conn, sink, target, key, max_bytes, batch_size, controller):
+    keys = conn.execute("SELECT voter_id FROM temp.pending WHERE op = 'delete' ORDER BY voter_id").fetchall()
+    items = ((esc(k), k) for (k,) in keys)
+    head = f'DELETE FROM {target} WHERE {key} IN ('
+    sent = 0
+    for batch, carried in send_batches(sink, items, head, max_bytes, batch_size, sep=',', tail=');',
+                                       controller=controller):
+        conn.executemany(
+            'DELETE FROM m.row_hashes WHERE target = ? AND voter_id = ?',
+            [(target, k) for _, k in carried],
+        )
+        conn.commit()
+        sent += batch.rows
+        print(f'Deleted {sent} rows from {target}')
+    return sent
+
+
+def delta_sync(conn, sink, target, cols, select_sql, key='voter_id', batch_size=2000,
+               max_bytes=MAX_STATEMENT_BYTES, mark_synced=False, controller=None):
+    """Send only the rows of `select_sql` that changed since the last sync.
+
+    `conn` must have the manifest attached (attach_manifest).  With
+    `mark_synced=True` nothing is sent; the manifest is set to the current
+    source, e.g. right after a verified full seed.
+    Returns {'insert': n, 'update': n, 'delete': n}.
+    """
+    key_index = cols.index(key)
+    stage_source_hashes(conn, select_sql, cols, key)
+    if mark_synced:
+        conn.execute('DELETE FROM m.row_hashes WHERE target = ?', (target,))
+        conn.execute('INSERT INTO m.row_hashes SELECT ?, voter_id, hash FROM temp.cur', (target,))
+        n = conn.execute('SELECT COUNT(*) FROM temp.cur').fetchone()[0]
+        _record_sync(conn, target)
+        print(f'Marked {n} {target} rows as synced; nothing sent')
+        return {'insert': 0, 'update': 0, 'delete': 0}
+
+    plan = plan_delta(conn, target)
+    counts = {op: plan.get(op, 0) for op in ('insert', 'update', 'delete')}
+    print(f"Delta for {target}: {counts['insert']} inserts, {counts['update']} updates, {counts['delete']} deletes")
+    if any(counts.values()):
+        sink.ensure_table(target, cols)
+        _send_upserts(conn, sink, target, cols, select_sql, key, key_index, max_bytes, batch_size, controller)
+        _send_deletes(conn, sink, target, key, max_bytes, batch_size, controller)
+    _record_sync(conn, target)
+    return counts
+
+
+def _record_sync(conn, target):
+    conn.execute(
+        """INSERT OR REPLACE INTO m.syncs (target, rows, synced_at)
+           SELECT ?, COUNT(*), datetime('now') FROM m.row_hashes WHERE target = ?""",
+        (target, target),
+    )
+    conn.commit()
+
+
+def fingerprint_expr(cols):
+    """Cheap per-row checksum built only from core SQLite functions, so D1
+    and the local source compute the same value.  It mixes each column's
+    length with the code points at its start, middle and end; it is a range
+    filter, not a cryptographic hash.
+    """
+    terms = []
+    for i, c in enumerate(cols):
+        col = (
+            f"COALESCE(LENGTH({c}) + 3 * UNICODE({c}) + 7 * UNICODE(SUBSTR({c}, -1))"
+            f" + 13 * UNICODE(SUBSTR({c}, (LENGTH({c}) + 1) / 2, 1)), -1)"
+        )
+        terms.append(f'{2 * i + 1} * {col}')
+    return ' + '.join(terms)
+
+
+def _bucket_sql(relation, cols, key, bounds):
+    cases = ' '.join(f'WHEN {key} < {esc(b)} THEN {i}' for i, b in enumerate(bounds))
+    bucket = f'CASE {cases} ELSE {len(bounds)} END' if bounds else '0'
+    return (f'SELECT {bucket} AS bucket, COUNT(*) AS cnt, TOTAL({fingerprint_expr(cols)}) AS fp '
+            f'FROM {relation} GROUP BY bucket')
+
+
+def verify_remote(conn, sink, target, cols, select_sql, key='voter_id', range_size=5000,
+                  batch_size=2000, max_bytes=MAX_STATEMENT_BYTES, repair=True, controller=None):
+    """Compare source and sink per voter_id range and repair drifted ranges.
+
+    Run after delta_sync, when the sink should match the source.  One
+    aggregate query per side; only mismatched ranges are fetched back.
+    Returns the list of (low, high) key ranges that differed.
+    """
+    key_index = cols.index(key)
+    inner = _inner(select_sql)
+    # bounds and local ranges in text order, which is D1's order for its
+    # TEXT key column
+    text_key = _key_sql(key)
+    bounds = [r[0] for r in conn.execute(
+        f'SELECT k FROM (SELECT {text_key} AS k, ROW_NUMBER() OVER (ORDER BY {text_key}) AS rn FROM ({inner})) '
+        f'WHERE rn > 1 AND (rn - 1) % ? = 0 ORDER BY k', (range_size,))]
+    local = {r[0]: (r[1], r[2]) for r in conn.execute(_bucket_sql(f'({inner})', cols, text_key, bounds))}
+    remote = {r['bucket']: (r['cnt'], r['fp']) for r in sink.query(_bucket_sql(target, cols, key, bounds))}
+    edges = [None] + bounds + [None]
+    drifted = []
+    for b in sorted(set(local) | set(remote)):
+        if local.get(b) != remote.get(b):
+            drifted.append((edges[b], edges[b + 1]))
+    print(f'{target}: {len(drifted)} of {len(bounds) + 1} {key} ranges differ on {sink.name}')
+    if repair:
+        for low, high in drifted:
+            _repair_range(conn, sink, target, cols, inner, key, key_index, low, high, batch_size, max_bytes,
+                          controller)
+    return drifted
+
+
+def _range_clause(key, low, high):
+    parts = []
+    if low is not None:
+        parts.append(f'{key} >= {esc(low)}')
+    if high is not None:
+        parts.append(f'{key} < {esc(high)}')
+    return ' AND '.join(parts) or '1 = 1'
+
+
+def _repair_range(conn, sink, target, cols, inner, key, key_index, low, high, batch_size, max_bytes,
+                  controller=None):
+    remote = {}
+    for r in sink.query(f"SELECT {', '.join(cols)} FROM {target} WHERE {_range_clause(key, low, high)}"):
+        vals = _text_key([r[c] for c in cols], key_index)
+        remote[vals[key_index]] = row_hash(*vals)
+    fixes = []
+    seen = set()
+    text_key = _key_sql(key)
+    for r in conn.execute(f'SELECT * FROM ({inner}) WHERE {_range_clause(text_key, low, high)} ORDER BY {text_key}'):
+        vals = _text_key(r, key_index)
+        k = vals[key_index]
+        seen.add(k)
+        h = row_hash(*vals)
+        if remote.get(k) != h:
+            fixes.append((encode_row(r), k, h))
+    extras = [k for k in remote if k not in seen]
+    for batch, carried in send_batches(sink, fixes, insert_head(target, cols), max_bytes, batch_size,
+                                       controller=controller):
+        conn.executemany('INSERT OR REPLACE INTO m.row_hashes (target, voter_id, hash) VALUES (?, ?, ?)',
+                         [(target, k, h) for _, k, h in carried])
+        conn.commit()
+    items = [(esc(k), k) for k in extras]
+    for batch, carried in send_batches(sink, items, f'DELETE FROM {target} WHERE {key} IN (',
+                                       max_bytes, batch_size, sep=',', tail=');', controller=controller):
+        conn.executemany('DELETE FROM m.row_hashes WHERE target = ? AND voter_id = ?',
+                         [(target, k) for _, k in carried])
+        conn.commit()
+    print(f'  repaired range [{low!r}, {high!r}): {len(fixes)} rows rewritten, {len(extras)} extra rows deleted')
@@ -0,0 +1,398 @@
+"""
+A local stand-in for `wrangler d1 execute`, for offline end-to-end seeding.
+
+scripts/d1_emulator.py takes the same arguments the seeders give wrangler:
+
+  d1_emulator.py [--db PATH] [--latency S] ... d1 execute DATABASE (--remote|--local)
+                 (--file PATH | --command SQL) [--json] [--yes]
+
+and runs them against a sqlite database built from worker/db/migrations
+(applied on first use, tracked in d1_migrations like wrangler does), with
+v_voters_addr_norm turned into the plain table it is on remote D1.  The
+seeders reach it through WranglerSink exactly as they reach wrangler (a
+temp .sql file per statement, --json for reads), so --sink emulator
+exercises the whole path: encoding, files, a process per statement,
+output parsing and the adaptive controller's error classification.
+
+D1's limits are enforced per statement:
+
+  statement length     100,000 bytes (D1_ERROR ... SQLITE_TOOBIG)
+  string / row size    2,000,000 bytes
+  columns per table    100
+  bound parameters     100
+  function arguments   32
+  query duration       30 s (--max-duration), failing as a timeout
+
+A call is all-or-nothing like a D1 batch: every statement of a --file runs
+in one transaction that is rolled back on the first error, and explicit
+BEGIN / COMMIT / SAVEPOINT statements are refused as D1 refuses them.
+
+Each call first sleeps `latency + bytes / bandwidth` (+/-20% jitter), and
+fails transiently with probability --fail-rate using the error texts D1
+and wrangler print.  The draw is seeded by --seed, the statement's hash
+and how often that statement was tried before: with the same seed a
+given statement fails (or lands) the same way on every run, however the
+upload workers interleave.  Runs only repeat exactly when they send the
+same statements (--adaptive sizes them from measured timings).
+
+Output follows wrangler: with --json a list of {"results", "success",
+"meta"} objects (one per statement for --command and --local, one import
+summary for --remote --file), errors as {"error": {...}} with exit code 1;
+without --json the human-readable lines and "✘ [ERROR]" on stderr.
+meta.rows_read counts rows returned, not rows scanned.
+
+Options may also come from the environment (D1_EMULATOR_DB,
+D1_EMULATOR_LATENCY, ...), so `--wrangler "python3 scripts/d1_emulator.py"`
+works with any tool that only knows how to call wrangler.
+"""
+import argparse, hashlib, json, os, random, sqlite3, subprocess, sys, tempfile, time
+from pathlib import Path
+
+from .sinks import REPO_ROOT, SqliteSink
+
+DEFAULT_DB_DIR = REPO_ROOT / '.d1_emulator'
+
+# Seeding targets that are views in the migration chain but plain tables on
+# remote D1 (see SqliteSink.ensure_table), materialized when a database is
+# opened so plain `--wrangler d1_emulator.py` runs can write them too:
+# table -> columns the seeders send beyond the view's own.
+REMOTE_TABLES = {'v_voters_addr_norm': ['state']}
+
+MAX_STATEMENT_BYTES = 100_000
+LIMITS = {
+    'SQLITE_LIMIT_LENGTH': 2_000_000,
+    'SQLITE_LIMIT_COLUMN': 100,
+    'SQLITE_LIMIT_VARIABLE_NUMBER': 100,
+    'SQLITE_LIMIT_FUNCTION_ARG': 32,
+}
+
+TRANSIENT_ERRORS = (
+    'D1_ERROR: Network connection lost.',
+    'fetch failed: ECONNRESET',
+    'D1_ERROR: 503 Service Unavailable',
+    'Request timed out',
+    'D1_ERROR: D1 DB is overloaded. Too many requests queued.',
+)
+TRANSACTION_ERROR = ('D1_ERROR: To execute a transaction, please use the state.storage.transaction() or '
+                     'state.storage.transactionSync() APIs instead of the SQL BEGIN TRANSACTION or SAVEPOINT '
+                     'statements.')
+TRANSACTION_WORDS = ('BEGIN', 'COMMIT', 'END', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+CALLS_SCHEMA = 'CREATE TABLE IF NOT EXISTS _emulator_calls (hash TEXT PRIMARY KEY, attempts INTEGER NOT NULL)'
+
+
+class D1Error(Exception):
+    """A failed call; `code` is the Cloudflare API error code wrangler shows."""
+
+    def __init__(self, message, code=7500):
+        super().__init__(message)
+        self.code = code
+
+
+def split_statements(sql):
+    """Split a script into complete statements (trigger bodies stay whole)."""
+    statements = []
+    start = 0
+    pos = sql.find(';')
+    while pos != -1:
+        chunk = sql[start:pos + 1]
+        if sqlite3.complete_statement(chunk):
+            if chunk.strip(' \t\r\n;'):
+                statements.append(chunk.strip())
+            start = pos + 1
+        pos = sql.find(';', pos + 1)
+    rest = sql[start:].strip()
+    if rest and not all(line.strip().startswith('--') for line in rest.splitlines() if line.strip()):
+        statements.append(rest)
+    return statements
+
+
+def _first_word(statement):
+    lines = [line for line in statement.splitlines() if not line.strip().startswith('--')]
+    words = ' '.join(lines).split(None, 1)
+    return words[0].upper().rstrip(';') if words else ''
+
+
+class Emulator:
+    """One emulated D1 database in a sqlite file."""
+
+    def __init__(self, path, latency=0.0, bandwidth=0, fail_rate=0.0, seed=None, limit=MAX_STATEMENT_BYTES,
+                 max_duration=30.0, sleep=time.sleep, clock=time.monotonic):
+        self.path = Path(path)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.fail_rate = fail_rate
+        self.seed = seed
+        self.limit = limit
+        self.max_duration = max_duration
+        self.sleep = sleep
+        self.clock = clock
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        sink = SqliteSink(self.path)  # applies any migrations not yet recorded
+        sink.conn.execute('PRAGMA journal_mode=WAL')
+        for table, extra in REMOTE_TABLES.items():
+            row = sink.conn.execute('SELECT type FROM sqlite_master WHERE name = ?', (table,)).fetchone()
+            if row is not None and row[0] == 'view':
+                cols = [r[1] for r in sink.conn.execute(f'PRAGMA table_info({table})')]
+                sink.ensure_table(table, cols + [c for c in extra if c not in cols])
+        sink.conn.execute(CALLS_SCHEMA)
+        sink.close()
+        self.conn = sqlite3.connect(str(self.path), isolation_level=None, timeout=60)
+        self.conn.row_factory = sqlite3.Row
+        setlimit = getattr(self.conn, 'setlimit', None)  # Python 3.11+
+        if setlimit is not None:
+            for name, value in LIMITS.items():
+                setlimit(getattr(sqlite3, name), value)
+
+    # -- simulated network ---------------------------------------------------
+
+    def _attempt(self, sql):
+        """Record one more try of `sql` and return how many came before."""
+        digest = hashlib.blake2b(sql.encode('utf-8'), digest_size=8).hexdigest()
+        with self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            row = self.conn.execute('SELECT attempts FROM _emulator_calls WHERE hash = ?', (digest,)).fetchone()
+            attempts = row[0] if row else 0
+            self.conn.execute('INSERT OR REPLACE INTO _emulator_calls (hash, attempts) VALUES (?, ?)',
+                              (digest, attempts + 1))
+        return digest, attempts
+
+    def simulate(self, sql):
+        """Sleep like a round trip to D1; raise D1Error for an injected failure."""
+        size = len(sql.encode('utf-8'))
+        if not (self.latency or self.bandwidth or self.fail_rate):
+            return
+        digest, attempts = self._attempt(sql) if self.fail_rate else ('', 0)
+        rnd = random.Random(f'{self.seed}:{digest}:{attempts}')
+        delay = (self.latency + (size / self.bandwidth if self.bandwidth else 0.0)) * rnd.uniform(0.8, 1.25)
+        if rnd.random() < self.fail_rate:
+            self.sleep(delay * rnd.random())
+            raise D1Error(rnd.choice(TRANSIENT_ERRORS), code=7500)
+        self.sleep(delay)
+
+    # -- execution -----------------------------------------------------------
+
+    def _check(self, statement):
+        size = len(statement.encode('utf-8'))
+        if size > self.limit:
+            raise D1Error(f'D1_ERROR: statement too long: SQLITE_TOOBIG ({size} bytes, limit {self.limit})')
+        if _first_word(statement) in TRANSACTION_WORDS:
+            raise D1Error(TRANSACTION_ERROR)
+
+    def _deadline(self, started):
+        def check():
+            return 1 if self.clock() - started > self.max_duration else 0
+        return check
+
+    def run(self, sql):
+        """Execute every statement in `sql` atomically.
+
+        Returns one (rows, meta) pair per statement.
+        """
+        statements = split_statements(sql)
+        for statement in statements:
+            self._check(statement)
+        self.simulate(sql)
+        outcomes = []
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            for statement in statements:
+                started = self.clock()
+                before = self.conn.total_changes
+                self.conn.set_progress_handler(self._deadline(started), 10_000)
+                try:
+                    cursor = self.conn.execute(statement)
+                    rows = [dict(r) for r in cursor.fetchall()]
+                except sqlite3.OperationalError as e:
+                    if 'interrupted' in str(e):
+                        raise D1Error('D1_ERROR: D1 DB storage operation exceeded timeout which caused object '
+                                      'to be reset.')
+                    raise
+                finally:
+                    self.conn.set_progress_handler(None, 10_000)
+                written = self.conn.total_changes - before
+                outcomes.append((rows, {
+                    'served_by': 'd1-emulator',
+                    'duration': round((self.clock() - started) * 1000, 4),
+                    'changes': written,
+                    'last_row_id': cursor.lastrowid or 0,
+                    'changed_db': written > 0,
+                    'size_after': self.size(),
+                    'rows_read': len(rows),
+                    'rows_written': written,
+                }))
+            self.conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            self.conn.execute('ROLLBACK')
+            raise D1Error(f"D1_ERROR: {e}: {getattr(e, 'sqlite_errorname', None) or 'SQLITE_ERROR'}")
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        return outcomes
+
+    def size(self):
+        pages, page_size = (self.conn.execute(f'PRAGMA {p}').fetchone()[0] for p in ('page_count', 'page_size'))
+        return pages * page_size
+
+    def close(self):
+        self.conn.close()
+
+
+# -- wrangler-compatible command line ----------------------------------------
+
+def _env(name, default, cast=str):
+    value = os.environ.get(f'D1_EMULATOR_{name}')
+    return cast(value) if value not in (None, '') else default
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='d1_emulator.py', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=_env('DB', None),
+                        help='emulated database file (default: .d1_emulator/<DATABASE>.sqlite)')
+    parser.add_argument('--latency', type=float, default=_env('LATENCY', 0.0, float),
+                        help='simulated round trip per call, seconds')
+    parser.add_argument('--bandwidth', type=int, default=_env('BANDWIDTH', 0, int),
+                        help='simulated upload bytes/second (0: unlimited)')
+    parser.add_argument('--fail-rate', type=float, default=_env('FAIL_RATE', 0.0, float),
+                        help='probability of a transient failure per call')
+    parser.add_argument('--seed', default=_env('SEED', None), help='seed for latency jitter and failures')
+    parser.add_argument('--limit', type=int, default=_env('LIMIT', MAX_STATEMENT_BYTES, int),
+                        help='max bytes per statement')
+    parser.add_argument('--max-duration', type=float, default=_env('MAX_DURATION', 30.0, float),
+                        help='max seconds per statement')
+    parser.add_argument('d1', choices=['d1'])
+    parser.add_argument('command', choices=['execute'])
+    parser.add_argument('database')
+    where = parser.add_mutually_exclusive_group()
+    where.add_argument('--remote', action='store_true')
+    where.add_argument('--local', action='store_true')
+    what = parser.add_mutually_exclusive_group(required=True)
+    what.add_argument('--file')
+    what.add_argument('--command', dest='sql')
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--yes', '-y', action='store_true')
+    return parser
+
+
+def _error_output(args, err):
+    if args.json:
+        print(json.dumps({'error': {'text': f'A request to the Cloudflare API failed. {err}',
+                                    'notes': [{'text': f'{err} [code: {err.code}]'}],
+                                    'kind': 'error', 'name': 'APIError', 'code': err.code}}, indent=2))
+    else:
+        print(f'✘ [ERROR] A request to the Cloudflare API (/d1/database/{args.database}/query) failed.\n\n'
+              f'  {err} [code: {err.code}]\n', file=sys.stderr)
+
+
+def _success_output(args, emulator, outcomes, seconds):
+    read = sum(meta['rows_read'] for _, meta in outcomes)
+    written = sum(meta['rows_written'] for _, meta in outcomes)
+    if args.file and args.remote:
+        payload = [{
+            'results': [{'Total queries executed': len(outcomes), 'Rows read': read, 'Rows written': written,
+                         'Database size (MB)': f'{emulator.size() / 1e6:.2f}'}],
+            'success': True,
+            'finalBookmark': f'{int(time.time() * 1000):016x}',
+            'meta': {'served_by': 'd1-emulator', 'duration': round(seconds * 1000, 4), 'changes': written,
+                     'last_row_id': outcomes[-1][1]['last_row_id'] if outcomes else 0,
+                     'changed_db': written > 0, 'size_after': emulator.size(),
+                     'rows_read': read, 'rows_written': written},
+        }]
+    else:
+        payload = [{'results': rows, 'success': True, 'meta': meta} for rows, meta in outcomes]
+    if args.json:
+        print(json.dumps(payload, indent=2))
+        return
+    where = 'remote' if args.remote else 'local'
+    print(f'\U0001F300 Executing on {where} database {args.database} (d1 emulator: {emulator.path}):')
+    print(f'\U0001F6A3 Executed {len(outcomes)} queries in {seconds * 1000:.2f}ms '
+          f'({read} rows read, {written} rows written)')
+    if args.sql:
+        for rows, _ in outcomes:
+            if rows:
+                print(json.dumps(rows, indent=2))
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.file:
+        path = Path(args.file)
+        if not path.exists():
+            print(f'✘ [ERROR] Unable to read SQL text file "{path}". Please check the file path and try again.',
+                  file=sys.stderr)
+            return 1
+        sql = path.read_text(encoding='utf-8')
+    else:
+        sql = args.sql
+    db = args.db or DEFAULT_DB_DIR / f'{args.database}.sqlite'
+    emulator = Emulator(db, latency=args.latency, bandwidth=args.bandwidth, fail_rate=args.fail_rate,
+                        seed=args.seed, limit=args.limit, max_duration=args.max_duration)
+    started = time.monotonic()
+    try:
+        outcomes = emulator.run(sql)
+        _success_output(args, emulator, outcomes, time.monotonic() - started)
+    except D1Error as e:
+        _error_output(args, e)
+        return 1
+    finally:
+        emulator.close()
+    return 0
+
+
+SEED_TABLES = {
+    'voters': 'voters',
+    'v_best_phone': 'best_phone_built',
+    'v_voters_addr_norm': 'voters_addr_norm',
+}
+
+
+def build_seed_source(path, voters=5000, seed=1):
+    """A wy.sqlite-shaped source with voters, best_phone_built and
+    voters_addr_norm, from the synthetic data set."""
+    from .dataset import load_synthetic
+    sink = SqliteSink(':memory:')
+    load_synthetic(sink.conn, voters=voters, seed=seed)
+    sink.conn.execute('ATTACH DATABASE ? AS src', (str(path),))
+    sink.conn.executescript("""
+        CREATE TABLE src.voters AS SELECT voter_id, political_party, county,
+          senate AS senate_district, house AS house_district FROM voters;
+        CREATE TABLE src.best_phone_built AS
+          SELECT voter_id, phone_e164, confidence_code, is_wy_area, imported_at FROM v_best_phone;
+        CREATE TABLE src.voters_addr_norm AS
+          SELECT voter_id, ln, fn, addr1, city, 'WY' AS state, zip, senate, house FROM voters_addr_norm;
+        CREATE UNIQUE INDEX src.idx_voters_voter_id ON voters (voter_id);
+        CREATE UNIQUE INDEX src.idx_best_phone_built_voter_id ON best_phone_built (voter_id);
+        CREATE UNIQUE INDEX src.idx_voters_addr_norm_voter_id ON voters_addr_norm (voter_id);
+    """)
+    sink.close()
+
+
+def seed_check(voters=5000, workdir=None, extra_args=()):
+    """Seed voters, v_best_phone and v_voters_addr_norm through the emulator
+    with d1_seed_from_sqlite.py and compare each table's count with the
+    source.  Returns the number of tables that differ."""
+    workdir = Path(workdir or tempfile.mkdtemp(prefix='d1_emulator_check_'))
+    workdir.mkdir(parents=True, exist_ok=True)
+    source, db = workdir / 'source.sqlite', workdir / 'emulated.sqlite'
+    for path in (source, db):
+        path.unlink(missing_ok=True)
+    build_seed_source(source, voters)
+    cmd = [sys.executable, str(REPO_ROOT / 'scripts' / 'd1_seed_from_sqlite.py'), str(source), '--sink', 'emulator',
+           '--sink-sqlite', str(db), '--fake-latency', '0', '--fake-fail-rate', '0', '--no-checkpoint',
+           *extra_args]
+    print('Running:', ' '.join(cmd))
+    res = subprocess.run(cmd, capture_output=True, text=True)
+    if res.returncode != 0:
+        print(res.stdout[-2000:] + res.stderr[-2000:])
+        return len(SEED_TABLES)
+    src, dst = sqlite3.connect(str(source)), sqlite3.connect(str(db))
+    failures = 0
+    for target, table in SEED_TABLES.items():
+        want = src.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        got = dst.execute(f'SELECT COUNT(*) FROM {target}').fetchone()[0]
+        print(f'  {target:<20} {got:>7} rows seeded, {want:>7} in {table}')
+        failures += got != want
+    src.close()
+    dst.close()
+    return failures
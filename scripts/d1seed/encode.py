@@ -0,0 +1,81 @@
+"""
+SQL literal encoding and byte-budgeted INSERT batching.
+"""
+import math
+from collections import namedtuple
+
+# D1 rejects any single SQL statement over 100 KB; stay under it with headroom.
+MAX_STATEMENT_BYTES = 90_000
+
+
+def esc(v):
+    """Encode a Python value as a SQLite literal.
+
+    Numbers are emitted bare (column affinity still converts them for TEXT
+    columns such as voter_id), bytes as blob literals, everything else as a
+    quoted string.
+    """
+    if v is None:
+        return 'NULL'
+    if isinstance(v, bool):
+        return '1' if v else '0'
+    if isinstance(v, int):
+        return str(v)
+    if isinstance(v, float):
+        if math.isnan(v) or math.isinf(v):
+            return 'NULL'
+        return repr(v)
+    if isinstance(v, (bytes, bytearray, memoryview)):
+        return "X'" + bytes(v).hex() + "'"
+    return "'" + str(v).replace("'", "''") + "'"
+
+
+# rows: row count, sql: the INSERT statement, last_key: key of the final row
+Batch = namedtuple('Batch', 'rows sql last_key')
+
+
+def insert_head(table, cols):
+    return f"INSERT OR REPLACE INTO {table} ({','.join(cols)}) VALUES\n"
+
+
+def encode_row(r):
+    return '(' + ','.join(esc(v) for v in r) + ')'
+
+
+def pack_statements(items, head, max_bytes=MAX_STATEMENT_BYTES, max_rows=2000, sep=',\n', tail=';'):
+    """Pack (fragment, key, ...) items into `head + fragments + tail` statements.
+
+    A statement is cut when adding the next fragment would exceed
+    `max_bytes` or `max_rows`.  Yields (Batch, items) so callers can act on
+    exactly the items a confirmed batch carried.
+    """
+    base = len(head.encode('utf-8')) + len(tail)
+    step = len(sep)
+    frags = []
+    batch = []
+    size = base
+    for item in items:
+        n = len(item[0].encode('utf-8')) + step
+        if frags and (size + n > max_bytes or len(frags) >= max_rows):
+            yield Batch(len(frags), head + sep.join(frags) + tail, batch[-1][1]), batch
+            frags = []
+            batch = []
+            size = base
+        frags.append(item[0])
+        batch.append(item)
+        size += n
+    if frags:
+        yield Batch(len(frags), head + sep.join(frags) + tail, batch[-1][1]), batch
+
+
+def iter_insert_batches(rows, table, cols, max_bytes=MAX_STATEMENT_BYTES, max_rows=2000, key_index=0):
+    """Stream rows (any iterable, typically an executed cursor) into INSERT
+    OR REPLACE statements.
+
+    Batches are cut when the encoded statement would exceed `max_bytes`;
+    `max_rows` only caps the row count.  Only one batch is held in memory.
+    Yields Batch tuples; last_key is column `key_index` of the batch's last row.
+    """
+    items = ((encode_row(r), r[key_index]) for r in rows)
+    for batch, _ in pack_statements(items, insert_head(table, cols), max_bytes, max_rows):
+        yield batch
@@ -0,0 +1,242 @@
+"""
+Pre-upload referential-integrity and duplicate-key checks.
+
+voters, v_best_phone and v_voters_addr_norm are seeded independently with
+INSERT OR REPLACE, so a phone or address whose voter is missing, or two
+source rows with the same voter_id (D1 keeps one of them, and which one
+depends on where a keyset page ends), only surface after upload.
+check_sources() streams each source's voter_id column once and reports
+them before anything is sent.
+
+Ids are held in an IdSet: decimal ids whose text round-trips
+('200123456', not '0200123456') become 64-bit integers, collected in sorted runs and merged
+into one array('q'), about 8 bytes per id against ~75 for a set of str.
+Anything else is kept as-is in a small side set.  Duplicates fall out of
+the merge, and orphans / missing children are linear walks over two
+sorted arrays.
+
+With drop=True the bad ids are written to temp.seed_drop on the source
+connection and filtered() wraps a seeding query to skip them: rows with
+no voter_id, every row of a duplicated id (none of them is known to be
+the right one) and children whose voter is missing or duplicated.
+"""
+import heapq, sys
+from array import array
+from collections import Counter, namedtuple
+
+from . import telemetry
+
+RUN = 1 << 16  # ids sorted per run before the merge
+INT_MAX = (1 << 63) - 1
+
+
+def _key(v):
+    """Int form of an id whose decimal text round-trips ('200123456', not
+    '0200123456' or ' 200123456'), or None."""
+    if isinstance(v, int) and not isinstance(v, bool):
+        return v if -INT_MAX <= v <= INT_MAX else None
+    if isinstance(v, str) and 0 < len(v) < 19:
+        try:
+            k = int(v)
+        except ValueError:
+            return None
+        return k if str(k) == v else None
+    return None
+
+
+class IdSet:
+    """Sorted, compact set of voter_ids that remembers duplicates."""
+
+    def __init__(self):
+        self.ids = array('q')
+        self.other = Counter()
+        self.duplicates = Counter()  # id -> extra copies seen
+        self.nulls = 0
+        self.rows = 0
+        self._runs = []
+        self._buf = []
+
+    def extend(self, keys):
+        """Add int ids (from id_key_sql)."""
+        self.rows += len(keys)
+        self._buf.extend(keys)
+        if len(self._buf) >= RUN:
+            self._flush()
+
+    def add(self, v):
+        """Add one id of any form."""
+        k = _key(v)
+        if k is not None:
+            return self.extend([k])
+        self.rows += 1
+        if v is None or v == '':
+            self.nulls += 1
+        else:
+            self.other[v] += 1
+
+    def _flush(self):
+        if self._buf:
+            self._buf.sort()
+            self._runs.append(array('q', self._buf))
+            self._buf = []
+
+    def freeze(self):
+        """Merge the runs into `ids`; call once after the last add()."""
+        self._flush()
+        runs, self._runs = self._runs, []
+        out, last = self.ids, None
+        for k in heapq.merge(*runs) if len(runs) > 1 else (runs[0] if runs else ()):
+            if k == last:
+                self.duplicates[k] += 1
+            else:
+                out.append(k)
+                last = k
+        for v, n in self.other.items():
+            if n > 1:
+                self.duplicates[v] += n - 1
+        return self
+
+    def __len__(self):
+        return len(self.ids) + len(self.other)
+
+    def __contains__(self, v):
+        k = _key(v)
+        if k is None:
+            return v in self.other
+        ids = self.ids
+        lo, hi = 0, len(ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ids[mid] < k:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < len(ids) and ids[lo] == k
+
+    @property
+    def nbytes(self):
+        return self.ids.itemsize * len(self.ids) + sum(sys.getsizeof(v) for v in self.other)
+
+    def minus(self, other):
+        """Iterate the ids in this set and not in `other` (ints in order, then the rest)."""
+        b, j, nb = other.ids, 0, len(other.ids)
+        for k in self.ids:
+            while j < nb and b[j] < k:
+                j += 1
+            if j >= nb or b[j] != k:
+                yield k
+        yield from sorted((v for v in self.other if v not in other.other), key=str)
+
+
+def id_key_sql(key):
+    """SQL for the int form of `key` that _key() gives, NULL when it has none."""
+    return (f"CASE WHEN length({key}) < 19 AND CAST(CAST({key} AS INTEGER) AS TEXT) = {key} "
+            f"THEN CAST({key} AS INTEGER) END")
+
+
+def read_ids(conn, select_sql, key='voter_id'):
+    """Stream `key` of `select_sql` into a frozen IdSet.
+
+    SQLite converts the ids to ints as it reads, so the common case is one
+    list comprehension per page rather than Python work per id.
+    """
+    ids = IdSet()
+    log = telemetry.current()
+    cur = conn.execute(f"SELECT {id_key_sql(key)}, {key} FROM ({select_sql.rstrip().rstrip(';')})")
+    with log.stage('fetch'):
+        while True:
+            rows = cur.fetchmany(RUN)
+            if not rows:
+                break
+            keys = [k for k, _ in rows if k is not None]
+            ids.extend(keys)
+            if len(keys) < len(rows):
+                for k, v in rows:
+                    if k is None:
+                        ids.add(v)
+    return ids.freeze()
+
+
+# Per-table result: rows read, distinct ids, ids with duplicates, extra rows
+# they carry, rows without an id, ids whose voter is missing (children only)
+# and a sample of each problem.
+TableCheck = namedtuple('TableCheck', 'table rows ids duplicated extra nulls orphans missing samples nbytes')
+
+
+def _tally(values, n):
+    """(count, first `n` as str) of an iterable, without keeping the rest."""
+    count, sample = 0, []
+    for v in values:
+        if count < n:
+            sample.append(str(v))
+        count += 1
+    return count, sample
+
+
+def check_sources(conn, parent, children, sample=10, drop=False):
+    """Check `children` against `parent` in the local source.
+
+    `parent` is (table, select_sql) for voters and `children` a list of
+    (table, select_sql) for the tables keyed on a voter.  Returns a list of
+    TableCheck, parent first; `missing` counts voters without a row in
+    that child (informational: not every voter has a phone).  With
+    drop=True the ids to skip are written to temp.seed_drop, see
+    filtered().
+    """
+    table, select_sql = parent
+    voters = read_ids(conn, select_sql)
+    checks = [TableCheck(table, voters.rows, len(voters), len(voters.duplicates),
+                         sum(voters.duplicates.values()), voters.nulls, 0, 0,
+                         {'duplicates': _tally(voters.duplicates, sample)[1]}, voters.nbytes)]
+    drops = {table: set(voters.duplicates)}
+    for table, select_sql in children:
+        ids = read_ids(conn, select_sql)
+        orphans = list(ids.minus(voters))
+        if drop:
+            # children of a voter we skip would be orphans on D1
+            orphans += [k for k in voters.duplicates if k in ids]
+        missing, missing_sample = _tally(voters.minus(ids), sample)
+        checks.append(TableCheck(table, ids.rows, len(ids), len(ids.duplicates), sum(ids.duplicates.values()),
+                                 ids.nulls, len(orphans), missing,
+                                 {'duplicates': _tally(ids.duplicates, sample)[1],
+                                  'orphans': [str(v) for v in orphans[:sample]], 'missing': missing_sample},
+                                 ids.nbytes))
+        drops[table] = set(ids.duplicates) | set(orphans)
+    if drop:
+        _write_drops(conn, drops)
+    return checks
+
+
+def _write_drops(conn, drops):
+    conn.execute('DROP TABLE IF EXISTS temp.seed_drop')
+    conn.execute('CREATE TEMP TABLE seed_drop (target TEXT NOT NULL, voter_id TEXT NOT NULL, '
+                 'PRIMARY KEY (target, voter_id)) WITHOUT ROWID')
+    conn.executemany('INSERT OR IGNORE INTO temp.seed_drop VALUES (?, ?)',
+                     [(table, str(v)) for table, ids in drops.items() for v in ids])
+    conn.commit()
+
+
+def filtered(select_sql, table, key='voter_id'):
+    """Wrap `select_sql` to skip rows check_sources(drop=True) marked for
+    `table`, and rows without a key."""
+    inner = select_sql.rstrip().rstrip(';')
+    return (f"SELECT * FROM ({inner}) WHERE {key} IS NOT NULL AND {key} <> '' AND CAST({key} AS TEXT) NOT IN "
+            f"(SELECT voter_id FROM temp.seed_drop WHERE target = '{table}');")
+
+
+def problems(checks):
+    """Rows that would reach D1 in a bad state: duplicates, ids that are
+    missing or orphaned."""
+    return sum(c.extra + c.nulls + c.orphans for c in checks)
+
+
+def report(checks):
+    for c in checks:
+        line = (f'  {c.table:<20} {c.rows:>9} rows, {c.ids:>9} ids ({c.nbytes / 1e6:.1f} MB): '
+                f'{c.duplicated} duplicated ids (+{c.extra} rows), {c.nulls} without voter_id')
+        if c is not checks[0]:
+            line += f', {c.orphans} orphans, {c.missing} voters without a row'
+        print(line)
+        for kind, ids in c.samples.items():
+            if ids:
+                print(f'      {kind}: {", ".join(ids)}')
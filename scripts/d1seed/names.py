@@ -0,0 +1,62 @@
+"""
+Name normalization and FTS5 match expressions for the voter name search.
+
+voter_name_search (migration 038) stores every name through name_key(),
+and worker/src/api/contact-form.js normalizes what a volunteer types the
+same way (nameKey / buildNameMatch), so the two must stay in step:
+
+  "O'Brien"     -> 'OBRIEN'
+  'José-María'  -> 'JOSE MARIA'
+  'St. John'    -> 'ST JOHN'
+
+fts_match() builds the MATCH expression the Worker sends: every last and
+first name token as a prefix query on its own column, the county as an
+exact phrase.
+"""
+import re, unicodedata
+
+SEARCH_COLUMNS = ['voter_id', 'ln_norm', 'fn_norm', 'city', 'county', 'zip']
+
+DROPPED = re.compile(r"['.`’]")
+SEPARATORS = re.compile(r'[^A-Z0-9]+')
+
+
+def name_key(value):
+    """Upper case, diacritics and apostrophes removed, other punctuation
+    folded to single spaces; None when nothing is left."""
+    if value is None:
+        return None
+    text = unicodedata.normalize('NFKD', str(value))
+    text = ''.join(c for c in text if not unicodedata.combining(c)).upper()
+    text = SEPARATORS.sub(' ', DROPPED.sub('', text)).strip()
+    return text or None
+
+
+def register(conn):
+    """Make name_key() available to SQL on `conn`."""
+    conn.create_function('name_key', 1, name_key, deterministic=True)
+
+
+def search_select(addr='voters_addr_norm', voters='voters'):
+    """SELECT producing voter_name_search rows (SEARCH_COLUMNS order) from an
+    address table and voters; needs register() on the connection."""
+    return f"""
+        SELECT a.voter_id, name_key(a.ln) AS ln_norm, name_key(a.fn) AS fn_norm,
+               UPPER(TRIM(a.city)) AS city, UPPER(TRIM(v.county)) AS county, TRIM(a.zip) AS zip
+        FROM {addr} a
+        JOIN {voters} v ON v.voter_id = a.voter_id
+        WHERE name_key(a.ln) IS NOT NULL
+    """
+
+
+def fts_match(last_name, first_name=None, county=None):
+    """MATCH expression for voter_name_fts, or None without a last name."""
+    last = (name_key(last_name) or '').split()
+    if not last:
+        return None
+    terms = [f'ln : "{token}"*' for token in last]
+    terms += [f'fn : "{token}"*' for token in (name_key(first_name) or '').split()]
+    county = name_key(county)
+    if county:
+        terms.append(f'county : "{county}"')
+    return ' AND '.join(terms)
@@ -0,0 +1,124 @@
+"""
+Pipelined sending: pack the next statements while earlier ones upload.
+
+send_pipelined() is send_batches() with the sink calls moved to a thread
+pool.  The calling thread keeps paging rows, encoding and packing
+statements while up to `workers` statements execute.  At most `in_flight`
+statements (default 2 * workers) are packed but not yet confirmed; when
+the sink is the slow side the producer blocks on the oldest one, which
+bounds memory.
+
+Results are yielded strictly in statement order, so a caller that
+checkpoints after each yield never records a key past a statement that has
+not landed.  When statement k fails, everything before it has already been
+yielded, later statements are dropped whether or not they landed (INSERT
+OR REPLACE makes resending them harmless) and the error propagates.
+
+On Ctrl-C, on any other exception, or when the caller closes the
+generator, queued statements are cancelled, retry backoffs are cut short
+and running statements are waited for, so WranglerSink has removed every
+temp file before the error surfaces.
+
+Sinks must be safe to call from several threads: WranglerSink runs one
+wrangler process per statement, SqliteSink serializes on a lock (FakeSink
+still overlaps its simulated latency).
+"""
+import threading, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from . import telemetry
+from .adaptive import _take, send_chunk, statement_target
+from .encode import MAX_STATEMENT_BYTES, pack_statements
+
+
+class Cancelled(Exception):
+    """Raised inside an upload worker when the pipeline is shutting down."""
+
+
+def _execute(sink, batch, carried, clock):
+    started = clock()
+    try:
+        sink.execute(batch.sql)
+    except Exception as e:
+        return [], {}, e
+    return [(batch, carried, len(batch.sql.encode('utf-8')), clock() - started)], {}, None
+
+
+def _execute_chunk(sink, chunk, head, sep, tail, controller, lock, sleep, clock):
+    landed = []
+    tally = {}
+    try:
+        for result in send_chunk(sink, chunk, head, sep, tail, controller, tally, sleep, clock, lock=lock):
+            landed.append(result)
+    except Exception as e:
+        return landed, tally, e
+    return landed, tally, None
+
+
+def send_pipelined(sink, items, head, max_bytes=MAX_STATEMENT_BYTES, max_rows=2000, sep=',\n', tail=';',
+                   controller=None, workers=2, in_flight=None, clock=time.monotonic):
+    """Like send_batches(), with `workers` statements executing concurrently.
+
+    Yields (Batch, items) in statement order after each statement landed.
+    """
+    log = telemetry.current()
+    log.begin()
+    op, table = statement_target(head)
+    in_flight = max(workers, in_flight or 2 * workers)
+    stop = threading.Event()
+    lock = threading.Lock()
+
+    def backoff(delay):
+        if stop.wait(delay):
+            raise Cancelled('pipeline cancelled')
+
+    def chunks():
+        base = len(head.encode('utf-8')) + len(tail)
+        pending = deque()
+        source = iter(items)
+        while True:
+            with log.stage('pack'):
+                with lock:
+                    budget = controller.budget
+                chunk = _take(pending, source, budget, max_rows, base, len(sep))
+            if not chunk:
+                return
+            yield chunk
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='d1seed-upload')
+    if controller is None:
+        packed = log.timed('pack', pack_statements(items, head, max_bytes, max_rows, sep, tail))
+        jobs = (pool.submit(_execute, sink, batch, carried, clock) for batch, carried in packed)
+    else:
+        jobs = (pool.submit(_execute_chunk, sink, chunk, head, sep, tail, controller, lock, backoff, clock)
+                for chunk in chunks())
+    queue = deque()
+    sent = 0
+
+    def collect():
+        nonlocal sent
+        with log.stage('wait'):
+            landed, tally, error = queue.popleft().result()
+        log.count('retries', tally.get('retries', 0))
+        log.count('splits', tally.get('splits', 0))
+        for batch, carried, nbytes, seconds in landed:
+            extra = {'budget': controller.budget} if controller is not None else {}
+            log.batch(table, op, batch.rows, nbytes, upload_s=seconds, in_flight=len(queue), **extra)
+            sent += batch.rows
+            yield batch, carried
+        if error is not None:
+            raise error
+
+    try:
+        for job in jobs:
+            queue.append(job)
+            while queue and (len(queue) >= in_flight or queue[0].done()):
+                yield from collect()
+        while queue:
+            yield from collect()
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+    summary = {'adaptive': controller.summary()} if controller is not None else {}
+    log.emit('table', table=table, op=op, rows=sent, workers=workers, in_flight=in_flight, **summary)
@@ -0,0 +1,225 @@
+"""
+Incremental pull of activity tables from a sink into a local sqlite file.
+
+The other direction from the seeders: call_activity and voter_contacts are
+written on D1 by the Worker, and pull_table() copies them down so analysis
+can join them against wy.sqlite locally.  Each table is read in three
+passes, all keyset pages of at most `page_size` rows:
+
+  new      rows with id above the high-water mark (ids are AUTOINCREMENT,
+           so they only grow)
+  changed  for tables with a `changed` column (voter_contacts.updated_at),
+           rows at or after the last updated_at seen, up to the id mark
+  verify   optional: one fingerprint aggregate per id range on each side
+           (delta.fingerprint_expr), and only ranges that differ are
+           fetched again; this catches deletes and edits that did not touch
+           updated_at
+
+Every page is written with INSERT OR REPLACE in one transaction together
+with its mark in d1_pull_state, so an interrupted pull resumes after the
+last page it committed and pulling twice changes nothing.
+"""
+import json
+from collections import namedtuple
+
+from . import telemetry
+from .checkpoint import utcnow
+from .delta import fingerprint_expr
+from .encode import esc
+
+# changed: column the Worker bumps on edit, or None when rows are only inserted
+PullSpec = namedtuple('PullSpec', 'table changed')
+
+PULLS = [
+    PullSpec('call_activity', None),
+    PullSpec('voter_contacts', 'updated_at'),
+]
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS d1_pull_state (
+  tbl TEXT PRIMARY KEY,
+  source TEXT NOT NULL,
+  last_id INTEGER NOT NULL DEFAULT 0,
+  last_changed TEXT,
+  rows INTEGER NOT NULL DEFAULT 0,
+  pulled_at TEXT
+);
+"""
+
+# Tallies from one pull_table() call
+PullResult = namedtuple('PullResult', 'table new changed repaired removed pages last_id')
+
+
+def remote_columns(sink, table):
+    """[(name, declared type)] of `table` on the sink; [] when it is missing."""
+    return [(r['name'], r['type'] or '') for r in sink.query(f'PRAGMA table_info({table});')]
+
+
+def ensure_local(conn, table, columns, changed=None):
+    """Create (or widen) the local copy of `table`.
+
+    The copy keeps the sink's declared types, so stored values and their
+    fingerprints match, but none of its constraints: it mirrors whatever
+    the sink holds.  voter_id and `changed` are indexed for local joins.
+    """
+    conn.executescript(STATE_SCHEMA)
+    defs = ['id INTEGER PRIMARY KEY'] + [f'{name} {typ}'.rstrip() for name, typ in columns if name != 'id']
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(defs)})")
+    have = {r[1] for r in conn.execute(f'PRAGMA table_info({table})')}
+    for name, typ in columns:
+        if name not in have:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {typ}'.rstrip())
+    for col in ('voter_id', changed):
+        if col and any(name == col for name, _ in columns):
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{col} ON {table} ({col})')
+
+
+def get_state(conn, table):
+    row = conn.execute('SELECT source, last_id, last_changed, rows FROM d1_pull_state WHERE tbl = ?',
+                       (table,)).fetchone()
+    return dict(zip(('source', 'last_id', 'last_changed', 'rows'), row)) if row else None
+
+
+def reset(conn, table):
+    """Forget `table`'s marks and local rows so the next pull starts over."""
+    conn.executescript(STATE_SCHEMA)
+    conn.execute('BEGIN')
+    conn.execute('DELETE FROM d1_pull_state WHERE tbl = ?', (table,))
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+        conn.execute(f'DELETE FROM {table}')
+    conn.execute('COMMIT')
+
+
+def _store(conn, table, cols, rows, source, last_id=None, last_changed=None, delete_where=None):
+    """Write one page and its marks in a single transaction."""
+    conn.execute('BEGIN')
+    try:
+        if delete_where:
+            conn.execute(f'DELETE FROM {table} WHERE {delete_where}')
+        conn.executemany(f"INSERT OR REPLACE INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                         [tuple(r[c] for c in cols) for r in rows])
+        conn.execute('INSERT OR IGNORE INTO d1_pull_state (tbl, source) VALUES (?, ?)', (table, source))
+        conn.execute(
+            """UPDATE d1_pull_state SET
+                 last_id = MAX(last_id, COALESCE(?, last_id)),
+                 last_changed = COALESCE(?, last_changed),
+                 rows = (SELECT COUNT(*) FROM """ + table + """),
+                 pulled_at = ?
+               WHERE tbl = ?""",
+            (last_id, last_changed, utcnow(), table))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def _page(sink, table, cols, where, order, page_size):
+    log = telemetry.current()
+    with log.stage('fetch'):
+        return sink.query(f"SELECT {', '.join(cols)} FROM {table} WHERE {where} ORDER BY {order} LIMIT {page_size};")
+
+
+def _log_page(table, op, rows):
+    log = telemetry.current()
+    log.batch(table, op, len(rows), len(json.dumps(rows, default=str)) if log.enabled else 0)
+
+
+def pull_new(conn, sink, table, cols, source, after, page_size):
+    """Pull rows with id above `after`; returns (rows, pages, last id)."""
+    pulled = pages = 0
+    while True:
+        rows = _page(sink, table, cols, f'id > {int(after)}', 'id', page_size)
+        if not rows:
+            return pulled, pages, after
+        after = rows[-1]['id']
+        _store(conn, table, cols, rows, source, last_id=after)
+        _log_page(table, 'pull', rows)
+        pulled += len(rows)
+        pages += 1
+        print(f'  {table}: {pulled} new rows, up to id {after}')
+
+
+def pull_changed(conn, sink, table, cols, changed, source, since, upto, page_size):
+    """Pull rows with `changed` >= `since` and id <= `upto`, in (changed, id)
+    keyset order.  Rows at exactly `since` are read again, since more edits
+    can land in the same second.  Returns (rows, pages)."""
+    pulled = pages = 0
+    mark, after = since, 0
+    while True:
+        where = f'id <= {int(upto)} AND ({changed} > {esc(mark)} OR ({changed} = {esc(mark)} AND id > {int(after)}))'
+        rows = _page(sink, table, cols, where, f'{changed}, id', page_size)
+        if not rows:
+            return pulled, pages
+        mark, after = rows[-1][changed], rows[-1]['id']
+        _store(conn, table, cols, rows, source, last_changed=mark)
+        _log_page(table, 'pull_changed', rows)
+        pulled += len(rows)
+        pages += 1
+
+
+def _buckets(relation, cols, upto, range_size):
+    return (f'SELECT id / {int(range_size)} AS bucket, COUNT(*) AS cnt, TOTAL({fingerprint_expr(cols)}) AS fp '
+            f'FROM {relation} WHERE id <= {int(upto)} GROUP BY bucket')
+
+
+def verify_ranges(conn, sink, table, cols, source, upto, range_size, page_size):
+    """Re-pull every id range whose count or fingerprint differs from the
+    sink.  Returns (rows rewritten, rows removed, ranges that differed)."""
+    sql = _buckets(table, cols, upto, range_size)
+    local = {r[0]: (r[1], r[2]) for r in conn.execute(sql)}
+    remote = {r['bucket']: (r['cnt'], r['fp']) for r in sink.query(sql + ';')}
+    drifted = sorted(b for b in set(local) | set(remote) if local.get(b) != remote.get(b))
+    rewritten = removed = 0
+    for b in drifted:
+        low, high = b * range_size, min((b + 1) * range_size, upto + 1)
+        where = f'id >= {low} AND id < {high}'
+        rows = []
+        while True:
+            page = _page(sink, table, cols, where + (f" AND id > {rows[-1]['id']}" if rows else ''), 'id', page_size)
+            rows += page
+            if len(page) < page_size:
+                break
+        before = conn.execute(f'SELECT COUNT(*) FROM {table} WHERE {where}').fetchone()[0]
+        _store(conn, table, cols, rows, source, delete_where=where)
+        _log_page(table, 'pull_repair', rows)
+        rewritten += len(rows)
+        removed += max(0, before - len(rows))
+    print(f'  {table}: {len(drifted)} of {len(set(local) | set(remote))} id ranges differed')
+    return rewritten, removed, len(drifted)
+
+
+def pull_table(conn, sink, spec, page_size=5000, verify=False, range_size=5000):
+    """Bring the local copy of `spec.table` up to date with the sink.
+
+    `conn` is the local database (opened with isolation_level=None).  The
+    pull refuses to mix sinks: a table first pulled from another sink must
+    be reset() first.  Returns a PullResult, or None when the sink has no
+    such table.
+    """
+    table = spec.table
+    columns = remote_columns(sink, table)
+    if not columns:
+        print(f'  {table}: not on {sink.name}; skipped')
+        return None
+    ensure_local(conn, table, columns, spec.changed)
+    cols = [name for name, _ in columns]
+    state = get_state(conn, table) or {'source': sink.label, 'last_id': 0, 'last_changed': None, 'rows': 0}
+    if state['source'] != sink.label:
+        raise ValueError(f"{table} was pulled from {state['source']}, not {sink.label}; reset it (--full) first")
+
+    new, pages, last_id = pull_new(conn, sink, table, cols, sink.label, state['last_id'], page_size)
+    changed = 0
+    if spec.changed and spec.changed in cols:
+        since = state['last_changed']
+        if since is None:
+            # A first pull has every edit so far: start from the latest one
+            # it saw, or '' (any edit at all) when nothing was edited yet.
+            since = conn.execute(f"SELECT COALESCE(MAX({spec.changed}), '') FROM {table}").fetchone()[0]
+            _store(conn, table, cols, [], sink.label, last_changed=since)
+        elif last_id:
+            changed, more = pull_changed(conn, sink, table, cols, spec.changed, sink.label, since, last_id, page_size)
+            pages += more
+    repaired = removed = 0
+    if verify and last_id:
+        repaired, removed, _ = verify_ranges(conn, sink, table, cols, sink.label, last_id, range_size, page_size)
+    return PullResult(table, new, changed, repaired, removed, pages, last_id)
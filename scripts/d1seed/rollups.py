@@ -0,0 +1,154 @@
+"""
+Activity rollups for the admin dashboards (migration 040).
+
+Each Rollup folds one activity table into a summary table keyed by day,
+the voter's county and districts and the row's method/outcome, plus the
+per-source all-time counts in activity_totals.  refresh_sql() is the
+statement file refresh_rollups.py sends: for every source it pins the
+current MAX(id) as pending_id, adds the rows between last_id and that
+mark, advances last_id and drops rows that went to zero.  voter_rollup
+is recounted only when voters' MAX(rowid) moved.
+
+recount() computes the same rollups from scratch on a connection and
+compare() lists every key where the two disagree, for the local
+correctness check.  The key expressions here must match the triggers in
+040_add_activity_rollups.sql and the Worker's tail queries.
+"""
+from collections import namedtuple
+
+# keys: [(column, expression over s = source row, v = its voter)]
+# totals: (method, outcome) expressions for activity_totals
+Rollup = namedtuple('Rollup', 'source table count keys totals')
+
+DAY = "COALESCE(date(s.created_at), '')"
+PLACE = [
+    ('county', "COALESCE(UPPER(TRIM(v.county)), '')"),
+    ('house', "COALESCE(TRIM(v.house), '')"),
+    ('senate', "COALESCE(TRIM(v.senate), '')"),
+]
+CALL_OUTCOME = "COALESCE(NULLIF(s.call_result, ''), s.outcome, '')"
+
+ROLLUPS = [
+    Rollup('voter_contacts', 'contact_rollup', 'contacts',
+           [('day', DAY)] + PLACE + [('method', "COALESCE(s.method, '')"), ('outcome', "COALESCE(s.outcome, '')")],
+           ("COALESCE(s.method, '')", "COALESCE(s.outcome, '')")),
+    Rollup('call_activity', 'call_rollup', 'calls', [('day', DAY)] + PLACE + [('outcome', CALL_OUTCOME)],
+           ("''", CALL_OUTCOME)),
+    Rollup('pulse_optins', 'pulse_rollup', 'optins',
+           [('day', DAY), ('contact_method', "COALESCE(s.contact_method, '')"),
+            ('consent_source', "COALESCE(s.consent_source, '')")],
+           ("COALESCE(s.contact_method, '')", "COALESCE(s.consent_source, '')")),
+]
+
+VOTER_KEYS = [(name, expr) for name, expr in PLACE]
+TABLES = [r.table for r in ROLLUPS] + ['activity_totals', 'voter_rollup']
+
+
+def _from(rollup, where=''):
+    join = 'LEFT JOIN voters v ON v.voter_id = s.voter_id' if any('v.' in e for _, e in rollup.keys) else ''
+    return f'FROM {rollup.source} s {join} {where}'.rstrip()
+
+
+def _state(source, column):
+    return f"(SELECT {column} FROM rollup_state WHERE source = '{source}')"
+
+
+def fold_sql(rollup):
+    """Statements adding `rollup.source` rows above the high-water mark."""
+    names = ', '.join(name for name, _ in rollup.keys)
+    exprs = ', '.join(expr for _, expr in rollup.keys)
+    groups = ', '.join(str(i + 1) for i in range(len(rollup.keys)))
+    where = (f"WHERE s.id > {_state(rollup.source, 'last_id')} "
+             f"AND s.id <= {_state(rollup.source, 'pending_id')}")
+    method, outcome = rollup.totals
+    return f"""
+UPDATE rollup_state SET pending_id = (SELECT COALESCE(MAX(id), 0) FROM {rollup.source})
+WHERE source = '{rollup.source}';
+INSERT INTO {rollup.table} ({names}, {rollup.count})
+SELECT {exprs}, COUNT(*)
+{_from(rollup, where)}
+GROUP BY {groups}
+ON CONFLICT ({names}) DO UPDATE SET {rollup.count} = {rollup.count} + excluded.{rollup.count};
+INSERT INTO activity_totals (source, method, outcome, n)
+SELECT '{rollup.source}', {method}, {outcome}, COUNT(*)
+FROM {rollup.source} s {where}
+GROUP BY 2, 3
+ON CONFLICT (source, method, outcome) DO UPDATE SET n = n + excluded.n;
+UPDATE rollup_state SET last_id = MAX(last_id, pending_id), pending_id = NULL, refreshed_at = datetime('now')
+WHERE source = '{rollup.source}';
+DELETE FROM {rollup.table} WHERE {rollup.count} = 0;
+"""
+
+
+def voters_sql():
+    """Recount voter_rollup when voters changed since the last refresh."""
+    names = ', '.join(name for name, _ in VOTER_KEYS)
+    exprs = ', '.join(expr for _, expr in VOTER_KEYS)
+    moved = f"{_state('voters', 'last_id')} <> (SELECT COALESCE(MAX(rowid), 0) FROM voters)"
+    return f"""
+DELETE FROM voter_rollup WHERE {moved};
+INSERT INTO voter_rollup ({names}, voters)
+SELECT {exprs}, COUNT(*) FROM voters v WHERE {moved} GROUP BY 1, 2, 3;
+UPDATE rollup_state SET last_id = (SELECT COALESCE(MAX(rowid), 0) FROM voters), refreshed_at = datetime('now')
+WHERE source = 'voters';
+"""
+
+
+def reset_sql():
+    """Empty every rollup and rewind the marks so the next fold starts over."""
+    return '\n'.join(f'DELETE FROM {table};' for table in TABLES) + """
+UPDATE rollup_state SET last_id = CASE WHEN source = 'voters' THEN -1 ELSE 0 END, pending_id = NULL;
+"""
+
+
+def refresh_sql(full=False):
+    """The whole refresh as one statement file; with full=True it rebuilds
+    the rollups from nothing."""
+    parts = [reset_sql()] if full else []
+    parts += [fold_sql(r) for r in ROLLUPS]
+    parts.append(voters_sql())
+    parts.append('DELETE FROM activity_totals WHERE n = 0;\n')
+    return ''.join(parts)
+
+
+def recount(conn):
+    """Full recounts as {table: {key tuple: count}}, straight from the sources."""
+    counts = {}
+    totals = {}
+    for r in ROLLUPS:
+        exprs = ', '.join(expr for _, expr in r.keys)
+        groups = ', '.join(str(i + 1) for i in range(len(r.keys)))
+        counts[r.table] = {tuple(row[:-1]): row[-1] for row in conn.execute(
+            f'SELECT {exprs}, COUNT(*) {_from(r)} GROUP BY {groups}')}
+        method, outcome = r.totals
+        for row in conn.execute(f'SELECT {method}, {outcome}, COUNT(*) FROM {r.source} s GROUP BY 1, 2'):
+            totals[(r.source, row[0], row[1])] = row[2]
+    counts['activity_totals'] = totals
+    exprs = ', '.join(expr for _, expr in VOTER_KEYS)
+    counts['voter_rollup'] = {tuple(row[:-1]): row[-1] for row in conn.execute(
+        f'SELECT {exprs}, COUNT(*) FROM voters v GROUP BY 1, 2, 3')}
+    return counts
+
+
+def stored(conn):
+    """The rollup tables as {table: {key tuple: count}}."""
+    keys = {r.table: ([name for name, _ in r.keys], r.count) for r in ROLLUPS}
+    keys['activity_totals'] = (['source', 'method', 'outcome'], 'n')
+    keys['voter_rollup'] = ([name for name, _ in VOTER_KEYS], 'voters')
+    counts = {}
+    for table, (names, count) in keys.items():
+        counts[table] = {tuple(row[:-1]): row[-1] for row in conn.execute(
+            f"SELECT {', '.join(names)}, {count} FROM {table} WHERE {count} <> 0")}
+    return counts
+
+
+def compare(conn):
+    """[(table, key, rollup count, recount)] for every key that differs."""
+    have, want = stored(conn), recount(conn)
+    diffs = []
+    for table in TABLES:
+        for key in sorted(set(have[table]) | set(want[table])):
+            got, expected = have[table].get(key, 0), want[table].get(key, 0)
+            if got != expected:
+                diffs.append((table, key, got, expected))
+    return diffs
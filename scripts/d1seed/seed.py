@@ -0,0 +1,145 @@
+"""
+Seeding helpers shared by the D1 seeding scripts.
+"""
+from . import telemetry
+from .adaptive import send_batches
+from .encode import MAX_STATEMENT_BYTES, encode_row, insert_head
+
+
+def find_source(conn, names, types=('table', 'view')):
+    """Return the first of `names` that exists in the local sqlite, or None.
+
+    Candidates are tried in the given order.
+    """
+    for name in names:
+        ph = ','.join('?' * len(types))
+        row = conn.execute(
+            f'SELECT name FROM sqlite_master WHERE type IN ({ph}) AND name = ?',
+            (*types, name),
+        ).fetchone()
+        if row:
+            return row[0]
+    return None
+
+
+def count_rows(conn, select_sql):
+    return conn.execute(f"SELECT COUNT(*) FROM ({select_sql.rstrip().rstrip(';')})").fetchone()[0]
+
+
+def iter_keyset(conn, select_sql, key='voter_id', key_index=0, after=None, page_size=10000, skip=None):
+    """Page through `select_sql` in `key` order with keyset pagination.
+
+    Each page is `WHERE key > last ORDER BY key LIMIT page_size`, which
+    SQLite answers from the key's index, so resuming deep into a table costs
+    the same as starting it.  Rows are yielded one at a time.
+
+    Keys need not be unique (voter_phones has a row per number).  Rows that
+    share a key are ordered by every column, which is the only tiebreaker a
+    view or query offers, and a page that ends inside such a group is
+    extended to its end, so `key > last` never skips part of a group.  With
+    `skip`, paging resumes inside the group of `after`: its first `skip`
+    rows in that order were already sent.  skip=None keeps the old resume,
+    strictly after `after`.
+
+    Rows with a NULL key are never yielded: they have no place in key
+    order (and no row to upsert on the sink); batch_insert reports them.
+    """
+    inner = select_sql.rstrip().rstrip(';')
+    ncols = len(conn.execute(f'SELECT * FROM ({inner}) LIMIT 0').description)
+    order = ', '.join([key] + [str(i + 1) for i in range(ncols)])
+    first_sql = f'SELECT * FROM ({inner}) WHERE {key} IS NOT NULL ORDER BY {order} LIMIT ?'
+    next_sql = f'SELECT * FROM ({inner}) WHERE {key} > ? ORDER BY {order} LIMIT ?'
+    rest_sql = f'SELECT * FROM ({inner}) WHERE {key} = ? ORDER BY {order} LIMIT -1 OFFSET ?'
+    log = telemetry.current()
+    if after is not None and skip:
+        with log.stage('fetch'):
+            rows = conn.execute(rest_sql, (after, skip)).fetchall()
+        yield from rows
+    while True:
+        with log.stage('fetch'):
+            if after is None:
+                rows = conn.execute(first_sql, (page_size,)).fetchall()
+            else:
+                rows = conn.execute(next_sql, (after, page_size)).fetchall()
+            last = rows[-1][key_index] if rows else None
+            if len(rows) == page_size:
+                tied = sum(1 for r in rows if r[key_index] == last)
+                rows += conn.execute(rest_sql, (last, tied)).fetchall()
+        if not rows:
+            return
+        yield from rows
+        after = last
+
+
+def batch_insert(conn, sink, table, cols, select_sql, batch_size=2000, max_bytes=MAX_STATEMENT_BYTES,
+                 key='voter_id', checkpoint=None, resume=False, controller=None, workers=1, in_flight=None):
+    """Stream `select_sql` from the local sqlite into `table` on `sink`.
+
+    Rows are paged in `key` order and cut into INSERT OR REPLACE statements
+    of at most `max_bytes`; `batch_size` only caps rows per batch.  With a
+    `checkpoint`, the last committed key is recorded after every batch the
+    sink confirms, and `resume=True` continues right after it.  With a
+    BatchController, statement sizes adapt to the sink and transient
+    failures are retried instead of aborting the run.  With `workers` > 1
+    the next statements are encoded while up to `workers` earlier ones
+    upload (d1seed.pipeline); checkpoints still advance in key order.
+    Returns the number of rows sent (including rows from a resumed run).
+    """
+    key_index = cols.index(key)
+    after = skip = None
+    done = 0
+    if checkpoint is not None:
+        entry = checkpoint.get(table) if resume else None
+        if entry and entry['source'] != select_sql:
+            print(f'Checkpoint for {table} was written for a different source query; starting over')
+            entry = None
+        if entry and entry['finished_at']:
+            print(f"{table} already completed at {entry['finished_at']} ({entry['rows']} rows); nothing to do.")
+            return entry['rows']
+        if entry:
+            after = entry['last_key']
+            skip = entry.get('last_key_rows')
+            done = entry['rows']
+            print(f"Resuming {table} after {key} {after!r} ({done} rows in {entry['batches']} batches already committed)")
+        else:
+            checkpoint.start(table, select_sql, key)
+
+    rows_all, total = conn.execute(
+        f"SELECT COUNT(*), COUNT({key}) FROM ({select_sql.rstrip().rstrip(';')})").fetchone()
+    print(f'Found {total} rows for {table}')
+    if rows_all > total:
+        print(f'  skipping {rows_all - total} rows without a {key}')
+    if total == 0:
+        print('Nothing to do.')
+        if checkpoint is not None:
+            checkpoint.finish(table)
+        return 0
+    sink.ensure_table(table, cols)
+    log = telemetry.current()
+    rows = iter_keyset(conn, select_sql, key=key, key_index=key_index, after=after, skip=skip)
+    items = log.timed('encode', ((encode_row(r), r[key_index]) for r in rows))
+    tied = skip or 0
+    for batch, carried in send_batches(sink, items, insert_head(table, cols), max_bytes, batch_size,
+                                       controller=controller, workers=workers, in_flight=in_flight):
+        # rows sent so far that share the batch's last key, so a resume
+        # can continue inside a group of repeated keys
+        run = next((i for i, (_, k) in enumerate(reversed(carried)) if k != batch.last_key), len(carried))
+        tied = run + tied if run == len(carried) and after == batch.last_key else run
+        after = batch.last_key
+        if checkpoint is not None:
+            with log.stage('checkpoint'):
+                checkpoint.commit(table, batch.last_key, batch.rows, batch.sql, last_key_rows=tied)
+        done += batch.rows
+        print(f'Inserted batch up to {done} / {total} ({batch.rows} rows, {len(batch.sql.encode("utf-8"))} bytes)')
+    if checkpoint is not None:
+        checkpoint.finish(table)
+    print(f'Done seeding {table}')
+    if controller is not None:
+        print(f'  [adaptive] {controller.summary()}')
+    return done
+
+
+def verify_counts(sink, table):
+    cnt = sink.count(table)
+    print(f'{sink.name} {table} count:', cnt)
+    return cnt
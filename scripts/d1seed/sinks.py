@@ -0,0 +1,325 @@
+"""
+Execution targets for seeding batches.
+
+Every sink exposes the same small interface:
+
+  execute(sql)              run one or more statements, raise SinkError on failure
+  query(sql)                run a read and return a list of dict rows
+  count(table)              SELECT COUNT(*) helper (None if it cannot be read)
+  ensure_table(table, cols) make sure the target can accept the insert
+  close()
+
+WranglerSink shells out to `wrangler d1 execute` (remote or --local);
+SqliteSink applies worker/db/migrations to a scratch sqlite3 database so
+seeding can be measured and tuned offline with no Cloudflare round-trips.
+FakeSink is a SqliteSink that also injects D1-like latency and failures, to
+exercise the adaptive batch controller without a network.  EmulatorSink is
+a WranglerSink pointed at scripts/d1_emulator.py, so the full wrangler path
+(temp files, one process per statement, output parsing) runs offline.
+
+All sinks can be called from several threads (d1seed.pipeline): wrangler
+runs as one process per call, and the sqlite sinks serialize on a lock.
+"""
+import json, os, random, sqlite3, subprocess, sys, tempfile, threading, time
+from pathlib import Path
+
+from . import telemetry
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+WORKER_DIR = REPO_ROOT / 'worker'
+MIGRATIONS_DIR = WORKER_DIR / 'db' / 'migrations'
+EMULATOR_SCRIPT = REPO_ROOT / 'scripts' / 'd1_emulator.py'
+
+
+class SinkError(RuntimeError):
+    """A batch or query failed on the sink."""
+
+    def __init__(self, message, returncode=None, output=''):
+        super().__init__(message)
+        self.returncode = returncode
+        self.output = output
+
+
+class Sink:
+    name = 'sink'
+    label = 'sink'  # names this target's checkpoint file
+
+    def execute(self, sql):
+        raise NotImplementedError
+
+    def query(self, sql):
+        raise NotImplementedError
+
+    def count(self, table):
+        try:
+            rows = self.query(f'SELECT COUNT(*) AS cnt FROM {table};')
+        except SinkError as e:
+            print('verify command failed', e.output or e)
+            return None
+        if not rows:
+            return None
+        return int(rows[0]['cnt'])
+
+    def ensure_table(self, table, cols):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class WranglerSink(Sink):
+    """Run SQL through `wrangler d1 execute`, against --remote or --local."""
+
+    def __init__(self, database='wy', remote=True, wrangler='wrangler', cwd=None, verbose=True):
+        self.database = database
+        self.remote = remote
+        self.wrangler = wrangler.split() if isinstance(wrangler, str) else list(wrangler)
+        self.cwd = str(cwd) if cwd else None
+        self.verbose = verbose
+        self.name = 'remote' if remote else 'local'
+        self.label = f'{self.name}-{database}'
+
+    def _cmd(self, *args):
+        return [*self.wrangler, 'd1', 'execute', self.database,
+                '--remote' if self.remote else '--local', *args]
+
+    def _run(self, cmd, echo):
+        if echo:
+            print('Running:', ' '.join(cmd))
+        res = subprocess.run(cmd, capture_output=True, text=True, cwd=self.cwd)
+        if echo:
+            print('Exit', res.returncode)
+            if res.stdout:
+                print(res.stdout)
+            if res.stderr:
+                print(res.stderr)
+        if res.returncode != 0:
+            raise SinkError('wrangler command failed', res.returncode, res.stdout + res.stderr)
+        return res
+
+    def execute_file(self, path):
+        self._run(self._cmd('--file', str(path)), self.verbose)
+
+    def execute(self, sql):
+        log = telemetry.current()
+        with log.stage('tempfile'):
+            fh, fname = tempfile.mkstemp(suffix='.sql', prefix='d1_')
+        try:
+            with log.stage('tempfile'):
+                with os.fdopen(fh, 'w', encoding='utf-8') as f:
+                    f.write(sql)
+            with log.stage('wrangler'):
+                self.execute_file(fname)
+        finally:
+            with log.stage('tempfile'):
+                os.remove(fname)
+
+    def query(self, sql):
+        res = self._run(self._cmd('--command', sql, '--json'), False)
+        try:
+            payload = json.loads(res.stdout)
+        except ValueError:
+            raise SinkError('could not parse wrangler --json output', res.returncode, res.stdout)
+        if isinstance(payload, dict):
+            payload = [payload]
+        return payload[-1].get('results', []) if payload else []
+
+
+class SqliteSink(Sink):
+    """Direct sqlite3 stand-in for D1.
+
+    The worker migrations are applied once (tracked in d1_migrations, like
+    wrangler does) so the scratch database has the same tables, views and
+    indexes the seeders target in production.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path=':memory:', migrations_dir=MIGRATIONS_DIR, apply_schema=True):
+        self.path = str(path)
+        self.label = 'sqlite-' + ('memory' if self.path == ':memory:' else Path(self.path).stem)
+        self.conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        if apply_schema:
+            self.apply_migrations(migrations_dir)
+
+    def applied_migrations(self):
+        row = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='d1_migrations'"
+        ).fetchone()
+        if not row:
+            return set()
+        return {r[0] for r in self.conn.execute('SELECT name FROM d1_migrations')}
+
+    def apply_migrations(self, migrations_dir=MIGRATIONS_DIR):
+        done = self.applied_migrations()
+        # Same definition as 002_create_system_tables.sql, created up front so
+        # 001 can be recorded too.
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS d1_migrations ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, '
+            'applied_at DATETIME DEFAULT CURRENT_TIMESTAMP)'
+        )
+        for path in sorted(Path(migrations_dir).glob('*.sql')):
+            if path.name in done:
+                continue
+            self.conn.executescript(path.read_text(encoding='utf-8'))
+            self.conn.execute('INSERT OR IGNORE INTO d1_migrations (name) VALUES (?)', (path.name,))
+
+    def execute(self, sql):
+        with self.lock:
+            try:
+                self.conn.executescript(sql)
+            except sqlite3.Error as e:
+                if self.conn.in_transaction:
+                    self.conn.execute('ROLLBACK')
+                raise SinkError(str(e), output=str(e))
+
+    def query(self, sql):
+        with self.lock:
+            try:
+                return [dict(r) for r in self.conn.execute(sql)]
+            except sqlite3.Error as e:
+                raise SinkError(str(e), output=str(e))
+
+    def ensure_table(self, table, cols):
+        # Remote D1 carries drift the migration chain does not: there
+        # v_voters_addr_norm / v_best_phone are plain tables the seeders
+        # write to.  Materialize a view target as a table keyed on the first
+        # column, and add any columns the batch needs but the schema lacks.
+        row = self.conn.execute(
+            'SELECT type FROM sqlite_master WHERE name = ?', (table,)
+        ).fetchone()
+        if row is None or row[0] == 'view':
+            if row is not None:
+                self.conn.execute(f'DROP VIEW {table}')
+            defs = [f'{cols[0]} TEXT PRIMARY KEY'] + list(cols[1:])
+            self.conn.execute(f"CREATE TABLE {table} ({', '.join(defs)})")
+            return
+        have = {r[1] for r in self.conn.execute(f'PRAGMA table_info({table})')}
+        for col in cols:
+            if col not in have:
+                self.conn.execute(f'ALTER TABLE {table} ADD COLUMN {col}')
+
+    def close(self):
+        self.conn.close()
+
+
+class FakeSink(SqliteSink):
+    """SqliteSink with a simulated D1 in front of it.
+
+    Each execute() sleeps `latency + bytes / bandwidth` seconds (with some
+    jitter), fails like D1 does for statements over `limit` bytes, and fails
+    transiently with probability `fail_rate`.  Statements that get through
+    are applied to the scratch database, so counts can still be verified.
+    """
+
+    name = 'fake'
+
+    TRANSIENT_ERRORS = (
+        'D1_ERROR: Network connection lost.',
+        'fetch failed: ECONNRESET',
+        'D1_ERROR: 503 Service Unavailable',
+        'Request timed out',
+    )
+
+    def __init__(self, path=':memory:', latency=0.3, bandwidth=250_000, limit=100_000,
+                 fail_rate=0.05, seed=None, sleep=time.sleep, **kwargs):
+        super().__init__(path, **kwargs)
+        self.label = 'fake-' + self.label.split('-', 1)[1]
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.limit = limit
+        self.fail_rate = fail_rate
+        self.random = random.Random(seed)
+        self.sleep = sleep
+        self.calls = 0
+        self.failures = 0
+
+    def execute(self, sql):
+        size = len(sql.encode('utf-8'))
+        with self.lock:
+            self.calls += 1
+            delay = (self.latency + size / self.bandwidth) * self.random.uniform(0.8, 1.25)
+            fail = self.random.random() < self.fail_rate
+            fail_after = delay * self.random.random()
+            error = self.random.choice(self.TRANSIENT_ERRORS)
+        # The simulated round trip happens outside the lock, so concurrent
+        # callers overlap their latency the way parallel uploads to D1 do.
+        if size > self.limit:
+            self.sleep(self.latency)
+            self.failures += 1
+            raise SinkError('statement too long', 1,
+                            f'D1_ERROR: statement too long: SQLITE_TOOBIG ({size} bytes)')
+        if fail:
+            self.sleep(fail_after)
+            self.failures += 1
+            raise SinkError('wrangler command failed', 1, error)
+        self.sleep(delay)
+        super().execute(sql)
+
+
+class EmulatorSink(WranglerSink):
+    """WranglerSink running scripts/d1_emulator.py in place of wrangler.
+
+    `path` is the emulated database (migrated here once, before any upload
+    worker starts a process; view targets are turned into tables by
+    ensure_table, as SqliteSink does); latency, bandwidth, fail_rate, limit and seed
+    are passed to every call like FakeSink's.
+    """
+
+    def __init__(self, path, database='wy', latency=0.3, bandwidth=250_000, limit=100_000, fail_rate=0.05,
+                 seed=None, verbose=True):
+        from .emulator import Emulator
+        Emulator(path).close()
+        cmd = [sys.executable, str(EMULATOR_SCRIPT), '--db', str(path), '--latency', str(latency),
+               '--bandwidth', str(bandwidth), '--limit', str(limit), '--fail-rate', str(fail_rate)]
+        if seed is not None:
+            cmd += ['--seed', str(seed)]
+        super().__init__(database, remote=True, wrangler=cmd, verbose=verbose)
+        self.path = Path(path)
+        self.name = 'emulator'
+        self.label = f'emulator-{self.path.stem}'
+
+    def ensure_table(self, table, cols):
+        # Same drift as SqliteSink: on remote D1 the view targets are plain
+        # tables, so materialize them in the emulated database too.
+        sink = SqliteSink(self.path, apply_schema=False)
+        try:
+            sink.ensure_table(table, cols)
+        finally:
+            sink.close()
+
+
+SINK_CHOICES = ('remote', 'local', 'sqlite', 'fake', 'emulator')
+
+
+def make_sink(kind, database=None, sqlite_path=None, wrangler='wrangler', verbose=True, fake=None):
+    """Build a sink by name: 'remote', 'local', 'sqlite', 'fake' or 'emulator'.
+
+    `fake` holds keyword arguments for FakeSink and EmulatorSink (latency,
+    fail_rate, seed, ...).  The emulator's database is `sqlite_path`, or
+    .d1_emulator/<database>.sqlite.
+    """
+    if kind == 'remote':
+        return WranglerSink(database or 'wy', remote=True, wrangler=wrangler, verbose=verbose)
+    if kind == 'local':
+        # Local D1 state lives under worker/.wrangler, keyed by wrangler.toml.
+        return WranglerSink(database or 'wy_local', remote=False, wrangler=wrangler,
+                            cwd=WORKER_DIR, verbose=verbose)
+    if kind == 'sqlite':
+        return SqliteSink(sqlite_path or ':memory:')
+    if kind == 'fake':
+        return FakeSink(sqlite_path or ':memory:', **(fake or {}))
+    if kind == 'emulator':
+        database = database or 'wy'
+        path = sqlite_path or REPO_ROOT / '.d1_emulator' / f'{database}.sqlite'
+        return EmulatorSink(path, database, verbose=verbose, **(fake or {}))
+    raise ValueError(f'unknown sink {kind!r} (expected one of {", ".join(SINK_CHOICES)})')
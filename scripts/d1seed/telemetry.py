@@ -0,0 +1,288 @@
+"""
+Structured throughput events and opt-in profiling for the seeding tools.
+
+With --events PATH ('-' for stderr) every run appends JSON lines, one
+object per line, each with "ts", "event" and "tool":
+
+  run_start  argv and the tool's settings
+  batch      one per statement the sink confirmed: table, op, rows, bytes,
+             seconds per stage (fetch_s, encode_s, pack_s, upload_s, which
+             wrangler sinks split into tempfile_s and wrangler_s, backoff_s,
+             checkpoint_s, other_s for everything unattributed), wall_s,
+             retries, splits, rows_per_s and mb_per_s
+  table      totals for one send_batches() run (a table, or one op of a
+             delta sync)
+  summary    last line of every run, also written when it fails: totals,
+             each stage's seconds and share of the wall time, and the
+             stage that took longest
+
+Stage times are exclusive: time spent fetching rows while the encoder
+waits for them is charged to fetch, not encode.  Stages are only timed
+with --events, so the default path (and a --profile run) is unchanged.
+
+--profile DIR runs the tool under cProfile and tracemalloc and writes
+profile.pstats (for `python -m pstats` or snakeviz), profile.txt (top
+functions by cumulative and by internal time) and tracemalloc.txt (peak
+traced memory, top allocation sites overall and inside d1seed/encode.py).
+Profiling slows the run down; compare its numbers with each other, not
+with an unprofiled run.
+"""
+import cProfile, io, json, pstats, sys, threading, time, tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+# Stages that make up a batch's upload; upload_s in events is their sum.
+UPLOAD_STAGES = ('upload', 'tempfile', 'wrangler')
+
+
+class EventLog:
+    """JSON-lines event writer plus the per-stage clock the seeders charge."""
+
+    def __init__(self, path=None, tool=None, clock=time.perf_counter):
+        self.tool = tool or Path(sys.argv[0]).stem
+        self.clock = clock
+        self.fh = None
+        self.path = path
+        if path == '-':
+            self.fh = sys.stderr
+        elif path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.fh = open(path, 'a', encoding='utf-8')
+        self.timing = False
+        self.thread = threading.get_ident()  # stages are only timed on this thread
+        self.profiler = None
+        self.started = clock()
+        self.reset_totals()
+
+    def reset_totals(self):
+        self.totals = {'batches': 0, 'rows': 0, 'bytes': 0, 'retries': 0, 'splits': 0}
+        self.seconds = {}  # run totals per stage
+        self.pending = {}  # per stage since the last batch event
+        self.counts = {}
+        self.stack = []
+        self.mark = self.clock()
+        self.last_batch = self.mark
+
+    @property
+    def enabled(self):
+        return self.fh is not None
+
+    def emit(self, event, **fields):
+        if self.fh is None:
+            return
+        record = {'ts': round(time.time(), 3), 'event': event, 'tool': self.tool, **fields}
+        self.fh.write(json.dumps(record, default=str) + '\n')
+        self.fh.flush()
+
+    # -- stage clock -------------------------------------------------------
+
+    def _charge(self, now):
+        if self.stack:
+            name = self.stack[-1]
+            self.pending[name] = self.pending.get(name, 0.0) + now - self.mark
+        self.mark = now
+
+    def enter(self, name):
+        self._charge(self.clock())
+        self.stack.append(name)
+
+    def leave(self):
+        self._charge(self.clock())
+        self.stack.pop()
+
+    @contextmanager
+    def _stage(self, name):
+        self.enter(name)
+        try:
+            yield
+        finally:
+            self.leave()
+
+    def stage(self, name):
+        """Context manager charging its body to `name` (a no-op when off)."""
+        return self._stage(name) if self.timing and threading.get_ident() == self.thread else nullcontext()
+
+    def _timed(self, name, iterable):
+        it = iter(iterable)
+        while True:
+            self.enter(name)
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                self.leave()
+            yield item
+
+    def timed(self, name, iterable):
+        """Iterate `iterable`, charging the time spent in next() to `name`."""
+        return self._timed(name, iterable) if self.timing else iterable
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    # -- events ------------------------------------------------------------
+
+    def begin(self):
+        """Start the next batch's clock here, so work done before a table's
+        first statement (builds, counts) is not charged to that batch."""
+        now = self.clock()
+        self._charge(now)
+        for name, secs in self.pending.items():
+            self.seconds[name] = self.seconds.get(name, 0.0) + secs
+        self.pending = {}
+        self.last_batch = now
+
+    def batch(self, table, op, rows, nbytes, **extra):
+        """Emit a batch event for everything charged since the previous one.
+
+        `upload_s` reports an upload timed on another thread (pipelined
+        sends); it overlaps the other stages, so it is not part of other_s.
+        """
+        now = self.clock()
+        self._charge(now)
+        wall = max(now - self.last_batch, 1e-9)
+        self.last_batch = now
+        stages, self.pending = self.pending, {}
+        counts, self.counts = self.counts, {}
+        other = max(0.0, wall - sum(stages.values()))
+        upload = extra.pop('upload_s', None)
+        if upload is not None:
+            stages['upload'] = stages.get('upload', 0.0) + upload
+        for name, secs in stages.items():
+            self.seconds[name] = self.seconds.get(name, 0.0) + secs
+        self.totals['batches'] += 1
+        self.totals['rows'] += rows
+        self.totals['bytes'] += nbytes
+        self.totals['retries'] += counts.get('retries', 0)
+        self.totals['splits'] += counts.get('splits', 0)
+        if self.profiler is not None:
+            self.profiler.sample()
+        if not self.enabled:
+            return
+        fields = {f'{name}_s': round(secs, 6) for name, secs in sorted(stages.items())}
+        fields['upload_s'] = round(sum(stages.get(s, 0.0) for s in UPLOAD_STAGES), 6)
+        fields['other_s'] = round(other, 6)
+        self.emit('batch', table=table, op=op, rows=rows, bytes=nbytes, **fields, wall_s=round(wall, 6),
+                  retries=counts.get('retries', 0), splits=counts.get('splits', 0),
+                  rows_per_s=round(rows / wall, 1), mb_per_s=round(nbytes / wall / 1e6, 3), **extra)
+
+    def summary(self, status='ok', **extra):
+        self._charge(self.clock())
+        for name, secs in self.pending.items():
+            self.seconds[name] = self.seconds.get(name, 0.0) + secs
+        self.pending = {}
+        wall = max(self.clock() - self.started, 1e-9)
+        stages = {name: {'seconds': round(secs, 3), 'share': round(secs / wall, 4)}
+                  for name, secs in sorted(self.seconds.items(), key=lambda kv: -kv[1])}
+        upload = sum(self.seconds.get(s, 0.0) for s in UPLOAD_STAGES)
+        t = self.totals
+        self.emit('summary', status=status, wall_s=round(wall, 3), **t,
+                  rows_per_s=round(t['rows'] / wall, 1), mb_per_s=round(t['bytes'] / wall / 1e6, 3),
+                  upload_s=round(upload, 3), stages=stages,
+                  slowest_stage=next(iter(stages), None), **extra)
+
+    def close(self):
+        if self.fh is not None and self.fh is not sys.stderr:
+            self.fh.close()
+        self.fh = None
+
+
+# The log every d1seed module reports to; replaced for the length of run().
+log = EventLog()
+
+
+class Profiler:
+    """cProfile + tracemalloc over a run, written to `out_dir` on stop().
+
+    Batch buffers are garbage by the end of a run, so the allocation report
+    comes from the snapshot taken at the batch with the most traced memory
+    (sample() is called as each batch is confirmed, while its rows and SQL
+    are still alive).
+    """
+
+    def __init__(self, out_dir, frames=10, top=40):
+        self.out_dir = Path(out_dir)
+        self.frames = frames
+        self.top = top
+        self.profile = None
+        self.snapshot = None
+        self.snapshot_bytes = 0
+
+    def start(self):
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        tracemalloc.start(self.frames)
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def sample(self):
+        current = tracemalloc.get_traced_memory()[0]
+        if current > self.snapshot_bytes:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.snapshot_bytes = current
+
+    def stop(self):
+        self.profile.disable()
+        self.sample()
+        snapshot = self.snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.profile.dump_stats(str(self.out_dir / 'profile.pstats'))
+        text = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=text).strip_dirs()
+        for order in ('cumulative', 'tottime'):
+            text.write(f'--- top {self.top} by {order} ---\n')
+            stats.sort_stats(order).print_stats(self.top)
+        (self.out_dir / 'profile.txt').write_text(text.getvalue(), encoding='utf-8')
+
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                           tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')])
+        lines = [f'peak {peak} bytes; snapshot at {self.snapshot_bytes} bytes traced', '',
+                 f'--- top {self.top} allocation sites ---']
+        lines += [str(s) for s in snapshot.statistics('lineno')[:self.top]]
+        encode = snapshot.filter_traces([tracemalloc.Filter(True, '*/d1seed/encode.py')])
+        lines += ['', '--- encode path (d1seed/encode.py) by traceback ---']
+        for s in encode.statistics('traceback')[:10]:
+            lines.append(str(s))
+            lines += ['    ' + line for line in s.traceback.format()]
+        (self.out_dir / 'tracemalloc.txt').write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        return {'profile_dir': str(self.out_dir), 'peak_traced_bytes': peak}
+
+
+@contextmanager
+def run(events=None, profile=None, tool=None, **settings):
+    """Instrument the body: a run_start event, the shared `log` timing every
+    stage, and a summary event ('failed' or 'interrupted' when it raises)."""
+    global log
+    previous = log
+    log = EventLog(events, tool)
+    log.timing = bool(events)
+    log.emit('run_start', argv=sys.argv[1:], **settings)
+    profiler = log.profiler = Profiler(profile) if profile else None
+    if profiler:
+        profiler.start()
+    status, extra = 'ok', {}
+    try:
+        yield log
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            status, extra['error'] = 'failed', str(e.code)
+        raise
+    except KeyboardInterrupt:
+        status = 'interrupted'
+        raise
+    except BaseException as e:
+        status, extra['error'] = 'failed', f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        if profiler:
+            extra.update(profiler.stop())
+            print(f"Profile written to {extra['profile_dir']}")
+        log.summary(status, **extra)
+        log.close()
+        log = previous
+
+
+def current():
+    return log
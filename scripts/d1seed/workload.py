@@ -0,0 +1,465 @@
+"""
+The Worker's hot D1 query shapes, replayable against a sqlite stand-in.
+
+Each Query carries the SQL as worker/src builds it for the common case
+(best_phone as the phone table, voters_addr_norm as the address table)
+and a params(sample, rnd) function that fills it in from a sampled voter,
+so parameters follow the data: busy towns and long streets are probed in
+proportion to the voters living there.  Keep the SQL in step with the
+route when a query changes; the names here are what benchmark JSON and
+plan baselines are keyed on.
+
+  QUERIES             - the catalog, in route order
+  ParamPool           - deterministic random voters to draw parameters from
+  explain(conn, ...)  - EXPLAIN QUERY PLAN as indented lines
+  run_query(...)      - latency samples, rows returned and VM steps
+"""
+import random, time
+from collections import namedtuple
+
+from .names import fts_match, name_key
+
+# requires: tables that must have rows for the query to be meaningful
+Query = namedtuple('Query', 'name route sql params requires')
+
+HOUSE_NUMBER = "TRIM(SUBSTR(va.addr_raw, 1, INSTR(va.addr_raw || ' ', ' ') - 1))"
+PHONE = "NULLIF(bp.phone_e164, '')"
+
+CANVASS_SELECT = f"""
+SELECT v.voter_id,
+       COALESCE(va.fn, '') AS first_name,
+       COALESCE(va.ln, '') AS last_name,
+       COALESCE(va.addr1, '') AS address,
+       COALESCE(va.city, '') AS city,
+       COALESCE(va.zip, '') AS zip,
+       v.county,
+       v.political_party AS party,
+       COALESCE({PHONE}, '') AS phone_e164,
+       bp.confidence_code AS phone_confidence,
+       COALESCE(va.house, v.house, '') AS house_district,
+       COALESCE(va.senate, v.senate, '') AS senate_district
+"""
+
+CANVASS_SORT_SQL = CANVASS_SELECT + f"""
+FROM voters v
+LEFT JOIN voters_addr_norm va ON v.voter_id = va.voter_id
+LEFT JOIN best_phone bp ON v.voter_id = bp.voter_id
+WHERE 1 = 1 AND va.street_index_id = ?1 AND va.addr_raw IS NOT NULL AND va.addr_raw != ''
+ORDER BY CASE WHEN CAST({HOUSE_NUMBER} AS INTEGER) IS NULL THEN 1 ELSE 0 END,
+         ABS(CAST({HOUSE_NUMBER} AS INTEGER) - ?2) ASC, CAST({HOUSE_NUMBER} AS INTEGER) ASC, v.voter_id
+LIMIT ?3
+"""
+
+CANVASS_HOUSE_ORDER_SQL = """
+WITH anchor AS (
+  SELECT s.parity,
+         COALESCE(
+           (SELECT a.position FROM street_house_order a
+             WHERE a.streets_index_id = ?1 AND a.parity = s.parity AND a.house_number >= ?2
+             ORDER BY a.house_number, a.position LIMIT 1),
+           (SELECT a.position FROM street_house_order a
+             WHERE a.streets_index_id = ?1 AND a.parity = s.parity
+             ORDER BY a.position DESC LIMIT 1)) AS pos
+  FROM (SELECT 0 AS parity UNION ALL SELECT 1) s
+),
+doors AS (
+  SELECT o.voter_id, o.house_number
+  FROM anchor
+  JOIN street_house_order o
+    ON o.streets_index_id = ?1 AND o.parity = anchor.parity
+   AND o.position BETWEEN anchor.pos - ?3 AND anchor.pos + ?3
+)""" + CANVASS_SELECT + """
+FROM doors d JOIN voters v ON v.voter_id = d.voter_id
+LEFT JOIN voters_addr_norm va ON v.voter_id = va.voter_id
+LEFT JOIN best_phone bp ON v.voter_id = bp.voter_id
+WHERE 1 = 1
+ORDER BY ABS(d.house_number - ?2) ASC, d.house_number ASC, v.voter_id LIMIT ?4
+"""
+
+CANVASS_STREET_NAME_SQL = CANVASS_SELECT + f"""
+FROM voters v
+LEFT JOIN voters_addr_norm va ON v.voter_id = va.voter_id
+LEFT JOIN best_phone bp ON v.voter_id = bp.voter_id
+WHERE 1 = 1 AND UPPER(va.addr1) LIKE '%' || ?1 || '%' AND v.county = ?2 AND va.city = ?3
+  AND va.addr_raw IS NOT NULL AND va.addr_raw != ''
+ORDER BY CASE WHEN CAST({HOUSE_NUMBER} AS INTEGER) IS NULL THEN 1 ELSE 0 END,
+         ABS(CAST({HOUSE_NUMBER} AS INTEGER) - ?4) ASC, CAST({HOUSE_NUMBER} AS INTEGER) ASC, v.voter_id
+LIMIT ?5
+"""
+
+STREETS_SQL = """
+SELECT si.id, si.street_canonical AS street_name
+FROM streets_index si
+JOIN wy_city_county cc ON si.city_county_id = cc.id
+WHERE cc.county = ? AND cc.city = ?
+ORDER BY si.street_canonical
+"""
+
+DISTRICT_COVERAGE_SQL = """
+SELECT DISTINCT cc.id
+FROM district_coverage dc
+JOIN wy_city_county cc
+  ON cc.county = dc.county
+ AND (dc.city = '' OR cc.city = dc.city)
+WHERE dc.district_type = ?1 AND dc.district_code = ?2
+"""
+
+DISTRICT_FALLBACK_SQL = """
+SELECT DISTINCT cc.id
+FROM voters_addr_norm va
+JOIN voters v ON v.voter_id = va.voter_id
+JOIN wy_city_county cc
+  ON cc.county = UPPER(TRIM(v.county))
+ AND cc.city = UPPER(TRIM(COALESCE(va.city, '')))
+WHERE CASE
+    WHEN TRIM(va.house) GLOB '[0-9]*' AND TRIM(va.house) <> ''
+      THEN printf('%02d', CAST(TRIM(va.house) AS INTEGER))
+    ELSE UPPER(TRIM(va.house))
+  END = ?1
+"""
+
+HOUSES_SQL = f"""
+SELECT DISTINCT
+  {HOUSE_NUMBER} AS house_number,
+  COUNT(*) OVER (PARTITION BY {HOUSE_NUMBER}) AS voter_count
+FROM voters_addr_norm va
+JOIN wy_city_county cc ON va.city_county_id = cc.id
+WHERE cc.county = ? AND cc.city = ?
+  AND va.street_index_id = ?
+  AND va.addr_raw IS NOT NULL
+ORDER BY CAST(house_number AS NUMERIC) ASC, house_number ASC
+"""
+
+SEARCH_NAMES_SQL = """
+SELECT
+  v.voter_id,
+  a.fn as first_name,
+  a.ln as last_name,
+  a.addr1,
+  a.city,
+  v.county,
+  a.zip,
+  v.political_party,
+  p.phone_e164,
+  CASE
+    WHEN UPPER(a.ln) = UPPER(?) AND UPPER(a.fn) = UPPER(?) THEN 100
+    WHEN UPPER(a.ln) = UPPER(?) AND UPPER(SUBSTR(a.fn, 1, 1)) = UPPER(SUBSTR(?, 1, 1)) THEN 80
+    WHEN UPPER(a.ln) = UPPER(?) THEN 60
+    WHEN UPPER(a.fn) = UPPER(?) AND UPPER(a.ln) LIKE UPPER(?) || '%' THEN 70
+    ELSE 40
+  END as match_score
+FROM voters v
+JOIN voters_addr_norm a ON v.voter_id = a.voter_id
+LEFT JOIN best_phone p ON v.voter_id = p.voter_id
+WHERE v.county = ? AND a.city = ? AND (UPPER(a.ln) LIKE UPPER(?) || '%' OR UPPER(a.ln) LIKE '%' || UPPER(?) || '%')
+  AND UPPER(a.fn) LIKE UPPER(?) || '%'
+ORDER BY match_score DESC, a.ln, a.fn
+LIMIT 25
+"""
+
+# The same lookup through the name index (migration 038): ?1 is the FTS5
+# MATCH expression (d1seed.names.fts_match), ?2/?3 the normalized last and
+# first name, ?4 the city to rank first.
+SEARCH_NAMES_FTS_SQL = """
+SELECT
+  v.voter_id,
+  a.fn as first_name,
+  a.ln as last_name,
+  a.addr1,
+  a.city,
+  v.county,
+  a.zip,
+  v.political_party,
+  p.phone_e164,
+  m.match_score,
+  m.same_city
+FROM (
+  SELECT s.voter_id, s.ln_norm, s.fn_norm,
+    CASE
+      WHEN s.ln_norm = ?2 AND s.fn_norm = ?3 THEN 100
+      WHEN s.ln_norm = ?2 AND SUBSTR(s.fn_norm, 1, 1) = SUBSTR(?3, 1, 1) THEN 80
+      WHEN s.ln_norm = ?2 THEN 60
+      WHEN s.fn_norm = ?3 AND s.ln_norm LIKE ?2 || '%' THEN 70
+      ELSE 40
+    END as match_score,
+    COALESCE(s.city = ?4, 0) as same_city
+  FROM voter_name_fts
+  JOIN voter_name_search s ON s.rowid = voter_name_fts.rowid
+  WHERE voter_name_fts MATCH ?1
+  ORDER BY match_score DESC, same_city DESC, s.ln_norm, s.fn_norm
+  LIMIT 25
+) m
+JOIN voters v ON v.voter_id = m.voter_id
+JOIN voters_addr_norm a ON a.voter_id = m.voter_id
+LEFT JOIN best_phone p ON p.voter_id = m.voter_id
+ORDER BY m.match_score DESC, m.same_city DESC, m.ln_norm, m.fn_norm
+"""
+
+STATS_VOTERS_SQL = 'SELECT COUNT(*) as count FROM voters'
+STATS_CONTACTS_SQL = 'SELECT COUNT(*) as count FROM voter_contacts'
+STATS_METHOD_SQL = """
+SELECT method as method, COUNT(*) as count
+FROM voter_contacts
+WHERE method IS NOT NULL
+GROUP BY method
+"""
+STATS_OUTCOME_SQL = """
+SELECT outcome, COUNT(*) as count
+FROM voter_contacts
+WHERE outcome IS NOT NULL
+GROUP BY outcome
+ORDER BY count DESC
+"""
+
+# The same answers from the rollups (migration 040): all-time counts from
+# activity_totals plus the contacts above the high-water mark, which a
+# rowid range reads.  Methods and outcomes stored as '' are left out.
+CONTACTS_TAIL = "FROM voter_contacts WHERE id > (SELECT last_id FROM rollup_state WHERE source = 'voter_contacts')"
+STATS_ROLLUP_VOTERS_SQL = 'SELECT COALESCE(SUM(voters), 0) as count FROM voter_rollup'
+STATS_ROLLUP_CONTACTS_SQL = f"""
+SELECT (SELECT COALESCE(SUM(n), 0) FROM activity_totals WHERE source = 'voter_contacts')
+     + (SELECT COUNT(*) {CONTACTS_TAIL}) as count
+"""
+STATS_ROLLUP_METHOD_SQL = f"""
+SELECT method, SUM(n) as count
+FROM (SELECT method, n FROM activity_totals WHERE source = 'voter_contacts'
+      UNION ALL SELECT COALESCE(method, ''), 1 {CONTACTS_TAIL})
+WHERE method <> ''
+GROUP BY method
+HAVING SUM(n) > 0
+"""
+STATS_ROLLUP_OUTCOME_SQL = f"""
+SELECT outcome, SUM(n) as count
+FROM (SELECT outcome, n FROM activity_totals WHERE source = 'voter_contacts'
+      UNION ALL SELECT COALESCE(outcome, ''), 1 {CONTACTS_TAIL})
+WHERE outcome <> ''
+GROUP BY outcome
+HAVING SUM(n) > 0
+ORDER BY count DESC
+"""
+PULSE_TOTAL_SQL = 'SELECT COUNT(*) as count FROM pulse_optins'
+PULSE_ROLLUP_TOTAL_SQL = """
+SELECT (SELECT COALESCE(SUM(n), 0) FROM activity_totals WHERE source = 'pulse_optins')
+     + (SELECT COUNT(*) FROM pulse_optins
+        WHERE id > (SELECT last_id FROM rollup_state WHERE source = 'pulse_optins')) as count
+"""
+
+NEARBY_STREET_SQL = """
+SELECT si.id FROM streets_index si
+JOIN wy_city_county cc ON si.city_county_id = cc.id
+WHERE UPPER(si.street_canonical) = UPPER(?1)
+  AND UPPER(cc.city) = UPPER(?2)
+LIMIT 1
+"""
+
+NEARBY_VOTERS_SQL = f"""
+SELECT v.voter_id,
+       COALESCE(va.fn, '') AS first_name,
+       COALESCE(va.ln, '') AS last_name,
+       COALESCE(va.addr1, '') AS address,
+       COALESCE(va.city, '') AS city,
+       COALESCE(va.zip, '') AS zip,
+       {PHONE} AS phone_e164
+FROM voters v
+LEFT JOIN voters_addr_norm va ON v.voter_id = va.voter_id
+LEFT JOIN best_phone bp ON v.voter_id = bp.voter_id
+WHERE va.street_index_id = ?1
+ORDER BY CASE WHEN {PHONE} IS NULL THEN 1 ELSE 0 END ASC, va.addr1 ASC
+LIMIT 50
+"""
+
+CALL_SELECT = f"""
+SELECT v.voter_id,
+       COALESCE(va.fn, '') AS first_name,
+       COALESCE(va.ln, '') AS last_name,
+       COALESCE({PHONE}, '') AS phone_1,
+       '' AS phone_2,
+       v.county,
+       COALESCE(va.city, '') AS city,
+       v.political_party,
+       COALESCE(va.house, v.house, '') AS house_district,
+       COALESCE(va.senate, v.senate, '') AS senate_district
+FROM voters v
+LEFT JOIN voters_addr_norm va ON v.voter_id = va.voter_id
+LEFT JOIN best_phone bp ON v.voter_id = bp.voter_id
+LEFT JOIN voter_contacts vc ON v.voter_id = vc.voter_id
+"""
+
+CALL_SCAN_SQL = CALL_SELECT + f"""
+WHERE 1 = 1 AND vc.voter_id IS NULL AND v.county = ?1 AND {PHONE} IS NOT NULL
+ORDER BY RANDOM() LIMIT 1
+"""
+
+CALL_QUEUE_POP_SQL = """
+SELECT q.voter_id, q.priority FROM call_queue q WHERE q.queue = ?1
+  AND (q.reason = 'followup' OR NOT EXISTS (SELECT 1 FROM voter_contacts vc WHERE vc.voter_id = q.voter_id))
+  AND NOT EXISTS (SELECT 1 FROM call_activity ca WHERE ca.voter_id = q.voter_id AND ca.created_at >= q.built_at)
+ORDER BY q.priority, q.voter_id LIMIT 25
+"""
+
+
+def _limit(rnd):
+    # the canvass UI asks for 20 almost always, 50 on "show more"
+    return 50 if rnd.random() < 0.1 else 20
+
+
+def _prefix(name, rnd):
+    # people type 3-6 letters of a surname before the search fires
+    return name[:rnd.randint(3, 6)] if name else 'SMI'
+
+
+def _name_search_fts(s, rnd):
+    ln, fn = _prefix(s['ln'], rnd), (s['fn'] or '')[:rnd.randint(0, 3)]
+    return (fts_match(ln, fn, s['county']), name_key(ln), name_key(fn) or '', s['city'])
+
+
+def _district(value):
+    value = (value or '').strip()
+    return '%02d' % int(value) if value.isdigit() else value.upper()
+
+
+QUERIES = [
+    Query('canvass_nearby_sort', '/canvass/nearby', CANVASS_SORT_SQL,
+          lambda s, rnd: (s['street_index_id'], s['house_number'], _limit(rnd)), ('voters_addr_norm',)),
+    Query('canvass_nearby_house_order', '/canvass/nearby', CANVASS_HOUSE_ORDER_SQL,
+          lambda s, rnd: (s['street_index_id'], s['house_number'], 20, _limit(rnd)), ('street_house_order',)),
+    Query('canvass_nearby_street_name', '/canvass/nearby', CANVASS_STREET_NAME_SQL,
+          lambda s, rnd: (s['street_canonical'], s['county'], s['city'], s['house_number'], _limit(rnd)),
+          ('voters_addr_norm',)),
+    Query('streets', '/streets', STREETS_SQL, lambda s, rnd: (s['county'], s['city']), ('streets_index',)),
+    Query('region_district_coverage', '/streets', DISTRICT_COVERAGE_SQL,
+          lambda s, rnd: ('house', _district(s['house'])), ('district_coverage',)),
+    Query('region_district_fallback', '/streets', DISTRICT_FALLBACK_SQL,
+          lambda s, rnd: (_district(s['house']),), ('voters_addr_norm',)),
+    Query('houses', '/houses', HOUSES_SQL,
+          lambda s, rnd: (s['county'], s['city'], s['street_index_id']), ('voters_addr_norm',)),
+    Query('search_names', '/contact-form/search-names', SEARCH_NAMES_SQL,
+          lambda s, rnd: (lambda ln, fn: (ln, fn, ln, fn, ln, fn, ln, s['county'], s['city'], ln, ln, fn))(
+              _prefix(s['ln'], rnd), (s['fn'] or '')[:rnd.randint(0, 3)]), ('voters_addr_norm',)),
+    Query('search_names_fts', '/contact-form/search-names', SEARCH_NAMES_FTS_SQL, _name_search_fts,
+          ('voter_name_search',)),
+    Query('admin_stats_voters', '/admin/stats', STATS_VOTERS_SQL, lambda s, rnd: (), ('voters',)),
+    Query('admin_stats_contacts', '/admin/stats', STATS_CONTACTS_SQL, lambda s, rnd: (), ('voter_contacts',)),
+    Query('admin_stats_by_method', '/admin/stats', STATS_METHOD_SQL, lambda s, rnd: (), ('voter_contacts',)),
+    Query('admin_stats_by_outcome', '/admin/stats', STATS_OUTCOME_SQL, lambda s, rnd: (), ('voter_contacts',)),
+    Query('admin_stats_rollup_voters', '/admin/stats', STATS_ROLLUP_VOTERS_SQL, lambda s, rnd: (), ('voter_rollup',)),
+    Query('admin_stats_rollup_contacts', '/admin/stats', STATS_ROLLUP_CONTACTS_SQL, lambda s, rnd: (),
+          ('activity_totals',)),
+    Query('admin_stats_rollup_by_method', '/admin/stats', STATS_ROLLUP_METHOD_SQL, lambda s, rnd: (),
+          ('activity_totals',)),
+    Query('admin_stats_rollup_by_outcome', '/admin/stats', STATS_ROLLUP_OUTCOME_SQL, lambda s, rnd: (),
+          ('activity_totals',)),
+    Query('admin_pulse_total', '/admin/pulse', PULSE_TOTAL_SQL, lambda s, rnd: (), ('pulse_optins',)),
+    Query('admin_pulse_rollup_total', '/admin/pulse', PULSE_ROLLUP_TOTAL_SQL, lambda s, rnd: (),
+          ('pulse_optins', 'activity_totals')),
+    Query('nearby_voters_street_lookup', '/admin/field-sessions/:id/nearby-voters', NEARBY_STREET_SQL,
+          lambda s, rnd: (s['street_canonical'].lower() if rnd.random() < 0.5 else s['street_canonical'],
+                          s['city'].title()), ('streets_index',)),
+    Query('nearby_voters_by_street', '/admin/field-sessions/:id/nearby-voters', NEARBY_VOTERS_SQL,
+          lambda s, rnd: (s['street_index_id'],), ('voters_addr_norm',)),
+    Query('call_next_scan', '/call', CALL_SCAN_SQL, lambda s, rnd: (s['county'],), ('voters',)),
+    Query('call_queue_pop', '/call', CALL_QUEUE_POP_SQL,
+          lambda s, rnd: ('county:' + s['county'] if rnd.random() < 0.7 else 'all',), ('call_queue',)),
+]
+
+
+class ParamPool:
+    """Voters drawn uniformly at random, with the fields queries take
+    parameters from.  Only voters linked to a street are drawn."""
+
+    def __init__(self, conn, size=500, seed=1):
+        self.seed = seed
+        self.rnd = random.Random(seed)
+        hi = conn.execute('SELECT MAX(rowid) FROM voters_addr_norm').fetchone()[0] or 0
+        rowids = sorted({self.rnd.randint(1, hi) for _ in range(size * 3)}) if hi else []
+        rows = []
+        for start in range(0, len(rowids), 500):
+            chunk = rowids[start:start + 500]
+            rows.extend(conn.execute(f"""
+                SELECT va.voter_id, v.county, va.city, va.street_index_id, si.street_canonical,
+                       CAST({HOUSE_NUMBER} AS INTEGER) AS house_number, va.fn, va.ln, va.house, va.senate
+                FROM voters_addr_norm va
+                JOIN voters v ON v.voter_id = va.voter_id
+                JOIN streets_index si ON si.id = va.street_index_id
+                WHERE va.rowid IN ({', '.join('?' * len(chunk))})
+            """, chunk).fetchall())
+        keys = ('voter_id', 'county', 'city', 'street_index_id', 'street_canonical', 'house_number', 'fn', 'ln',
+                'house', 'senate')
+        self.samples = [dict(zip(keys, tuple(r))) for r in rows][:size]
+        if not self.samples:
+            raise SystemExit('no voters linked to streets_index to draw parameters from')
+
+    def for_query(self, name):
+        """A generator of its own per query, so adding a query to the
+        catalog leaves the parameters every other query gets unchanged."""
+        return random.Random(f'{self.seed}:{name}')
+
+
+def available(conn, query):
+    for table in query.requires:
+        try:
+            if conn.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone() is None:
+                return False
+        except Exception:
+            return False
+    return True
+
+
+def explain(conn, sql, params=()):
+    """EXPLAIN QUERY PLAN rows as lines indented by depth."""
+    depth = {0: -1}
+    lines = []
+    for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params):
+        node, parent, detail = row[0], row[1], row[-1]
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node] + detail)
+    return lines
+
+
+def count_steps(conn, sql, params, every=100):
+    """Approximate VM instructions for one execution: the stand-in for rows
+    scanned, since the sqlite3 module does not expose scan statistics."""
+    ticks = [0]
+
+    def tick():
+        ticks[0] += 1
+        return 0
+
+    conn.set_progress_handler(tick, every)
+    try:
+        conn.execute(sql, params).fetchall()
+    finally:
+        conn.set_progress_handler(None, every)
+    return ticks[0] * every
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def run_query(conn, query, pool, samples, warmup=3):
+    """Execute `query` with `samples` parameter draws and summarise."""
+    rnd = pool.for_query(query.name)
+    params = [query.params(rnd.choice(pool.samples), rnd) for _ in range(samples)]
+    for p in params[:warmup]:
+        conn.execute(query.sql, p).fetchall()
+    timings, rows = [], []
+    for p in params:
+        t0 = time.perf_counter()
+        result = conn.execute(query.sql, p).fetchall()
+        timings.append((time.perf_counter() - t0) * 1000)
+        rows.append(len(result))
+    steps = [count_steps(conn, query.sql, p) for p in params[:min(len(params), 20)]]
+    return {
+        'route': query.route,
+        'samples': samples,
+        'p50_ms': round(percentile(timings, 0.50), 4),
+        'p95_ms': round(percentile(timings, 0.95), 4),
+        'p99_ms': round(percentile(timings, 0.99), 4),
+        'mean_ms': round(sum(timings) / len(timings), 4),
+        'rows_mean': round(sum(rows) / len(rows), 2),
+        'vm_steps_mean': int(sum(steps) / len(steps)),
+        'vm_steps_max': max(steps),
+        'plan': explain(conn, query.sql, params[0]),
+    }
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Index advisor and query-plan regression gate for the D1 schema.
+
+Usage:
+  python3 scripts/index_advisor.py                      # report + check plans against the baseline
+  python3 scripts/index_advisor.py --update-baseline    # accept the current plans
+  python3 scripts/index_advisor.py --propose [--synthetic 50000]
+
+The full migration chain (worker/db/migrations/*.sql) is applied to an
+in-memory sqlite database, which is loaded with a small synthetic data
+set (d1seed.dataset) so the query catalog in d1seed.workload gets
+realistic parameters.  For every query the EXPLAIN QUERY PLAN is captured
+and flagged for full table scans, temp B-trees (a sort or DISTINCT that no
+index delivers) and automatic indexes.  Indexes are checked too:
+
+  duplicate  same columns as another index on the table, or a leading
+             prefix of one (the longer index serves the same lookups)
+  unused     not chosen by any catalog query; not proof it is dead, since
+             the catalog only covers the hot paths
+
+Plans are compared against the baseline file (worker/db/query_plans.txt by
+default); any difference prints as a unified diff and exits 1, so a
+migration that changes how a hot query runs shows up in review.  Run with
+--update-baseline and commit the file to accept the new plans.
+
+--propose derives candidate indexes from each flagged query's equality,
+range, ORDER BY / GROUP BY and selected columns, creates each one in turn
+and re-measures the catalog in VM steps (d1seed.workload.count_steps), so
+the estimated benefit comes from the sample data rather than a guess.
+Plans here are without ANALYZE, as on D1.
+"""
+import argparse, difflib, re, sys
+from collections import defaultdict
+from pathlib import Path
+
+from d1seed import MIGRATIONS_DIR, SqliteSink
+from d1seed.dataset import load_from_sqlite, load_synthetic
+from d1seed.sinks import REPO_ROOT
+from d1seed.workload import QUERIES, ParamPool, available, count_steps, explain
+
+DEFAULT_BASELINE = REPO_ROOT / 'worker' / 'db' / 'query_plans.txt'
+INDEX_DEF_RE = re.compile(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', re.I)
+FROM_RE = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.I)
+KEYWORDS = {'ON', 'WHERE', 'LEFT', 'JOIN', 'INNER', 'GROUP', 'ORDER', 'LIMIT', 'USING', 'AND', 'SELECT'}
+MAX_INDEX_COLUMNS = 6
+STEP_SAMPLES = 10
+
+
+def index_definitions():
+    """{index name: migration file that last creates it}."""
+    where = {}
+    for path in sorted(Path(MIGRATIONS_DIR).glob('*.sql')):
+        for name in INDEX_DEF_RE.findall(path.read_text(encoding='utf-8')):
+            where[name] = path.name
+    return where
+
+
+def list_indexes(conn):
+    """[(table, name, columns, unique, partial)] for every index but rowid PKs."""
+    out = []
+    tables = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+    for table in tables:
+        for _, name, unique, origin, partial in conn.execute(f'PRAGMA index_list({table})'):
+            cols = tuple(r[2] for r in conn.execute(f'PRAGMA index_info({name})'))
+            out.append((table, name, cols, bool(unique), bool(partial)))
+    return sorted(out)
+
+
+def find_duplicates(indexes):
+    """[(redundant index, covering index, reason)] within each table."""
+    dupes = []
+    by_table = defaultdict(list)
+    for table, name, cols, unique, partial in indexes:
+        if not partial and None not in cols:
+            by_table[table].append((name, cols, unique))
+    for table, idx in by_table.items():
+        for name, cols, unique in idx:
+            if unique:
+                continue  # enforces a constraint; never redundant
+            for other, other_cols, other_unique in idx:
+                if other == name:
+                    continue
+                # of two identical non-unique indexes, report the later name
+                if other_cols == cols and (other_unique or other < name):
+                    dupes.append((name, other, f'same columns as {other}'))
+                    break
+                if len(other_cols) > len(cols) and other_cols[:len(cols)] == cols:
+                    dupes.append((name, other, f'prefix of {other}{other_cols}'))
+                    break
+    return sorted(dupes)
+
+
+def plan_flags(lines):
+    """Flags for one plan: full scans of real tables, temp B-trees, automatic indexes."""
+    derived = set()
+    flags = []
+    for line in lines:
+        text = line.strip()
+        m = re.match(r'(?:MATERIALIZE|CO-ROUTINE)\s+(\w+)', text)
+        if m:
+            derived.add(m.group(1))
+    for line in lines:
+        text = line.strip()
+        m = re.match(r'SCAN (\w+)(.*)', text)
+        if m and m.group(1) != 'CONSTANT' and m.group(1) not in derived:
+            flags.append(f'full scan {m.group(1)}' + (' (index order)' if 'INDEX' in m.group(2) else ''))
+        if text.startswith('USE TEMP B-TREE'):
+            flags.append(text[len('USE '):].lower())
+        if 'AUTOMATIC' in text:
+            flags.append('automatic index ' + text.split()[1])
+    return flags
+
+
+def capture_plans(conn, pool):
+    plans = {}
+    for query in QUERIES:
+        params = query.params(pool.samples[0], pool.for_query(query.name))
+        plans[query.name] = explain(conn, query.sql, params)
+    return plans
+
+
+def render_plans(plans):
+    out = []
+    for query in QUERIES:
+        lines = plans[query.name]
+        flags = plan_flags(lines)
+        out.append(f'== {query.name} ({query.route})' + (f"  [{'; '.join(flags)}]" if flags else ''))
+        out.extend(lines)
+        out.append('')
+    return '\n'.join(out)
+
+
+def check_baseline(path, rendered):
+    if not path.exists():
+        print(f'\nNo plan baseline at {path}; run with --update-baseline to create it')
+        return True
+    old = path.read_text(encoding='utf-8')
+    if old == rendered:
+        print(f'\nPlans match {path}')
+        return True
+    print(f'\nPlans differ from {path}:')
+    sys.stdout.writelines(difflib.unified_diff(old.splitlines(True), rendered.splitlines(True),
+                                               'baseline', 'current'))
+    return False
+
+
+# -- proposals -------------------------------------------------------------
+
+def query_aliases(conn, sql):
+    """{alias: table} for the real tables a query reads (views are skipped)."""
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    aliases = {}
+    for table, alias in FROM_RE.findall(sql):
+        if table in tables:
+            aliases[alias if alias and alias.upper() not in KEYWORDS else table] = table
+    return aliases
+
+
+def candidate_columns(conn, sql, alias, table):
+    """(equality, range, ordered, referenced) columns of one table in a query."""
+    cols = {r[1] for r in conn.execute(f'PRAGMA table_info({table})')}
+    bare = len(query_aliases(conn, sql)) == 1 and not re.search(rf'\b{alias}\.', sql)
+    ref = r'(?:{}\.)?'.format(alias) if bare else rf'{alias}\.'
+
+    def found(pattern):
+        seen = []
+        for c in re.findall(pattern, sql, re.I):
+            if c in cols and c not in seen:
+                seen.append(c)
+        return seen
+
+    eq = found(rf'(?<![\w.(]){ref}(\w+)\s*(?:=(?!=)|\bIN\b)') + found(rf'=\s*{ref}(\w+)\b(?!\s*\()')
+    rng = found(rf'(?<![\w.(]){ref}(\w+)\s*(?:>=|<=|>|<|\bBETWEEN\b)')
+    ordered = []
+    for clause in re.findall(r'\b(?:ORDER|GROUP)\s+BY\s+(.*?)(?:\bLIMIT\b|\bORDER\b|$)', sql, re.I | re.S):
+        for term in clause.split(','):
+            m = re.fullmatch(rf'\s*{ref}(\w+)(?:\s+(?:ASC|DESC))?\s*', term, re.I)
+            if not m or m.group(1) not in cols:
+                break
+            ordered.append(m.group(1))
+    referenced = found(rf'\b{ref}(\w+)\b') if not bare else [c for c in cols if re.search(rf'\b{c}\b', sql)]
+    eq = list(dict.fromkeys(eq))
+    return eq, [c for c in rng if c not in eq], [c for c in ordered if c not in eq], referenced
+
+
+def candidates(conn, query, existing):
+    """CREATE INDEX candidates for the tables a flagged query touches."""
+    out = []
+    for alias, table in query_aliases(conn, query.sql).items():
+        eq, rng, ordered, referenced = candidate_columns(conn, query.sql, alias, table)
+        keys = eq + (ordered or rng[:1])
+        if not keys:
+            continue
+        options = [tuple(keys)]
+        covering = tuple(keys + [c for c in referenced if c not in keys])
+        if len(covering) <= MAX_INDEX_COLUMNS and covering != options[0]:
+            options.append(covering)
+        for cols in options:
+            if any(e[:len(cols)] == cols for e in existing.get(table, ())):
+                continue
+            out.append((table, cols))
+    return out
+
+
+def measure(conn, pool, queries):
+    steps = {}
+    for query in queries:
+        rnd = pool.for_query(query.name)
+        draws = [query.params(rnd.choice(pool.samples), rnd) for _ in range(STEP_SAMPLES)]
+        steps[query.name] = sum(count_steps(conn, query.sql, p, every=10) for p in draws) // len(draws)
+    return steps
+
+
+def propose(conn, pool, plans, indexes):
+    live = [q for q in QUERIES if available(conn, q)]
+    flagged = [q for q in live if plan_flags(plans[q.name])]
+    existing = defaultdict(list)
+    for table, name, cols, unique, partial in indexes:
+        if not partial:
+            existing[table].append(cols)
+    seen, cands = set(), []
+    for query in flagged:
+        for table, cols in candidates(conn, query, existing):
+            if (table, cols) not in seen:
+                seen.add((table, cols))
+                cands.append((table, cols))
+    if not cands:
+        print('\nNo candidate indexes for the flagged queries')
+        return
+    print(f'\nMeasuring {len(cands)} candidate indexes against {len(live)} queries '
+          f'({STEP_SAMPLES} parameter draws each)...')
+    before = measure(conn, pool, live)
+    results = []
+    for n, (table, cols) in enumerate(cands):
+        name = f'idx_advisor_{n}'
+        conn.execute(f"CREATE INDEX {name} ON {table}({', '.join(cols)})")
+        touched = [q for q in live if table in query_aliases(conn, q.sql).values()]
+        after = measure(conn, pool, touched)
+        conn.execute(f'DROP INDEX {name}')
+        changes = {q: (before[q], after[q]) for q in after if after[q] != before[q]}
+        saved = sum(b - a for b, a in changes.values())
+        results.append((saved, table, cols, changes))
+    results.sort(key=lambda r: (-r[0], r[1], r[2]))
+    shown = 0
+    for saved, table, cols, changes in results:
+        if saved <= 0 or not any(a < b * 0.9 for b, a in changes.values()):
+            continue
+        shown += 1
+        rows = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        print(f"\n  CREATE INDEX IF NOT EXISTS idx_{table}_{'_'.join(cols)} ON {table}({', '.join(cols)});")
+        print(f'    {rows} rows indexed; VM steps per call:')
+        for qname, (b, a) in sorted(changes.items(), key=lambda kv: kv[1][1] - kv[1][0]):
+            print(f'      {qname:<30} {b:>10} -> {a:<10} ({(a - b) / max(b, 1):+.0%})')
+    if not shown:
+        print('  none of the candidates cut a query by 10% or more')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--synthetic', type=int, default=20000, metavar='VOTERS',
+                        help='synthetic voters to load (default 20000; use more with --propose)')
+    source.add_argument('--from-sqlite', default=None, metavar='PATH', help='load a local wy.sqlite instead')
+    parser.add_argument('--seed', type=int, default=1, help='data and parameter seed')
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='plan baseline file')
+    parser.add_argument('--update-baseline', action='store_true', help='write the current plans to --baseline')
+    parser.add_argument('--plans', action='store_true', help='print every plan, not only the flagged ones')
+    parser.add_argument('--propose', action='store_true', help='measure candidate covering indexes')
+    args = parser.parse_args()
+
+    sink = SqliteSink(':memory:')
+    conn = sink.conn
+    conn.row_factory = None
+    if args.from_sqlite:
+        if not Path(args.from_sqlite).exists():
+            raise SystemExit(f'SQLite file missing: {args.from_sqlite}')
+        load_from_sqlite(conn, args.from_sqlite)
+    else:
+        load_synthetic(conn, voters=args.synthetic, seed=args.seed)
+    pool = ParamPool(conn, seed=args.seed)
+    migrations = len(list(Path(MIGRATIONS_DIR).glob('*.sql')))
+    print(f'Applied {migrations} migrations; {len(QUERIES)} catalog queries')
+
+    plans = capture_plans(conn, pool)
+    print('\nQuery plans:')
+    for query in QUERIES:
+        flags = plan_flags(plans[query.name])
+        print(f"  {query.name:<30} {'; '.join(flags) if flags else 'ok'}")
+        if args.plans or flags:
+            for line in plans[query.name]:
+                print(f'      {line}')
+
+    indexes = list_indexes(conn)
+    defined = index_definitions()
+    used = {m for lines in plans.values() for line in lines for m in re.findall(r'INDEX (\w+)', line)}
+    dupes = find_duplicates(indexes)
+    print('\nDuplicate indexes:')
+    for name, other, reason in dupes:
+        print(f"  {name:<40} {reason}  [{defined.get(name, '?')}]")
+    if not dupes:
+        print('  none')
+    catalog_tables = {t for q in QUERIES for t in query_aliases(conn, q.sql).values()}
+    print('\nIndexes on catalog tables no catalog query uses:')
+    unused = [(t, n) for t, n, cols, unique, partial in indexes
+              if t in catalog_tables and n not in used and not n.startswith('sqlite_autoindex')]
+    for table, name in unused:
+        print(f"  {table + '.' + name:<60} [{defined.get(name, '?')}]")
+    if not unused:
+        print('  none')
+
+    if args.propose:
+        propose(conn, pool, plans, indexes)
+
+    rendered = render_plans(plans)
+    baseline = Path(args.baseline)
+    sink.close()
+    if args.update_baseline:
+        baseline.write_text(rendered, encoding='utf-8')
+        print(f'\nWrote {baseline}')
+        return
+    if not check_baseline(baseline, rendered):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Parse every voter address in the local wy.sqlite into voter_addr_parsed.
+
+Usage:
+  python3 scripts/parse_addresses.py /path/to/wy.sqlite [--workers 8] [--chunk 20000] [--column addr1]
+
+Rows are read from voters_addr_norm (or v_voters_addr_norm) in voter_id
+order, cut into chunks and parsed on all cores with multiprocessing; the
+main process bulk-writes the results into voter_addr_parsed (same schema as
+worker/db/migrations/034_add_voter_addr_parsed.sql).  The table is rebuilt
+from scratch on every run.  d1_seed_from_sqlite.py uploads it when present.
+"""
+import argparse, os, time
+from collections import deque
+from multiprocessing import Pool
+
+from d1seed.address import PARSED_COLUMNS, parse_rows
+from d1seed.cli import add_source_argument, open_source
+from d1seed.seed import find_source
+
+PARSED_SCHEMA = """
+CREATE TABLE voter_addr_parsed (
+  voter_id TEXT PRIMARY KEY,
+  house_number INTEGER,
+  house_suffix TEXT,
+  pre_dir TEXT,
+  street_core TEXT,
+  street_type TEXT,
+  post_dir TEXT,
+  unit_type TEXT,
+  unit_number TEXT,
+  street_canonical TEXT,
+  status TEXT NOT NULL DEFAULT 'ok'
+);
+"""
+
+PARSED_INDEX = 'CREATE INDEX idx_voter_addr_parsed_street_house ON voter_addr_parsed(street_canonical, house_number)'
+
+
+def iter_chunks(conn, source, column, size):
+    cur = conn.execute(f'SELECT voter_id, {column} FROM {source} ORDER BY voter_id')
+    while True:
+        rows = cur.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_source_argument(parser)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='parser processes (default: all cores)')
+    parser.add_argument('--chunk', type=int, default=20000, help='addresses per work unit')
+    parser.add_argument('--column', default='addr1', help='address column to parse (addr1 or addr_raw)')
+    args = parser.parse_args()
+
+    conn = open_source(args.sqlite)
+    source = find_source(conn, ['voters_addr_norm', 'v_voters_addr_norm'])
+    if not source:
+        raise SystemExit('No voters_addr_norm source found in sqlite')
+    total = conn.execute(f'SELECT COUNT(*) FROM {source}').fetchone()[0]
+    print(f'Parsing {total} addresses from {source}.{args.column} with {args.workers} workers')
+
+    # one transaction, so NORMAL costs a single sync; the journal mode (WAL
+    # or not) is left as wy.sqlite has it, so a crash cannot corrupt it
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('DROP TABLE IF EXISTS voter_addr_parsed')
+    conn.execute(PARSED_SCHEMA)
+    insert = (f"INSERT INTO voter_addr_parsed (voter_id, {', '.join(PARSED_COLUMNS)}) "
+              f"VALUES ({', '.join('?' * (len(PARSED_COLUMNS) + 1))})")
+
+    started = time.perf_counter()
+    done = 0
+    chunks = iter_chunks(conn, source, args.column, args.chunk)
+    with conn:
+        if args.workers > 1:
+            # Chunks are read here, on the thread that owns the connection,
+            # and handed over as lists; at most 2 x workers are in flight, so
+            # memory stays bounded and results are written in order.
+            with Pool(args.workers) as pool:
+                pending = deque()
+                for rows in chunks:
+                    pending.append(pool.apply_async(parse_rows, (rows,)))
+                    while pending and (len(pending) >= 2 * args.workers or pending[0].ready()):
+                        parsed = pending.popleft().get()
+                        conn.executemany(insert, parsed)
+                        done += len(parsed)
+                        print(f'Parsed {done} / {total}')
+                while pending:
+                    parsed = pending.popleft().get()
+                    conn.executemany(insert, parsed)
+                    done += len(parsed)
+                    print(f'Parsed {done} / {total}')
+        else:
+            for rows in chunks:
+                conn.executemany(insert, parse_rows(rows))
+                done += len(rows)
+                print(f'Parsed {done} / {total}')
+        conn.execute(PARSED_INDEX)
+    elapsed = time.perf_counter() - started
+    print(f'Wrote {done} rows to voter_addr_parsed in {elapsed:.1f}s ({done / max(elapsed, 1e-9):,.0f} rows/s)')
+
+    for status, cnt in conn.execute('SELECT status, COUNT(*) FROM voter_addr_parsed GROUP BY status ORDER BY 2 DESC'):
+        print(f'  {status}: {cnt}')
+    streets = conn.execute('SELECT COUNT(DISTINCT street_canonical) FROM voter_addr_parsed').fetchone()[0]
+    print(f'  distinct canonical streets: {streets}')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Pull call_activity and voter_contacts from D1 into a local sqlite file for
+analysis, picking up where the last pull stopped.
+
+Usage:
+  python3 scripts/pull_activity.py [--sink remote|local|emulator] [--database wy] [--out activity.sqlite]
+  python3 scripts/pull_activity.py --out /path/to/wy.sqlite --verify       # also catch edits and deletes
+  python3 scripts/pull_activity.py --table voter_contacts --full           # forget the marks and pull again
+  python3 scripts/pull_activity.py --check [--synthetic 30000] [--rounds 3]
+
+Each table is read in keyset pages of --page-size rows by id (and, for
+voter_contacts, by updated_at) above the marks in d1_pull_state, and each
+page is committed locally with its mark (d1seed.pull).  Stop it at any
+point and run it again: it continues after the last committed page, and a
+pull with nothing new only costs one empty page per table.  Rows are
+written with INSERT OR REPLACE, so the local copy can live next to voters
+in wy.sqlite (--out) for joins.
+
+Rows the Worker deletes (admin contact deletes) and edits that do not bump
+updated_at are only seen with --verify, which compares one fingerprint per
+--range-size ids with the sink and re-pulls the ranges that differ.  It
+reads every row on D1 once, so run it occasionally rather than on every
+pull.
+
+--check is the local correctness check.  It loads a migrated sqlite
+stand-in with synthetic data, pulls it through a sink that fails after a
+few pages, resumes, then for --rounds rounds inserts, edits and deletes
+rows and pulls again.  After every pull the local tables must equal the
+stand-in's, and a second pull right after must change nothing.  Exits 1
+on any difference.
+"""
+import argparse, random, sqlite3, tempfile, time
+from pathlib import Path
+
+from d1seed import Sink, SinkError, SqliteSink
+from d1seed.cli import add_sink_arguments, sink_from_args, instrumented
+from d1seed.dataset import CALL_OUTCOMES, CONTACT_OUTCOMES, load_synthetic
+from d1seed.pull import PULLS, get_state, pull_table, reset
+
+DEFAULT_OUT = Path('activity.sqlite')
+
+
+def open_local(path):
+    conn = sqlite3.connect(str(path), isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    return conn
+
+
+def pull_all(conn, sink, specs, args):
+    results = []
+    for spec in specs:
+        started = time.perf_counter()
+        result = pull_table(conn, sink, spec, page_size=args.page_size, verify=args.verify,
+                            range_size=args.range_size)
+        if result is None:
+            continue
+        results.append(result)
+        print(f'{spec.table}: {result.new} new, {result.changed} changed, {result.repaired} re-pulled, '
+              f'{result.removed} removed in {result.pages} pages ({time.perf_counter() - started:.1f}s), '
+              f'up to id {result.last_id}')
+    return results
+
+
+def run_pull(args, log):
+    specs = [s for s in PULLS if not args.table or s.table in args.table]
+    sink = sink_from_args(args)
+    conn = open_local(args.out)
+    if args.full:
+        for spec in specs:
+            reset(conn, spec.table)
+    for result in pull_all(conn, sink, specs, args):
+        log.emit('pull', **result._asdict())
+    conn.close()
+    sink.close()
+    print(f'Pulled from {sink.name} into {args.out}')
+
+
+class Interrupted(Sink):
+    """Stand-in sink whose reads start failing after `reads` queries."""
+
+    def __init__(self, sink, reads):
+        self.inner = sink
+        self.name, self.label = sink.name, sink.label
+        self.reads = reads
+
+    def query(self, sql):
+        if self.reads <= 0:
+            raise SinkError('simulated interruption', 1, 'D1_ERROR: Network connection lost.')
+        self.reads -= 1
+        return self.inner.query(sql)
+
+    def close(self):
+        pass
+
+
+def differences(local, source, table):
+    """(missing, extra, stale) row counts of the local copy against the source."""
+    cols = [r[1] for r in source.execute(f'PRAGMA table_info({table})')]
+    sql = f"SELECT {', '.join(cols)} FROM {table}"
+    have = {r[0]: tuple(r) for r in local.execute(sql)}
+    want = {r[0]: tuple(r) for r in source.execute(sql)}
+    stale = sum(1 for i, r in want.items() if i in have and have[i] != r)
+    return len(want.keys() - have.keys()), len(have.keys() - want.keys()), stale
+
+
+def simulate(conn, rnd, n):
+    """New calls and contacts, Worker edits (with updated_at), admin edits
+    (without) and admin deletes, spread over rows already pulled."""
+    voters = [r[0] for r in conn.execute('SELECT voter_id FROM voters v WHERE NOT EXISTS '
+                                         '(SELECT 1 FROM voter_contacts c WHERE c.voter_id = v.voter_id)')]
+    outcomes, calls = ([v for v, _ in pairs] for pairs in (CONTACT_OUTCOMES, CALL_OUTCOMES))
+    ids = lambda table, k: rnd.sample([r[0] for r in conn.execute(f'SELECT id FROM {table}')], k)
+    conn.execute('BEGIN')
+    conn.executemany("INSERT INTO voter_contacts (voter_id, method, outcome, created_at) "
+                     "VALUES (?, 'door', ?, datetime('now'))", [(v, rnd.choice(outcomes)) for v in voters[:n]])
+    conn.executemany("INSERT INTO call_activity (voter_id, volunteer_email, call_result, created_at) "
+                     "VALUES (?, 'check@example.org', ?, datetime('now'))",
+                     [(rnd.choice(voters), rnd.choice(calls)) for _ in range(n)])
+    k = max(1, n // 10)
+    conn.executemany("UPDATE voter_contacts SET outcome = ?, updated_at = datetime('now') WHERE id = ?",
+                     [(rnd.choice(outcomes), i) for i in ids('voter_contacts', k)])
+    conn.executemany('UPDATE voter_contacts SET comments = ? WHERE id = ?',
+                     [(f'admin note {rnd.random():.6f}', i) for i in ids('voter_contacts', k)])
+    conn.executemany('DELETE FROM voter_contacts WHERE id = ?', [(i,) for i in ids('voter_contacts', k)])
+    conn.executemany('DELETE FROM call_activity WHERE id = ?', [(i,) for i in ids('call_activity', k)])
+    conn.execute('COMMIT')
+
+
+def check_round(label, local, source, sink, args, log):
+    failures = 0
+    for verify in (False, True):
+        args.verify = verify
+        pull_all(local, sink, PULLS, args)
+    for spec in PULLS:
+        missing, extra, stale = differences(local, source, spec.table)
+        again = pull_table(local, sink, spec, page_size=args.page_size)
+        print(f'{label} {spec.table}: {missing} missing, {extra} extra, {stale} stale; '
+              f'a second pull found {again.new} new rows')
+        log.emit('pull_check', round=label, table=spec.table, missing=missing, extra=extra, stale=stale,
+                 second_new=again.new)
+        failures += missing + extra + stale + again.new
+    return failures
+
+
+def run_check(args, log):
+    sink = SqliteSink(':memory:')
+    source = sink.conn
+    started = time.perf_counter()
+    counts = load_synthetic(source, voters=args.synthetic, seed=args.seed)
+    print(f"Loaded {counts['voter_contacts']} contacts and {counts['call_activity']} calls "
+          f'in {time.perf_counter() - started:.1f}s')
+    out = Path(args.out) if args.out != DEFAULT_OUT else Path(tempfile.mkdtemp()) / 'activity.sqlite'
+    local = open_local(out)
+    for spec in PULLS:
+        reset(local, spec.table)
+
+    failures = 0
+    try:
+        pull_all(local, Interrupted(sink, reads=4), PULLS, args)
+    except SinkError as e:
+        marks = {s.table: (get_state(local, s.table) or {}).get('last_id') for s in PULLS}
+        print(f'Pull stopped by {e.output}; committed marks {marks}')
+    else:
+        print('Interrupted pull finished without stopping; raise --synthetic or lower --page-size')
+        failures += 1
+    failures += check_round('resume', local, source, sink, args, log)
+
+    rnd = random.Random(args.seed)
+    for round_no in range(1, args.rounds + 1):
+        simulate(source, rnd, args.activity)
+        failures += check_round(f'round {round_no}', local, source, sink, args, log)
+    local.close()
+    sink.close()
+    if failures:
+        raise SystemExit(f'pull check failed: {failures} differences')
+    print('\nLocal copies match the stand-in')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_sink_arguments(parser)
+    parser.add_argument('--out', type=Path, default=DEFAULT_OUT, help='local sqlite to pull into (default: activity.sqlite)')
+    parser.add_argument('--table', action='append', choices=[s.table for s in PULLS], help='pull only this table')
+    parser.add_argument('--page-size', type=int, default=5000, help='rows per keyset page')
+    parser.add_argument('--full', action='store_true', help='drop the local rows and marks and pull everything again')
+    parser.add_argument('--verify', action='store_true',
+                        help='compare per-range fingerprints with the sink and re-pull ranges that differ')
+    parser.add_argument('--range-size', type=int, default=5000, help='ids per range for --verify')
+    g = parser.add_argument_group('local correctness check')
+    g.add_argument('--check', action='store_true', help='pull from a synthetic stand-in and compare')
+    g.add_argument('--synthetic', type=int, default=30000, metavar='VOTERS', help='synthetic voters to load')
+    g.add_argument('--rounds', type=int, default=3, help='rounds of simulated activity')
+    g.add_argument('--activity', type=int, default=300, help='new contacts and calls per round')
+    g.add_argument('--seed', type=int, default=1, help='data and activity seed')
+    args = parser.parse_args()
+
+    with instrumented(args) as log:
+        if args.check:
+            if args.page_size == parser.get_default('page_size'):
+                args.page_size = 200  # several pages per table
+            if args.range_size == parser.get_default('range_size'):
+                args.range_size = 250
+            run_check(args, log)
+        else:
+            run_pull(args, log)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except SinkError as e:
+        raise SystemExit(f'pull failed: {e.output or e}')
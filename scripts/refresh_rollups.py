@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Fold new voter_contacts, call_activity and pulse_optins rows into the
+dashboard rollups (migration 040) and recount voter_rollup when voters
+changed.
+
+Usage:
+  python3 scripts/refresh_rollups.py [--sink remote|local|sqlite|emulator] [--database wy] [--full]
+  python3 scripts/refresh_rollups.py --check [--synthetic 30000 | --from-sqlite /path/to/wy.sqlite] [--rounds 3]
+
+A refresh is one statement file run on the sink (d1seed.rollups.refresh_sql),
+which D1 commits as a unit: for each source it reads only the rows above
+the high-water mark in rollup_state, adds them to the per-day / county /
+district / method / outcome counts and to activity_totals, and moves the
+mark.  Rows folded earlier and later edited or deleted are kept right by
+the triggers from the migration.  Run it on a schedule (every few minutes
+during GOTV) and after re-seeding voters; --full empties the rollups and
+folds everything again.
+
+/admin/stats and /admin/pulse read activity_totals and voter_rollup, plus
+a rowid range over rows newer than the mark, once a refresh has run; until
+then they count the full tables as before.  bench_queries.py times both
+(admin_stats_* against admin_stats_rollup_*).
+
+--check is the local correctness check.  It builds a migrated sqlite
+stand-in (--db, reused when it already has voters), refreshes, then for
+--rounds rounds inserts, edits and deletes contacts, calls and opt-ins on
+both sides of the mark, and refreshes again.  After every round the
+rollups must equal a full recount of the sources, and the dashboard
+answers from the rollups must equal the full-table queries both before
+and after the refresh.  Exits 1 on any difference.
+"""
+import argparse, random, time
+
+from d1seed import SinkError, SqliteSink
+from d1seed.cli import add_sink_arguments, sink_from_args, instrumented
+from d1seed.dataset import CALL_OUTCOMES, CONTACT_METHODS, CONTACT_OUTCOMES, load_from_sqlite, load_synthetic
+from d1seed.rollups import ROLLUPS, compare, refresh_sql
+from d1seed import workload
+
+# (name, full-table query, rollup query) pairs the dashboards answer
+DASHBOARD = [
+    ('total_contacts', workload.STATS_CONTACTS_SQL, workload.STATS_ROLLUP_CONTACTS_SQL),
+    ('by_method', workload.STATS_METHOD_SQL, workload.STATS_ROLLUP_METHOD_SQL),
+    ('by_outcome', workload.STATS_OUTCOME_SQL, workload.STATS_ROLLUP_OUTCOME_SQL),
+    ('pulse_total', workload.PULSE_TOTAL_SQL, workload.PULSE_ROLLUP_TOTAL_SQL),
+]
+PULSE_METHODS = ['sms', 'email']
+PULSE_SOURCES = ['call', 'canvass', 'webform']
+
+
+def refresh(sink, full=False):
+    sql = refresh_sql(full)
+    if isinstance(sink, SqliteSink):
+        # wrangler runs a file as one transaction; do the same here
+        sql = 'BEGIN;\n' + sql + 'COMMIT;\n'
+    started = time.perf_counter()
+    sink.execute(sql)
+    return time.perf_counter() - started
+
+
+def state(sink):
+    rows = sink.query('SELECT source, last_id, refreshed_at FROM rollup_state ORDER BY source;')
+    totals = {r['source']: r['n'] for r in sink.query(
+        'SELECT source, SUM(n) AS n FROM activity_totals GROUP BY source;')}
+    voters = sink.query('SELECT COALESCE(SUM(voters), 0) AS n FROM voter_rollup;')
+    totals['voters'] = voters[0]['n'] if voters else 0
+    return {r['source']: {'last_id': r['last_id'], 'refreshed_at': r['refreshed_at'],
+                          'rows': totals.get(r['source'], 0)} for r in rows}
+
+
+def run_refresh(args, log):
+    sink = sink_from_args(args)
+    before = state(sink)
+    seconds = refresh(sink, args.full)
+    after = state(sink)
+    for source, s in after.items():
+        added = s['rows'] - before.get(source, {}).get('rows', 0)
+        print(f"  {source:<15} {s['rows']:>9} rows ({added:+d}), mark {s['last_id']}")
+    print(f"Refreshed rollups on {sink.name} in {seconds:.1f}s{' (full rebuild)' if args.full else ''}")
+    log.emit('rollups', seconds=round(seconds, 3), full=args.full,
+             **{source: s['rows'] for source, s in after.items()})
+    sink.close()
+
+
+def _dashboard(conn, query):
+    return sorted(tuple(r) for r in conn.execute(query).fetchall())
+
+
+def dashboard_diffs(conn):
+    """Dashboard answers where the rollup query and the full query differ."""
+    return [(name, _dashboard(conn, rollup), _dashboard(conn, full))
+            for name, full, rollup in DASHBOARD if _dashboard(conn, full) != _dashboard(conn, rollup)]
+
+
+def _ids(conn, table, rnd, k):
+    ids = [r[0] for r in conn.execute(f'SELECT id FROM {table}')]
+    return rnd.sample(ids, min(k, len(ids)))
+
+
+def simulate(conn, rnd, n):
+    """One round of dashboard traffic: about `n` new contacts and calls,
+    a tenth as many edits and deletes, spread over folded and unfolded rows."""
+    methods, outcomes, calls = ([v for v, _ in pairs] for pairs in (CONTACT_METHODS, CONTACT_OUTCOMES, CALL_OUTCOMES))
+    day = lambda: f'2026-10-{rnd.randint(1, 31):02d} {rnd.randint(8, 20):02d}:00:00'
+    fresh = [r[0] for r in conn.execute(
+        'SELECT voter_id FROM voters v WHERE NOT EXISTS (SELECT 1 FROM voter_contacts c WHERE c.voter_id = v.voter_id)')]
+    voters = rnd.sample(fresh, min(n, len(fresh)))
+    conn.execute('BEGIN')
+    conn.executemany('INSERT INTO voter_contacts (voter_id, method, outcome, created_at) VALUES (?, ?, ?, ?)', [
+        (v, rnd.choice(methods) if rnd.random() < 0.95 else None, rnd.choice(outcomes), day()) for v in voters])
+    conn.executemany('INSERT INTO call_activity (voter_id, volunteer_email, call_result, created_at) '
+                     'VALUES (?, ?, ?, ?)', [(rnd.choice(fresh), 'check@example.org', rnd.choice(calls), day())
+                                             for _ in range(n)])
+    conn.executemany('INSERT INTO pulse_optins (voter_id, contact_method, consent_source, created_at) '
+                     'VALUES (?, ?, ?, ?)', [(rnd.choice(fresh), rnd.choice(PULSE_METHODS),
+                                              rnd.choice(PULSE_SOURCES), day()) for _ in range(n // 5)])
+    k = max(1, n // 10)
+    conn.executemany('UPDATE voter_contacts SET outcome = ?, method = ? WHERE id = ?', [
+        (rnd.choice(outcomes), rnd.choice(methods), i) for i in _ids(conn, 'voter_contacts', rnd, k)])
+    conn.executemany('UPDATE voter_contacts SET created_at = ? WHERE id = ?', [
+        (day(), i) for i in _ids(conn, 'voter_contacts', rnd, k)])
+    conn.executemany('UPDATE call_activity SET call_result = ? WHERE id = ?', [
+        (rnd.choice(calls), i) for i in _ids(conn, 'call_activity', rnd, k)])
+    conn.executemany('UPDATE pulse_optins SET consent_source = ? WHERE id = ?', [
+        (rnd.choice(PULSE_SOURCES), i) for i in _ids(conn, 'pulse_optins', rnd, k // 5 + 1)])
+    for table in ('voter_contacts', 'call_activity', 'pulse_optins'):
+        conn.executemany(f'DELETE FROM {table} WHERE id = ?', [(i,) for i in _ids(conn, table, rnd, k)])
+    conn.execute('COMMIT')
+
+
+def report(label, diffs):
+    for table, key, got, expected in diffs[:10]:
+        print(f'  {label}: {table} {key}: rollup {got}, recount {expected}')
+    if len(diffs) > 10:
+        print(f'  ... and {len(diffs) - 10} more')
+
+
+def run_check(args, log):
+    sink = SqliteSink(args.db)
+    conn = sink.conn
+    conn.row_factory = None
+    if not conn.execute('SELECT COUNT(*) FROM voters').fetchone()[0]:
+        started = time.perf_counter()
+        counts = (load_from_sqlite(conn, args.from_sqlite) if args.from_sqlite
+                  else load_synthetic(conn, voters=args.synthetic, seed=args.seed))
+        print('Loaded ' + ', '.join(f'{t} {n}' for t, n in counts.items() if n) +
+              f' in {time.perf_counter() - started:.1f}s')
+    rnd = random.Random(args.seed)
+    failures = 0
+    for round_no in range(args.rounds + 1):
+        if round_no:
+            simulate(conn, rnd, args.activity)
+            early = dashboard_diffs(conn)
+            report('before refresh', [(name, '', got, want) for name, got, want in early])
+            failures += len(early)
+        seconds = refresh(sink, full=args.full and not round_no)
+        started = time.perf_counter()
+        diffs = compare(conn)
+        recount_seconds = time.perf_counter() - started
+        late = dashboard_diffs(conn)
+        report('after refresh', diffs + [(name, '', got, want) for name, got, want in late])
+        failures += len(diffs) + len(late)
+        sizes = {r.table: conn.execute(f'SELECT COUNT(*) FROM {r.table}').fetchone()[0] for r in ROLLUPS}
+        print(f"Round {round_no}: refresh {seconds * 1000:.0f} ms, full recount {recount_seconds * 1000:.0f} ms, "
+              + ', '.join(f'{t} {n} rows' for t, n in sizes.items())
+              + f", {len(diffs) + len(late)} differences")
+        log.emit('rollup_check', round=round_no, refresh_ms=round(seconds * 1000, 1),
+                 recount_ms=round(recount_seconds * 1000, 1), differences=len(diffs) + len(late), **sizes)
+    sink.close()
+    if failures:
+        raise SystemExit(f'rollup check failed: {failures} differences')
+    print('\nRollups match a full recount')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_sink_arguments(parser)
+    parser.add_argument('--full', action='store_true', help='empty the rollups and fold every row again')
+    g = parser.add_argument_group('local correctness check')
+    g.add_argument('--check', action='store_true', help='check the rollups against full recounts on a stand-in')
+    g.add_argument('--db', default=':memory:', help='migrated sqlite stand-in to build or reuse (default: in-memory)')
+    g.add_argument('--synthetic', type=int, default=30000, metavar='VOTERS', help='synthetic voters to load')
+    g.add_argument('--from-sqlite', default=None, metavar='PATH', help='load a local wy.sqlite instead')
+    g.add_argument('--rounds', type=int, default=3, help='rounds of simulated activity')
+    g.add_argument('--activity', type=int, default=500, help='new contacts and calls per round')
+    g.add_argument('--seed', type=int, default=1, help='data and activity seed')
+    args = parser.parse_args()
+
+    with instrumented(args) as log:
+        if args.check:
+            run_check(args, log)
+        else:
+            run_refresh(args, log)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except SinkError as e:
+        raise SystemExit(f'refresh failed: {e}')
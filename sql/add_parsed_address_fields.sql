@@ -5,6 +5,10 @@
 -- to voter_addresses to eliminate runtime string parsing overhead.
 --
 -- Only run this AFTER adding city_county_id (previous migration).
+--
+-- Superseded by scripts/parse_addresses.py, which parses addresses offline
+-- (integer house number, directionals, street type, unit) into
+-- voter_addr_parsed (worker migration 034) before upload.
 -- ============================================================================
 
 -- Step 1: Add parsed address columns
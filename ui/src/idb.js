@@ -1,11 +1,15 @@
 /**
  * IndexedDB Helper for GrassrootsMVT Offline Submissions
- * Handles storage and retrieval of failed API requests for background sync
+ * Handles storage and retrieval of failed API requests for background sync,
+ * and the offline data packs (scripts/build_data_packs.py) for a turf
  */
 
 const DB_NAME = 'grassrootsmvt-offline';
-const DB_VERSION = 1;
+const DB_VERSION = 2;
 const STORE_NAME = 'pending';
+const PACKS_STORE = 'packs';
+const PACK_VOTERS_STORE = 'pack_voters';
+const PACK_FORMAT = 1;
 
 /**
  * Open IndexedDB database
@@ -30,6 +34,17 @@ export async function openDB() {
         store.createIndex('endpoint', 'endpoint', { unique: false });
         store.createIndex('type', 'type', { unique: false });
       }
+
+      // Offline data packs: one record per pack (meta + streets), and its
+      // voters (with best phone merged in) keyed by [pack, voter_id]
+      if (!db.objectStoreNames.contains(PACKS_STORE)) {
+        db.createObjectStore(PACKS_STORE, { keyPath: 'id' });
+      }
+      if (!db.objectStoreNames.contains(PACK_VOTERS_STORE)) {
+        const voters = db.createObjectStore(PACK_VOTERS_STORE, { keyPath: ['pack', 'voter_id'] });
+        voters.createIndex('pack', 'pack', { unique: false });
+        voters.createIndex('pack_street', ['pack', 'street_id'], { unique: false });
+      }
     };
     
     request.onsuccess = (event) => {
@@ -229,4 +244,255 @@ export async function initDB() {
     console.error('❌ Failed to initialize IndexedDB:', error);
     return false;
   }
-}
\ No newline at end of file
+}
+
+/**
+ * Turn a pack section ({ columns, rows }) into objects
+ * @param {Object} section
+ * @returns {Array<Object>}
+ */
+function sectionRecords(section) {
+  if (!section || !Array.isArray(section.rows)) return [];
+  const { columns } = section;
+  return section.rows.map(row => {
+    const record = {};
+    columns.forEach((column, i) => { record[column] = row[i]; });
+    return record;
+  });
+}
+
+/**
+ * Download and parse a gzip'd JSON pack file
+ * @param {string} url
+ * @param {RequestInit} fetchOptions
+ * @returns {Promise<Object>}
+ */
+async function fetchPackFile(url, fetchOptions = {}) {
+  const response = await fetch(url, { credentials: 'include', ...fetchOptions });
+  if (!response.ok) {
+    throw new Error(`Pack download failed (${response.status}): ${url}`);
+  }
+  // Servers that set Content-Encoding: gzip hand us plain JSON already
+  const encoding = response.headers.get('Content-Encoding') || '';
+  if (encoding.includes('gzip') || typeof DecompressionStream === 'undefined') {
+    return response.json();
+  }
+  const stream = response.body.pipeThrough(new DecompressionStream('gzip'));
+  return new Response(stream).json();
+}
+
+/**
+ * Stored metadata for a pack (without its voters)
+ * @param {string} packId
+ * @returns {Promise<Object|null>}
+ */
+export async function getPackMeta(packId) {
+  const db = await openDB();
+
+  return new Promise((resolve, reject) => {
+    const transaction = db.transaction([PACKS_STORE], 'readonly');
+    const request = transaction.objectStore(PACKS_STORE).get(packId);
+
+    request.onsuccess = () => resolve(request.result || null);
+    request.onerror = () => reject(new Error(`Failed to get pack ${packId}: ${request.error}`));
+  });
+}
+
+/**
+ * All stored packs
+ * @returns {Promise<Array>}
+ */
+export async function listPacks() {
+  const db = await openDB();
+
+  return new Promise((resolve, reject) => {
+    const transaction = db.transaction([PACKS_STORE], 'readonly');
+    const request = transaction.objectStore(PACKS_STORE).getAll();
+
+    request.onsuccess = () => resolve(request.result || []);
+    request.onerror = () => reject(new Error(`Failed to list packs: ${request.error}`));
+  });
+}
+
+/**
+ * Voters of a stored pack, optionally only those on one street
+ * @param {string} packId
+ * @param {number|null} streetId - streets_index id
+ * @returns {Promise<Array>}
+ */
+export async function getPackVoters(packId, streetId = null) {
+  const db = await openDB();
+
+  return new Promise((resolve, reject) => {
+    const transaction = db.transaction([PACK_VOTERS_STORE], 'readonly');
+    const store = transaction.objectStore(PACK_VOTERS_STORE);
+    const request = streetId === null
+      ? store.index('pack').getAll(packId)
+      : store.index('pack_street').getAll([packId, streetId]);
+
+    request.onsuccess = () => resolve(request.result || []);
+    request.onerror = () => reject(new Error(`Failed to get voters for pack ${packId}: ${request.error}`));
+  });
+}
+
+/**
+ * Write a full pack or apply a delta pack in one transaction
+ * @param {Object} pack - parsed pack or delta
+ * @param {Object} meta - manifest entry fields to store with it
+ * @returns {Promise<void>}
+ */
+async function storePack(pack, meta) {
+  const db = await openDB();
+  const isDelta = Boolean(pack.base);
+  const previous = isDelta ? await getPackMeta(pack.id) : null;
+  const sections = isDelta ? pack.upsert : pack;
+  const phones = new Map(sectionRecords(sections.phones).map(p => [p.voter_id, p]));
+
+  return new Promise((resolve, reject) => {
+    const transaction = db.transaction([PACKS_STORE, PACK_VOTERS_STORE], 'readwrite');
+    const voters = transaction.objectStore(PACK_VOTERS_STORE);
+
+    if (!isDelta) {
+      const range = IDBKeyRange.bound([pack.id], [pack.id, []]);
+      voters.delete(range);
+    }
+    const deletedPhones = new Set(isDelta ? pack.delete.phones || [] : []);
+    for (const voter of sectionRecords(sections.voters)) {
+      const phone = phones.get(voter.voter_id);
+      phones.delete(voter.voter_id);
+      const record = {
+        ...voter,
+        pack: pack.id,
+        phone_e164: phone ? phone.phone_e164 : null,
+        phone_confidence: phone ? phone.confidence : null,
+      };
+      if (!isDelta || phone || deletedPhones.has(voter.voter_id)) {
+        voters.put(record);
+        continue;
+      }
+      // Delta changed the voter but not their phone: keep the stored one
+      const getRequest = voters.get([pack.id, voter.voter_id]);
+      getRequest.onsuccess = () => {
+        const existing = getRequest.result;
+        voters.put(existing
+          ? { ...record, phone_e164: existing.phone_e164, phone_confidence: existing.phone_confidence }
+          : record);
+      };
+    }
+    // Phone-only changes in a delta: patch the stored voter
+    for (const phone of phones.values()) {
+      const getRequest = voters.get([pack.id, phone.voter_id]);
+      getRequest.onsuccess = () => {
+        if (getRequest.result) {
+          voters.put({ ...getRequest.result, phone_e164: phone.phone_e164, phone_confidence: phone.confidence });
+        }
+      };
+    }
+    if (isDelta) {
+      for (const voterId of pack.delete.voters || []) {
+        voters.delete([pack.id, voterId]);
+      }
+      const upsertedVoters = new Set(sectionRecords(sections.voters).map(v => v.voter_id));
+      for (const voterId of deletedPhones) {
+        if (upsertedVoters.has(voterId)) continue;
+        const getRequest = voters.get([pack.id, voterId]);
+        getRequest.onsuccess = () => {
+          if (getRequest.result) {
+            voters.put({ ...getRequest.result, phone_e164: null, phone_confidence: null });
+          }
+        };
+      }
+    }
+
+    let streets = sectionRecords(sections.streets);
+    if (isDelta && previous) {
+      const byId = new Map((previous.streets || []).map(s => [s.id, s]));
+      for (const id of pack.delete.streets || []) byId.delete(id);
+      for (const street of streets) byId.set(street.id, street);
+      streets = [...byId.values()].sort((a, b) => a.id - b.id);
+    }
+    transaction.objectStore(PACKS_STORE).put({
+      id: pack.id,
+      kind: meta.kind,
+      label: meta.label,
+      version: pack.version,
+      etag: meta.etag,
+      streets,
+      fetchedAt: Date.now(),
+    });
+
+    transaction.oncomplete = () => {
+      console.log(`📦 Pack ${pack.id} ${isDelta ? 'updated' : 'stored'} at version ${pack.version}`);
+      resolve();
+    };
+    transaction.onerror = () => reject(new Error(`Failed to store pack ${pack.id}: ${transaction.error}`));
+  });
+}
+
+/**
+ * Bring one turf's pack up to date: nothing if the stored version is
+ * current, a delta if the manifest has one from the stored version, the
+ * full pack otherwise.
+ * @param {string} baseUrl - directory holding manifest.json and the packs
+ * @param {string} packId - e.g. 'county-natrona', 'city-natrona-casper', 'house-07'
+ * @param {RequestInit} fetchOptions
+ * @returns {Promise<Object>} { id, version, status: 'current'|'delta'|'full' }
+ */
+export async function fetchPack(baseUrl, packId, fetchOptions = {}) {
+  const base = baseUrl.endsWith('/') ? baseUrl : `${baseUrl}/`;
+  const manifestResponse = await fetch(`${base}manifest.json`, { credentials: 'include', cache: 'no-cache', ...fetchOptions });
+  if (!manifestResponse.ok) {
+    throw new Error(`Pack manifest unavailable (${manifestResponse.status})`);
+  }
+  const manifest = await manifestResponse.json();
+  const entry = manifest.packs && manifest.packs[packId];
+  if (!entry) {
+    throw new Error(`Unknown pack: ${packId}`);
+  }
+  if (manifest.format !== PACK_FORMAT) {
+    throw new Error(`Unsupported pack format ${manifest.format}`);
+  }
+
+  const stored = await getPackMeta(packId);
+  if (stored && stored.version === entry.version) {
+    return { id: packId, version: entry.version, status: 'current' };
+  }
+
+  const delta = stored && entry.deltas ? entry.deltas[stored.version] : null;
+  if (delta) {
+    try {
+      const pack = await fetchPackFile(`${base}${delta.file}`, fetchOptions);
+      if (pack.base === stored.version && pack.version === entry.version) {
+        await storePack(pack, entry);
+        return { id: packId, version: entry.version, status: 'delta' };
+      }
+    } catch (error) {
+      console.warn(`⚠️ Delta for ${packId} failed, fetching full pack:`, error);
+    }
+  }
+
+  const pack = await fetchPackFile(`${base}${entry.file}`, fetchOptions);
+  if (pack.version !== entry.version) {
+    throw new Error(`Pack ${packId} version mismatch: ${pack.version} != ${entry.version}`);
+  }
+  await storePack(pack, entry);
+  return { id: packId, version: entry.version, status: 'full' };
+}
+
+/**
+ * Remove a stored pack and its voters
+ * @param {string} packId
+ * @returns {Promise<void>}
+ */
+export async function deletePack(packId) {
+  const db = await openDB();
+
+  return new Promise((resolve, reject) => {
+    const transaction = db.transaction([PACKS_STORE, PACK_VOTERS_STORE], 'readwrite');
+    transaction.objectStore(PACKS_STORE).delete(packId);
+    transaction.objectStore(PACK_VOTERS_STORE).delete(IDBKeyRange.bound([packId], [packId, []]));
+
+    transaction.oncomplete = () => resolve();
+    transaction.onerror = () => reject(new Error(`Failed to delete pack ${packId}: ${transaction.error}`));
+  });
+}
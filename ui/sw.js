@@ -3,7 +3,8 @@
  * Handles offline caching and background sync for volunteer submissions
  */
 
-const CACHE_NAME = 'grassrootsmvt-v1';
+// v2: idb.js gained the offline data pack stores
+const CACHE_NAME = 'grassrootsmvt-v2';
 const OFFLINE_URL = '/offline.html';
 
 // Install event - cache essential resources
@@ -111,6 +112,11 @@ self.addEventListener('message', (event) => {
     case 'FORCE_SYNC':
       event.waitUntil(processOfflineQueue());
       break;
+    case 'FETCH_PACK':
+      event.waitUntil(fetchDataPack(data).then(result => {
+        if (event.ports[0]) event.ports[0].postMessage(result);
+      }));
+      break;
   }
 });
 
@@ -287,6 +293,24 @@ async function processOfflineQueue() {
   }
 }
 
+/**
+ * Download or update an offline data pack for a turf, so canvassers can
+ * work without signal. data: { baseUrl, packId }
+ */
+async function fetchDataPack(data) {
+  try {
+    const idbModule = await import('/src/idb.js');
+    const result = await idbModule.fetchPack(data.baseUrl, data.packId);
+    console.log(`📦 Pack ${result.id}: ${result.status} (${result.version})`);
+    notifyClients({ type: 'PACK_UPDATED', data: result });
+    return { ok: true, ...result };
+  } catch (error) {
+    console.error('❌ Failed to fetch data pack:', error);
+    notifyClients({ type: 'PACK_FAILED', data: { id: data && data.packId, error: error.message } });
+    return { ok: false, error: error.message };
+  }
+}
+
 /**
  * Get current queue status
  */
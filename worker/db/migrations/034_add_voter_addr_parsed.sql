@@ -0,0 +1,22 @@
+-- Migration 034: Pre-parsed street address components per voter
+-- Filled offline by scripts/parse_addresses.py (house number, directionals,
+-- street core/type and unit, USPS Pub. 28 abbreviations) and seeded with
+-- scripts/d1_seed_from_sqlite.py, so handlers can filter and order on an
+-- integer house_number instead of parsing addr1/addr_raw per request.
+
+CREATE TABLE IF NOT EXISTS voter_addr_parsed (
+  voter_id TEXT PRIMARY KEY,
+  house_number INTEGER,
+  house_suffix TEXT,
+  pre_dir TEXT,
+  street_core TEXT,
+  street_type TEXT,
+  post_dir TEXT,
+  unit_type TEXT,
+  unit_number TEXT,
+  street_canonical TEXT,
+  status TEXT NOT NULL DEFAULT 'ok'
+);
+
+CREATE INDEX IF NOT EXISTS idx_voter_addr_parsed_street_house
+  ON voter_addr_parsed(street_canonical, house_number);
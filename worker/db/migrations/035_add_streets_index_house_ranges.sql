@@ -0,0 +1,11 @@
+-- Migration 035: House-number ranges and address counts on streets_index
+-- Rebuilt offline by scripts/build_streets_index.py from the parsed voter
+-- addresses (voter_addr_parsed). The lookup index matches how /streets and
+-- the builder address a street: city_county_id + canonical name.
+
+ALTER TABLE streets_index ADD COLUMN house_min INTEGER;
+ALTER TABLE streets_index ADD COLUMN house_max INTEGER;
+ALTER TABLE streets_index ADD COLUMN address_count INTEGER;
+
+CREATE INDEX IF NOT EXISTS idx_streets_index_city_canonical
+  ON streets_index(city_county_id, street_canonical);
@@ -0,0 +1,25 @@
+-- Migration 036: House-number-ordered doors per street side
+-- Built offline by scripts/build_house_order.py from voter_addr_parsed and
+-- the streets_index links. One row per voter with a numbered address:
+-- parity splits a street into its even (0) and odd (1) side, and position
+-- is the door's rank on that side in house-number order (0-based; voters
+-- at the same house share a position). /canvass/nearby turns "N doors
+-- either side of house X" into two index range scans on position instead
+-- of sorting the whole street by ABS(house - X).
+
+CREATE TABLE IF NOT EXISTS street_house_order (
+  voter_id TEXT PRIMARY KEY,
+  streets_index_id INTEGER NOT NULL REFERENCES streets_index(id),
+  parity INTEGER NOT NULL,
+  position INTEGER NOT NULL,
+  house_number INTEGER NOT NULL,
+  house_suffix TEXT
+);
+
+-- window lookup: doors at positions [p - N, p + N] on one side
+CREATE INDEX IF NOT EXISTS idx_street_house_order_position
+  ON street_house_order(streets_index_id, parity, position);
+
+-- anchor lookup: first door at or above house X on one side
+CREATE INDEX IF NOT EXISTS idx_street_house_order_house
+  ON street_house_order(streets_index_id, parity, house_number, position);
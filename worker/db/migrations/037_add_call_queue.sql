@@ -0,0 +1,25 @@
+-- Migration 037: Pre-ranked call queue for "get next voter"
+-- Built offline by scripts/build_call_queue.py from voters and v_best_phone
+-- plus call_activity, call_followups and voter_contacts. One row per voter
+-- per queue: 'all', 'county:<COUNTY>', 'house:<NN>' and 'senate:<NN>'
+-- (districts zero-padded). priority is lower-first (due follow-ups, then
+-- never-called, then retries; within those Wyoming area codes and higher
+-- phone confidence first), so POST /call with only those filters pops the
+-- head of one queue from the index instead of scanning voters.
+-- built_at is when the row was ranked; calls logged after it are skipped
+-- at pop time until the next refresh re-ranks the voter.
+
+CREATE TABLE IF NOT EXISTS call_queue (
+  queue TEXT NOT NULL,
+  voter_id TEXT NOT NULL,
+  priority INTEGER NOT NULL,
+  reason TEXT,                    -- 'followup','new','retry'
+  built_at TEXT,
+  PRIMARY KEY (queue, voter_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_call_queue_pop
+  ON call_queue(queue, priority, voter_id);
+
+CREATE INDEX IF NOT EXISTS idx_call_queue_voter
+  ON call_queue(voter_id);
@@ -0,0 +1,57 @@
+-- Migration 038: Full-text name search for /contact-form/search-names
+-- Built offline by scripts/build_name_search.py from voters_addr_norm and
+-- voters. voter_name_search holds one row per voter with normalized names
+-- (upper case, no diacritics, apostrophes or periods; other punctuation
+-- becomes a space) plus city, county and zip. Exact-name and same-city
+-- ranking compare against these columns directly.
+-- voter_name_fts is an FTS5 index over the same values with prefix
+-- indexes, so "last name starts with SMI" is an index lookup instead of a
+-- LIKE over every voter in the county. Its rowid is voter_name_search's
+-- rowid; the triggers below keep it in step with the seeder's INSERT OR
+-- REPLACE and DELETE statements (the BEFORE INSERT trigger drops the entry
+-- a REPLACE is about to overwrite, since REPLACE does not fire DELETE
+-- triggers). Note that `wrangler d1 export` skips virtual tables; rebuild
+-- the index by re-seeding voter_name_search.
+
+CREATE TABLE IF NOT EXISTS voter_name_search (
+  voter_id TEXT PRIMARY KEY,
+  ln_norm TEXT NOT NULL,
+  fn_norm TEXT,
+  city TEXT,
+  county TEXT,
+  zip TEXT
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS voter_name_fts USING fts5(
+  ln, fn, city, county, zip,
+  prefix = '1 2 3 4',
+  tokenize = 'unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_voter_name_search_replace
+BEFORE INSERT ON voter_name_search
+BEGIN
+  DELETE FROM voter_name_fts
+  WHERE rowid IN (SELECT rowid FROM voter_name_search WHERE voter_id = NEW.voter_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_voter_name_search_insert
+AFTER INSERT ON voter_name_search
+BEGIN
+  INSERT INTO voter_name_fts (rowid, ln, fn, city, county, zip)
+  VALUES (NEW.rowid, NEW.ln_norm, NEW.fn_norm, NEW.city, NEW.county, NEW.zip);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_voter_name_search_delete
+AFTER DELETE ON voter_name_search
+BEGIN
+  DELETE FROM voter_name_fts WHERE rowid = OLD.rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_voter_name_search_update
+AFTER UPDATE ON voter_name_search
+BEGIN
+  DELETE FROM voter_name_fts WHERE rowid = OLD.rowid;
+  INSERT INTO voter_name_fts (rowid, ln, fn, city, county, zip)
+  VALUES (NEW.rowid, NEW.ln_norm, NEW.fn_norm, NEW.city, NEW.county, NEW.zip);
+END;
@@ -0,0 +1,18 @@
+-- Migration 039: Populate district_coverage offline, with voter counts
+-- scripts/build_district_coverage.py fills district_coverage from wy.sqlite
+-- in one aggregation pass over voters (the population 008 deferred) and
+-- seeds it through the regular seeding path. cell is the row's stable key
+-- ('house:07:ALBANY:LARAMIE') used for keyset batches, checkpoints and
+-- --delta syncs; voter_count is the number of voters in that district,
+-- county and city. Rows only exist for voters with a city, so city '' (the
+-- whole county, see getCityCountyIdsForDistrict) is never written by the
+-- builder.
+
+ALTER TABLE district_coverage ADD COLUMN cell TEXT;
+ALTER TABLE district_coverage ADD COLUMN voter_count INTEGER NOT NULL DEFAULT 0;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_district_coverage_cell
+  ON district_coverage (cell);
+
+CREATE INDEX IF NOT EXISTS idx_district_coverage_county_type
+  ON district_coverage (county, district_type, district_code);
@@ -0,0 +1,196 @@
+-- Migration 040: Activity rollups for the admin dashboards
+-- /admin/stats and /admin/pulse used to count voters, voter_contacts and
+-- pulse_optins in full on every load. scripts/refresh_rollups.py folds new
+-- activity into the summary tables below: each run adds only rows whose id
+-- is above the source's high-water mark in rollup_state, grouped by day,
+-- the voter's county and districts, and method/outcome, then advances the
+-- mark. The fold, the state update and the cleanup run as one statement
+-- file, which D1 commits as a unit.
+--
+--   contact_rollup   voter_contacts per day, county, house, senate, method, outcome
+--   call_rollup      call_activity per day, county, house, senate, outcome
+--   pulse_rollup     pulse_optins per day, contact_method, consent_source
+--   activity_totals  all-time counts per source and method/outcome (what
+--                    /admin/stats and /admin/pulse read; a few dozen rows)
+--   voter_rollup     voters per county, house, senate; recounted when the
+--                    voters table changed (its MAX(rowid) moved)
+--
+-- Missing values are stored as '' so they take part in the primary keys.
+-- Rows above the mark are not in the rollups yet; the Worker adds them
+-- with a rowid range scan, so the dashboards stay exact between refreshes.
+-- The triggers keep the rollups right when an already folded row is
+-- edited or deleted (admin contact edits, pulse opt-in deletes): they
+-- subtract the old row and add the new one. A voter's county and districts
+-- are looked up when a row is folded; after re-seeding voters with moved
+-- districts, run the refresh with --full.
+
+CREATE TABLE IF NOT EXISTS rollup_state (
+  source TEXT PRIMARY KEY,
+  last_id INTEGER NOT NULL DEFAULT 0,
+  pending_id INTEGER,
+  refreshed_at TEXT
+);
+
+INSERT OR IGNORE INTO rollup_state (source, last_id) VALUES
+  ('voter_contacts', 0), ('call_activity', 0), ('pulse_optins', 0), ('voters', -1);
+
+CREATE TABLE IF NOT EXISTS contact_rollup (
+  day TEXT NOT NULL,
+  county TEXT NOT NULL,
+  house TEXT NOT NULL,
+  senate TEXT NOT NULL,
+  method TEXT NOT NULL,
+  outcome TEXT NOT NULL,
+  contacts INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, county, house, senate, method, outcome)
+);
+
+CREATE TABLE IF NOT EXISTS call_rollup (
+  day TEXT NOT NULL,
+  county TEXT NOT NULL,
+  house TEXT NOT NULL,
+  senate TEXT NOT NULL,
+  outcome TEXT NOT NULL,
+  calls INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, county, house, senate, outcome)
+);
+
+CREATE TABLE IF NOT EXISTS pulse_rollup (
+  day TEXT NOT NULL,
+  contact_method TEXT NOT NULL,
+  consent_source TEXT NOT NULL,
+  optins INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, contact_method, consent_source)
+);
+
+CREATE TABLE IF NOT EXISTS activity_totals (
+  source TEXT NOT NULL,
+  method TEXT NOT NULL,
+  outcome TEXT NOT NULL,
+  n INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (source, method, outcome)
+);
+
+CREATE TABLE IF NOT EXISTS voter_rollup (
+  county TEXT NOT NULL,
+  house TEXT NOT NULL,
+  senate TEXT NOT NULL,
+  voters INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (county, house, senate)
+);
+
+CREATE INDEX IF NOT EXISTS idx_contact_rollup_county_day ON contact_rollup (county, day);
+CREATE INDEX IF NOT EXISTS idx_call_rollup_county_day ON call_rollup (county, day);
+
+-- voter_contacts: edits and deletes of folded rows
+
+CREATE TRIGGER IF NOT EXISTS trg_voter_contacts_rollup_update
+AFTER UPDATE OF voter_id, method, outcome, created_at ON voter_contacts
+WHEN OLD.id <= (SELECT last_id FROM rollup_state WHERE source = 'voter_contacts')
+BEGIN
+  INSERT INTO contact_rollup (day, county, house, senate, method, outcome, contacts)
+  SELECT COALESCE(date(r.created_at), ''), COALESCE(UPPER(TRIM(v.county)), ''), COALESCE(TRIM(v.house), ''),
+         COALESCE(TRIM(v.senate), ''), COALESCE(r.method, ''), COALESCE(r.outcome, ''), r.delta
+  FROM (SELECT OLD.voter_id AS voter_id, OLD.created_at AS created_at, OLD.method AS method,
+               OLD.outcome AS outcome, -1 AS delta
+        UNION ALL
+        SELECT NEW.voter_id, NEW.created_at, NEW.method, NEW.outcome, 1) r
+  LEFT JOIN voters v ON v.voter_id = r.voter_id
+  WHERE 1
+  ON CONFLICT (day, county, house, senate, method, outcome) DO UPDATE SET contacts = contacts + excluded.contacts;
+  INSERT INTO activity_totals (source, method, outcome, n)
+  VALUES ('voter_contacts', COALESCE(OLD.method, ''), COALESCE(OLD.outcome, ''), -1)
+  ON CONFLICT (source, method, outcome) DO UPDATE SET n = n + excluded.n;
+  INSERT INTO activity_totals (source, method, outcome, n)
+  VALUES ('voter_contacts', COALESCE(NEW.method, ''), COALESCE(NEW.outcome, ''), 1)
+  ON CONFLICT (source, method, outcome) DO UPDATE SET n = n + excluded.n;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_voter_contacts_rollup_delete
+AFTER DELETE ON voter_contacts
+WHEN OLD.id <= (SELECT last_id FROM rollup_state WHERE source = 'voter_contacts')
+BEGIN
+  INSERT INTO contact_rollup (day, county, house, senate, method, outcome, contacts)
+  SELECT COALESCE(date(OLD.created_at), ''), COALESCE(UPPER(TRIM(v.county)), ''), COALESCE(TRIM(v.house), ''),
+         COALESCE(TRIM(v.senate), ''), COALESCE(OLD.method, ''), COALESCE(OLD.outcome, ''), -1
+  FROM (SELECT OLD.voter_id AS voter_id) r
+  LEFT JOIN voters v ON v.voter_id = r.voter_id
+  WHERE 1
+  ON CONFLICT (day, county, house, senate, method, outcome) DO UPDATE SET contacts = contacts + excluded.contacts;
+  INSERT INTO activity_totals (source, method, outcome, n)
+  VALUES ('voter_contacts', COALESCE(OLD.method, ''), COALESCE(OLD.outcome, ''), -1)
+  ON CONFLICT (source, method, outcome) DO UPDATE SET n = n + excluded.n;
+END;
+
+-- call_activity: the outcome is call_result, or outcome where only that is set
+
+CREATE TRIGGER IF NOT EXISTS trg_call_activity_rollup_update
+AFTER UPDATE OF voter_id, call_result, outcome, created_at ON call_activity
+WHEN OLD.id <= (SELECT last_id FROM rollup_state WHERE source = 'call_activity')
+BEGIN
+  INSERT INTO call_rollup (day, county, house, senate, outcome, calls)
+  SELECT COALESCE(date(r.created_at), ''), COALESCE(UPPER(TRIM(v.county)), ''), COALESCE(TRIM(v.house), ''),
+         COALESCE(TRIM(v.senate), ''), r.outcome, r.delta
+  FROM (SELECT OLD.voter_id AS voter_id, OLD.created_at AS created_at,
+               COALESCE(NULLIF(OLD.call_result, ''), OLD.outcome, '') AS outcome, -1 AS delta
+        UNION ALL
+        SELECT NEW.voter_id, NEW.created_at, COALESCE(NULLIF(NEW.call_result, ''), NEW.outcome, ''), 1) r
+  LEFT JOIN voters v ON v.voter_id = r.voter_id
+  WHERE 1
+  ON CONFLICT (day, county, house, senate, outcome) DO UPDATE SET calls = calls + excluded.calls;
+  INSERT INTO activity_totals (source, method, outcome, n)
+  VALUES ('call_activity', '', COALESCE(NULLIF(OLD.call_result, ''), OLD.outcome, ''), -1)
+  ON CONFLICT (source, method, outcome) DO UPDATE SET n = n + excluded.n;
+  INSERT INTO activity_totals (source, method, outcome, n)
+  VALUES ('call_activity', '', COALESCE(NULLIF(NEW.call_result, ''), NEW.outcome, ''), 1)
+  ON CONFLICT (source, method, outcome) DO UPDATE SET n = n + excluded.n;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_call_activity_rollup_delete
+AFTER DELETE ON call_activity
+WHEN OLD.id <= (SELECT last_id FROM rollup_state WHERE source = 'call_activity')
+BEGIN
+  INSERT INTO call_rollup (day, county, house, senate, outcome, calls)
+  SELECT COALESCE(date(OLD.created_at), ''), COALESCE(UPPER(TRIM(v.county)), ''), COALESCE(TRIM(v.house), ''),
+         COALESCE(TRIM(v.senate), ''), COALESCE(NULLIF(OLD.call_result, ''), OLD.outcome, ''), -1
+  FROM (SELECT OLD.voter_id AS voter_id) r
+  LEFT JOIN voters v ON v.voter_id = r.voter_id
+  WHERE 1
+  ON CONFLICT (day, county, house, senate, outcome) DO UPDATE SET calls = calls + excluded.calls;
+  INSERT INTO activity_totals (source, method, outcome, n)
+  VALUES ('call_activity', '', COALESCE(NULLIF(OLD.call_result, ''), OLD.outcome, ''), -1)
+  ON CONFLICT (source, method, outcome) DO UPDATE SET n = n + excluded.n;
+END;
+
+-- pulse_optins: activity_totals keeps contact_method as method and
+-- consent_source as outcome
+
+CREATE TRIGGER IF NOT EXISTS trg_pulse_optins_rollup_update
+AFTER UPDATE OF contact_method, consent_source, created_at ON pulse_optins
+WHEN OLD.id <= (SELECT last_id FROM rollup_state WHERE source = 'pulse_optins')
+BEGIN
+  INSERT INTO pulse_rollup (day, contact_method, consent_source, optins)
+  VALUES (COALESCE(date(OLD.created_at), ''), COALESCE(OLD.contact_method, ''), COALESCE(OLD.consent_source, ''), -1)
+  ON CONFLICT (day, contact_method, consent_source) DO UPDATE SET optins = optins + excluded.optins;
+  INSERT INTO pulse_rollup (day, contact_method, consent_source, optins)
+  VALUES (COALESCE(date(NEW.created_at), ''), COALESCE(NEW.contact_method, ''), COALESCE(NEW.consent_source, ''), 1)
+  ON CONFLICT (day, contact_method, consent_source) DO UPDATE SET optins = optins + excluded.optins;
+  INSERT INTO activity_totals (source, method, outcome, n)
+  VALUES ('pulse_optins', COALESCE(OLD.contact_method, ''), COALESCE(OLD.consent_source, ''), -1)
+  ON CONFLICT (source, method, outcome) DO UPDATE SET n = n + excluded.n;
+  INSERT INTO activity_totals (source, method, outcome, n)
+  VALUES ('pulse_optins', COALESCE(NEW.contact_method, ''), COALESCE(NEW.consent_source, ''), 1)
+  ON CONFLICT (source, method, outcome) DO UPDATE SET n = n + excluded.n;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_pulse_optins_rollup_delete
+AFTER DELETE ON pulse_optins
+WHEN OLD.id <= (SELECT last_id FROM rollup_state WHERE source = 'pulse_optins')
+BEGIN
+  INSERT INTO pulse_rollup (day, contact_method, consent_source, optins)
+  VALUES (COALESCE(date(OLD.created_at), ''), COALESCE(OLD.contact_method, ''), COALESCE(OLD.consent_source, ''), -1)
+  ON CONFLICT (day, contact_method, consent_source) DO UPDATE SET optins = optins + excluded.optins;
+  INSERT INTO activity_totals (source, method, outcome, n)
+  VALUES ('pulse_optins', COALESCE(OLD.contact_method, ''), COALESCE(OLD.consent_source, ''), -1)
+  ON CONFLICT (source, method, outcome) DO UPDATE SET n = n + excluded.n;
+END;
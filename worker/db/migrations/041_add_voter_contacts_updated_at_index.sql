@@ -0,0 +1,7 @@
+-- Migration 041: Index voter_contacts.updated_at for incremental pulls
+-- scripts/pull_activity.py re-reads contacts edited since its last pull with
+-- WHERE updated_at >= ? ... ORDER BY updated_at, id. id is the rowid, so this
+-- index serves the range and the order without reading the rest of the table.
+
+CREATE INDEX IF NOT EXISTS idx_voter_contacts_updated_at
+  ON voter_contacts (updated_at);
@@ -108,13 +108,112 @@ async function checkExistingAddress(env, county, city, street, houseNumber) {
   };
 }
 
+// Name search index (migration 038, scripts/build_name_search.py).
+// nameKey and buildNameMatch mirror scripts/d1seed/names.py.
+let nameIndexReady = null;
+
+function nameKey(value) {
+  if (value === null || value === undefined) return '';
+  return String(value)
+    .normalize('NFKD')
+    .replace(/\p{M}/gu, '')
+    .toUpperCase()
+    .replace(/['.`\u2019]/g, '')
+    .replace(/[^A-Z0-9]+/g, ' ')
+    .trim();
+}
+
+function buildNameMatch({ county, firstName, lastName }) {
+  const last = nameKey(lastName).split(' ').filter(Boolean);
+  if (!last.length) return null;
+  const terms = last.map(token => `ln : "${token}"*`);
+  nameKey(firstName).split(' ').filter(Boolean).forEach(token => terms.push(`fn : "${token}"*`));
+  const countyKey = nameKey(county);
+  if (countyKey) terms.push(`county : "${countyKey}"`);
+  return terms.join(' AND ');
+}
+
+async function hasNameIndex(db) {
+  if (nameIndexReady !== null) return nameIndexReady;
+  try {
+    const row = await db.prepare('SELECT 1 AS ok FROM voter_name_search LIMIT 1').first();
+    nameIndexReady = Boolean(row);
+  } catch (err) {
+    const message = String(err?.message || err).toLowerCase();
+    if (!message.includes('no such table')) throw err;
+    nameIndexReady = false;
+  }
+  return nameIndexReady;
+}
+
+// Prefix matches from the FTS5 index, ranked on the stored normalized
+// names: exact and near-exact names first, then voters in the requested
+// city. Only the 25 winners are joined to the voter tables.
+async function searchNameIndex(db, addrTable, { county, city, firstName, lastName }) {
+  const match = buildNameMatch({ county, firstName, lastName });
+  if (!match) return [];
+  const query = `
+    SELECT
+      v.voter_id,
+      a.fn as first_name,
+      a.ln as last_name,
+      a.addr1,
+      a.city,
+      v.county,
+      a.zip,
+      v.political_party,
+      p.phone_e164,
+      m.match_score,
+      m.same_city
+    FROM (
+      SELECT s.voter_id, s.ln_norm, s.fn_norm,
+        CASE
+          WHEN s.ln_norm = ?2 AND s.fn_norm = ?3 THEN 100
+          WHEN s.ln_norm = ?2 AND SUBSTR(s.fn_norm, 1, 1) = SUBSTR(?3, 1, 1) THEN 80
+          WHEN s.ln_norm = ?2 THEN 60
+          WHEN s.fn_norm = ?3 AND s.ln_norm LIKE ?2 || '%' THEN 70
+          ELSE 40
+        END as match_score,
+        COALESCE(s.city = ?4, 0) as same_city
+      FROM voter_name_fts
+      JOIN voter_name_search s ON s.rowid = voter_name_fts.rowid
+      WHERE voter_name_fts MATCH ?1
+      ORDER BY match_score DESC, same_city DESC, s.ln_norm, s.fn_norm
+      LIMIT 25
+    ) m
+    JOIN voters v ON v.voter_id = m.voter_id
+    JOIN ${addrTable} a ON a.voter_id = m.voter_id
+    LEFT JOIN best_phone p ON p.voter_id = m.voter_id
+    ORDER BY m.match_score DESC, m.same_city DESC, m.ln_norm, m.fn_norm
+  `;
+  const cityKey = city ? String(city).trim().toUpperCase() : null;
+  const result = await db
+    .prepare(query)
+    .bind(match, nameKey(lastName), nameKey(firstName), cityKey)
+    .all();
+  return result.results;
+}
+
 // 5. POST /api/contact-form/search-names
-// Fuzzy search for similar names in area
+// Fuzzy search for similar names in area. Uses the name index when it has
+// been seeded; otherwise LIKE over the address table, limited to the city.
 async function searchSimilarNames(db, { county, city, firstName, lastName }) {
   if (!db) {
     throw new Error('Database connection unavailable');
   }
   const addrTable = await resolveAddrTable(db);
+  if (await hasNameIndex(db)) {
+    try {
+      return await searchNameIndex(db, addrTable, { county, city, firstName, lastName });
+    } catch (err) {
+      const message = String(err?.message || err).toLowerCase();
+      if (!message.includes('no such table') && !message.includes('fts5') && !message.includes('no such module')) {
+        throw err;
+      }
+      console.warn('name index unavailable, falling back to LIKE search', err);
+      nameIndexReady = false;
+    }
+  }
   const caseParams = [
     lastName, firstName,
     lastName, firstName,
@@ -9,6 +9,7 @@ import { sendResendEmail } from './resend.js';
 const JSON_CONTENT_TYPE = 'application/json; charset=utf-8';
 const tableCache = new Map();
 const tableColumnsCache = new Map();
+const CALL_QUEUE_HEAD = 25;
 const DEFAULT_ICEBREAKER =
   "Hi, I'm a volunteer with Grassroots MVT. Do you have a minute to chat about the campaign?";
 
@@ -175,6 +176,53 @@ function normalizeDistrictCode(value) {
   return trimmed.toUpperCase();
 }
 
+/**
+ * Queue key of a prebuilt call_queue for a "next voter" filter set, or null
+ * when the filters need the full scan (city or party filters, or county
+ * combined with a district).
+ */
+function callQueueKey(filters = {}) {
+  if (filters.city || (Array.isArray(filters.parties) && filters.parties.length)) return null;
+  const county = normalizeTextValue(filters.county);
+  if (filters.district_type && filters.district) {
+    if (county) return null;
+    const district = normalizeDistrictCode(filters.district);
+    return district ? `${filters.district_type === 'senate' ? 'senate' : 'house'}:${district}` : null;
+  }
+  return county ? `county:${county}` : 'all';
+}
+
+/**
+ * Pick the next voter from a call_queue: the best-priority rows still
+ * callable (not excluded, not contacted, no call logged since the row was
+ * ranked), choosing at random among the leading tier so concurrent
+ * volunteers rarely get the same voter.
+ */
+async function popCallQueue(db, { queueTable, queueKey, contactsTable, callTable, excludeIds = [] }) {
+  let sql = `SELECT q.voter_id, q.priority FROM ${queueTable} q WHERE q.queue = ?1`;
+  const params = [queueKey];
+  let paramIndex = 2;
+  if (contactsTable) {
+    sql += ` AND (q.reason = 'followup' OR NOT EXISTS (SELECT 1 FROM ${contactsTable} vc WHERE vc.voter_id = q.voter_id))`;
+  }
+  if (callTable) {
+    sql += ` AND NOT EXISTS (SELECT 1 FROM ${callTable} ca WHERE ca.voter_id = q.voter_id AND ca.created_at >= q.built_at)`;
+  }
+  if (excludeIds.length) {
+    const placeholders = excludeIds.map(() => `?${paramIndex++}`).join(',');
+    sql += ` AND q.voter_id NOT IN (${placeholders})`;
+    params.push(...excludeIds);
+  }
+  sql += ` ORDER BY q.priority, q.voter_id LIMIT ${CALL_QUEUE_HEAD}`;
+  const result = await buildStatement(db, sql, params).all();
+  const head = result.results || [];
+  if (!head.length) return null;
+  // priority = tier * 1e8 + ...; only pick among the first row's tier
+  const tier = Math.floor(head[0].priority / 1e8);
+  const candidates = head.filter(row => Math.floor(row.priority / 1e8) === tier);
+  return candidates[Math.floor(Math.random() * candidates.length)].voter_id;
+}
+
 function buildDistrictNormalizationExpr(column) {
   return `CASE
     WHEN TRIM(${column}) GLOB '[0-9]*' AND TRIM(${column}) <> ''
@@ -1083,7 +1131,9 @@ router.post('/call', async (request, env, ctx) => {
     if (body.filters !== undefined || body.exclude_ids !== undefined) {
       const votersTable = await resolveTable(env, ['voters']);
       const addrTable = await resolveTable(env, ['voters_addr_norm', 'voters_addr', 'voter_addresses']);
-      const phoneTable = await resolveTableOptional(env, ['best_phone', 'voter_phones', 'v_best_phone', 'best_phone_view']);
+      // v_best_phone holds one ranked E.164 phone per voter (scripts/build_best_phone.py),
+      // so the join is a primary-key lookup rather than a trip through the best_phone view.
+      const phoneTable = await resolveTableOptional(env, ['v_best_phone', 'best_phone', 'voter_phones', 'best_phone_view']);
       const phoneJoinClause = phoneTable ? `LEFT JOIN ${phoneTable} bp ON v.voter_id = bp.voter_id` : '-- no phone table available';
       const phoneValueExpr = phoneTable ? "NULLIF(bp.phone_e164, '')" : 'NULL';
       const phoneValueSelectExpr = phoneTable ? `COALESCE(${phoneValueExpr}, '')` : `''`;
@@ -1092,7 +1142,7 @@ router.post('/call', async (request, env, ctx) => {
       const excludeIds = Array.isArray(body.exclude_ids) ? body.exclude_ids : [];
       const excludeContacted = body.exclude_contacted !== false; // Default true
 
-      let sql = `
+      const selectVoterSql = `
         SELECT v.voter_id,
                COALESCE(va.fn, '') AS first_name,
                COALESCE(va.ln, '') AS last_name,
@@ -1107,54 +1157,79 @@ router.post('/call', async (request, env, ctx) => {
         LEFT JOIN ${addrTable} va ON v.voter_id = va.voter_id
         ${phoneJoinClause}
         LEFT JOIN ${contactsTable} vc ON v.voter_id = vc.voter_id
-        WHERE 1 = 1
       `;
-      const params = [];
-      let paramIndex = 1;
 
-      // Exclude voters who have already been contacted (unless explicitly disabled)
-      if (excludeContacted) {
-        sql += ` AND vc.voter_id IS NULL`;
+      // Filter sets that match a prebuilt queue (scripts/build_call_queue.py)
+      // pop its head from the index; anything else, or an empty or missing
+      // queue, falls through to the filtered scan below.
+      let voter = null;
+      const queueKey = callQueueKey(filters);
+      const queueTable = queueKey ? await resolveTableOptional(env, ['call_queue']) : null;
+      if (queueTable) {
+        const callTable = await resolveTableOptional(env, ['call_activity', 'call_log', 'calls']);
+        const queuedVoterId = await popCallQueue(db, {
+          queueTable,
+          queueKey,
+          contactsTable: excludeContacted ? contactsTable : null,
+          callTable,
+          excludeIds,
+        });
+        if (queuedVoterId) {
+          const queuedResult = await buildStatement(db, `${selectVoterSql} WHERE v.voter_id = ?1`, [queuedVoterId]).all();
+          voter = queuedResult.results?.[0] || null;
+        }
+        console.log('[/call] call_queue pop', { queueKey, voter_id: voter?.voter_id || null });
       }
 
-      if (filters.county) {
-        sql += ` AND v.county = ?${paramIndex++}`;
-        params.push(filters.county);
-      }
-      if (filters.city) {
-        sql += ` AND va.city = ?${paramIndex++}`;
-        params.push(filters.city);
-      }
-      if (Array.isArray(filters.parties) && filters.parties.length) {
-        const placeholders = filters.parties.map(() => `?${paramIndex++}`).join(',');
-        sql += ` AND v.political_party IN (${placeholders})`;
-        params.push(...filters.parties);
-      }
-      if (filters.require_phone) {
-        if (phoneTable) {
-          sql += ` AND ${phoneValueExpr} IS NOT NULL`;
-        } else {
-          return ctx.jsonResponse(
-            { ok: true, empty: true, message: 'No phone data available for this environment.' },
-            200,
-            ctx.allowedOrigin
-          );
+      if (!voter) {
+        let sql = `${selectVoterSql} WHERE 1 = 1`;
+        const params = [];
+        let paramIndex = 1;
+
+        // Exclude voters who have already been contacted (unless explicitly disabled)
+        if (excludeContacted) {
+          sql += ` AND vc.voter_id IS NULL`;
         }
-      }
-      if (filters.district_type && filters.district) {
-        const column = filters.district_type === 'senate' ? 'v.senate' : 'v.house';
-        sql += ` AND ${column} = ?${paramIndex++}`;
-        params.push(filters.district);
-      }
-      if (excludeIds.length) {
-        const placeholders = excludeIds.map(() => `?${paramIndex++}`).join(',');
-        sql += ` AND v.voter_id NOT IN (${placeholders})`;
-        params.push(...excludeIds);
-      }
-      sql += ' ORDER BY RANDOM() LIMIT 1';
 
-      const voterResult = await buildStatement(db, sql, params).all();
-      const voter = voterResult.results?.[0];
+        if (filters.county) {
+          sql += ` AND v.county = ?${paramIndex++}`;
+          params.push(filters.county);
+        }
+        if (filters.city) {
+          sql += ` AND va.city = ?${paramIndex++}`;
+          params.push(filters.city);
+        }
+        if (Array.isArray(filters.parties) && filters.parties.length) {
+          const placeholders = filters.parties.map(() => `?${paramIndex++}`).join(',');
+          sql += ` AND v.political_party IN (${placeholders})`;
+          params.push(...filters.parties);
+        }
+        if (filters.require_phone) {
+          if (phoneTable) {
+            sql += ` AND ${phoneValueExpr} IS NOT NULL`;
+          } else {
+            return ctx.jsonResponse(
+              { ok: true, empty: true, message: 'No phone data available for this environment.' },
+              200,
+              ctx.allowedOrigin
+            );
+          }
+        }
+        if (filters.district_type && filters.district) {
+          const column = filters.district_type === 'senate' ? 'v.senate' : 'v.house';
+          sql += ` AND ${column} = ?${paramIndex++}`;
+          params.push(filters.district);
+        }
+        if (excludeIds.length) {
+          const placeholders = excludeIds.map(() => `?${paramIndex++}`).join(',');
+          sql += ` AND v.voter_id NOT IN (${placeholders})`;
+          params.push(...excludeIds);
+        }
+        sql += ' ORDER BY RANDOM() LIMIT 1';
+
+        const voterResult = await buildStatement(db, sql, params).all();
+        voter = voterResult.results?.[0];
+      }
 
       if (voter) {
         return ctx.jsonResponse(
@@ -1454,7 +1529,7 @@ router.post('/canvass/nearby', async (request, env, ctx) => {
   try {
     const votersTable = await resolveTable(env, ['voters']);
     const addrTable = await resolveTable(env, ['voters_addr_norm', 'voters_addr', 'voter_addresses']);
-    const phoneTable = await resolveTableOptional(env, ['best_phone', 'voter_phones', 'v_best_phone', 'best_phone_view']);
+    const phoneTable = await resolveTableOptional(env, ['v_best_phone', 'best_phone', 'voter_phones', 'best_phone_view']);
     const phoneColumns = phoneTable ? await getTableColumns(env, phoneTable) : [];
     const hasConfidenceColumn = phoneColumns.includes('confidence_code');
     const phoneJoinClause = phoneTable ? `LEFT JOIN ${phoneTable} bp ON v.voter_id = bp.voter_id` : '-- no phone table available';
@@ -1462,6 +1537,12 @@ router.post('/canvass/nearby', async (request, env, ctx) => {
     const phoneValueSelectExpr = phoneTable ? `COALESCE(${phoneValueExpr}, '')` : `''`;
     const phoneConfidenceExpr = phoneTable && hasConfidenceColumn ? 'bp.confidence_code' : 'NULL';
     const useStreetId = hasStreetId;
+    // Doors either side of the house come from the precomputed per-side
+    // house order (scripts/build_house_order.py) when it has been seeded.
+    const houseOrderTable = useStreetId && numericHouse !== null
+      ? await resolveTableOptional(env, ['street_house_order'])
+      : null;
+    const doorRange = Math.min(Math.max(Number(range) || 20, 1), 200);
     const addrColumns = await getTableColumns(env, addrTable);
     const fnExpr = addrColumns.includes('fn')
       ? "COALESCE(va.fn, '')"
@@ -1474,93 +1555,129 @@ router.post('/canvass/nearby', async (request, env, ctx) => {
         ? "COALESCE(va.last_name, '')"
         : "''";
 
-    let query = `
-      SELECT v.voter_id,
-             ${fnExpr} AS first_name,
-             ${lnExpr} AS last_name,
-             COALESCE(va.addr1, '') AS address,
-             COALESCE(va.city, '') AS city,
-             COALESCE(va.zip, '') AS zip,
-             v.county,
-             v.political_party AS party,
-             ${phoneValueSelectExpr} AS phone_e164,
-             ${phoneConfidenceExpr} AS phone_confidence,
-             COALESCE(va.house, v.house, '') AS house_district,
-             COALESCE(va.senate, v.senate, '') AS senate_district
-      FROM ${votersTable} v
-      LEFT JOIN ${addrTable} va ON v.voter_id = va.voter_id
-      ${phoneJoinClause}
-      WHERE 1 = 1
-    `;
+    const buildPrimaryQuery = (useHouseOrder) => {
+      let query = useHouseOrder ? `
+        WITH anchor AS (
+          SELECT s.parity,
+                 COALESCE(
+                   (SELECT a.position FROM ${houseOrderTable} a
+                     WHERE a.streets_index_id = ?1 AND a.parity = s.parity AND a.house_number >= ?2
+                     ORDER BY a.house_number, a.position LIMIT 1),
+                   (SELECT a.position FROM ${houseOrderTable} a
+                     WHERE a.streets_index_id = ?1 AND a.parity = s.parity
+                     ORDER BY a.position DESC LIMIT 1)) AS pos
+          FROM (SELECT 0 AS parity UNION ALL SELECT 1) s
+        ),
+        doors AS (
+          SELECT o.voter_id, o.house_number
+          FROM anchor
+          JOIN ${houseOrderTable} o
+            ON o.streets_index_id = ?1 AND o.parity = anchor.parity
+           AND o.position BETWEEN anchor.pos - ?3 AND anchor.pos + ?3
+        )` : '';
+      query += `
+        SELECT v.voter_id,
+               ${fnExpr} AS first_name,
+               ${lnExpr} AS last_name,
+               COALESCE(va.addr1, '') AS address,
+               COALESCE(va.city, '') AS city,
+               COALESCE(va.zip, '') AS zip,
+               v.county,
+               v.political_party AS party,
+               ${phoneValueSelectExpr} AS phone_e164,
+               ${phoneConfidenceExpr} AS phone_confidence,
+               COALESCE(va.house, v.house, '') AS house_district,
+               COALESCE(va.senate, v.senate, '') AS senate_district
+        FROM ${useHouseOrder ? `doors d JOIN ${votersTable} v ON v.voter_id = d.voter_id` : `${votersTable} v`}
+        LEFT JOIN ${addrTable} va ON v.voter_id = va.voter_id
+        ${phoneJoinClause}
+        WHERE 1 = 1
+      `;
 
-    const params = [];
-    let paramIndex = 1;
+      const params = useHouseOrder ? [streetId, numericHouse, doorRange] : [];
+      let paramIndex = params.length + 1;
+
+      if (useHouseOrder) {
+        // street and house number are already applied by the doors window
+      } else if (useStreetId) {
+        query += ` AND va.street_index_id = ?${paramIndex}`;
+        params.push(streetId);
+        paramIndex++;
+      } else if (streetFilter) {
+        query += ` AND UPPER(va.addr1) LIKE '%' || ?${paramIndex} || '%'`;
+        params.push(streetFilter);
+        paramIndex++;
+      }
 
-    if (useStreetId) {
-      query += ` AND va.street_index_id = ?${paramIndex}`;
-      params.push(streetId);
-      paramIndex++;
-    } else if (streetFilter) {
-      query += ` AND UPPER(va.addr1) LIKE '%' || ?${paramIndex} || '%'`;
-      params.push(streetFilter);
-      paramIndex++;
-    }
+      // Filter by house number if provided (fast exact match)
+      if (houseNumberFilter && !useHouseOrder) {
+        const houseNumberExpr = `TRIM(SUBSTR(va.addr_raw, 1, INSTR(va.addr_raw || ' ', ' ') - 1))`;
+        query += ` AND va.addr_raw IS NOT NULL`;
+      }
 
-    // Filter by house number if provided (fast exact match)
-    if (houseNumberFilter) {
-      const houseNumberExpr = `TRIM(SUBSTR(va.addr_raw, 1, INSTR(va.addr_raw || ' ', ' ') - 1))`;
-      query += ` AND va.addr_raw IS NOT NULL`;
-    }
+      if (voterIdFilter) {
+        query += ` AND v.voter_id = ?${paramIndex}`;
+        params.push(voterIdFilter);
+        paramIndex++;
+      }
 
-    if (voterIdFilter) {
-      query += ` AND v.voter_id = ?${paramIndex}`;
-      params.push(voterIdFilter);
-      paramIndex++;
-    }
+      if (countyFilter) {
+        query += ` AND v.county = ?${paramIndex}`;
+        params.push(countyFilter);
+        paramIndex++;
+      }
 
-    if (countyFilter) {
-      query += ` AND v.county = ?${paramIndex}`;
-      params.push(countyFilter);
-      paramIndex++;
-    }
+      if (cityFilter) {
+        query += ` AND va.city = ?${paramIndex}`;
+        params.push(cityFilter);
+        paramIndex++;
+      }
 
-    if (cityFilter) {
-      query += ` AND va.city = ?${paramIndex}`;
-      params.push(cityFilter);
-      paramIndex++;
-    }
+      if (partiesFilter.length > 0) {
+        const placeholders = partiesFilter.map(() => `?${paramIndex++}`).join(',');
+        query += ` AND UPPER(v.political_party) IN (${placeholders})`;
+        params.push(...partiesFilter);
+      }
+      if (filters.district_type && filters.district) {
+        const column = filters.district_type === 'senate' ? 'v.senate' : 'v.house';
+        query += ` AND ${column} = ?${paramIndex++}`;
+        params.push(filters.district);
+        if (districtCityFilter) {
+          query += ` AND UPPER(TRIM(COALESCE(va.city, ''))) = ?${paramIndex++}`;
+          params.push(districtCityFilter);
+        }
+      }
 
-    if (partiesFilter.length > 0) {
-      const placeholders = partiesFilter.map(() => `?${paramIndex++}`).join(',');
-      query += ` AND UPPER(v.political_party) IN (${placeholders})`;
-      params.push(...partiesFilter);
-    }
-    if (filters.district_type && filters.district) {
-      const column = filters.district_type === 'senate' ? 'v.senate' : 'v.house';
-      query += ` AND ${column} = ?${paramIndex++}`;
-      params.push(filters.district);
-      if (districtCityFilter) {
-        query += ` AND UPPER(TRIM(COALESCE(va.city, ''))) = ?${paramIndex++}`;
-        params.push(districtCityFilter);
+      if (house && range && !useHouseOrder) {
+        query += ` AND va.addr_raw IS NOT NULL AND va.addr_raw != ''`;
       }
-    }
 
-    if (house && range) {
-      query += ` AND va.addr_raw IS NOT NULL AND va.addr_raw != ''`;
-    }
+      if (useHouseOrder) {
+        query += ` ORDER BY ABS(d.house_number - ?2) ASC, d.house_number ASC, v.voter_id LIMIT ?${paramIndex}`;
+        params.push(limit);
+      } else if (houseNumberFilter && numericHouse !== null) {
+        const houseNumberExpr = `TRIM(SUBSTR(va.addr_raw, 1, INSTR(va.addr_raw || ' ', ' ') - 1))`;
+        const houseNumberCasted = `CAST(${houseNumberExpr} AS INTEGER)`;
+        query += ` ORDER BY CASE WHEN ${houseNumberCasted} IS NULL THEN 1 ELSE 0 END, ABS(${houseNumberCasted} - ?${paramIndex}) ASC, ${houseNumberCasted} ASC, v.voter_id LIMIT ?${paramIndex + 1}`;
+        params.push(numericHouse, limit);
+      } else {
+        query += ` ORDER BY v.voter_id LIMIT ?${paramIndex}`;
+        params.push(limit);
+      }
+      return { query, params };
+    };
 
-    if (houseNumberFilter && numericHouse !== null) {
-      const houseNumberExpr = `TRIM(SUBSTR(va.addr_raw, 1, INSTR(va.addr_raw || ' ', ' ') - 1))`;
-      const houseNumberCasted = `CAST(${houseNumberExpr} AS INTEGER)`;
-      query += ` ORDER BY CASE WHEN ${houseNumberCasted} IS NULL THEN 1 ELSE 0 END, ABS(${houseNumberCasted} - ?${paramIndex}) ASC, ${houseNumberCasted} ASC, v.voter_id LIMIT ?${paramIndex + 1}`;
-      params.push(numericHouse, limit);
-    } else {
-      query += ` ORDER BY v.voter_id LIMIT ?${paramIndex}`;
-      params.push(limit);
+    let result = { results: [] };
+    if (houseOrderTable) {
+      const primary = buildPrimaryQuery(true);
+      result = await buildStatement(db, primary.query, primary.params).all();
+      console.log('[/canvass/nearby] house order result count', result.results ? result.results.length : 0);
+    }
+    if (!result.results || result.results.length === 0) {
+      const primary = buildPrimaryQuery(false);
+      result = await buildStatement(db, primary.query, primary.params).all();
+      console.log('[/canvass/nearby] primary result count', result.results ? result.results.length : 0);
     }
-
-    let result = await buildStatement(db, query, params).all();
-    console.log('[/canvass/nearby] primary result count', result.results ? result.results.length : 0);
 
     // GUARD: If street_index_id search returns 0 results and we have a street name,
     // fall back to street name matching. This handles data misalignment where
@@ -3625,7 +3742,7 @@ router.get('/admin/field-sessions/:id/nearby-voters', async (request, env, ctx)
 
     const votersTable = await resolveTable(env, ['voters']);
     const addrTable = await resolveTable(env, ['voters_addr_norm', 'voters_addr', 'voter_addresses']);
-    const phoneTable = await resolveTableOptional(env, ['best_phone', 'voter_phones', 'v_best_phone', 'best_phone_view']);
+    const phoneTable = await resolveTableOptional(env, ['v_best_phone', 'best_phone', 'voter_phones', 'best_phone_view']);
 
     const phoneJoin = phoneTable ? `LEFT JOIN ${phoneTable} bp ON v.voter_id = bp.voter_id` : '';
     const phoneExpr = phoneTable ? `NULLIF(bp.phone_e164, '')` : 'NULL';
@@ -4285,6 +4402,62 @@ router.get('/admin/whoami', async (request, env, ctx) => {
   }
 });
 
+// High-water marks from scripts/refresh_rollups.py (migration 040), or null
+// until a refresh has run. Rows above a source's mark are not in the
+// rollups yet; readers count them with a rowid range.
+async function readRollupState(db) {
+  try {
+    const result = await buildStatement(db, `
+      SELECT source, last_id, refreshed_at FROM rollup_state WHERE refreshed_at IS NOT NULL
+    `).all();
+    const rows = result?.results || [];
+    if (!rows.length) return null;
+    return Object.fromEntries(rows.map(row => [row.source, row]));
+  } catch (err) {
+    const message = String(err?.message || err).toLowerCase();
+    if (!message.includes('no such table')) throw err;
+    return null;
+  }
+}
+
+const CONTACTS_TAIL = `FROM voter_contacts WHERE id > (SELECT last_id FROM rollup_state WHERE source = 'voter_contacts')`;
+
+// /admin/stats from activity_totals and voter_rollup plus the contacts
+// logged since the last refresh. Methods and outcomes left empty are
+// stored as '' and left out, like NULLs.
+async function readStatsFromRollups(db) {
+  const totalVoters = await buildStatement(db, `
+    SELECT COALESCE(SUM(voters), 0) as count FROM voter_rollup
+  `).first();
+  const totalContacts = await buildStatement(db, `
+    SELECT (SELECT COALESCE(SUM(n), 0) FROM activity_totals WHERE source = 'voter_contacts')
+         + (SELECT COUNT(*) ${CONTACTS_TAIL}) as count
+  `).first();
+  const contactsByMethod = await buildStatement(db, `
+    SELECT method, SUM(n) as count
+    FROM (SELECT method, n FROM activity_totals WHERE source = 'voter_contacts'
+          UNION ALL SELECT COALESCE(method, ''), 1 ${CONTACTS_TAIL})
+    WHERE method <> ''
+    GROUP BY method
+    HAVING SUM(n) > 0
+  `).all();
+  const contactsByOutcome = await buildStatement(db, `
+    SELECT outcome, SUM(n) as count
+    FROM (SELECT outcome, n FROM activity_totals WHERE source = 'voter_contacts'
+          UNION ALL SELECT COALESCE(outcome, ''), 1 ${CONTACTS_TAIL})
+    WHERE outcome <> ''
+    GROUP BY outcome
+    HAVING SUM(n) > 0
+    ORDER BY count DESC
+  `).all();
+  return {
+    total_voters: totalVoters?.count || 0,
+    total_contacts: totalContacts?.count || 0,
+    by_method: contactsByMethod?.results || [],
+    by_outcome: contactsByOutcome?.results || [],
+  };
+}
+
 router.get('/admin/stats', async (request, env, ctx) => {
   try {
     const auth = await ensureAuth(request, env, ctx.config);
@@ -4298,8 +4471,26 @@ router.get('/admin/stats', async (request, env, ctx) => {
     // Get voter contact statistics
     const contactTable = await resolveTable(env, ['voter_contacts', 'voter_contact']);
     const votersTable = await resolveTable(env, ['voters']);
+
+    // Rollups cover voter_contacts / voters only; other layouts count in full
+    const rollups = contactTable === 'voter_contacts' && votersTable === 'voters'
+      ? await readRollupState(db)
+      : null;
+    if (rollups?.voter_contacts && rollups?.voters) {
+      return ctx.jsonResponse(
+        {
+          ok: true,
+          stats: await readStatsFromRollups(db),
+          rollups_refreshed_at: rollups.voter_contacts.refreshed_at,
+          admin: auth.email,
+        },
+        200,
+        ctx.allowedOrigin
+      );
+    }
+
     const columns = await getTableColumns(env, contactTable);
-    
+
     // Determine which column name to use for method
     const methodColumn = columns.includes('method') 
       ? 'method' 
@@ -4748,9 +4939,17 @@ router.get('/admin/pulse', async (request, env, ctx) => {
       LIMIT ?1 OFFSET ?2
     `, [limit, offset]).all();
     
-    const total = await buildStatement(db, `
-      SELECT COUNT(*) as count FROM ${pulseTable}
-    `).first();
+    // With rollups, the total is the folded count plus opt-ins since the refresh
+    const rollups = pulseTable === 'pulse_optins' ? await readRollupState(db) : null;
+    const total = rollups?.pulse_optins
+      ? await buildStatement(db, `
+        SELECT (SELECT COALESCE(SUM(n), 0) FROM activity_totals WHERE source = 'pulse_optins')
+             + (SELECT COUNT(*) FROM pulse_optins
+                WHERE id > (SELECT last_id FROM rollup_state WHERE source = 'pulse_optins')) as count
+      `).first()
+      : await buildStatement(db, `
+        SELECT COUNT(*) as count FROM ${pulseTable}
+      `).first();
     
     return ctx.jsonResponse(
       {